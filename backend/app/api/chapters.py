@@ -12,6 +12,7 @@ from app.models.database import Novel, Chapter
 from app.db.init_db import get_db_session
 from app.models.schemas import ChapterListItem, ChapterContent
 from app.utils.encoding_detector import EncodingDetector
+from app.services.index_versions import get_index_versions
 
 router = APIRouter(
     prefix="/api/novels/{novel_id}/chapters",
@@ -64,6 +65,11 @@ class ChapterCache:
 chapter_cache = ChapterCache(max_size=100)
 
 
+def _chapter_cache_key(novel_id: int, chapter_num: int) -> str:
+    """章节缓存键（包含索引版本号，重新索引/追加章节后旧内容不再被读取）"""
+    return f"novel_{novel_id}_v{get_index_versions().get(novel_id)}_chapter_{chapter_num}"
+
+
 # ==================== API端点 ====================
 
 @router.get("", response_model=List[ChapterListItem])
@@ -126,7 +132,7 @@ def get_chapter_content(
         )
     
     # 尝试从缓存读取
-    cache_key = f"novel_{novel_id}_chapter_{chapter_num}"
+    cache_key = _chapter_cache_key(novel_id, chapter_num)
     content = chapter_cache.get(cache_key)
     
     # 缓存未命中,从文件读取
@@ -213,7 +219,7 @@ def clear_chapter_cache(
     清除特定章节的缓存
     (管理功能,可选实现)
     """
-    cache_key = f"novel_{novel_id}_chapter_{chapter_num}"
+    cache_key = _chapter_cache_key(novel_id, chapter_num)
     if cache_key in chapter_cache._cache:
         del chapter_cache._cache[cache_key]
         chapter_cache._access_order.remove(cache_key)
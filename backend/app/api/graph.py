@@ -5,13 +5,12 @@
 """
 
 import logging
-import pickle
-from pathlib import Path
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 
 from app.services.graph.graph_exporter import get_graph_exporter
+from app.services.graph.graph_repository import get_graph_repository
 
 logger = logging.getLogger(__name__)
 
@@ -69,9 +68,9 @@ async def get_relation_graph(
         RelationGraphResponse: 关系图数据
     """
     try:
-        # 加载图谱
-        graph_path = Path(f"./data/graphs/novel_{novel_id}_graph.pkl")
-        if not graph_path.exists():
+        # 加载图谱（共享只读缓存）
+        graph = get_graph_repository().get_graph(novel_id)
+        if graph is None:
             logger.warning(f"小说 {novel_id} 的知识图谱不存在，返回空数据")
             # 返回空图谱数据而不是报错
             return RelationGraphResponse(
@@ -86,9 +85,6 @@ async def get_relation_graph(
                 }
             )
         
-        with open(graph_path, 'rb') as f:
-            graph = pickle.load(f)
-        
         # 章节范围过滤
         chapter_filter = None
         if start_chapter is not None and end_chapter is not None:
@@ -157,17 +153,14 @@ async def get_node_details(
         dict: 节点详细信息
     """
     try:
-        # 加载图谱
-        graph_path = Path(f"./data/graphs/novel_{novel_id}_graph.pkl")
-        if not graph_path.exists():
+        # 加载图谱（共享只读缓存）
+        graph = get_graph_repository().get_graph(novel_id)
+        if graph is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"小说 {novel_id} 的知识图谱不存在"
             )
         
-        with open(graph_path, 'rb') as f:
-            graph = pickle.load(f)
-        
         # 导出节点详情
         exporter = get_graph_exporter()
         node_details = exporter.export_node_details(graph, node_id)
@@ -204,17 +197,14 @@ async def get_graph_statistics(novel_id: int):
         dict: 统计数据
     """
     try:
-        # 加载图谱
-        graph_path = Path(f"./data/graphs/novel_{novel_id}_graph.pkl")
-        if not graph_path.exists():
+        # 加载图谱（共享只读缓存）
+        graph = get_graph_repository().get_graph(novel_id)
+        if graph is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"小说 {novel_id} 的知识图谱不存在"
             )
         
-        with open(graph_path, 'rb') as f:
-            graph = pickle.load(f)
-        
         # 导出统计信息
         exporter = get_graph_exporter()
         stats = exporter.export_statistics(graph)
@@ -257,9 +247,9 @@ async def get_timeline(
         TimelineResponse: 时间线数据
     """
     try:
-        # 加载图谱
-        graph_path = Path(f"./data/graphs/novel_{novel_id}_graph.pkl")
-        if not graph_path.exists():
+        # 加载图谱（共享只读缓存）
+        graph = get_graph_repository().get_graph(novel_id)
+        if graph is None:
             logger.warning(f"小说 {novel_id} 的知识图谱不存在，返回空时间线")
             return TimelineResponse(
                 events=[],
@@ -271,9 +261,6 @@ async def get_timeline(
                 }
             )
         
-        with open(graph_path, 'rb') as f:
-            graph = pickle.load(f)
-        
         # 解析过滤参数
         entity_names = set()
         if entity_filter:
@@ -441,12 +428,8 @@ async def get_statistics(novel_id: int):
             # 获取章节信息
             chapters = db.query(Chapter).filter(Chapter.novel_id == novel_id).all()
             
-            # 加载知识图谱
-            graph_path = Path(f"./data/graphs/novel_{novel_id}_graph.pkl")
-            graph = None
-            if graph_path.exists():
-                with open(graph_path, 'rb') as f:
-                    graph = pickle.load(f)
+            # 加载知识图谱（共享只读缓存）
+            graph = get_graph_repository().get_graph(novel_id)
             
             # 计算统计数据
             total_chapters = novel.total_chapters or len(chapters)
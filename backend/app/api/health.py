@@ -8,7 +8,7 @@ from datetime import datetime
 import logging
 
 from app.db.init_db import get_db_session
-from app.core.chromadb_client import get_chroma_client
+from app.core.vector_store import get_vector_store
 from app.core.config import settings
 
 router = APIRouter(tags=["健康检查"])
@@ -39,6 +39,8 @@ async def detailed_health_check(db: Session = Depends(get_db_session)):
     - 数据库连接
     - ChromaDB连接
     - 文件存储
+    - BM25索引缓存（命中/未命中/淘汰计数）
+    - 知识图谱缓存（命中/未命中计数）
     """
     health_status = {
         "service": "novel-rag-backend",
@@ -62,17 +64,18 @@ async def detailed_health_check(db: Session = Depends(get_db_session)):
             "error": str(e)
         }
     
-    # 检查ChromaDB
+    # 检查向量存储
     try:
-        chroma_client = get_chroma_client()
-        collections = chroma_client.list_collections()
-        health_status["components"]["chromadb"] = {
+        vector_store = get_vector_store()
+        collections = vector_store.list_collections()
+        health_status["components"]["vector_store"] = {
             "status": "healthy",
+            "backend": vector_store.backend_name,
             "collections_count": len(collections)
         }
     except Exception as e:
-        logger.error(f"ChromaDB健康检查失败: {e}")
-        health_status["components"]["chromadb"] = {
+        logger.error(f"向量存储健康检查失败: {e}")
+        health_status["components"]["vector_store"] = {
             "status": "unhealthy",
             "error": str(e)
         }
@@ -97,6 +100,63 @@ async def detailed_health_check(db: Session = Depends(get_db_session)):
             "error": str(e)
         }
     
+    # BM25 索引缓存统计
+    try:
+        from app.services.bm25_retriever import get_bm25_registry
+        health_status["components"]["bm25_index_cache"] = {
+            "status": "healthy",
+            **get_bm25_registry().get_stats()
+        }
+    except Exception as e:
+        logger.error(f"BM25索引缓存检查失败: {e}")
+        health_status["components"]["bm25_index_cache"] = {
+            "status": "unhealthy",
+            "error": str(e)
+        }
+    
+    # 知识图谱缓存统计
+    try:
+        from app.services.graph.graph_repository import get_graph_repository
+        health_status["components"]["graph_cache"] = {
+            "status": "healthy",
+            **get_graph_repository().get_stats()
+        }
+    except Exception as e:
+        logger.error(f"知识图谱缓存检查失败: {e}")
+        health_status["components"]["graph_cache"] = {
+            "status": "unhealthy",
+            "error": str(e)
+        }
+    
+    # 查询规划缓存统计（查询改写/分解）
+    try:
+        from app.services.query_plan_cache import get_query_plan_cache
+        plan_cache = get_query_plan_cache()
+        health_status["components"]["query_plan_cache"] = (
+            {"status": "healthy", **plan_cache.get_stats()} if plan_cache is not None
+            else {"status": "disabled"}
+        )
+    except Exception as e:
+        logger.error(f"查询规划缓存检查失败: {e}")
+        health_status["components"]["query_plan_cache"] = {
+            "status": "unhealthy",
+            "error": str(e)
+        }
+    
+    # 并发请求合并统计
+    try:
+        from app.core.single_flight import get_coalescing_stats
+        health_status["components"]["request_coalescing"] = {
+            "status": "healthy" if settings.query_coalescing_enabled else "disabled",
+            **get_coalescing_stats()
+        }
+    except Exception as e:
+        logger.error(f"请求合并统计失败: {e}")
+        health_status["components"]["request_coalescing"] = {
+            "status": "unhealthy",
+            "error": str(e)
+        }
+    
     # 检查智谱AI配置
     try:
         has_api_key = bool(settings.zhipu_api_key and settings.zhipu_api_key != "your_zhipuai_api_key_here")
@@ -134,9 +194,8 @@ async def readiness_check(db: Session = Depends(get_db_session)):
         # 检查数据库连接
         db.execute("SELECT 1")
         
-        # 检查ChromaDB
-        chroma_client = get_chroma_client()
-        chroma_client.list_collections()
+        # 检查向量存储
+        get_vector_store().list_collections()
         
         return {"ready": True}
     except Exception as e:
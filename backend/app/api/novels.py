@@ -143,6 +143,8 @@ async def delete_novel(
     - 删除数据库记录
     - 删除上传的文件
     - 删除ChromaDB集合
+    - 删除BM25索引与分块特征
+    - 递增索引版本号（使查询/章节/图谱缓存失效）
     """
     novel = db.query(Novel).filter(Novel.id == novel_id).first()
     
@@ -154,18 +156,33 @@ async def delete_novel(
         file_storage = get_file_storage()
         file_storage.delete_file(novel.file_path)
         
-        # 删除ChromaDB集合
-        from app.core.chromadb_client import get_chroma_client
-        chroma_client = get_chroma_client()
+        # 删除向量集合
+        from app.core.vector_store import get_vector_store
         try:
-            chroma_client.delete_collection(f"novel_{novel_id}")
+            get_vector_store().delete_collection(f"novel_{novel_id}")
         except:
             pass  # 集合可能不存在
         
+        # 删除BM25索引（同时移出进程内缓存）
+        from app.services.bm25_retriever import BM25Retriever
+        BM25Retriever(novel_id).delete_index()
+        
+        # 删除预计算的分块特征
+        from app.services.chunk_features import ChunkFeatureStore
+        ChunkFeatureStore(novel_id).delete()
+        
+        # 删除分块文本中心存储
+        from app.services.chunk_store import ChunkStore
+        ChunkStore(novel_id).delete()
+        
         # 删除数据库记录（CASCADE会自动删除chapters）
         db.delete(novel)
         db.commit()
         
+        # 使该小说的缓存失效（小说ID可能被复用）
+        from app.services.query_cache import get_query_cache
+        get_query_cache().clear_novel(novel_id)
+        
         logger.info(f"✅ 小说已删除: ID={novel_id}")
         
         return {"message": f"小说 {novel.title} 已删除", "novel_id": novel_id}
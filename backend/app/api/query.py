@@ -4,10 +4,11 @@
 
 import logging
 import time
+from contextlib import aclosing
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query as QueryParam
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from pydantic import BaseModel
 
 from app.db.init_db import get_db_session
@@ -20,6 +21,9 @@ from app.core.error_handlers import NovelNotFoundError
 from app.models.database import Novel, Query
 from app.core.trace_logger import get_trace_logger
 from app.core.config import settings
+from app.core.executors import run_blocking
+from app.core.single_flight import get_single_flight, get_stream_fanout
+from app.services.index_versions import get_index_versions
 
 router = APIRouter(prefix="/api/query", tags=["智能问答"])
 logger = logging.getLogger(__name__)
@@ -123,7 +127,7 @@ async def query_novel(
         
         # 执行RAG查询
         rag_engine = get_rag_engine()
-        answer, citations, stats, rewritten_query = rag_engine.query(
+        result = await rag_engine.aquery(
             db=db,
             novel_id=request.novel_id,
             query=request.query,
@@ -133,25 +137,16 @@ async def query_novel(
             query_id=temp_query_id,
             recency_bias_weight=request.recency_bias_weight
         )
+        answer = result.answer
+        citations = result.citations
+        rewritten_query = result.rewritten_query
+        reranked_chunks = result.reranked_chunks
         
         # 统计Prompt和Completion tokens
-        # 注意：这里使用估算，因为非流式接口不返回实际的usage信息
-        # 可以通过重新构建prompt来计算，或者估算
-        query_embedding = rag_engine.query_embedding(request.query)
-        vector_results = rag_engine.vector_search(request.novel_id, query_embedding)
-        reranked_chunks = rag_engine.rerank(
-            request.query, 
-            vector_results, 
-            None,
-            novel_id=request.novel_id,
-            db=db,
-            recency_bias_weight=request.recency_bias_weight
-        )
-        
-        # 构建prompt用于计算tokens
-        prompt = rag_engine.build_prompt(db, request.novel_id, request.query, reranked_chunks)
-        prompt_tokens = token_counter.count_tokens(prompt)
-        completion_tokens = token_counter.count_tokens(answer)
+        # 优先使用提供商返回的usage，缺失时基于实际Prompt和答案估算
+        usage = result.usage or {}
+        prompt_tokens = usage.get('prompt_tokens') or token_counter.count_tokens(result.prompt)
+        completion_tokens = usage.get('completion_tokens') or token_counter.count_tokens(answer)
         
         total_tokens = embedding_tokens + prompt_tokens + completion_tokens
         
@@ -164,7 +159,7 @@ async def query_novel(
             answer=answer,
             citations=[{'score': c.score} for c in citations],
             reranked_chunks=reranked_chunks,
-            retrieved_count=stats.get('retrieved_chunks', 0)
+            retrieved_count=result.retrieved_count
         )
         
         # 获取置信度详情（用于日志）
@@ -172,7 +167,7 @@ async def query_novel(
             answer=answer,
             citations=[{'score': c.score} for c in citations],
             reranked_chunks=reranked_chunks,
-            retrieved_count=stats.get('retrieved_chunks', 0)
+            retrieved_count=result.retrieved_count
         )
         logger.info(f"📊 置信度计算: {confidence_level.value} "
                    f"(得分: {confidence_details['confidence_percentage']:.1f}%)")
@@ -311,6 +306,373 @@ async def query_novel(
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
+def _validate_answer_with_self_rag(
+    db: Session,
+    novel_id: Optional[int],
+    full_answer: str,
+    query_id: int
+) -> Tuple[List[Dict], str, str]:
+    """
+    Self-RAG验证：提取断言 → 收集证据 → 一致性检查 → 矛盾检测 → 答案修正
+    
+    包含同步的Embedding/LLM调用与数据库查询，流式问答中通过 run_blocking 在执行器中运行
+    
+    Args:
+        db: 数据库会话
+        novel_id: 小说ID
+        full_answer: 生成的答案
+        query_id: 查询ID（用于日志记录）
+    
+    Returns:
+        Tuple[List[Dict], str, str]: (矛盾列表, 置信度, 修正后的答案)
+    """
+    # Self-RAG验证流程
+    from app.services.self_rag import (
+        get_assertion_extractor,
+        get_evidence_collector,
+        get_evidence_scorer,
+        get_consistency_checker,
+        get_contradiction_detector,
+        get_answer_corrector
+    )
+    
+    contradictions_list = []
+    confidence_level = "high"
+    corrected_answer = full_answer
+    
+    try:
+        # 1. 提取断言
+        assertion_extractor = get_assertion_extractor()
+        assertions = assertion_extractor.extract_assertions(full_answer, query_id=query_id)
+        logger.info(f"✅ 提取断言: {len(assertions)} 个")
+        
+        if assertions:
+            # 2. 收集证据
+            evidence_collector = get_evidence_collector()
+            evidence_map = {}
+            
+            for idx, assertion in enumerate(assertions):
+                evidence_list = evidence_collector.collect_evidence_for_assertion(
+                    db, novel_id, assertion, top_k=3
+                )
+                evidence_map[idx] = evidence_list
+            
+            logger.info(f"✅ 收集证据完成")
+            
+            # 详细日志：证据收集
+            trace_logger.trace_step(
+                query_id=query_id,
+                step_name="Self-RAG: 证据收集",
+                emoji="📚",
+                input_data=f"为{len(assertions)}个断言收集证据",
+                output_data={
+                    "证据总数": sum(len(v) for v in evidence_map.values()),
+                    "每个断言的证据数": {f"断言{k}": len(v) for k, v in evidence_map.items()}
+                },
+                status="success"
+            )
+            
+            # 3. 评分证据
+            evidence_scorer = get_evidence_scorer()
+            for idx, assertion in enumerate(assertions):
+                evidence_list = evidence_map.get(idx, [])
+                # 对每条证据进行评分
+                scored_evidence_list = []
+                for evidence in evidence_list:
+                    scored = evidence_scorer.score_evidence(
+                        db=db,
+                        novel_id=novel_id,
+                        evidence=evidence,
+                        query_context={'assertion': assertion}
+                    )
+                    # 将评分信息添加到证据中
+                    evidence['score'] = scored
+                    scored_evidence_list.append(evidence)
+                evidence_map[idx] = scored_evidence_list
+            
+            # 4. 一致性检查
+            consistency_checker = get_consistency_checker()
+            
+            # 4.1 时序一致性检查
+            temporal_issues = consistency_checker.check_temporal_consistency(
+                assertions, evidence_map
+            )
+            
+            # 4.2 角色一致性检查
+            character_issues = consistency_checker.check_character_consistency(
+                db, novel_id, assertions, evidence_map
+            )
+            
+            # 合并一致性检查结果
+            consistency_report = {
+                'temporal_issues': temporal_issues,
+                'character_issues': character_issues,
+                'total_issues': len(temporal_issues) + len(character_issues)
+            }
+            
+            logger.info(f"✅ 一致性检查完成: {consistency_report['total_issues']} 个问题")
+            
+            # 详细日志：一致性检查
+            trace_logger.trace_step(
+                query_id=query_id,
+                step_name="Self-RAG: 一致性检查",
+                emoji="🔗",
+                input_data={
+                    "断言数量": len(assertions),
+                    "证据总数": sum(len(v) for v in evidence_map.values())
+                },
+                output_data={
+                    "时序问题": len(temporal_issues),
+                    "角色一致性问题": len(character_issues),
+                    "总问题数": consistency_report['total_issues']
+                },
+                status="success"
+            )
+            
+            # 5. 检测矛盾
+            contradiction_detector = get_contradiction_detector()
+            contradictions = contradiction_detector.detect_contradictions(
+                db, novel_id, assertions, evidence_map, consistency_report
+            )
+            
+            # 转换为可序列化的字典列表
+            contradictions_list = [
+                {
+                    'type': c.type,
+                    'earlyDescription': c.early_description,
+                    'earlyChapter': c.early_chapter,
+                    'lateDescription': c.late_description,
+                    'lateChapter': c.late_chapter,
+                    'analysis': c.analysis,
+                    'confidence': c.confidence
+                }
+                for c in contradictions
+            ]
+            
+            logger.info(f"✅ 检测到矛盾: {len(contradictions_list)} 个")
+            
+            # 详细日志：矛盾检测
+            trace_logger.trace_step(
+                query_id=query_id,
+                step_name="Self-RAG: 矛盾检测",
+                emoji="⚠️",
+                input_data="基于断言、证据和一致性检查结果",
+                output_data={
+                    "矛盾数量": len(contradictions_list),
+                    "矛盾列表": contradictions_list
+                },
+                status="success"
+            )
+            
+            # 6. 修正答案
+            if contradictions:
+                answer_corrector = get_answer_corrector()
+                correction_result = answer_corrector.correct_answer(
+                    full_answer, contradictions, "high"
+                )
+                corrected_answer = correction_result.get('corrected_answer', full_answer)
+                confidence_level = correction_result.get('final_confidence', 'high')
+                
+                logger.info(f"✅ 答案修正完成，置信度: {confidence_level}")
+                
+                # 详细日志：答案修正
+                trace_logger.trace_step(
+                    query_id=query_id,
+                    step_name="Self-RAG: 答案修正",
+                    emoji="🔧",
+                    input_data={
+                        "原始答案长度": len(full_answer),
+                        "矛盾数量": len(contradictions)
+                    },
+                    output_data={
+                        "修正后答案长度": len(corrected_answer),
+                        "最终置信度": confidence_level,
+                        "是否修改": corrected_answer != full_answer
+                    },
+                    status="success"
+                )
+    
+    except Exception as e:
+        logger.error(f"⚠️ Self-RAG验证失败: {e}")
+        # Self-RAG失败不影响主流程，继续返回原答案
+    
+    return contradictions_list, confidence_level, corrected_answer
+
+
+async def _prepare_stream_query(
+    rag_engine,
+    db: Session,
+    novel_ids: List[int],
+    query: str,
+    enable_query_rewrite: bool,
+    enable_query_decomposition: bool,
+    use_rewritten_in_prompt: bool,
+    top_k_retrieval: int,
+    top_k_rerank: int,
+    max_context_chunks: int,
+    recency_bias_weight: float,
+    query_id: int
+) -> Dict:
+    """
+    流式问答准备阶段：查询改写 → 查询分解 → 向量化 → 检索 → Rerank → Prompt构建
+    
+    不发送WebSocket消息：相同的并发流式查询通过 SingleFlight 共享同一次准备结果，各连接按结果自行发送进度
+    
+    Args:
+        rag_engine: RAG引擎
+        db: 数据库会话
+        novel_ids: 已完成索引的小说ID列表（第一本为主小说）
+        query: 原始查询
+        enable_query_rewrite: 是否启用查询改写
+        enable_query_decomposition: 是否启用查询分解
+        use_rewritten_in_prompt: Prompt是否使用改写后的查询
+        top_k_retrieval: 检索数量
+        top_k_rerank: Rerank保留数量
+        max_context_chunks: Prompt最多使用的分块数
+        recency_bias_weight: 时间衰减权重
+        query_id: 查询ID（用于日志记录）
+    
+    Returns:
+        Dict: rewritten_query、sub_queries、reranked_chunks、prompt（未检索到相关内容时为None）、embedding_tokens
+    """
+    # 查询改写
+    rewrite_result = await run_blocking(
+        "llm",
+        rag_engine.query_rewriter.rewrite_query,
+        query,
+        enable=enable_query_rewrite,
+        query_id=query_id
+    )
+    query_for_retrieval = rewrite_result["rewritten"]
+    rewritten_query = query_for_retrieval if rewrite_result["rewrite_applied"] else None
+    
+    # 🔨 查询分解（如果启用）
+    sub_queries = None
+    logger.info(f"🔧 [DEBUG] 流式查询 - 检查查询分解: enable_query_decomposition={enable_query_decomposition}")
+    
+    if enable_query_decomposition:
+        logger.info(f"🔧 [DEBUG] 流式查询 - 进入查询分解逻辑")
+        try:
+            from app.services.query_decomposer import QueryDecomposer
+            # settings 已在文件顶部导入，无需重复导入
+            
+            decomposer = QueryDecomposer(
+                zhipu_client=rag_engine.zhipu_client,
+                max_subqueries=settings.query_decomposition_max_subqueries,
+                complexity_threshold=settings.query_decomposition_complexity_threshold,
+                model=settings.query_decomposition_model
+            )
+            
+            # 判断是否需要分解（使用原始查询）
+            should_decompose, reason = await run_blocking("llm", decomposer.should_decompose, query)
+            logger.info(f"🔧 [DEBUG] 流式查询 - 复杂度判断: should_decompose={should_decompose}, reason='{reason}'")
+            
+            if should_decompose:
+                # 执行查询分解
+                sub_queries = await run_blocking(
+                    "llm",
+                    decomposer.decompose_query,
+                    query_for_retrieval,
+                    query_id=query_id
+                )
+                
+                if sub_queries and len(sub_queries) > 1:
+                    logger.info(f"🔨 流式查询 - 使用查询分解流程: {len(sub_queries)}个子查询")
+                    
+                    # ⚠️ 注意：流式查询暂不完全支持并行分解检索
+                    # 这里简单地使用第一个子查询作为主查询
+                    # TODO: 未来可以改进为真正的并行检索
+                    logger.warning(f"⚠️ 流式查询使用简化的分解模式：使用首个子查询")
+                    query_for_retrieval = sub_queries[0]
+                else:
+                    sub_queries = None
+        
+        except Exception as e:
+            logger.error(f"❌ 流式查询 - 查询分解失败: {e}")
+            import traceback
+            logger.error(f"❌ 异常堆栈:\n{traceback.format_exc()}")
+    else:
+        logger.info(f"🔧 [DEBUG] 流式查询 - 查询分解未启用")
+    
+    # 查询向量化（统计Embedding tokens，使用改写后的查询）
+    from app.utils.token_counter import get_token_counter
+    embedding_tokens = get_token_counter().count_tokens(query_for_retrieval)
+    
+    query_embedding = await run_blocking(
+        "llm",
+        rag_engine.query_embedding,
+        query_for_retrieval,
+        query_id=query_id
+    )
+    
+    # 语义检索（支持多小说）
+    if len(novel_ids) > 1:
+        logger.info(f"🔍 执行多小说检索: {len(novel_ids)} 本小说")
+        vector_results = await run_blocking(
+            "retrieval",
+            rag_engine.vector_search_multi,
+            novel_ids,
+            query_embedding,
+            top_k=top_k_retrieval,
+            query_id=query_id
+        )
+    else:
+        vector_results = await run_blocking(
+            "retrieval",
+            rag_engine.vector_search,
+            novel_ids[0],
+            query_embedding,
+            top_k=top_k_retrieval,
+            query_id=query_id
+        )
+    
+    # Rerank（带GraphRAG增强，使用配置的top_k_rerank）
+    # 注意：对于多小说查询，使用第一本小说的ID进行GraphRAG增强
+    reranked_chunks = await run_blocking(
+        "retrieval",
+        rag_engine.rerank,
+        query=query_for_retrieval,
+        vector_results=vector_results,
+        novel_id=novel_ids[0],
+        db=db,
+        top_k=top_k_rerank,
+        query_id=query_id,
+        recency_bias_weight=recency_bias_weight
+    )
+    
+    # 未检索到相关内容时不构建Prompt
+    prompt = None
+    if reranked_chunks:
+        # 构建自适应Prompt（使用配置的max_context_chunks）
+        # 根据配置决定使用原始查询还是改写后的查询
+        query_for_prompt = query_for_retrieval if (use_rewritten_in_prompt and rewritten_query) else query
+        
+        if use_rewritten_in_prompt and rewritten_query:
+            logger.info(f"💡 Prompt使用改写后的查询: {query_for_prompt}")
+        else:
+            logger.info(f"💡 Prompt使用原始查询: {query_for_prompt}")
+        
+        prompt = await run_blocking(
+            "retrieval",
+            rag_engine.prompt_builder.build_prompt,
+            db,
+            novel_ids[0],  # 主小说ID
+            query_for_prompt,  # 根据配置选择使用原始或改写后的查询
+            reranked_chunks,
+            max_chunks=max_context_chunks,
+            query_id=query_id,
+            novel_ids=novel_ids if len(novel_ids) > 1 else None  # 多小说时传递所有ID
+        )
+    
+    return {
+        'rewritten_query': rewritten_query,
+        'sub_queries': sub_queries,
+        'reranked_chunks': reranked_chunks,
+        'prompt': prompt,
+        'embedding_tokens': embedding_tokens
+    }
+
+
 @router.websocket("/stream")
 async def query_stream(websocket: WebSocket):
     """
@@ -456,14 +818,55 @@ async def query_stream(websocket: WebSocket):
             
             rag_engine = get_rag_engine()
             
-            # 查询改写
-            rewrite_result = rag_engine.query_rewriter.rewrite_query(
-                query, 
-                enable=enable_query_rewrite,
-                query_id=temp_query_id
-            )
-            query_for_retrieval = rewrite_result["rewritten"]
-            rewritten_query = query_for_retrieval if rewrite_result["rewrite_applied"] else None
+            # Token统计初始化
+            from app.services.token_stats_service import get_token_stats_service
+            token_stats_service = get_token_stats_service()
+            
+            from app.utils.token_counter import get_token_counter
+            token_counter = get_token_counter()
+            
+            prompt_tokens = 0
+            completion_tokens = 0
+            
+            # 准备阶段：查询改写/分解、向量化、检索、Rerank、Prompt构建
+            async def prepare() -> Dict:
+                return await _prepare_stream_query(
+                    rag_engine,
+                    db,
+                    novel_ids,
+                    query,
+                    enable_query_rewrite,
+                    enable_query_decomposition,
+                    use_rewritten_in_prompt,
+                    top_k_retrieval,
+                    top_k_rerank,
+                    max_context_chunks,
+                    recency_bias_weight,
+                    temp_query_id
+                )
+            
+            # 🔗 相同的并发流式查询合并为一次准备（键与 aquery 相同的查询参数，另含流式配置与索引版本号），
+            # 答案生成按同一个键共享增量流
+            coalescing_key = None
+            if settings.query_coalescing_enabled:
+                coalescing_key = rag_engine._coalescing_key(
+                    tuple(novel_ids), query, model, enable_query_rewrite, enable_query_decomposition, recency_bias_weight
+                ) + (
+                    top_k_retrieval,
+                    top_k_rerank,
+                    max_context_chunks,
+                    use_rewritten_in_prompt,
+                    tuple(get_index_versions().get(nid) for nid in novel_ids)
+                )
+                prepared, _ = await get_single_flight().ado(coalescing_key, prepare)
+            else:
+                prepared = await prepare()
+            
+            rewritten_query = prepared['rewritten_query']
+            sub_queries = prepared['sub_queries']
+            reranked_chunks = prepared['reranked_chunks']
+            prompt = prepared['prompt']
+            embedding_tokens = prepared['embedding_tokens']
             
             # 如果查询被改写，发送改写结果
             if rewritten_query:
@@ -474,53 +877,14 @@ async def query_stream(websocket: WebSocket):
                     metadata={"rewritten_query": rewritten_query}
                 ).model_dump())
             
-            # 🔨 查询分解（如果启用）
-            logger.info(f"🔧 [DEBUG] 流式查询 - 检查查询分解: enable_query_decomposition={enable_query_decomposition}")
-            
-            if enable_query_decomposition:
-                logger.info(f"🔧 [DEBUG] 流式查询 - 进入查询分解逻辑")
-                try:
-                    from app.services.query_decomposer import QueryDecomposer
-                    # settings 已在文件顶部导入，无需重复导入
-                    
-                    decomposer = QueryDecomposer(
-                        zhipu_client=rag_engine.zhipu_client,
-                        max_subqueries=settings.query_decomposition_max_subqueries,
-                        complexity_threshold=settings.query_decomposition_complexity_threshold,
-                        model=settings.query_decomposition_model
-                    )
-                    
-                    # 判断是否需要分解（使用原始查询）
-                    should_decompose, reason = decomposer.should_decompose(query)
-                    logger.info(f"🔧 [DEBUG] 流式查询 - 复杂度判断: should_decompose={should_decompose}, reason='{reason}'")
-                    
-                    if should_decompose:
-                        # 执行查询分解
-                        sub_queries = decomposer.decompose_query(query_for_retrieval, query_id=temp_query_id)
-                        
-                        if sub_queries and len(sub_queries) > 1:
-                            logger.info(f"🔨 流式查询 - 使用查询分解流程: {len(sub_queries)}个子查询")
-                            
-                            # 发送分解通知
-                            await websocket.send_json(StreamMessage(
-                                stage=QueryStage.UNDERSTANDING,
-                                content=f"查询已分解为 {len(sub_queries)} 个子问题",
-                                progress=0.2,
-                                metadata={"sub_queries": sub_queries}
-                            ).model_dump())
-                            
-                            # ⚠️ 注意：流式查询暂不完全支持并行分解检索
-                            # 这里简单地使用第一个子查询作为主查询
-                            # TODO: 未来可以改进为真正的并行检索
-                            logger.warning(f"⚠️ 流式查询使用简化的分解模式：使用首个子查询")
-                            query_for_retrieval = sub_queries[0]
-                            
-                except Exception as e:
-                    logger.error(f"❌ 流式查询 - 查询分解失败: {e}")
-                    import traceback
-                    logger.error(f"❌ 异常堆栈:\n{traceback.format_exc()}")
-            else:
-                logger.info(f"🔧 [DEBUG] 流式查询 - 查询分解未启用")
+            # 发送分解通知
+            if sub_queries:
+                await websocket.send_json(StreamMessage(
+                    stage=QueryStage.UNDERSTANDING,
+                    content=f"查询已分解为 {len(sub_queries)} 个子问题",
+                    progress=0.2,
+                    metadata={"sub_queries": sub_queries}
+                ).model_dump())
             
             # 阶段2: 检索上下文
             await websocket.send_json(StreamMessage(
@@ -529,50 +893,6 @@ async def query_stream(websocket: WebSocket):
                 progress=0.3
             ).model_dump())
             
-            # Token统计初始化
-            from app.services.token_stats_service import get_token_stats_service
-            token_stats_service = get_token_stats_service()
-            
-            embedding_tokens = 0
-            prompt_tokens = 0
-            completion_tokens = 0
-            
-            # 查询向量化（统计Embedding tokens，使用改写后的查询）
-            from app.utils.token_counter import get_token_counter
-            token_counter = get_token_counter()
-            embedding_tokens += token_counter.count_tokens(query_for_retrieval)
-            
-            query_embedding = rag_engine.query_embedding(query_for_retrieval, query_id=temp_query_id)
-            
-            # 语义检索（支持多小说）
-            if len(novel_ids) > 1:
-                logger.info(f"🔍 执行多小说检索: {len(novel_ids)} 本小说")
-                vector_results = rag_engine.vector_search_multi(
-                    novel_ids, 
-                    query_embedding,
-                    top_k=top_k_retrieval,
-                    query_id=temp_query_id
-                )
-            else:
-                vector_results = rag_engine.vector_search(
-                    novel_ids[0], 
-                    query_embedding,
-                    top_k=top_k_retrieval,
-                    query_id=temp_query_id
-                )
-            
-            # Rerank（带GraphRAG增强，使用配置的top_k_rerank）
-            # 注意：对于多小说查询，使用第一本小说的ID进行GraphRAG增强
-            reranked_chunks = rag_engine.rerank(
-                query=query_for_retrieval,
-                vector_results=vector_results,
-                novel_id=novel_ids[0],
-                db=db,
-                top_k=top_k_rerank,
-                query_id=temp_query_id,
-                recency_bias_weight=recency_bias_weight
-            )
-            
             if not reranked_chunks:
                 await websocket.send_json({
                     'stage': 'finalizing',
@@ -638,25 +958,6 @@ async def query_stream(websocket: WebSocket):
                 progress=0.5
             ).model_dump())
             
-            # 构建自适应Prompt（使用配置的max_context_chunks）
-            # 根据配置决定使用原始查询还是改写后的查询
-            query_for_prompt = query_for_retrieval if (use_rewritten_in_prompt and rewritten_query) else query
-            
-            if use_rewritten_in_prompt and rewritten_query:
-                logger.info(f"💡 Prompt使用改写后的查询: {query_for_prompt}")
-            else:
-                logger.info(f"💡 Prompt使用原始查询: {query_for_prompt}")
-            
-            prompt = rag_engine.prompt_builder.build_prompt(
-                db, 
-                novel_ids[0],  # 主小说ID
-                query_for_prompt,  # 根据配置选择使用原始或改写后的查询
-                reranked_chunks,
-                max_chunks=max_context_chunks,
-                query_id=temp_query_id,
-                novel_ids=novel_ids if len(novel_ids) > 1 else None  # 多小说时传递所有ID
-            )
-            
             # 流式生成答案
             full_answer = ""
             generation_usage = None
@@ -664,55 +965,65 @@ async def query_stream(websocket: WebSocket):
             
             logger.info("🔄 开始流式生成答案...")
             
-            for chunk_data in rag_engine.generate_answer_with_stats(prompt, model, stream=True):
-                # chunk_data可能包含content、thinking和usage
-                if isinstance(chunk_data, dict):
-                    chunk = chunk_data.get('content', '')
-                    thinking_chunk = chunk_data.get('reasoning_content')  # 提取thinking内容
-                    usage = chunk_data.get('usage')
-                    finish_reason_value = chunk_data.get('finish_reason')
+            # 异步流式生成：逐块等待WebSocket发送完成后再取下一块（反压到生成端）
+            # 合并的并发请求共享同一次生成，增量流分发给所有订阅者
+            if settings.query_coalescing_enabled:
+                answer_stream = get_stream_fanout().subscribe(
+                    coalescing_key,
+                    lambda: rag_engine.agenerate_answer_stream(prompt, model)
+                )
+            else:
+                answer_stream = rag_engine.agenerate_answer_stream(prompt, model)
+            async with aclosing(answer_stream):
+                async for chunk_data in answer_stream:
+                    # chunk_data可能包含content、thinking和usage
+                    if isinstance(chunk_data, dict):
+                        chunk = chunk_data.get('content', '')
+                        thinking_chunk = chunk_data.get('reasoning_content')  # 提取thinking内容
+                        usage = chunk_data.get('usage')
+                        finish_reason_value = chunk_data.get('finish_reason')
+                        
+                        if usage:
+                            # 保存最后的usage信息
+                            generation_usage = usage
+                            logger.info(f"💡 [WebSocket] 收到usage: {usage}")
+                        
+                        if finish_reason_value:
+                            finish_reason = finish_reason_value
+                            logger.info(f"🏁 [WebSocket] 收到finish_reason: {finish_reason}")
+                            
+                            # 检测到敏感内容，立即终止
+                            if finish_reason == 'sensitive':
+                                logger.warning("⚠️ 检测到敏感内容，终止生成")
+                                await websocket.send_json({
+                                    'error': '抱歉，您的问题或小说内容可能包含敏感信息，无法生成答案。请尝试修改问题或选择其他内容。'
+                                })
+                                return
+                    else:
+                        # 向后兼容：纯文本chunk
+                        chunk = chunk_data if chunk_data else ''
+                        thinking_chunk = None
                     
-                    if usage:
-                        # 保存最后的usage信息
-                        generation_usage = usage
-                        logger.info(f"💡 [WebSocket] 收到usage: {usage}")
+                    # 发送thinking内容（如果有）
+                    if thinking_chunk:
+                        await websocket.send_json({
+                            'stage': 'generating',
+                            'thinking': thinking_chunk,  # 发送thinking增量内容
+                            'content': '',
+                            'progress': 0.6,
+                            'is_delta': True
+                        })
                     
-                    if finish_reason_value:
-                        finish_reason = finish_reason_value
-                        logger.info(f"🏁 [WebSocket] 收到finish_reason: {finish_reason}")
-                        
-                        # 检测到敏感内容，立即终止
-                        if finish_reason == 'sensitive':
-                            logger.warning("⚠️ 检测到敏感内容，终止生成")
-                            await websocket.send_json({
-                                'error': '抱歉，您的问题或小说内容可能包含敏感信息，无法生成答案。请尝试修改问题或选择其他内容。'
-                            })
-                            return
-                else:
-                    # 向后兼容：纯文本chunk
-                    chunk = chunk_data if chunk_data else ''
-                    thinking_chunk = None
-                
-                # 发送thinking内容（如果有）
-                if thinking_chunk:
-                    await websocket.send_json({
-                        'stage': 'generating',
-                        'thinking': thinking_chunk,  # 发送thinking增量内容
-                        'content': '',
-                        'progress': 0.6,
-                        'is_delta': True
-                    })
+                    # 发送答案内容（如果有）
+                    if chunk:
+                        full_answer += chunk
+                        await websocket.send_json({
+                            'stage': 'generating',
+                            'content': chunk,  # 发送增量内容
+                            'progress': 0.7,
+                            'is_delta': True
+                        })
                 
-                # 发送答案内容（如果有）
-                if chunk:
-                    full_answer += chunk
-                    await websocket.send_json({
-                        'stage': 'generating',
-                        'content': chunk,  # 发送增量内容
-                        'progress': 0.7,
-                        'is_delta': True
-                    })
-            
             logger.info(f"✅ 流式生成完成，答案长度: {len(full_answer)}, 是否有usage: {generation_usage is not None}")
             
             # 检查答案是否为空（可能是敏感内容被过滤）
@@ -749,176 +1060,16 @@ async def query_stream(websocket: WebSocket):
                 'metadata': {'message': '正在验证答案准确性...'}
             })
             
-            # Self-RAG验证流程
-            from app.services.self_rag import (
-                get_assertion_extractor,
-                get_evidence_collector,
-                get_evidence_scorer,
-                get_consistency_checker,
-                get_contradiction_detector,
-                get_answer_corrector
+            # Self-RAG验证流程（断言提取、证据收集的Embedding调用与答案修正的LLM调用均在执行器中运行）
+            contradictions_list, confidence_level, corrected_answer = await run_blocking(
+                "llm",
+                _validate_answer_with_self_rag,
+                db,
+                novel_id,
+                full_answer,
+                temp_query_id
             )
             
-            contradictions_list = []
-            confidence_level = "high"
-            corrected_answer = full_answer
-            
-            try:
-                # 1. 提取断言
-                assertion_extractor = get_assertion_extractor()
-                assertions = assertion_extractor.extract_assertions(full_answer, query_id=temp_query_id)
-                logger.info(f"✅ 提取断言: {len(assertions)} 个")
-                
-                if assertions:
-                    # 2. 收集证据
-                    evidence_collector = get_evidence_collector()
-                    evidence_map = {}
-                    
-                    for idx, assertion in enumerate(assertions):
-                        evidence_list = evidence_collector.collect_evidence_for_assertion(
-                            db, novel_id, assertion, top_k=3
-                        )
-                        evidence_map[idx] = evidence_list
-                    
-                    logger.info(f"✅ 收集证据完成")
-                    
-                    # 详细日志：证据收集
-                    trace_logger.trace_step(
-                        query_id=temp_query_id,
-                        step_name="Self-RAG: 证据收集",
-                        emoji="📚",
-                        input_data=f"为{len(assertions)}个断言收集证据",
-                        output_data={
-                            "证据总数": sum(len(v) for v in evidence_map.values()),
-                            "每个断言的证据数": {f"断言{k}": len(v) for k, v in evidence_map.items()}
-                        },
-                        status="success"
-                    )
-                    
-                    # 3. 评分证据
-                    evidence_scorer = get_evidence_scorer()
-                    for idx, assertion in enumerate(assertions):
-                        evidence_list = evidence_map.get(idx, [])
-                        # 对每条证据进行评分
-                        scored_evidence_list = []
-                        for evidence in evidence_list:
-                            scored = evidence_scorer.score_evidence(
-                                db=db,
-                                novel_id=novel_id,
-                                evidence=evidence,
-                                query_context={'assertion': assertion}
-                            )
-                            # 将评分信息添加到证据中
-                            evidence['score'] = scored
-                            scored_evidence_list.append(evidence)
-                        evidence_map[idx] = scored_evidence_list
-                    
-                    # 4. 一致性检查
-                    consistency_checker = get_consistency_checker()
-                    
-                    # 4.1 时序一致性检查
-                    temporal_issues = consistency_checker.check_temporal_consistency(
-                        assertions, evidence_map
-                    )
-                    
-                    # 4.2 角色一致性检查
-                    character_issues = consistency_checker.check_character_consistency(
-                        db, novel_id, assertions, evidence_map
-                    )
-                    
-                    # 合并一致性检查结果
-                    consistency_report = {
-                        'temporal_issues': temporal_issues,
-                        'character_issues': character_issues,
-                        'total_issues': len(temporal_issues) + len(character_issues)
-                    }
-                    
-                    logger.info(f"✅ 一致性检查完成: {consistency_report['total_issues']} 个问题")
-                    
-                    # 详细日志：一致性检查
-                    trace_logger.trace_step(
-                        query_id=temp_query_id,
-                        step_name="Self-RAG: 一致性检查",
-                        emoji="🔗",
-                        input_data={
-                            "断言数量": len(assertions),
-                            "证据总数": sum(len(v) for v in evidence_map.values())
-                        },
-                        output_data={
-                            "时序问题": len(temporal_issues),
-                            "角色一致性问题": len(character_issues),
-                            "总问题数": consistency_report['total_issues']
-                        },
-                        status="success"
-                    )
-                    
-                    # 5. 检测矛盾
-                    contradiction_detector = get_contradiction_detector()
-                    contradictions = contradiction_detector.detect_contradictions(
-                        db, novel_id, assertions, evidence_map, consistency_report
-                    )
-                    
-                    # 转换为可序列化的字典列表
-                    contradictions_list = [
-                        {
-                            'type': c.type,
-                            'earlyDescription': c.early_description,
-                            'earlyChapter': c.early_chapter,
-                            'lateDescription': c.late_description,
-                            'lateChapter': c.late_chapter,
-                            'analysis': c.analysis,
-                            'confidence': c.confidence
-                        }
-                        for c in contradictions
-                    ]
-                    
-                    logger.info(f"✅ 检测到矛盾: {len(contradictions_list)} 个")
-                    
-                    # 详细日志：矛盾检测
-                    trace_logger.trace_step(
-                        query_id=temp_query_id,
-                        step_name="Self-RAG: 矛盾检测",
-                        emoji="⚠️",
-                        input_data="基于断言、证据和一致性检查结果",
-                        output_data={
-                            "矛盾数量": len(contradictions_list),
-                            "矛盾列表": contradictions_list
-                        },
-                        status="success"
-                    )
-                    
-                    # 6. 修正答案
-                    if contradictions:
-                        answer_corrector = get_answer_corrector()
-                        correction_result = answer_corrector.correct_answer(
-                            full_answer, contradictions, "high"
-                        )
-                        corrected_answer = correction_result.get('corrected_answer', full_answer)
-                        confidence_level = correction_result.get('final_confidence', 'high')
-                        
-                        logger.info(f"✅ 答案修正完成，置信度: {confidence_level}")
-                        
-                        # 详细日志：答案修正
-                        trace_logger.trace_step(
-                            query_id=temp_query_id,
-                            step_name="Self-RAG: 答案修正",
-                            emoji="🔧",
-                            input_data={
-                                "原始答案长度": len(full_answer),
-                                "矛盾数量": len(contradictions)
-                            },
-                            output_data={
-                                "修正后答案长度": len(corrected_answer),
-                                "最终置信度": confidence_level,
-                                "是否修改": corrected_answer != full_answer
-                            },
-                            status="success"
-                        )
-                
-            except Exception as e:
-                logger.error(f"⚠️ Self-RAG验证失败: {e}")
-                # Self-RAG失败不影响主流程，继续返回原答案
-            
             # 阶段5: 完成汇总
             logger.info("📋 开始构建最终结果...")
             # 注意：不发送 content，避免覆盖之前的答案
@@ -241,6 +241,15 @@ class Settings(BaseSettings):
     # ChromaDB配置
     chromadb_path: str = Field(default="./data/chromadb", env="CHROMADB_PATH")
     
+    # 向量存储后端配置（chroma: ChromaDB HNSW；numpy: 内存映射矩阵精确检索）
+    vector_store_backend: str = Field(default="chroma", description="向量存储后端（chroma/numpy）", env="VECTOR_STORE_BACKEND")
+    vector_store_path: str = Field(default="./data/vectors", description="NumPy向量存储目录", env="VECTOR_STORE_PATH")
+    vector_store_quantization: str = Field(default="none", description="NumPy向量存储的两阶段检索粗排方式（none/int8/pq/truncate）", env="VECTOR_STORE_QUANTIZATION")
+    vector_store_rescore_size: int = Field(default=300, description="量化粗排后用全精度向量重排的候选数", env="VECTOR_STORE_RESCORE_SIZE")
+    vector_store_pq_subspaces: int = Field(default=64, description="PQ子空间数（需整除向量维度）", env="VECTOR_STORE_PQ_SUBSPACES")
+    vector_store_pq_min_rows: int = Field(default=50000, description="启用PQ的最小向量数（不足时使用int8）", env="VECTOR_STORE_PQ_MIN_ROWS")
+    vector_store_truncate_dim: int = Field(default=256, description="维度截断粗排保留的前导维度数", env="VECTOR_STORE_TRUNCATE_DIM")
+    
     # 文件存储配置
     data_dir: str = Field(default="./data", env="DATA_DIR")
     upload_dir: str = Field(default="./data/uploads", env="UPLOAD_DIR")
@@ -270,9 +279,50 @@ class Settings(BaseSettings):
     min_similarity_threshold: float = Field(default=1.2, description="向量检索最大L2距离阈值(越小越相似)")
     recency_bias_weight: float = Field(default=0.15, description="时间衰减权重(0.0-0.5,越大越偏向后期)")
     
+    # 异步查询执行器配置（阻塞步骤在有界线程池中执行，避免阻塞事件循环）
+    query_retrieval_workers: int = Field(default=8, description="检索阶段线程池大小（Chroma/BM25/NER/SQLite）", env="QUERY_RETRIEVAL_WORKERS")
+    query_branch_workers: int = Field(default=16, description="单次查询内检索分支并发线程池大小（向量/BM25/NER/图谱）", env="QUERY_BRANCH_WORKERS")
+    multi_novel_initial_k: int = Field(default=5, description="多小说检索每本初始检索数量（仅可能进入全局Top-K的小说按需加倍）", env="MULTI_NOVEL_INITIAL_K")
+    llm_blocking_workers: int = Field(default=16, description="同步LLM SDK调用线程池大小（无原生异步SDK的提供商）", env="LLM_BLOCKING_WORKERS")
+    llm_stream_workers: int = Field(default=64, description="同步流式LLM调用线程池大小（即同时流式生成的上限）", env="LLM_STREAM_WORKERS")
+    llm_stream_queue_size: int = Field(default=32, description="流式生成桥接队列长度（发送端变慢时反压生产线程）", env="LLM_STREAM_QUEUE_SIZE")
+    
+    # 查询结果缓存（L1: 进程内TTLCache；L2: 同一节点所有worker共享的SQLite WAL持久化缓存）
+    query_cache_ttl: int = Field(default=3600, description="L1查询缓存过期时间（秒）", env="QUERY_CACHE_TTL")
+    query_cache_l2_enabled: bool = Field(default=True, description="是否启用L2持久化查询缓存", env="QUERY_CACHE_L2_ENABLED")
+    query_cache_l2_path: str = Field(default="./data/cache/query_cache.db", description="L2查询缓存数据库路径", env="QUERY_CACHE_L2_PATH")
+    query_cache_l2_ttl: int = Field(default=86400, description="L2查询缓存过期时间（秒）", env="QUERY_CACHE_L2_TTL")
+    query_cache_l2_max_mb: int = Field(default=256, description="L2查询缓存容量上限（MB，按压缩后大小LRU淘汰）", env="QUERY_CACHE_L2_MAX_MB")
+    
+    # 小说索引版本号（查询/章节/图谱缓存键的一部分，索引、追加、删除时递增；保存在L2缓存数据库中）
+    index_version_refresh_seconds: float = Field(default=1.0, description="进程内缓存索引版本号的时间（秒，其他worker的递增最多延迟这么久可见）", env="INDEX_VERSION_REFRESH_SECONDS")
+    
+    # 查询规划缓存（查询改写/分解的LLM输出，独立于答案缓存，切换答案模型时复用）
+    query_plan_cache_enabled: bool = Field(default=True, description="是否缓存查询改写/分解结果", env="QUERY_PLAN_CACHE_ENABLED")
+    query_plan_cache_ttl: int = Field(default=86400, description="查询规划缓存过期时间（秒）", env="QUERY_PLAN_CACHE_TTL")
+    query_plan_cache_maxsize: int = Field(default=4096, description="查询规划缓存最大条目数", env="QUERY_PLAN_CACHE_MAXSIZE")
+    
+    # 并发请求合并（相同的进行中查询只计算一次，流式生成的增量分发给所有订阅者）
+    query_coalescing_enabled: bool = Field(default=True, description="是否合并相同的并发查询", env="QUERY_COALESCING_ENABLED")
+    
+    # 语义查询缓存（精确缓存未命中时，按原始查询向量的余弦相似度复用同义查询的结果）
+    semantic_cache_enabled: bool = Field(default=True, description="是否启用语义查询缓存（在查询改写/分解之前检查）", env="SEMANTIC_CACHE_ENABLED")
+    semantic_cache_threshold: float = Field(default=0.95, description="语义缓存命中的余弦相似度阈值", env="SEMANTIC_CACHE_THRESHOLD")
+    semantic_cache_max_per_novel: int = Field(default=256, description="每本小说保留的最近查询向量数", env="SEMANTIC_CACHE_MAX_PER_NOVEL")
+    
+    # BM25 索引缓存配置
+    bm25_cache_max_mb: int = Field(default=512, description="BM25索引进程内缓存上限（MB，按LRU淘汰）", env="BM25_CACHE_MAX_MB")
+    bm25_segment_merge_threshold: int = Field(default=8, description="BM25追加段数量达到该值时后台合并", env="BM25_SEGMENT_MERGE_THRESHOLD")
+    bm25_k1: float = Field(default=1.5, description="BM25词频饱和参数k1（调整后无需重建索引）", env="BM25_K1")
+    bm25_b: float = Field(default=0.75, description="BM25文档长度归一化参数b（调整后无需重建索引）", env="BM25_B")
+    bm25_tokenize_workers: int = Field(default=4, description="BM25构建分词进程数（0=CPU核数，1=不使用进程池）", env="BM25_TOKENIZE_WORKERS")
+    bm25_tokenize_batch_size: int = Field(default=256, description="BM25分词每个工作单元的文本块数", env="BM25_TOKENIZE_BATCH_SIZE")
+    
     # 智谱AI Embedding配置
     embedding_model: str = Field(default="embedding-3", description="Embedding模型")
     embedding_dimension: int = Field(default=2048, description="向量维度（embedding-3 默认 2048）")
+    embedding_cache_enabled: bool = Field(default=True, description="是否启用Embedding磁盘缓存（按模型+维度+文本哈希复用向量）", env="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_dtype: str = Field(default="float16", description="Embedding缓存存储精度（float16/float32）", env="EMBEDDING_CACHE_DTYPE")
     
     # 查询分解配置
     query_decomposition_enabled: bool = Field(default=True, description="是否启用查询分解功能", env="QUERY_DECOMPOSITION_ENABLED")
@@ -284,6 +334,7 @@ class Settings(BaseSettings):
     use_batch_api_for_graph: bool = Field(default=True, description="图谱构建是否使用Batch API（默认开启，完全免费）", env="USE_BATCH_API_FOR_GRAPH")
     use_batch_api_for_embedding: bool = Field(default=True, description="向量化是否使用Batch API（默认开启，价格便宜50%）", env="USE_BATCH_API_FOR_EMBEDDING")
     batch_api_threshold: int = Field(default=20, description="Batch API 最小请求数阈值（< 此值使用实时API）", env="BATCH_API_THRESHOLD")
+    graph_cache_max_graphs: int = Field(default=8, description="进程内缓存的知识图谱数量上限（按LRU淘汰）", env="GRAPH_CACHE_MAX_GRAPHS")
     
     # 并发控制配置（根据智谱AI速率限制调整）
     # 参考：https://bigmodel.cn/usercenter/proj-mgmt/rate-limits
@@ -310,7 +361,11 @@ class Settings(BaseSettings):
             self.upload_dir,
             self.graph_dir,
             self.chromadb_path,
+            self.vector_store_path,
             Path(self.data_dir) / "indices",  # BM25 索引目录
+            Path(self.data_dir) / "embedding_cache",  # Embedding 缓存目录
+            Path(self.data_dir) / "chunks",  # 分块文本中心存储目录
+            Path(self.query_cache_l2_path).parent,  # 查询缓存L2目录
             Path(self.database_url.replace("sqlite:///", "")).parent,
             Path(self.log_file).parent,
         ]
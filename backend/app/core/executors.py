@@ -0,0 +1,190 @@
+"""
+有界执行器
+为异步接口中的阻塞步骤提供按用途隔离的有界线程池，避免阻塞事件循环
+
+- retrieval: 检索阶段（Chroma查询、BM25打分、HanLP实体识别、SQLite读取、图谱加载）
+- retrieval_branch: 单次查询内并发的检索分支（由retrieval线程提交，独立线程池避免嵌套等待死锁）
+- llm: 无原生异步SDK的同步LLM/Embedding调用（网络等待为主）
+- stream: 无原生异步SDK的同步流式生成（每个流占用一个线程直到生成结束）
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _get_max_workers(name: str) -> int:
+    """读取执行器的线程数配置"""
+    sizes = {
+        "retrieval": settings.query_retrieval_workers,
+        "retrieval_branch": settings.query_branch_workers,
+        "llm": settings.llm_blocking_workers,
+        "stream": settings.llm_stream_workers,
+    }
+    if name not in sizes:
+        raise ValueError(f"未知的执行器: {name}（可选: {', '.join(sizes)}）")
+    return max(1, sizes[name])
+
+
+def get_executor(name: str) -> ThreadPoolExecutor:
+    """
+    获取指定用途的有界线程池（单例）
+    
+    Args:
+        name: 执行器名称（retrieval/retrieval_branch/llm/stream）
+    
+    Returns:
+        ThreadPoolExecutor: 线程池
+    """
+    with _executors_lock:
+        if name not in _executors:
+            max_workers = _get_max_workers(name)
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix=f"{name}-worker"
+            )
+            logger.info(f"✅ 创建执行器: {name} (max_workers={max_workers})")
+        return _executors[name]
+
+
+def submit_blocking(name: str, func: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    从同步代码向有界线程池提交任务（保留当前contextvars上下文）
+    
+    Args:
+        name: 执行器名称
+        func: 阻塞函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+    
+    Returns:
+        Future: 任务句柄
+    """
+    context = contextvars.copy_context()
+    return get_executor(name).submit(context.run, func, *args, **kwargs)
+
+
+async def run_blocking(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    在有界线程池中执行阻塞函数（保留当前contextvars上下文）
+    
+    Args:
+        name: 执行器名称
+        func: 阻塞函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+    
+    Returns:
+        Any: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(name), call)
+
+
+class _StreamEnd:
+    """流结束标记（携带生产端异常）"""
+    
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def stream_blocking(
+    name: str,
+    func: Callable[..., Any],
+    *args,
+    queue_size: Optional[int] = None,
+    **kwargs
+) -> AsyncGenerator[Any, None]:
+    """
+    将同步生成器桥接为异步生成器（线程 + 有界队列）
+    
+    生产线程在有界线程池中迭代同步生成器并写入有界队列；队列满时生产线程阻塞，
+    从而把消费端（如WebSocket发送）的速度反压到上游。消费端提前退出时生产线程
+    在下一次写入时停止并关闭同步生成器。
+    
+    Args:
+        name: 执行器名称
+        func: 返回同步可迭代对象的函数
+        *args: 位置参数
+        queue_size: 队列长度（默认取配置 llm_stream_queue_size）
+        **kwargs: 关键字参数
+    
+    Yields:
+        Any: 同步生成器产出的元素
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size or settings.llm_stream_queue_size))
+    stopped = threading.Event()
+    
+    def put(item: Any) -> bool:
+        """从生产线程写入队列（队列满时阻塞），消费端已退出时返回False"""
+        if stopped.is_set():
+            return False
+        try:
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        except RuntimeError:
+            # 事件循环已关闭
+            return False
+        while True:
+            try:
+                future.result(timeout=1.0)
+                return not stopped.is_set()
+            except FutureTimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+    
+    def produce():
+        iterator = None
+        error = None
+        try:
+            iterator = func(*args, **kwargs)
+            for item in iterator:
+                if not put(item):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        put(_StreamEnd(error))
+    
+    context = contextvars.copy_context()
+    loop.run_in_executor(get_executor(name), functools.partial(context.run, produce))
+    
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _StreamEnd):
+                if item.error is not None:
+                    raise item.error
+                break
+            yield item
+    finally:
+        stopped.set()
+        # 释放可能阻塞在队列上的生产线程
+        while not queue.empty():
+            queue.get_nowait()
+
+
+def shutdown_executors(wait: bool = False):
+    """关闭所有执行器（应用退出时调用）"""
+    with _executors_lock:
+        for name, executor in _executors.items():
+            executor.shutdown(wait=wait, cancel_futures=True)
+            logger.info(f"🛑 执行器已关闭: {name}")
+        _executors.clear()
@@ -0,0 +1,43 @@
+"""
+跨进程文件锁
+
+生产环境以多个 uvicorn worker 运行，同一份磁盘数据（Embedding缓存、numpy向量库等只追加文件）
+会被多个进程同时读写。进程内的 threading.Lock 无法约束其他 worker，这里用 fcntl.flock 加建议锁：
+- 追加、截断持有排他锁
+- 读取已提交数据持有共享锁
+
+flock 锁在同一进程内按文件描述符区分，因此仍需配合进程内的线程锁使用。
+不支持 fcntl 的平台（Windows 本地开发，单进程运行）退化为空操作
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], exclusive: bool = True) -> Iterator[None]:
+    """
+    持有文件锁（锁文件不存在时自动创建）
+    
+    Args:
+        path: 锁文件路径
+        exclusive: True 为排他锁（写入），False 为共享锁（读取）
+    """
+    if fcntl is None:
+        yield
+        return
+    
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        # 关闭描述符即释放锁
+        os.close(fd)
@@ -0,0 +1,585 @@
+"""
+NumPy向量存储（进程内精确检索）
+
+每个集合一个目录:
+- vectors.f32:     float32 行主序矩阵（只追加，内存映射读取；cosine空间写入前归一化）
+- records.jsonl:   每行一条 {"id", "document", "metadata"}，第i行对应矩阵第i行
+- collection.json: 距离空间、维度、集合元数据
+
+检索为一次BLAS矩阵-向量乘积 + argpartition 的精确Top-K（召回率100%）；
+距离定义与Chroma相同空间一致：l2为平方欧氏距离，cosine为 1-余弦相似度，ip为 1-内积
+
+开启量化（VECTOR_STORE_QUANTIZATION=int8/pq/truncate，见 vector_quantization.py）后改为两阶段检索：
+先扫描量化编码（或截断的前N维）得到候选短名单，再从磁盘读取短名单的全精度向量精确重排
+
+多个 worker 进程共享集合目录：追加（含量化编码同步）持有集合的排他文件锁，先写向量再写记录，
+records.jsonl 中完整的行即为已提交的数据；每次检索前检查记录文件是否增长，只加载新增的行。
+写入中断留下的不完整尾部只在持有排他锁时截断，读取端从不截断
+"""
+
+import json
+import logging
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.file_lock import file_lock
+from app.core.vector_store import VectorStore
+from app.core.vector_quantization import (
+    QuantizedIndex,
+    SUPPORTED_QUANTIZATIONS,
+    create_quantized_index,
+)
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SPACES = ("l2", "cosine", "ip")
+
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+COLLECTION_FILE = "collection.json"
+LOCK_FILE = "lock"
+
+
+class NumpyCollection:
+    """单个集合：内存映射向量矩阵 + 内存中的ID/文本/元数据数组"""
+    
+    def __init__(
+        self,
+        path: Path,
+        quantization: str = "none",
+        rescore_size: int = 300,
+        pq_subspaces: int = 64,
+        pq_min_rows: int = 50000,
+        truncate_dim: int = 256
+    ):
+        """
+        Args:
+            path: 集合目录
+            quantization: 量化方式（none/int8/pq/truncate）
+            rescore_size: 量化粗排后用全精度向量重排的候选数
+            pq_subspaces: PQ子空间数
+            pq_min_rows: 启用PQ的最小行数（行数不足时使用int8）
+            truncate_dim: 维度截断粗排保留的前导维度数
+        """
+        self.path = path
+        self.quantization = quantization
+        self.rescore_size = rescore_size
+        self.pq_subspaces = pq_subspaces
+        self.pq_min_rows = pq_min_rows
+        self.truncate_dim = truncate_dim
+        self.vectors_path = path / VECTORS_FILE
+        self.records_path = path / RECORDS_FILE
+        self.collection_path = path / COLLECTION_FILE
+        self.lock_path = path / LOCK_FILE
+        self._lock = threading.RLock()
+        
+        self._reset()
+        with file_lock(self.lock_path, exclusive=False):
+            self.vectors_path.touch(exist_ok=True)
+            self.records_path.touch(exist_ok=True)
+            self._refresh()
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    def _reset(self):
+        """清空内存中的数据并重新读取集合信息（首次加载或集合被其他进程重建时）"""
+        info = json.loads(self.collection_path.read_text(encoding="utf-8"))
+        self.space: str = info.get("space", "l2")
+        self.dimension: Optional[int] = info.get("dimension")
+        self.metadata: Dict[str, Any] = info.get("metadata", {})
+        
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._id_set = set()
+        self._records_offset = 0  # 已加载的记录字节数
+        self._records_inode: Optional[int] = None
+        
+        self._matrix: Optional[np.memmap] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._quantized: Optional[QuantizedIndex] = None
+    
+    def _refresh(self):
+        """加载其他进程追加的已提交记录（只读取新增部分，调用方持有线程锁）"""
+        try:
+            stat = self.records_path.stat()
+        except FileNotFoundError:
+            return  # 集合已被删除，继续使用已加载的数据
+        
+        if self._records_inode is not None and (
+            stat.st_ino != self._records_inode or stat.st_size < self._records_offset
+        ):
+            logger.info(f"🔄 集合已被其他进程重建，重新加载: {self.path.name}")
+            self._reset()
+        self._records_inode = stat.st_ino
+        if stat.st_size == self._records_offset:
+            return
+        
+        if self.dimension is None:
+            # 维度由首次写入的进程确定
+            info = json.loads(self.collection_path.read_text(encoding="utf-8"))
+            self.dimension = info.get("dimension")
+            if self.dimension is None:
+                return
+        vector_rows = self.vectors_path.stat().st_size // (self.dimension * 4)
+        
+        with open(self.records_path, "rb") as f:
+            f.seek(self._records_offset)
+            data = f.read(stat.st_size - self._records_offset)
+        
+        loaded = 0
+        for line in data.splitlines(keepends=True):
+            # 只加载完整且向量已写入的记录（先写向量再写记录）
+            if not line.endswith(b"\n") or self.size >= vector_rows:
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self.ids.append(record["id"])
+            self.documents.append(record.get("document") or "")
+            self.metadatas.append(record.get("metadata") or {})
+            self._id_set.add(record["id"])
+            self._records_offset += len(line)
+            loaded += 1
+        
+        if loaded:
+            self._matrix = None
+            self._columns = {}
+    
+    def count(self) -> int:
+        """已提交的文档数（包含其他进程写入的）"""
+        with self._lock:
+            self._refresh()
+            return self.size
+    
+    def _write_info(self):
+        info = {"space": self.space, "dimension": self.dimension, "metadata": self.metadata}
+        self.collection_path.write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+    
+    def _get_matrix(self) -> np.memmap:
+        """获取向量矩阵的内存映射（写入新行后重新映射）"""
+        if self._matrix is None or self._matrix.shape[0] != self.size:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(self.size, self.dimension)
+            )
+        return self._matrix
+    
+    def _get_sq_norms(self, matrix: np.ndarray) -> np.ndarray:
+        """l2空间使用的行平方范数（按需计算并缓存）"""
+        if self._sq_norms is None or self._sq_norms.shape[0] != matrix.shape[0]:
+            self._sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        return self._sq_norms
+    
+    def _quantization_kind(self) -> str:
+        """实际使用的量化方式（PQ只用于足够大的集合，且子空间数需整除维度；截断维度需小于向量维度）"""
+        kind = self.quantization
+        if kind == "pq" and (self.size < self.pq_min_rows or self.dimension % self.pq_subspaces != 0):
+            kind = "int8"
+        elif kind == "truncate" and self.truncate_dim >= self.dimension:
+            kind = "none"
+        return kind
+    
+    def _get_quantized(self, file_locked: bool = False) -> Optional[QuantizedIndex]:
+        """
+        获取与向量矩阵对齐的量化索引（未开启量化时返回None，调用方需持有线程锁）
+        
+        量化文件同样由多个进程追加，编码新增行时持有排他文件锁
+        
+        Args:
+            file_locked: 调用方是否已持有排他文件锁
+        """
+        if self.quantization == "none" or self.size == 0:
+            return None
+        
+        kind = self._quantization_kind()
+        if kind == "none":
+            return None
+        if self._quantized is None or self._quantized.kind != kind:
+            self._quantized = create_quantized_index(
+                kind, self.path, self.dimension,
+                pq_subspaces=self.pq_subspaces,
+                truncate_dim=self.truncate_dim,
+                normalize=self.space == "cosine"
+            )
+        if self._quantized.size != self.size:
+            if file_locked:
+                self._quantized.sync(self._get_matrix())
+            else:
+                with file_lock(self.lock_path, exclusive=True):
+                    # 按最新的已提交行数同步，不截断其他进程已编码的行
+                    self._refresh()
+                    return self._get_quantized(file_locked=True)
+        return self._quantized if self._quantized.size == self.size else None
+    
+    def add(
+        self,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        追加文档（已存在的ID跳过）
+        
+        Returns:
+            int: 实际写入条数
+        """
+        metadatas = metadatas or [{} for _ in ids]
+        
+        with self._lock, file_lock(self.lock_path, exclusive=True):
+            # 先加载其他进程已写入的记录（跳过其已写入的ID，新行紧接已提交的行）
+            self._refresh()
+            keep = []
+            seen = set()
+            for i, doc_id in enumerate(ids):
+                if doc_id in self._id_set or doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                keep.append(i)
+            if not keep:
+                return 0
+            
+            block = np.asarray([embeddings[i] for i in keep], dtype=np.float32)
+            if self.dimension is None:
+                self.dimension = block.shape[1]
+                self._write_info()
+            elif block.shape[1] != self.dimension:
+                raise ValueError(f"向量维度不匹配: 集合为{self.dimension}维，写入{block.shape[1]}维")
+            
+            if self.space == "cosine":
+                norms = np.linalg.norm(block, axis=1, keepdims=True)
+                block = block / np.where(norms > 0, norms, 1.0)
+            
+            lines = [
+                json.dumps(
+                    {"id": ids[i], "document": documents[i], "metadata": metadatas[i] or {}},
+                    ensure_ascii=False
+                ) + "\n"
+                for i in keep
+            ]
+            
+            # 持有排他锁时没有其他写入者：截断写入中断留下的未提交尾部
+            for path, size in (
+                (self.records_path, self._records_offset),
+                (self.vectors_path, self.size * self.dimension * 4)
+            ):
+                if path.stat().st_size != size:
+                    with open(path, "r+b") as f:
+                        f.truncate(size)
+            
+            # 先写向量再写记录：记录写入即提交
+            encoded = "".join(lines).encode("utf-8")
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(block).tobytes())
+            with open(self.records_path, "ab") as f:
+                f.write(encoded)
+            
+            for i in keep:
+                self.ids.append(ids[i])
+                self.documents.append(documents[i])
+                self.metadatas.append(metadatas[i] or {})
+            self._id_set.update(ids[i] for i in keep)
+            self._records_offset += len(encoded)
+            self._matrix = None
+            self._columns = {}
+            
+            # 索引时同步编码新增行，避免首次查询时才量化
+            self._get_quantized(file_locked=True)
+            return len(keep)
+    
+    def _column(self, key: str, size: int) -> np.ndarray:
+        """元数据列（数值列为float64，缺失为NaN；否则为object数组）"""
+        column = self._columns.get(key)
+        if column is not None and column.shape[0] == size:
+            return column
+        
+        values = [metadata.get(key) for metadata in self.metadatas[:size]]
+        numeric = all(
+            value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+            for value in values
+        )
+        if numeric:
+            column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        else:
+            column = np.empty(size, dtype=object)
+            column[:] = values
+        self._columns[key] = column
+        return column
+    
+    def _where_mask(self, where: Dict[str, Any], size: int) -> np.ndarray:
+        """按Chroma where语法计算过滤掩码（支持 $and/$or/$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin）"""
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for sub in condition:
+                    mask &= self._where_mask(sub, size)
+            elif key == "$or":
+                any_mask = np.zeros(size, dtype=bool)
+                for sub in condition:
+                    any_mask |= self._where_mask(sub, size)
+                mask &= any_mask
+            else:
+                column = self._column(key, size)
+                operators = condition if isinstance(condition, dict) else {"$eq": condition}
+                for op, value in operators.items():
+                    mask &= self._compare(column, op, value)
+        return mask
+    
+    @staticmethod
+    def _compare(column: np.ndarray, op: str, value: Any) -> np.ndarray:
+        # 与Chroma一致：缺失该键的文档不匹配任何操作符（包括 $ne/$nin）
+        if column.dtype == object:
+            present = np.fromiter((item is not None for item in column), dtype=bool, count=column.shape[0])
+        else:
+            present = ~np.isnan(column)
+        
+        if op in ("$in", "$nin"):
+            if column.dtype == object:
+                values = set(value)
+                result = np.fromiter((item in values for item in column), dtype=bool, count=column.shape[0])
+            else:
+                result = np.isin(column, list(value))
+            return result if op == "$in" else ~result & present
+        
+        with np.errstate(invalid="ignore"):
+            if op == "$eq":
+                result = column == value
+            elif op == "$ne":
+                result = (column != value) & present
+            elif op == "$gt":
+                result = column > value
+            elif op == "$gte":
+                result = column >= value
+            elif op == "$lt":
+                result = column < value
+            elif op == "$lte":
+                result = column <= value
+            else:
+                raise ValueError(f"不支持的where操作符: {op}")
+        return np.asarray(result, dtype=bool) & present
+    
+    def _distances(self, scores: np.ndarray, sq_norms: Optional[np.ndarray], queries: np.ndarray) -> np.ndarray:
+        """内积 (n_rows, n_queries) 转换为所在空间的距离"""
+        if self.space == "l2":
+            distances = sq_norms[:, None] - 2.0 * scores + np.einsum("ij,ij->i", queries, queries)[None, :]
+            np.maximum(distances, 0.0, out=distances)
+            return distances
+        return 1.0 - scores
+    
+    @staticmethod
+    def _top_k(column: np.ndarray, k: int) -> np.ndarray:
+        """距离最小的k个位置（升序）"""
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < column.shape[0]:
+            top = np.argpartition(column, k - 1)[:k]
+            return top[np.argsort(column[top], kind="stable")]
+        return np.argsort(column, kind="stable")
+    
+    def _rescore(
+        self,
+        matrix: np.ndarray,
+        quantized: QuantizedIndex,
+        queries: np.ndarray,
+        candidates: Optional[np.ndarray],
+        n_results: int
+    ):
+        """
+        两阶段检索：量化编码粗排出短名单，再用全精度向量精确重排
+        
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: 每个查询的 (行号, 距离)
+        """
+        approx = quantized.inner_products(queries, candidates)
+        approx_sq_norms = quantized.sq_norms(candidates) if self.space == "l2" else None
+        approx_distances = self._distances(approx, approx_sq_norms, queries)
+        shortlist_size = max(self.rescore_size, n_results)
+        
+        hits = []
+        for q, column in enumerate(approx_distances.T):
+            shortlist = np.argpartition(column, shortlist_size - 1)[:shortlist_size]
+            rows = candidates[shortlist] if candidates is not None else shortlist
+            rows.sort()  # 按行号顺序读取磁盘
+            
+            vectors = np.asarray(matrix[rows])
+            query = queries[q:q + 1]
+            sq_norms = np.einsum("ij,ij->i", vectors, vectors) if self.space == "l2" else None
+            exact = self._distances(vectors @ query.T, sq_norms, query)[:, 0]
+            
+            top = self._top_k(exact, n_results)
+            hits.append((rows[top], exact[top]))
+        return hits
+    
+    def query(
+        self,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """
+        Top-K检索（未开启量化时为精确检索）
+        
+        Returns:
+            Dict: Chroma格式的检索结果（距离升序）
+        """
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        
+        with self._lock:
+            self._refresh()
+            # 量化同步可能加载其他进程新写入的行，先同步再确定行数
+            quantized = self._get_quantized()
+            size = self.size
+            if size == 0:
+                for _ in query_embeddings:
+                    for key in result:
+                        result[key].append([])
+                return result
+            matrix = self._get_matrix()
+            # 集合被重建时 _reset 会替换这些列表，锁外使用本次检索时的引用
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+            candidates = np.flatnonzero(self._where_mask(where, size)) if where else None
+        
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_embeddings), -1)
+        if self.space == "cosine":
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries = queries / np.where(norms > 0, norms, 1.0)
+        
+        n_candidates = candidates.shape[0] if candidates is not None else size
+        if quantized is not None and n_candidates > max(self.rescore_size, n_results):
+            hits = self._rescore(matrix, quantized, queries, candidates, n_results)
+        else:
+            if candidates is not None:
+                vectors = matrix[candidates]
+            else:
+                vectors = matrix
+            sq_norms = None
+            if self.space == "l2":
+                sq_norms = self._get_sq_norms(matrix)
+                if candidates is not None:
+                    sq_norms = sq_norms[candidates]
+            
+            # 一次BLAS乘积得到所有候选与所有查询的相似度 (n_candidates, n_queries)
+            distances = self._distances(vectors @ queries.T, sq_norms, queries)
+            hits = []
+            for column in distances.T:
+                top = self._top_k(column, n_results)
+                hits.append((candidates[top] if candidates is not None else top, column[top]))
+        
+        for rows, distances in hits:
+            result["ids"].append([ids[row] for row in rows])
+            result["documents"].append([documents[row] for row in rows])
+            result["metadatas"].append([dict(metadatas[row]) for row in rows])
+            result["distances"].append([float(distance) for distance in distances])
+        
+        return result
+
+
+class NumpyVectorStore(VectorStore):
+    """NumPy检索后端（每个集合一个内存映射矩阵，可选量化粗排）"""
+    
+    def __init__(self, root: str, quantization: Optional[str] = None):
+        """
+        Args:
+            root: 存储根目录
+            quantization: 量化方式（none/int8/pq/truncate，默认取配置 VECTOR_STORE_QUANTIZATION）
+        """
+        quantization = quantization or settings.vector_store_quantization
+        if quantization not in SUPPORTED_QUANTIZATIONS:
+            raise ValueError(f"不支持的量化方式: {quantization}（可选: {', '.join(SUPPORTED_QUANTIZATIONS)}）")
+        self.quantization = quantization
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+        
+        logger.info(f"✅ NumPy向量存储初始化成功: {self.root}（量化: {self.quantization}）")
+    
+    @property
+    def backend_name(self) -> str:
+        return "numpy"
+    
+    def _get(self, name: str) -> NumpyCollection:
+        with self._lock:
+            path = self.root / name
+            if not (path / COLLECTION_FILE).exists():
+                # 可能已被其他进程删除
+                self._collections.pop(name, None)
+                raise ValueError(f"Collection {name} does not exist.")
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(
+                    path,
+                    quantization=self.quantization,
+                    rescore_size=settings.vector_store_rescore_size,
+                    pq_subspaces=settings.vector_store_pq_subspaces,
+                    pq_min_rows=settings.vector_store_pq_min_rows,
+                    truncate_dim=settings.vector_store_truncate_dim
+                )
+                self._collections[name] = collection
+            return collection
+    
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        metadata = dict(metadata or {})
+        space = metadata.get("hnsw:space", "l2")
+        if space not in SUPPORTED_SPACES:
+            raise ValueError(f"不支持的距离空间: {space}（可选: {', '.join(SUPPORTED_SPACES)}）")
+        
+        with self._lock:
+            path = self.root / name
+            if (path / COLLECTION_FILE).exists():
+                return
+            path.mkdir(parents=True, exist_ok=True)
+            info = {"space": space, "dimension": None, "metadata": metadata}
+            (path / COLLECTION_FILE).write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+            logger.info(f"✅ Collection '{name}' 已就绪")
+    
+    def has_collection(self, name: str) -> bool:
+        return (self.root / name / COLLECTION_FILE).exists()
+    
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+            path = self.root / name
+            if not path.exists():
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(path)
+            logger.info(f"✅ Collection '{name}' 已删除")
+    
+    def list_collections(self) -> List[str]:
+        return sorted(
+            path.name for path in self.root.iterdir()
+            if (path / COLLECTION_FILE).exists()
+        )
+    
+    def add(
+        self,
+        name: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        added = self._get(name).add(ids, embeddings, documents, metadatas)
+        logger.info(f"✅ 已添加 {added} 个文档到 '{name}'")
+    
+    def query(
+        self,
+        name: str,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        return self._get(name).query(query_embeddings, n_results=n_results, where=where)
+    
+    def count(self, name: str) -> int:
+        return self._get(name).count()
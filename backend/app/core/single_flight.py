@@ -0,0 +1,264 @@
+"""
+并发请求合并（single-flight）
+
+热门问题（如新章节发布后）被大量读者同时提问时，所有请求会同时未命中查询缓存并各自执行完整的
+检索 + LLM流程。这里按键合并进行中的计算：
+
+- SingleFlight: 相同键的并发调用等待同一次计算（同步线程与异步协程均可等待），结果或异常共享给所有等待者
+- StreamFanout: 相同键的并发流式生成只调用一次LLM，每个订阅者从头接收同一个增量流（晚加入者先回放已生成的部分）
+
+只合并"进行中"的计算：计算完成后键即被移除，之后的请求由查询缓存负责
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """按键合并进行中的计算（线程安全）"""
+    
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leader_count = 0
+        self.coalesced_count = 0
+    
+    def _join(self, key: Hashable):
+        """获取或创建键对应的Future，返回 (Future, 是否由本调用负责计算)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced_count += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.leader_count += 1
+            return future, True
+    
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """移除键并发布结果（先移除，之后到达的请求重新计算或命中缓存）"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def do(self, key: Hashable, func: Callable[[], Any]):
+        """
+        同步执行（相同键的并发调用只执行一次 func）
+        
+        Args:
+            key: 合并键
+            func: 计算函数
+        
+        Returns:
+            Tuple[Any, bool]: (结果, 是否为合并的请求)
+        """
+        future, leader = self._join(key)
+        if not leader:
+            logger.info(f"🔗 合并进行中的相同请求，等待结果")
+            return future.result(), True
+        
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+    
+    async def ado(self, key: Hashable, func: Callable[[], Awaitable[Any]]):
+        """
+        异步执行（相同键的并发调用只执行一次 func）
+        
+        计算在独立任务中进行：发起请求的连接断开（协程被取消）不会中断其他等待者
+        
+        Args:
+            key: 合并键
+            func: 返回协程的计算函数
+        
+        Returns:
+            Tuple[Any, bool]: (结果, 是否为合并的请求)
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(func())
+            
+            def publish(done: asyncio.Future):
+                if done.cancelled():
+                    self._finish(key, future, error=asyncio.CancelledError())
+                elif done.exception() is not None:
+                    self._finish(key, future, error=done.exception())
+                else:
+                    self._finish(key, future, result=done.result())
+            
+            task.add_done_callback(publish)
+        else:
+            logger.info(f"🔗 合并进行中的相同请求，等待结果")
+        
+        # shield: 单个等待者被取消时不取消共享的Future
+        result = await asyncio.shield(asyncio.wrap_future(future))
+        return result, not leader
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取统计信息
+        
+        Returns:
+            Dict: 进行中的计算数、实际计算次数、被合并的请求数
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leader_count': self.leader_count,
+                'coalesced_count': self.coalesced_count
+            }
+
+
+class _Broadcast:
+    """一次进行中的流式生成（已生成的增量 + 订阅者计数）"""
+    
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.condition = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class StreamFanout:
+    """
+    按键合并进行中的流式生成（只在事件循环线程中使用）
+    
+    生成任务独立于订阅者运行，不受单个慢连接反压；所有订阅者都退出后取消生成
+    """
+    
+    def __init__(self):
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.leader_count = 0
+        self.coalesced_count = 0
+    
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, stream: AsyncGenerator[Any, None]):
+        """迭代上游流并广播给订阅者"""
+        try:
+            async with aclosing(stream):
+                async for chunk in stream:
+                    broadcast.chunks.append(chunk)
+                    async with broadcast.condition:
+                        broadcast.condition.notify_all()
+        except Exception as e:
+            broadcast.error = e
+        finally:
+            broadcast.done = True
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            async with broadcast.condition:
+                broadcast.condition.notify_all()
+    
+    async def subscribe(
+        self,
+        key: Hashable,
+        stream_factory: Callable[[], AsyncGenerator[Any, None]]
+    ) -> AsyncGenerator[Any, None]:
+        """
+        订阅流式生成（相同键的进行中生成只调用一次 stream_factory）
+        
+        Args:
+            key: 合并键
+            stream_factory: 创建上游异步生成器的函数
+        
+        Yields:
+            Any: 上游产出的增量（从头开始）
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, stream_factory()))
+            self.leader_count += 1
+        else:
+            self.coalesced_count += 1
+            logger.info(f"🔗 合并进行中的相同流式生成（已生成 {len(broadcast.chunks)} 个增量）")
+        broadcast.subscribers += 1
+        
+        index = 0
+        try:
+            while True:
+                async with broadcast.condition:
+                    await broadcast.condition.wait_for(
+                        lambda: index < len(broadcast.chunks) or broadcast.done
+                    )
+                while index < len(broadcast.chunks):
+                    chunk = broadcast.chunks[index]
+                    index += 1
+                    yield chunk
+                if broadcast.done and index >= len(broadcast.chunks):
+                    break
+            if broadcast.error is not None:
+                raise broadcast.error
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                # 所有订阅者都已退出，停止生成
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+                broadcast.task.cancel()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取统计信息
+        
+        Returns:
+            Dict: 进行中的生成数、实际生成次数、被合并的订阅数
+        """
+        return {
+            'in_flight': len(self._streams),
+            'leader_count': self.leader_count,
+            'coalesced_count': self.coalesced_count
+        }
+
+
+# 全局实例
+_single_flight: Optional[SingleFlight] = None
+_stream_fanout: Optional[StreamFanout] = None
+
+
+def get_single_flight() -> SingleFlight:
+    """获取全局请求合并实例（单例）"""
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+def get_stream_fanout() -> StreamFanout:
+    """获取全局流式生成合并实例（单例）"""
+    global _stream_fanout
+    if _stream_fanout is None:
+        _stream_fanout = StreamFanout()
+    return _stream_fanout
+
+
+def get_coalescing_stats() -> Dict[str, Any]:
+    """
+    获取请求合并统计
+    
+    Returns:
+        Dict: 非流式查询与流式生成的合并统计，以及被合并的请求总数
+    """
+    queries = get_single_flight().get_stats()
+    streams = get_stream_fanout().get_stats()
+    return {
+        'coalesced_requests': queries['coalesced_count'] + streams['coalesced_count'],
+        'queries': queries,
+        'streams': streams
+    }
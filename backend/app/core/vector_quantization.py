@@ -0,0 +1,408 @@
+"""
+向量量化（NumPy向量存储的压缩检索层）
+
+量化数据是由全精度矩阵派生的只追加文件，可随时从全精度向量重建：
+- int8: 按行对称标量量化（codes.i8 + scales.f32），体积为float32的1/4
+- pq:   乘积量化（pq_codebook.npy + pq_codes.u8），每行M字节，适合超大小说
+- truncate: 维度截断（truncated_{N}.f32），保存前N维float32；embedding-3为Matryoshka式向量，
+          前几百维已包含大部分语义信息
+
+各方式都额外保存每行（粗排表示）的平方范数（norms.f32），l2空间的粗排无需读取全精度矩阵。
+粗排只扫描量化编码，精排由调用方读取候选行的全精度向量完成。
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_QUANTIZATIONS = ("none", "int8", "pq", "truncate")
+
+NORMS_FILE = "norms.f32"
+
+# 编码/粗排时每块处理的行数（int8粗排的float32缓冲区保持在CPU缓存量级）
+CHUNK_ROWS = 2048
+
+
+def _load_rows(path: Path, dtype, width: int, rows: int) -> Optional[np.memmap]:
+    """以内存映射方式读取定长行文件的前rows行"""
+    if rows == 0:
+        return None
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows, width) if width > 1 else (rows,))
+
+
+class QuantizedIndex(ABC):
+    """量化索引基类"""
+    
+    kind: str = ""
+    
+    def __init__(self, path: Path, dimension: int):
+        """
+        Args:
+            path: 集合目录
+            dimension: 向量维度
+        """
+        self.path = path
+        self.dimension = dimension
+        self.norms_path = path / NORMS_FILE
+        self.size = 0
+    
+    @abstractmethod
+    def _files(self):
+        """按行追加的文件列表 [(路径, 每行字节数)]"""
+        pass
+    
+    @abstractmethod
+    def _encode(self, block: np.ndarray):
+        """编码一块全精度向量并追加写入"""
+        pass
+    
+    @abstractmethod
+    def _reload(self):
+        """重新映射编码文件"""
+        pass
+    
+    @abstractmethod
+    def inner_products(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        近似内积（粗排）
+        
+        Args:
+            queries: 查询矩阵 (n_queries, dimension)
+            rows: 候选行号（None表示全部）
+        
+        Returns:
+            np.ndarray: (n_rows, n_queries)
+        """
+        pass
+    
+    def _prepare(self, matrix: np.ndarray) -> bool:
+        """编码前的准备（如训练码本），返回False表示暂不可用"""
+        return True
+    
+    def _coarse(self, block: np.ndarray) -> np.ndarray:
+        """粗排使用的向量表示（平方范数按此计算）"""
+        return block
+    
+    @classmethod
+    def remove_files(cls, path: Path):
+        """删除该量化方式的所有文件"""
+        for name in cls.file_names:
+            (path / name).unlink(missing_ok=True)
+    
+    def _aligned_rows(self) -> int:
+        """各文件中完整对齐的行数"""
+        rows = []
+        for file_path, row_bytes in self._files() + [(self.norms_path, 4)]:
+            rows.append(file_path.stat().st_size // row_bytes if file_path.exists() else 0)
+        return min(rows)
+    
+    def sync(self, matrix: np.ndarray):
+        """
+        与全精度矩阵对齐：截断不完整的行，编码新增的行
+        
+        Args:
+            matrix: 全精度向量矩阵（内存映射）
+        """
+        total = matrix.shape[0]
+        if not self._prepare(matrix):
+            self.size = 0
+            return
+        
+        rows = min(self._aligned_rows(), total)
+        for file_path, row_bytes in self._files() + [(self.norms_path, 4)]:
+            file_path.touch(exist_ok=True)
+            if file_path.stat().st_size != rows * row_bytes:
+                with open(file_path, "r+b") as f:
+                    f.truncate(rows * row_bytes)
+        
+        if rows < total:
+            for start in range(rows, total, CHUNK_ROWS):
+                block = self._coarse(np.asarray(matrix[start:min(start + CHUNK_ROWS, total)], dtype=np.float32))
+                self._encode(block)
+                with open(self.norms_path, "ab") as f:
+                    f.write(np.einsum("ij,ij->i", block, block).astype(np.float32).tobytes())
+            logger.info(f"🗜️ {self.kind}量化: 编码 {total - rows} 行（共 {total} 行）")
+        
+        self.size = total
+        self._norms = _load_rows(self.norms_path, np.float32, 1, total)
+        self._reload()
+    
+    def sq_norms(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """每行的平方范数（l2空间粗排使用）"""
+        return np.asarray(self._norms if rows is None else self._norms[rows])
+    
+    def nbytes(self) -> int:
+        """粗排扫描的常驻字节数"""
+        return sum(row_bytes for _, row_bytes in self._files()) * self.size
+    
+    def _iter_chunks(self, rows: Optional[np.ndarray]):
+        """按块遍历行号（返回切片或行号数组）"""
+        total = self.size if rows is None else rows.shape[0]
+        for start in range(0, total, CHUNK_ROWS):
+            end = min(start + CHUNK_ROWS, total)
+            yield slice(start, end) if rows is None else rows[start:end]
+
+
+class Int8Index(QuantizedIndex):
+    """int8按行对称标量量化: x ≈ scale * code / 127"""
+    
+    kind = "int8"
+    file_names = ("codes.i8", "scales.f32")
+    
+    def __init__(self, path: Path, dimension: int):
+        super().__init__(path, dimension)
+        self.codes_path = path / "codes.i8"
+        self.scales_path = path / "scales.f32"
+        self._codes = None
+        self._scales = None
+    
+    def _files(self):
+        return [(self.codes_path, self.dimension), (self.scales_path, 4)]
+    
+    def _encode(self, block: np.ndarray):
+        scales = np.abs(block).max(axis=1)
+        safe = np.where(scales > 0, scales, 1.0)
+        codes = np.clip(np.rint(block / safe[:, None] * 127.0), -127, 127).astype(np.int8)
+        with open(self.codes_path, "ab") as f:
+            f.write(codes.tobytes())
+        with open(self.scales_path, "ab") as f:
+            f.write(scales.astype(np.float32).tobytes())
+    
+    def _reload(self):
+        self._codes = _load_rows(self.codes_path, np.int8, self.dimension, self.size)
+        self._scales = _load_rows(self.scales_path, np.float32, 1, self.size)
+    
+    def inner_products(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n_rows = self.size if rows is None else rows.shape[0]
+        result = np.empty((n_rows, queries.shape[0]), dtype=np.float32)
+        query_t = (queries.T / 127.0).astype(np.float32)
+        
+        offset = 0
+        for index in self._iter_chunks(rows):
+            codes = np.asarray(self._codes[index], dtype=np.float32)
+            scales = np.asarray(self._scales[index])
+            block = codes @ query_t
+            block *= scales[:, None]
+            result[offset:offset + block.shape[0]] = block
+            offset += block.shape[0]
+        return result
+
+
+class PQIndex(QuantizedIndex):
+    """
+    乘积量化: 向量切分为M个子空间，每个子空间用256个中心编码为1字节
+    粗排使用ADC查表（每个查询预先计算 M x 256 的子空间内积表）
+    """
+    
+    kind = "pq"
+    file_names = ("pq_codebook.npy", "pq_codes.u8")
+    
+    def __init__(
+        self,
+        path: Path,
+        dimension: int,
+        subspaces: int = 64,
+        train_size: int = 16384,
+        iterations: int = 8
+    ):
+        """
+        Args:
+            path: 集合目录
+            dimension: 向量维度
+            subspaces: 子空间数M（需整除维度）
+            train_size: 训练码本的采样行数
+            iterations: k-means迭代次数
+        """
+        super().__init__(path, dimension)
+        if dimension % subspaces != 0:
+            raise ValueError(f"PQ子空间数{subspaces}无法整除向量维度{dimension}")
+        self.subspaces = subspaces
+        self.sub_dim = dimension // subspaces
+        self.train_size = train_size
+        self.iterations = iterations
+        self.codebook_path = path / "pq_codebook.npy"
+        self.codes_path = path / "pq_codes.u8"
+        self.codebook: Optional[np.ndarray] = None  # (M, 256, sub_dim)
+        self._codes = None
+    
+    def _files(self):
+        return [(self.codes_path, self.subspaces)]
+    
+    def _prepare(self, matrix: np.ndarray) -> bool:
+        if self.codebook is not None:
+            return True
+        if self.codebook_path.exists():
+            codebook = np.load(self.codebook_path)
+            if codebook.shape == (self.subspaces, 256, self.sub_dim):
+                self.codebook = codebook
+                return True
+        if matrix.shape[0] < 256:
+            return False
+        
+        # 码本变化后旧编码失效
+        self.codes_path.unlink(missing_ok=True)
+        self.norms_path.unlink(missing_ok=True)
+        self.codebook = self._train(matrix)
+        np.save(self.codebook_path, self.codebook)
+        return True
+    
+    def _train(self, matrix: np.ndarray) -> np.ndarray:
+        """在采样数据上按子空间训练k-means码本"""
+        rng = np.random.default_rng(0)
+        total = matrix.shape[0]
+        sample_rows = np.sort(rng.choice(total, size=min(self.train_size, total), replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        
+        codebook = np.empty((self.subspaces, 256, self.sub_dim), dtype=np.float32)
+        for m in range(self.subspaces):
+            data = sample[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            centroids = data[rng.choice(data.shape[0], size=256, replace=False)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(data, centroids)
+                counts = np.bincount(assign, minlength=256)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, data)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebook[m] = centroids
+        
+        logger.info(f"✅ PQ码本训练完成: M={self.subspaces}, 采样 {sample.shape[0]} 行")
+        return codebook
+    
+    @staticmethod
+    def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """最近中心（平方欧氏距离）"""
+        distances = (
+            np.einsum("ij,ij->i", centroids, centroids)[None, :]
+            - 2.0 * (data @ centroids.T)
+        )
+        return distances.argmin(axis=1)
+    
+    def _encode(self, block: np.ndarray):
+        codes = np.empty((block.shape[0], self.subspaces), dtype=np.uint8)
+        for m in range(self.subspaces):
+            codes[:, m] = self._nearest(block[:, m * self.sub_dim:(m + 1) * self.sub_dim], self.codebook[m])
+        with open(self.codes_path, "ab") as f:
+            f.write(codes.tobytes())
+    
+    def _reload(self):
+        self._codes = _load_rows(self.codes_path, np.uint8, self.subspaces, self.size)
+    
+    def inner_products(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        n_rows = self.size if rows is None else rows.shape[0]
+        result = np.empty((n_rows, queries.shape[0]), dtype=np.float32)
+        
+        # 查表 (n_queries, M, 256)
+        tables = np.einsum(
+            "qmd,mkd->qmk",
+            queries.reshape(queries.shape[0], self.subspaces, self.sub_dim),
+            self.codebook
+        )
+        subspace_index = np.arange(self.subspaces)
+        
+        offset = 0
+        for index in self._iter_chunks(rows):
+            codes = np.asarray(self._codes[index])
+            for q in range(queries.shape[0]):
+                result[offset:offset + codes.shape[0], q] = tables[q][subspace_index, codes].sum(axis=1)
+            offset += codes.shape[0]
+        return result
+    
+    def nbytes(self) -> int:
+        return super().nbytes() + (self.codebook.nbytes if self.codebook is not None else 0)
+
+
+class TruncatedIndex(QuantizedIndex):
+    """维度截断：保存前N维float32，粗排为低维BLAS乘积"""
+    
+    kind = "truncate"
+    
+    def __init__(self, path: Path, dimension: int, truncate_dim: int = 256, normalize: bool = False):
+        """
+        Args:
+            path: 集合目录
+            dimension: 向量维度
+            truncate_dim: 保留的前导维度数
+            normalize: 截断后是否重新归一化（cosine空间）
+        """
+        super().__init__(path, dimension)
+        self.truncate_dim = min(truncate_dim, dimension)
+        self.normalize = normalize
+        self.vectors_path = path / f"truncated_{self.truncate_dim}.f32"
+        self._vectors = None
+        
+        # 截断维度变化后旧文件失效（行宽不同），平方范数需一并重建
+        stale = [file_path for file_path in path.glob("truncated_*.f32") if file_path != self.vectors_path]
+        if stale:
+            for file_path in stale:
+                file_path.unlink()
+            self.norms_path.unlink(missing_ok=True)
+    
+    @classmethod
+    def remove_files(cls, path: Path):
+        for file_path in path.glob("truncated_*.f32"):
+            file_path.unlink()
+    
+    def _files(self):
+        return [(self.vectors_path, self.truncate_dim * 4)]
+    
+    def _coarse(self, block: np.ndarray) -> np.ndarray:
+        block = np.ascontiguousarray(block[:, :self.truncate_dim])
+        if self.normalize:
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            block /= np.where(norms > 0, norms, 1.0)
+        return block
+    
+    def _encode(self, block: np.ndarray):
+        with open(self.vectors_path, "ab") as f:
+            f.write(block.tobytes())
+    
+    def _reload(self):
+        self._vectors = _load_rows(self.vectors_path, np.float32, self.truncate_dim, self.size)
+    
+    def inner_products(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # 查询前缀的范数对同一查询是常数，不影响粗排顺序，无需重新归一化
+        query_t = np.ascontiguousarray(queries[:, :self.truncate_dim].T)
+        vectors = self._vectors if rows is None else self._vectors[rows]
+        return vectors @ query_t
+
+
+def create_quantized_index(
+    kind: str,
+    path: Path,
+    dimension: int,
+    pq_subspaces: int = 64,
+    truncate_dim: int = 256,
+    normalize: bool = False
+) -> QuantizedIndex:
+    """
+    创建量化索引，并删除其他量化方式遗留的文件
+    
+    Args:
+        kind: int8 / pq / truncate
+        path: 集合目录
+        dimension: 向量维度
+        pq_subspaces: PQ子空间数
+        truncate_dim: 维度截断保留的维度数
+        normalize: 截断向量是否重新归一化（cosine空间）
+    
+    Returns:
+        QuantizedIndex: 量化索引（需调用 sync 与全精度矩阵对齐）
+    """
+    indexes = {"int8": Int8Index, "pq": PQIndex, "truncate": TruncatedIndex}
+    if kind not in indexes:
+        raise ValueError(f"不支持的量化方式: {kind}（可选: {', '.join(SUPPORTED_QUANTIZATIONS)}）")
+    for other_kind, cls in indexes.items():
+        if other_kind != kind:
+            cls.remove_files(path)
+    
+    if kind == "pq":
+        return PQIndex(path, dimension, subspaces=pq_subspaces)
+    if kind == "truncate":
+        return TruncatedIndex(path, dimension, truncate_dim=truncate_dim, normalize=normalize)
+    return Int8Index(path, dimension)
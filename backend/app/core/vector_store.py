@@ -0,0 +1,182 @@
+"""
+向量存储抽象接口
+
+每本小说一个集合（集合名 novel_{id}），检索结果统一为Chroma格式:
+{'ids': [[...]], 'documents': [[...]], 'metadatas': [[...]], 'distances': [[...]]}
+（外层列表与 query_embeddings 一一对应）
+
+后端由配置 VECTOR_STORE_BACKEND 选择:
+- chroma: ChromaDB持久化客户端（HNSW近似检索）
+- numpy: 内存映射float32矩阵 + 精确检索（见 numpy_vector_store.py）
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import logging
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_BACKENDS = ("chroma", "numpy")
+
+
+class VectorStore(ABC):
+    """向量存储抽象基类"""
+    
+    @property
+    @abstractmethod
+    def backend_name(self) -> str:
+        """后端名称"""
+        pass
+    
+    @abstractmethod
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        """
+        获取或创建集合
+        
+        Args:
+            name: 集合名称
+            metadata: 集合元数据（"hnsw:space" 决定距离空间: l2/cosine/ip）
+        """
+        pass
+    
+    @abstractmethod
+    def has_collection(self, name: str) -> bool:
+        """集合是否存在"""
+        pass
+    
+    @abstractmethod
+    def delete_collection(self, name: str):
+        """删除集合"""
+        pass
+    
+    @abstractmethod
+    def list_collections(self) -> List[str]:
+        """列出所有集合名称"""
+        pass
+    
+    @abstractmethod
+    def add(
+        self,
+        name: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        """
+        添加文档（已存在的ID跳过）
+        
+        Args:
+            name: 集合名称
+            ids: 文档ID列表
+            embeddings: 向量列表
+            documents: 文本列表
+            metadatas: 元数据列表
+        """
+        pass
+    
+    @abstractmethod
+    def query(
+        self,
+        name: str,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        """
+        Top-K检索
+        
+        Args:
+            name: 集合名称
+            query_embeddings: 查询向量列表
+            n_results: 每个查询返回的结果数
+            where: 元数据过滤条件（Chroma where语法）
+        
+        Returns:
+            Dict: Chroma格式的检索结果（距离升序）
+        """
+        pass
+    
+    @abstractmethod
+    def count(self, name: str) -> int:
+        """集合中的文档数"""
+        pass
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB后端"""
+    
+    def __init__(self):
+        from app.core.chromadb_client import get_chroma_client
+        self.chroma_client = get_chroma_client()
+    
+    @property
+    def backend_name(self) -> str:
+        return "chroma"
+    
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.chroma_client.get_or_create_collection(name=name, metadata=metadata)
+    
+    def has_collection(self, name: str) -> bool:
+        return name in self.chroma_client.list_collections()
+    
+    def delete_collection(self, name: str):
+        self.chroma_client.delete_collection(name)
+    
+    def list_collections(self) -> List[str]:
+        return self.chroma_client.list_collections()
+    
+    def add(
+        self,
+        name: str,
+        ids: List[str],
+        embeddings: List[List[float]],
+        documents: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.chroma_client.add_documents(
+            collection_name=name,
+            documents=documents,
+            embeddings=embeddings,
+            ids=ids,
+            metadatas=metadatas
+        )
+    
+    def query(
+        self,
+        name: str,
+        query_embeddings: List[List[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict:
+        return self.chroma_client.query_documents(
+            collection_name=name,
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where
+        )
+    
+    def count(self, name: str) -> int:
+        return self.chroma_client.get_collection_stats(name)["count"]
+
+
+# 全局向量存储实例
+_vector_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """获取全局向量存储实例（单例，后端由配置决定）"""
+    global _vector_store
+    if _vector_store is None:
+        backend = settings.vector_store_backend
+        if backend == "numpy":
+            from app.core.numpy_vector_store import NumpyVectorStore
+            _vector_store = NumpyVectorStore(settings.vector_store_path)
+        elif backend == "chroma":
+            _vector_store = ChromaVectorStore()
+        else:
+            raise ValueError(f"不支持的向量存储后端: {backend}（可选: {', '.join(SUPPORTED_BACKENDS)}）")
+        logger.info(f"✅ 向量存储后端: {backend}")
+    return _vector_store
@@ -12,7 +12,8 @@ from app.core.error_handlers import register_exception_handlers
 from app.core.logging import setup_logging, get_logger
 from app.middleware.logging import RequestLoggingMiddleware
 from app.db.init_db import init_database, check_database_initialized
-from app.core.chromadb_client import get_chroma_client
+from app.core.vector_store import get_vector_store
+from app.core.executors import shutdown_executors
 from app.api import health
 
 # 配置结构化日志系统
@@ -75,11 +76,11 @@ async def lifespan(app: FastAPI):
         else:
             logger.info("✅ 数据库已初始化")
         
-        # 初始化ChromaDB客户端
-        logger.info("🔍 初始化ChromaDB...")
-        chroma_client = get_chroma_client()
-        collections = chroma_client.list_collections()
-        logger.info(f"✅ ChromaDB已就绪 ({len(collections)} 个集合)")
+        # 初始化向量存储
+        logger.info(f"🔍 初始化向量存储 ({settings.vector_store_backend})...")
+        vector_store = get_vector_store()
+        collections = vector_store.list_collections()
+        logger.info(f"✅ 向量存储已就绪 ({len(collections)} 个集合)")
         
         # 检查智谱AI配置
         if settings.zhipu_api_key == "your_zhipuai_api_key_here":
@@ -98,6 +99,7 @@ async def lifespan(app: FastAPI):
     
     # 关闭时清理
     logger.info(f"👋 {APP_NAME} 关闭中...")
+    shutdown_executors()
     logger.info("✅ 应用已关闭")
 
 
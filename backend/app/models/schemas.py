@@ -150,6 +150,7 @@ class IndexingDetail(BaseModel):
     steps: List[IndexingStep] = Field(default_factory=list, description="处理步骤")
     failed_chapters: List[FailedChapter] = Field(default_factory=list, description="失败的章节")
     token_stats: Optional[Dict[str, Any]] = Field(None, description="Token统计")
+    embedding_cache: Optional[Dict[str, int]] = Field(None, description="Embedding缓存命中统计（hits/misses）")
     warnings: List[str] = Field(default_factory=list, description="警告信息")
 
 
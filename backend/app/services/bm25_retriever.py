@@ -1,24 +1,800 @@
 """
 BM25 检索器
 实现基于关键词的精确检索，弥补向量检索在专有名词上的不足
+
+检索引擎为原生倒排索引实现（BM25Index）：
+- 倒排表以 CSR 形式存储在紧凑的 numpy 数组中（词项偏移 + 文档ID + 词频）
+- 查询时只对包含查询词的文档打分，不再全量扫描
+- Top-K 使用 argpartition 部分选择，避免全量排序
+打分公式与 rank_bm25.BM25Okapi 保持一致，旧版 pickle 索引可直接加载
+
+已加载的索引由进程级注册表（BM25IndexRegistry）共享，按内存字节数 LRU 淘汰
+
+追加章节写入独立的增量段，检索时按全局文档频率跨段打分，段数达到阈值后在后台合并
+
+构建时分词在进程池中并行执行，分词结果持久化在索引旁，k1/b 为查询期参数，调整后无需重建
+
+分块文本已写入中心存储（chunk_store）时索引只保存分块ID，检索时只为 Top-K 结果读取文本并还原元数据
 """
 
 import os
+import sys
 import pickle
 import logging
+import threading
+import time
+import hashlib
 import jieba
-from typing import List, Dict, Any, Optional
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, Union, Callable
 from pathlib import Path
-from rank_bm25 import BM25Okapi
+from cachetools import LRUCache
 
 from app.core.config import settings
+from app.services.chunk_ids import chunk_id_of
+from app.services.chunk_store import get_chunk_store, has_chunk_texts
 
 logger = logging.getLogger(__name__)
 
+# 索引文件格式版本（1 = rank_bm25 pickle，2 = 原生倒排索引，3 = 增加分块ID，文本可由中心存储提供）
+INDEX_FORMAT_VERSION = 3
+
+
+def _okapi_idf(df: np.ndarray, num_docs: int, epsilon: float) -> np.ndarray:
+    """
+    计算 Okapi IDF（与 BM25Okapi 一致：负 IDF 以 epsilon * 平均IDF 代替）
+    
+    Args:
+        df: 每个词项的文档频率
+        num_docs: 文档总数
+        epsilon: 负IDF下限系数
+    
+    Returns:
+        np.ndarray: 每个词项的 IDF
+    """
+    if len(df) == 0:
+        return np.empty(0, dtype=np.float64)
+    df = df.astype(np.float64)
+    idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+    idf[idf < 0] = epsilon * idf.mean()
+    return idf
+
+
+def _sum_by_doc(doc_parts: List[np.ndarray], score_parts: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """按文档ID聚合多个查询词的得分"""
+    if not doc_parts:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+    if len(doc_parts) == 1:
+        return doc_parts[0], score_parts[0]
+    
+    all_docs = np.concatenate(doc_parts)
+    all_scores = np.concatenate(score_parts)
+    doc_ids, inverse = np.unique(all_docs, return_inverse=True)
+    scores = np.bincount(inverse, weights=all_scores, minlength=len(doc_ids))
+    return doc_ids, scores
+
+
+def _select_top_k(doc_ids: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """
+    部分选择 Top-K（仅正分）
+    
+    Returns:
+        List[Tuple[int, float]]: (文档ID, 分数)，按分数降序、文档ID升序排列
+    """
+    if k <= 0:
+        return []
+    
+    positive = scores > 0
+    doc_ids, scores = doc_ids[positive], scores[positive]
+    
+    if len(scores) > k:
+        # 部分选择：O(n) 选出 Top-K，再仅对这 K 个排序
+        selected = np.argpartition(-scores, k - 1)[:k]
+        doc_ids, scores = doc_ids[selected], scores[selected]
+    
+    order = np.lexsort((doc_ids, -scores))
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
+
+
+class BM25Index:
+    """
+    倒排索引 BM25 引擎（Okapi 变体）
+    
+    存储结构：
+    - vocab: 词项 -> 词项ID
+    - offsets: 词项ID对应倒排表在 postings_* 中的起止位置（长度 = 词表大小 + 1）
+    - postings_doc / postings_tf: 倒排表（文档ID升序）及对应词频
+    - doc_len: 每个文档的词数
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        """
+        初始化空索引
+        
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            epsilon: 负IDF下限系数（与 BM25Okapi 相同）
+        """
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings_doc = np.empty(0, dtype=np.int32)
+        self.postings_tf = np.empty(0, dtype=np.int32)
+        self.doc_len = np.empty(0, dtype=np.int32)
+        self.avgdl = 0.0
+        
+        # 派生数据（由 _finalize 计算，不持久化）
+        self.idf = np.empty(0, dtype=np.float64)
+        self._len_norm = np.empty(0, dtype=np.float64)
+    
+    @property
+    def num_docs(self) -> int:
+        """文档数量"""
+        return len(self.doc_len)
+    
+    @classmethod
+    def build(
+        cls,
+        tokenized_corpus: List[List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25
+    ) -> "BM25Index":
+        """
+        从分词后的语料构建索引
+        
+        Args:
+            tokenized_corpus: 每个文档的分词结果
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+            epsilon: 负IDF下限系数
+        
+        Returns:
+            BM25Index: 构建好的索引
+        """
+        index = cls(k1=k1, b=b, epsilon=epsilon)
+        
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        doc_len: List[int] = []
+        
+        vocab = index.vocab
+        for doc_id, tokens in enumerate(tokenized_corpus):
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_id = vocab.get(term)
+                if term_id is None:
+                    term_id = len(vocab)
+                    vocab[term] = term_id
+                term_ids.append(term_id)
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+        
+        term_arr = np.asarray(term_ids, dtype=np.int32)
+        # 稳定排序：同一词项内文档ID保持升序
+        order = np.argsort(term_arr, kind='stable')
+        
+        index.postings_doc = np.asarray(doc_ids, dtype=np.int32)[order]
+        index.postings_tf = np.asarray(tfs, dtype=np.int32)[order]
+        df = np.bincount(term_arr, minlength=len(vocab))
+        index.offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        index.doc_len = np.asarray(doc_len, dtype=np.int32)
+        index.avgdl = float(index.doc_len.sum()) / index.num_docs if index.num_docs else 0.0
+        
+        index._finalize()
+        return index
+    
+    @classmethod
+    def from_okapi(cls, bm25) -> "BM25Index":
+        """
+        从旧版 rank_bm25.BM25Okapi 对象转换（无需重新分词）
+        
+        Args:
+            bm25: BM25Okapi 实例
+        
+        Returns:
+            BM25Index: 等价的倒排索引
+        """
+        # BM25Okapi.doc_freqs 是每个文档的 {词: 词频}，展开即为原语料的词袋
+        corpus = [
+            [term for term, tf in doc.items() for _ in range(tf)]
+            for doc in bm25.doc_freqs
+        ]
+        return cls.build(corpus, k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon)
+    
+    @classmethod
+    def merge(cls, segments: List["BM25Index"]) -> "BM25Index":
+        """
+        合并多个段为一个索引（直接拼接倒排表，无需重新分词）
+        
+        文档ID按段顺序依次偏移，参数取第一个段
+        
+        Args:
+            segments: 段列表
+        
+        Returns:
+            BM25Index: 合并后的索引
+        """
+        first = segments[0]
+        index = cls(k1=first.k1, b=first.b, epsilon=first.epsilon)
+        
+        vocab = index.vocab
+        term_parts = []
+        doc_parts = []
+        tf_parts = []
+        doc_offset = 0
+        for segment in segments:
+            # 段内词项ID -> 全局词项ID
+            global_ids = np.empty(len(segment.vocab), dtype=np.int32)
+            for term, local_id in segment.vocab.items():
+                global_ids[local_id] = vocab.setdefault(term, len(vocab))
+            term_parts.append(np.repeat(global_ids, np.diff(segment.offsets)))
+            doc_parts.append(segment.postings_doc + doc_offset)
+            tf_parts.append(segment.postings_tf)
+            doc_offset += segment.num_docs
+        
+        term_arr = np.concatenate(term_parts) if term_parts else np.empty(0, dtype=np.int32)
+        # 稳定排序：段按顺序拼接，同一词项内文档ID保持升序
+        order = np.argsort(term_arr, kind='stable')
+        
+        index.postings_doc = np.concatenate(doc_parts).astype(np.int32)[order]
+        index.postings_tf = np.concatenate(tf_parts).astype(np.int32)[order]
+        df = np.bincount(term_arr, minlength=len(vocab))
+        index.offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        index.doc_len = np.concatenate([segment.doc_len for segment in segments]).astype(np.int32)
+        index.avgdl = float(index.doc_len.sum()) / index.num_docs if index.num_docs else 0.0
+        
+        index._finalize()
+        return index
+    
+    @property
+    def doc_freq(self) -> np.ndarray:
+        """每个词项的文档频率（按词项ID）"""
+        return np.diff(self.offsets)
+    
+    def _finalize(self):
+        """计算 IDF 与文档长度归一化项"""
+        self.idf = _okapi_idf(self.doc_freq, self.num_docs, self.epsilon)
+        self._len_norm = self.length_norm(self.avgdl)
+    
+    def length_norm(self, avgdl: float) -> np.ndarray:
+        """
+        计算文档长度归一化项 k1 * (1 - b + b * dl / avgdl)
+        
+        Args:
+            avgdl: 平均文档长度（分段索引使用全局值）
+        
+        Returns:
+            np.ndarray: 每个文档的归一化项
+        """
+        if avgdl > 0:
+            return self.k1 * (1 - self.b + self.b * self.doc_len / avgdl)
+        return np.full(self.num_docs, self.k1, dtype=np.float64)
+    
+    def get_scores(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算查询对命中文档的 BM25 分数（稀疏）
+        
+        Args:
+            query_tokens: 查询分词结果（重复词项会重复计分，与 BM25Okapi 一致）
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (文档ID数组, 分数数组)，只包含至少命中一个查询词的文档
+        """
+        weighted_terms = []
+        for term, count in Counter(query_tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                weighted_terms.append((term_id, count * self.idf[term_id]))
+        return self.score_terms(weighted_terms, self._len_norm)
+    
+    def score_terms(
+        self,
+        weighted_terms: List[Tuple[int, float]],
+        len_norm: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按给定的词项权重（查询词频 × IDF）遍历倒排表打分
+        
+        Args:
+            weighted_terms: (词项ID, 权重) 列表
+            len_norm: 文档长度归一化项
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (文档ID数组, 分数数组)
+        """
+        doc_parts = []
+        score_parts = []
+        
+        for term_id, weight in weighted_terms:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end].astype(np.float64)
+            doc_parts.append(docs)
+            score_parts.append(weight * tf * (self.k1 + 1) / (tf + len_norm[docs]))
+        
+        return _sum_by_doc(doc_parts, score_parts)
+    
+    def top_k(self, query_tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        """
+        获取分数最高的 k 个文档（仅正分）
+        
+        Args:
+            query_tokens: 查询分词结果
+            k: 返回数量
+        
+        Returns:
+            List[Tuple[int, float]]: (文档ID, 分数)，按分数降序、文档ID升序排列
+        """
+        return _select_top_k(*self.get_scores(query_tokens), k)
+    
+    def memory_usage(self) -> int:
+        """
+        估算索引占用的内存（字节）
+        
+        Returns:
+            int: 估算字节数
+        """
+        arrays = (
+            self.offsets, self.postings_doc, self.postings_tf,
+            self.doc_len, self.idf, self._len_norm
+        )
+        array_bytes = sum(arr.nbytes for arr in arrays)
+        # 词表：字符串对象 + dict 槽位（约 100 字节/项）
+        vocab_bytes = sum(sys.getsizeof(term) for term in self.vocab) + 100 * len(self.vocab)
+        return array_bytes + vocab_bytes
+    
+    def to_state(self) -> Dict[str, Any]:
+        """导出可持久化的状态"""
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'epsilon': self.epsilon,
+            'vocab': self.vocab,
+            'offsets': self.offsets,
+            'postings_doc': self.postings_doc,
+            'postings_tf': self.postings_tf,
+            'doc_len': self.doc_len,
+            'avgdl': self.avgdl,
+        }
+    
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "BM25Index":
+        """从持久化状态恢复索引"""
+        index = cls(k1=state['k1'], b=state['b'], epsilon=state['epsilon'])
+        index.vocab = state['vocab']
+        index.offsets = state['offsets']
+        index.postings_doc = state['postings_doc']
+        index.postings_tf = state['postings_tf']
+        index.doc_len = state['doc_len']
+        index.avgdl = state['avgdl']
+        index._finalize()
+        return index
+    
+    def set_params(self, k1: float, b: float):
+        """
+        调整 k1 / b 参数（倒排表存储原始词频与文档长度，无需重建或重新分词）
+        
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        if (k1, b) != (self.k1, self.b):
+            self.k1 = k1
+            self.b = b
+            self._finalize()
+
+
+class SegmentedBM25Index:
+    """
+    多段 BM25 索引（基础段 + 追加段）
+    
+    每个段是独立的 BM25Index，查询时使用全局统计量（文档总数、平均文档长度、
+    跨段合并的文档频率）计算 IDF，因此分数与把所有段合并成一个索引完全一致
+    """
+    
+    def __init__(self, segments: List[BM25Index]):
+        """
+        初始化分段索引
+        
+        Args:
+            segments: 段列表（顺序即文档ID顺序）
+        """
+        first = segments[0]
+        self.k1 = first.k1
+        self.b = first.b
+        self.epsilon = first.epsilon
+        self.segments = segments
+        
+        # 每个段的全局文档ID偏移
+        sizes = [segment.num_docs for segment in segments]
+        self.doc_offsets = np.concatenate(([0], np.cumsum(sizes)))[:-1].astype(np.int64)
+        
+        total_len = sum(float(segment.doc_len.sum()) for segment in segments)
+        self.avgdl = total_len / self.num_docs if self.num_docs else 0.0
+        
+        # 全局文档频率
+        global_df: Dict[str, int] = {}
+        for segment in segments:
+            seg_df = segment.doc_freq
+            for term, term_id in segment.vocab.items():
+                global_df[term] = global_df.get(term, 0) + int(seg_df[term_id])
+        idf = _okapi_idf(np.fromiter(global_df.values(), dtype=np.int64, count=len(global_df)),
+                         self.num_docs, self.epsilon)
+        self.idf: Dict[str, float] = dict(zip(global_df.keys(), idf.tolist()))
+        
+        # 每个段使用全局平均文档长度的归一化项
+        self._len_norms = [segment.length_norm(self.avgdl) for segment in segments]
+    
+    @property
+    def num_docs(self) -> int:
+        """文档数量（所有段之和）"""
+        return sum(segment.num_docs for segment in self.segments)
+    
+    def get_scores(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算查询对命中文档的 BM25 分数（全局文档ID）
+        
+        Args:
+            query_tokens: 查询分词结果
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (全局文档ID数组, 分数数组)
+        """
+        query_counts = Counter(query_tokens)
+        doc_parts = []
+        score_parts = []
+        
+        for segment, offset, len_norm in zip(self.segments, self.doc_offsets, self._len_norms):
+            weighted_terms = []
+            for term, count in query_counts.items():
+                term_id = segment.vocab.get(term)
+                if term_id is not None:
+                    weighted_terms.append((term_id, count * self.idf[term]))
+            if not weighted_terms:
+                continue
+            docs, scores = segment.score_terms(weighted_terms, len_norm)
+            # 段之间文档ID不重叠，直接拼接
+            doc_parts.append(docs.astype(np.int64) + offset)
+            score_parts.append(scores)
+        
+        if not doc_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(doc_parts), np.concatenate(score_parts)
+    
+    def top_k(self, query_tokens: List[str], k: int) -> List[Tuple[int, float]]:
+        """
+        获取分数最高的 k 个文档（仅正分）
+        
+        Args:
+            query_tokens: 查询分词结果
+            k: 返回数量
+        
+        Returns:
+            List[Tuple[int, float]]: (全局文档ID, 分数)
+        """
+        return _select_top_k(*self.get_scores(query_tokens), k)
+    
+    def memory_usage(self) -> int:
+        """估算索引占用的内存（字节）"""
+        idf_bytes = 100 * len(self.idf)
+        norm_bytes = sum(norm.nbytes for norm in self._len_norms)
+        return sum(segment.memory_usage() for segment in self.segments) + idf_bytes + norm_bytes
+
+
+@dataclass
+class LoadedBM25Index:
+    """已加载到内存的 BM25 索引（注册表中共享，只读）"""
+    index: Union[BM25Index, SegmentedBM25Index]
+    chunk_ids: np.ndarray  # 每个文档的分块ID（无法确定时为 -1）
+    documents: List[Optional[str]]  # None 表示文本由中心存储提供
+    metadatas: List[Optional[Dict[str, Any]]]
+    signature: Tuple  # 索引文件集合及其 mtime，用于判断缓存是否过期
+    merged_upto: int  # 基础段已合并的最大追加段序号
+    nbytes: int
+    
+    @property
+    def segments(self) -> List[BM25Index]:
+        """所有段（基础段在前）"""
+        if isinstance(self.index, SegmentedBM25Index):
+            return self.index.segments
+        return [self.index]
+
+
+def _make_loaded_index(
+    segments: List[BM25Index],
+    chunk_ids: np.ndarray,
+    documents: List[Optional[str]],
+    metadatas: List[Optional[Dict[str, Any]]],
+    signature: Tuple,
+    merged_upto: int
+) -> LoadedBM25Index:
+    """由段列表构造已加载索引（单段时直接使用 BM25Index）"""
+    index = segments[0] if len(segments) == 1 else SegmentedBM25Index(segments)
+    return LoadedBM25Index(
+        index=index,
+        chunk_ids=chunk_ids,
+        documents=documents,
+        metadatas=metadatas,
+        signature=signature,
+        merged_upto=merged_upto,
+        nbytes=_estimate_loaded_nbytes(index, chunk_ids, documents, metadatas)
+    )
+
+
+def _estimate_loaded_nbytes(
+    index,
+    chunk_ids: np.ndarray,
+    documents: List[Optional[str]],
+    metadatas: List[Optional[Dict]]
+) -> int:
+    """估算已加载索引的总内存占用（字节，中心存储提供的文本不计入）"""
+    doc_bytes = sys.getsizeof(documents) + sum(sys.getsizeof(doc) for doc in documents if doc is not None)
+    meta_bytes = sys.getsizeof(metadatas) + sum(
+        sys.getsizeof(meta) + sum(sys.getsizeof(v) for v in meta.values())
+        for meta in metadatas
+        if meta is not None
+    )
+    return index.memory_usage() + chunk_ids.nbytes + doc_bytes + meta_bytes
+
+
+def _chunk_id_array(metadatas: List[Optional[Dict[str, Any]]]) -> np.ndarray:
+    """由元数据得到分块ID数组（无法确定的为 -1）"""
+    chunk_ids = (chunk_id_of(meta) for meta in metadatas)
+    return np.fromiter(
+        (-1 if chunk_id is None else chunk_id for chunk_id in chunk_ids),
+        dtype=np.int64,
+        count=len(metadatas)
+    )
+
+
+class _ByteBoundedLRUCache(LRUCache):
+    """按字节数限制容量的 LRU 缓存，记录淘汰次数"""
+    
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize, getsizeof=lambda entry: entry.nbytes)
+        self.eviction_count = 0
+    
+    def popitem(self):
+        key, entry = super().popitem()
+        self.eviction_count += 1
+        logger.info(f"♻️ BM25 索引缓存淘汰: Novel ID={key} ({entry.nbytes / 1024 / 1024:.1f} MB)")
+        return key, entry
+
+
+class BM25IndexRegistry:
+    """
+    进程级 BM25 索引注册表
+    
+    - 以 novel_id 为键缓存已加载的索引，索引文件（含追加段）mtime 变化时自动重新加载
+    - 按估算内存字节数做 LRU 淘汰
+    - 同一小说的并发加载只执行一次（查询分解的多个子查询共享）
+    """
+    
+    def __init__(self, max_bytes: int):
+        """
+        初始化注册表
+        
+        Args:
+            max_bytes: 缓存总内存上限（字节）
+        """
+        self._cache = _ByteBoundedLRUCache(maxsize=max_bytes)
+        self._lock = threading.Lock()
+        self._load_locks: Dict[int, threading.Lock] = {}
+        self.hit_count = 0
+        self.miss_count = 0
+        logger.info(f"✅ BM25 索引注册表初始化 (max_bytes={max_bytes / 1024 / 1024:.0f} MB)")
+    
+    def _lookup(self, novel_id: int, signature: Tuple) -> Optional[LoadedBM25Index]:
+        """查找与文件签名一致的缓存项（需持有 _lock）"""
+        entry = self._cache.get(novel_id)
+        if entry is not None and entry.signature == signature:
+            return entry
+        return None
+    
+    def peek(self, novel_id: int) -> Optional[LoadedBM25Index]:
+        """
+        获取缓存项（不校验签名、不计入统计）
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            Optional[LoadedBM25Index]: 缓存项
+        """
+        with self._lock:
+            return self._cache.get(novel_id)
+    
+    def get(
+        self,
+        novel_id: int,
+        signature: Tuple,
+        loader: Callable[[], Optional[LoadedBM25Index]]
+    ) -> Optional[LoadedBM25Index]:
+        """
+        获取索引（缓存未命中时调用 loader 从磁盘加载）
+        
+        Args:
+            novel_id: 小说ID
+            signature: 当前索引文件签名
+            loader: 加载函数
+        
+        Returns:
+            Optional[LoadedBM25Index]: 已加载的索引，加载失败时返回 None
+        """
+        with self._lock:
+            entry = self._lookup(novel_id, signature)
+            if entry is not None:
+                self.hit_count += 1
+                return entry
+            load_lock = self._load_locks.setdefault(novel_id, threading.Lock())
+        
+        with load_lock:
+            # 等待期间可能已被其他线程加载
+            with self._lock:
+                entry = self._lookup(novel_id, signature)
+                if entry is not None:
+                    self.hit_count += 1
+                    return entry
+                self.miss_count += 1
+            
+            entry = loader()
+            if entry is not None:
+                self.put(novel_id, entry)
+            return entry
+    
+    def put(self, novel_id: int, entry: LoadedBM25Index):
+        """
+        放入索引（超过总上限的单个索引不缓存）
+        
+        Args:
+            novel_id: 小说ID
+            entry: 已加载的索引
+        """
+        with self._lock:
+            try:
+                self._cache[novel_id] = entry
+            except ValueError:
+                # 单个索引超过缓存上限
+                self._cache.pop(novel_id, None)
+                logger.warning(
+                    f"⚠️ BM25 索引过大，不进入缓存: Novel ID={novel_id} "
+                    f"({entry.nbytes / 1024 / 1024:.1f} MB)"
+                )
+    
+    def invalidate(self, novel_id: int):
+        """
+        移除指定小说的缓存索引
+        
+        Args:
+            novel_id: 小说ID
+        """
+        with self._lock:
+            self._cache.pop(novel_id, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取注册表统计信息
+        
+        Returns:
+            Dict: 统计信息
+        """
+        with self._lock:
+            total = self.hit_count + self.miss_count
+            return {
+                'size': len(self._cache),
+                'current_bytes': self._cache.currsize,
+                'max_bytes': self._cache.maxsize,
+                'hit_count': self.hit_count,
+                'miss_count': self.miss_count,
+                'eviction_count': self._cache.eviction_count,
+                'hit_rate': self.hit_count / total if total else 0.0,
+                'novel_ids': list(self._cache.keys())
+            }
+
+
+# 全局注册表实例
+_bm25_registry: Optional[BM25IndexRegistry] = None
+
+
+def get_bm25_registry() -> BM25IndexRegistry:
+    """获取全局 BM25 索引注册表（单例）"""
+    global _bm25_registry
+    if _bm25_registry is None:
+        _bm25_registry = BM25IndexRegistry(max_bytes=settings.bm25_cache_max_mb * 1024 * 1024)
+    return _bm25_registry
+
+
+# 每本小说的段写入锁（追加段与后台合并互斥）
+_segment_locks: Dict[int, threading.Lock] = {}
+_segment_locks_guard = threading.Lock()
+
+
+def _get_segment_lock(novel_id: int) -> threading.Lock:
+    """获取小说的段写入锁"""
+    with _segment_locks_guard:
+        return _segment_locks.setdefault(novel_id, threading.Lock())
+
+
+def _write_pickle_atomic(path: Path, data: Dict[str, Any]):
+    """先写临时文件再原子替换，避免读者看到写了一半的索引"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _init_tokenizer_worker():
+    """分词进程初始化：每个工作进程只加载一次 jieba 词典"""
+    jieba.initialize()
+
+
+def _tokenize_batch(texts: List[str]) -> List[List[str]]:
+    """分词工作单元：对一批文本进行搜索引擎模式分词"""
+    return [list(jieba.cut_for_search(text)) for text in texts]
+
+
+def tokenize_corpus(
+    texts: List[str],
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None
+) -> List[List[str]]:
+    """
+    并行分词（进程池，按批次分发工作单元）
+    
+    文本量不足以分摊进程启动开销、或进程池不可用时，退化为当前进程串行分词
+    
+    Args:
+        texts: 文本列表
+        workers: 工作进程数（默认取配置，0 表示 CPU 核数）
+        batch_size: 每个工作单元的文本数（默认取配置）
+    
+    Returns:
+        List[List[str]]: 与 texts 一一对应的分词结果
+    """
+    workers = settings.bm25_tokenize_workers if workers is None else workers
+    batch_size = batch_size or settings.bm25_tokenize_batch_size
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    workers = min(workers, len(batches))
+    
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_tokenizer_worker) as executor:
+                results = []
+                for batch_tokens in executor.map(_tokenize_batch, batches):
+                    results.extend(batch_tokens)
+            return results
+        except Exception as e:
+            logger.warning(f"⚠️ 并行分词失败，回退到串行分词: {e}")
+    
+    return _tokenize_batch(texts)
+
+
+def _text_hash(text: str) -> str:
+    """文本内容哈希（用于复用已持久化的分词结果）"""
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
 class BM25Retriever:
     """
     BM25 检索器
     负责构建、存储、加载和检索 BM25 索引
+    
+    磁盘布局：
+    - novel_{id}_bm25.pkl: 基础段（全量构建或合并的结果），记录已合并的追加段序号 merged_upto
+    - novel_{id}_bm25.seg{序号}.pkl: 追加章节写入的增量段，序号 > merged_upto 的段参与检索
+    - novel_{id}_bm25.tokens.pkl: 基础段的分词结果（按文本哈希复用，重建时无需重新分词）
     """
     
     def __init__(self, novel_id: int):
@@ -29,34 +805,248 @@ class BM25Retriever:
             novel_id: 小说ID
         """
         self.novel_id = novel_id
-        self.bm25 = None
-        self.documents = []  # 存储原始文档内容（或引用），用于检索返回
+        self.index: Optional[Union[BM25Index, SegmentedBM25Index]] = None
+        self.chunk_ids = np.empty(0, dtype=np.int64)  # 分块ID，文本由中心存储提供时用于读取文本
+        self.documents = []  # 存储原始文档内容（None 表示由中心存储提供），用于检索返回
         self.metadatas = []  # 存储元数据
         
         # 索引存储路径
         self.index_dir = Path(settings.data_dir) / "indices"
         self.index_path = self.index_dir / f"novel_{novel_id}_bm25.pkl"
+        self.tokens_path = self.index_dir / f"novel_{novel_id}_bm25.tokens.pkl"
         
         # 确保目录存在
         if not self.index_dir.exists():
             self.index_dir.mkdir(parents=True, exist_ok=True)
-            
+    
     def _tokenize(self, text: str) -> List[str]:
         """
         对中文文本进行分词
         
         Args:
             text: 输入文本
-            
+        
         Returns:
             List[str]: 分词结果
         """
         # 使用 jieba 进行搜索引擎模式分词
         return list(jieba.cut_for_search(text))
+    
+    def _segment_path(self, seq: int) -> Path:
+        """追加段文件路径"""
+        return self.index_dir / f"novel_{self.novel_id}_bm25.seg{seq}.pkl"
+    
+    def _list_segments(self) -> List[Tuple[int, Path]]:
+        """
+        列出磁盘上的追加段（按序号升序）
+        
+        Returns:
+            List[Tuple[int, Path]]: (序号, 路径)
+        """
+        prefix = f"novel_{self.novel_id}_bm25.seg"
+        segments = []
+        for path in self.index_dir.glob(f"{prefix}*.pkl"):
+            seq_str = path.name[len(prefix):-len(".pkl")]
+            if seq_str.isdigit():
+                segments.append((int(seq_str), path))
+        segments.sort()
+        return segments
+    
+    def _signature(self) -> Optional[Tuple]:
+        """
+        计算索引文件签名（基础段 + 追加段的文件名与 mtime）
+        
+        Returns:
+            Optional[Tuple]: 签名，没有任何索引文件时返回 None
+        """
+        paths = [self.index_path] if self.index_path.exists() else []
+        paths.extend(path for _, path in self._list_segments())
+        if not paths:
+            return None
+        try:
+            return tuple((path.name, path.stat().st_mtime_ns) for path in paths)
+        except FileNotFoundError:
+            # 合并过程中段文件被删除，重新计算
+            return self._signature()
+    
+    def _read_segment_file(self, path: Path) -> Tuple[BM25Index, np.ndarray, List, List, int]:
+        """
+        读取单个索引文件
+        
+        兼容旧版（rank_bm25 pickle）格式，加载时自动转换为倒排索引；
+        旧版索引没有分块ID，由元数据还原
+        
+        Returns:
+            Tuple: (索引, 分块ID, 文档, 元数据, merged_upto)
+        """
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        
+        if 'index' in data:
+            index = BM25Index.from_state(data['index'])
+        else:
+            # 旧版格式：{'bm25': BM25Okapi, ...}
+            logger.info(f"🔄 检测到旧版 BM25 索引，转换为倒排索引: {path}")
+            index = BM25Index.from_okapi(data['bm25'])
+        
+        # 使用当前配置的 k1 / b
+        index.set_params(settings.bm25_k1, settings.bm25_b)
+        
+        documents = data.get('documents')
+        metadatas = data.get('metadatas')
+        chunk_ids = data.get('chunk_ids')
+        if chunk_ids is None:
+            chunk_ids = _chunk_id_array(metadatas)
+        if documents is None:
+            # 只保存了分块ID，文本与元数据由中心存储提供
+            documents = [None] * len(chunk_ids)
+            metadatas = [None] * len(chunk_ids)
+        return index, chunk_ids, documents, metadatas, data.get('merged_upto', 0)
+    
+    def _read_index_files(self, signature: Tuple) -> Optional[LoadedBM25Index]:
+        """
+        从磁盘读取基础段与未合并的追加段
+        
+        Args:
+            signature: 读取前计算的文件签名
+        
+        Returns:
+            Optional[LoadedBM25Index]: 加载结果，失败返回 None
+        """
+        try:
+            segments = []
+            chunk_id_parts = []
+            documents = []
+            metadatas = []
+            merged_upto = 0
+            
+            if self.index_path.exists():
+                index, ids, docs, metas, merged_upto = self._read_segment_file(self.index_path)
+                segments.append(index)
+                chunk_id_parts.append(ids)
+                documents.extend(docs)
+                metadatas.extend(metas)
+            
+            for seq, path in self._list_segments():
+                if seq <= merged_upto:
+                    continue  # 已合并进基础段
+                index, ids, docs, metas, _ = self._read_segment_file(path)
+                segments.append(index)
+                chunk_id_parts.append(ids)
+                documents.extend(docs)
+                metadatas.extend(metas)
+            
+            if not segments:
+                return None
+            
+            logger.info(
+                f"✅ BM25 索引加载成功 (Novel ID: {self.novel_id}, "
+                f"{len(segments)} 个段, {len(documents)} 个文档)"
+            )
+            return _make_loaded_index(
+                segments, np.concatenate(chunk_id_parts), documents, metadatas, signature, merged_upto
+            )
+        except Exception as e:
+            logger.error(f"❌ 加载 BM25 索引失败: {e}")
+            return None
+    
+    def _load_token_store(self) -> Dict[str, List[str]]:
+        """
+        读取持久化的分词结果
+        
+        Returns:
+            Dict[str, List[str]]: 文本哈希 -> 分词结果
+        """
+        if not self.tokens_path.exists():
+            return {}
+        try:
+            with open(self.tokens_path, 'rb') as f:
+                data = pickle.load(f)
+            vocab = data['vocab']
+            token_ids = data['token_ids'].tolist()
+            offsets = data['offsets'].tolist()
+            return {
+                text_hash: [vocab[t] for t in token_ids[offsets[i]:offsets[i + 1]]]
+                for i, text_hash in enumerate(data['hashes'])
+            }
+        except Exception as e:
+            logger.warning(f"⚠️ 读取 BM25 分词缓存失败，将重新分词: {e}")
+            return {}
+    
+    def _save_token_store(self, hashes: List[str], tokenized_corpus: List[List[str]]):
+        """
+        持久化分词结果（词表 + int32 词项ID流 + 文档偏移）
+        
+        Args:
+            hashes: 每个文档的文本哈希
+            tokenized_corpus: 每个文档的分词结果
+        """
+        vocab: Dict[str, int] = {}
+        token_ids = [vocab.setdefault(token, len(vocab)) for tokens in tokenized_corpus for token in tokens]
+        lengths = [len(tokens) for tokens in tokenized_corpus]
+        try:
+            _write_pickle_atomic(self.tokens_path, {
+                'hashes': hashes,
+                'vocab': list(vocab),
+                'token_ids': np.asarray(token_ids, dtype=np.int32),
+                'offsets': np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ 保存 BM25 分词缓存失败（不影响索引）: {e}")
+    
+    def _tokenize_with_store(self, texts: List[str]) -> List[List[str]]:
+        """
+        分词：命中持久化分词结果的文本直接复用，其余文本并行分词，最后更新分词缓存
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            List[List[str]]: 分词结果
+        """
+        hashes = [_text_hash(text) for text in texts]
+        stored = self._load_token_store()
         
+        missing = [i for i, text_hash in enumerate(hashes) if text_hash not in stored]
+        tokenized_missing = tokenize_corpus([texts[i] for i in missing]) if missing else []
+        new_tokens = dict(zip(missing, tokenized_missing))
+        
+        tokenized_corpus = [
+            new_tokens[i] if i in new_tokens else stored[text_hash]
+            for i, text_hash in enumerate(hashes)
+        ]
+        logger.info(f"✂️ BM25 分词完成: 复用 {len(texts) - len(missing)} 个，新分词 {len(missing)} 个")
+        
+        if missing or len(stored) != len(hashes):
+            self._save_token_store(hashes, tokenized_corpus)
+        return tokenized_corpus
+    
+    def _segment_data(
+        self,
+        index: BM25Index,
+        chunk_ids: np.ndarray,
+        documents: List[Optional[str]],
+        metadatas: List[Optional[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        生成索引文件内容（所有分块文本都在中心存储中时只保存分块ID）
+        
+        Returns:
+            Dict: 待写入的索引数据
+        """
+        data = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'index': index.to_state(),
+            'chunk_ids': chunk_ids
+        }
+        if not len(chunk_ids) or (chunk_ids < 0).any() or not has_chunk_texts(self.novel_id, chunk_ids.tolist()):
+            data['documents'] = documents
+            data['metadatas'] = metadatas
+        return data
+    
     def build_index(self, chunks: List[Dict[str, Any]]):
         """
-        构建 BM25 索引
+        构建 BM25 索引（全量重建，替换基础段并丢弃所有追加段）
         
         Args:
             chunks: 文本块列表，每个元素包含 'content' 和 'metadata'
@@ -66,56 +1056,193 @@ class BM25Retriever:
         texts = [chunk['content'] for chunk in chunks]
         self.documents = texts
         self.metadatas = [chunk.get('metadata', {}) for chunk in chunks]
+        self.chunk_ids = _chunk_id_array(self.metadatas)
         
-        # 分词
-        tokenized_corpus = [self._tokenize(text) for text in texts]
+        # 分词（复用已持久化的分词结果，其余文本并行分词）
+        tokenized_corpus = self._tokenize_with_store(texts)
         
-        # 构建索引
-        self.bm25 = BM25Okapi(tokenized_corpus)
+        # 构建倒排索引
+        self.index = BM25Index.build(tokenized_corpus, k1=settings.bm25_k1, b=settings.bm25_b)
         
-        logger.info(f"✅ BM25 索引构建完成，共 {len(texts)} 个文档")
+        logger.info(
+            f"✅ BM25 索引构建完成，共 {len(texts)} 个文档，"
+            f"{len(self.index.vocab)} 个词项，{len(self.index.postings_doc)} 条倒排记录"
+        )
         
         # 保存索引
-        self.save_index()
+        with _get_segment_lock(self.novel_id):
+            self.save_index()
+    
+    def save_index(self, merged_upto: Optional[int] = None):
+        """
+        保存基础段到磁盘，并删除已被覆盖的追加段
         
-    def save_index(self):
-        """保存索引到磁盘"""
+        Args:
+            merged_upto: 基础段已包含的最大追加段序号（默认：当前磁盘上所有追加段）
+        """
         try:
-            data = {
-                'bm25': self.bm25,
-                'documents': self.documents,
-                'metadatas': self.metadatas
-            }
-            with open(self.index_path, 'wb') as f:
-                pickle.dump(data, f)
+            existing_segments = self._list_segments()
+            if merged_upto is None:
+                merged_upto = existing_segments[-1][0] if existing_segments else 0
+            
+            data = self._segment_data(self.index, self.chunk_ids, self.documents, self.metadatas)
+            data['merged_upto'] = merged_upto
+            _write_pickle_atomic(self.index_path, data)
+            if 'documents' not in data:
+                self.documents = [None] * len(self.chunk_ids)
+                self.metadatas = [None] * len(self.chunk_ids)
             logger.info(f"💾 BM25 索引已保存至: {self.index_path}")
+            
+            # 基础段写入后再删除被覆盖的追加段（读者按 merged_upto 忽略它们）
+            for seq, path in existing_segments:
+                if seq <= merged_upto:
+                    path.unlink(missing_ok=True)
+            
+            # 直接放入注册表，避免下一次查询重新加载
+            signature = self._signature()
+            if signature is not None and len(signature) == 1:
+                get_bm25_registry().put(self.novel_id, _make_loaded_index(
+                    [self.index], self.chunk_ids, self.documents, self.metadatas, signature, merged_upto
+                ))
+            else:
+                get_bm25_registry().invalidate(self.novel_id)
         except Exception as e:
             logger.error(f"❌ 保存 BM25 索引失败: {e}")
             raise
+    
+    def append_segment(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        为追加的章节写入增量段（只对新 chunks 分词建索引）
+        
+        段数超过阈值时在后台线程中合并
+        
+        Args:
+            chunks: 新增文本块列表
+        
+        Returns:
+            bool: 是否成功
+        """
+        if not chunks:
+            return True
+        
+        try:
+            texts = [chunk['content'] for chunk in chunks]
+            metadatas = [chunk.get('metadata', {}) for chunk in chunks]
+            chunk_ids = _chunk_id_array(metadatas)
+            segment = BM25Index.build(tokenize_corpus(texts), k1=settings.bm25_k1, b=settings.bm25_b)
+            data = self._segment_data(segment, chunk_ids, texts, metadatas)
+            if 'documents' not in data:
+                texts = [None] * len(chunk_ids)
+                metadatas = [None] * len(chunk_ids)
+            
+            with _get_segment_lock(self.novel_id):
+                registry = get_bm25_registry()
+                old_signature = self._signature()
+                cached = registry.peek(self.novel_id)
+                
+                # 序号单调递增（合并后段文件被删除，不能复用旧序号）
+                existing_segments = self._list_segments()
+                seq = time.time_ns()
+                if existing_segments:
+                    seq = max(seq, existing_segments[-1][0] + 1)
+                if cached is not None:
+                    seq = max(seq, cached.merged_upto + 1)
+                
+                _write_pickle_atomic(self._segment_path(seq), data)
+                
+                # 若注册表中的索引是最新的，直接追加新段，避免重新加载基础段
+                if cached is not None and cached.signature == old_signature:
+                    registry.put(self.novel_id, _make_loaded_index(
+                        cached.segments + [segment],
+                        np.concatenate([cached.chunk_ids, chunk_ids]),
+                        cached.documents + texts,
+                        cached.metadatas + metadatas,
+                        self._signature(),
+                        cached.merged_upto
+                    ))
+                else:
+                    registry.invalidate(self.novel_id)
+                
+                live_segments = len(self._live_segments())
+            
+            logger.info(
+                f"✅ BM25 增量段已写入 (Novel ID: {self.novel_id}, {len(texts)} 个文档, "
+                f"当前 {live_segments} 个追加段)"
+            )
+            
+            if live_segments >= settings.bm25_segment_merge_threshold:
+                threading.Thread(
+                    target=self.compact_segments,
+                    name=f"bm25-compact-{self.novel_id}",
+                    daemon=True
+                ).start()
+            return True
+        except Exception as e:
+            logger.error(f"❌ 写入 BM25 增量段失败: {e}")
+            return False
+    
+    def _live_segments(self) -> List[Tuple[int, Path]]:
+        """未合并进基础段的追加段"""
+        cached = get_bm25_registry().peek(self.novel_id)
+        merged_upto = cached.merged_upto if cached is not None else 0
+        return [(seq, path) for seq, path in self._list_segments() if seq > merged_upto]
+    
+    def compact_segments(self) -> bool:
+        """
+        合并基础段与所有追加段为新的基础段（直接拼接倒排表，无需重新分词）
+        
+        Returns:
+            bool: 是否执行了合并
+        """
+        with _get_segment_lock(self.novel_id):
+            signature = self._signature()
+            if signature is None:
+                return False
+            
+            entry = self._read_index_files(signature)
+            if entry is None or len(entry.segments) <= 1:
+                return False
+            
+            segment_count = len(entry.segments)
+            logger.info(f"🔧 开始合并 BM25 索引段 (Novel ID: {self.novel_id}, {segment_count} 个段)")
+            
+            self.index = BM25Index.merge(entry.segments)
+            self.chunk_ids = entry.chunk_ids
+            self.documents = entry.documents
+            self.metadatas = entry.metadatas
             
+            existing_segments = self._list_segments()
+            merged_upto = existing_segments[-1][0] if existing_segments else entry.merged_upto
+            self.save_index(merged_upto=merged_upto)
+        
+        logger.info(f"✅ BM25 索引段合并完成 (Novel ID: {self.novel_id}, {segment_count} → 1)")
+        return True
+    
     def load_index(self) -> bool:
         """
-        从磁盘加载索引
+        加载索引（优先使用进程级注册表中的缓存）
         
         Returns:
             bool: 是否加载成功
         """
-        if not self.index_path.exists():
+        signature = self._signature()
+        if signature is None:
             logger.warning(f"⚠️ BM25 索引文件不存在: {self.index_path}")
             return False
-            
-        try:
-            with open(self.index_path, 'rb') as f:
-                data = pickle.load(f)
-                self.bm25 = data['bm25']
-                self.documents = data['documents']
-                self.metadatas = data['metadatas']
-            logger.info(f"✅ BM25 索引加载成功 (Novel ID: {self.novel_id})")
-            return True
-        except Exception as e:
-            logger.error(f"❌ 加载 BM25 索引失败: {e}")
+        
+        entry = get_bm25_registry().get(
+            self.novel_id, signature, lambda: self._read_index_files(signature)
+        )
+        if entry is None:
             return False
-            
+        
+        self.index = entry.index
+        self.chunk_ids = entry.chunk_ids
+        self.documents = entry.documents
+        self.metadatas = entry.metadatas
+        logger.debug(f"✅ BM25 索引就绪 (Novel ID: {self.novel_id})")
+        return True
+    
     def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
         """
         执行关键词检索
@@ -123,42 +1250,59 @@ class BM25Retriever:
         Args:
             query: 查询文本
             top_k: 返回结果数量
-            
+        
         Returns:
-            List[Dict]: 检索结果列表，包含 content, metadata, score
+            List[Dict]: 检索结果列表，包含 chunk_id, content, metadata, score
         """
-        if not self.bm25:
+        if self.index is None:
             if not self.load_index():
                 return []
-                
+        
         tokenized_query = self._tokenize(query)
         
-        # 获取分数
-        scores = self.bm25.get_scores(tokenized_query)
+        # 只对命中查询词的文档打分（多段时使用全局统计量），并部分选择 Top-K
+        top_docs = self.index.top_k(tokenized_query, top_k)
         
-        # 获取 top_k 索引
-        # argsort 返回从小到大的索引，所以取最后 k 个并反转
-        top_n_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+        # 只为 Top-K 中文本由中心存储提供的文档读取文本
+        store = None
+        texts = {}
+        external = [doc_id for doc_id, _ in top_docs if self.documents[doc_id] is None]
+        if external:
+            store = get_chunk_store(self.novel_id)
+            if store is None:
+                logger.warning(f"⚠️ 分块文本存储不存在，BM25 结果缺少文本 (Novel ID: {self.novel_id})")
+            else:
+                texts = dict(zip(external, store.get_texts([int(self.chunk_ids[doc_id]) for doc_id in external])))
         
         results = []
-        for i in top_n_indices:
-            score = scores[i]
-            if score > 0:  # 只返回正相关结果
-                results.append({
-                    'content': self.documents[i],
-                    'metadata': self.metadatas[i],
-                    'score': float(score),  # 转换为 float 以便序列化
-                    'rank': len(results) + 1
-                })
-                
+        for doc_id, score in top_docs:
+            content = self.documents[doc_id]
+            if content is None:
+                content = texts.get(doc_id)
+                if content is None:
+                    continue
+                metadata = store.get_metadata(int(self.chunk_ids[doc_id]), content)
+            else:
+                # 复制元数据：索引在注册表中共享，调用方可能会修改结果
+                metadata = dict(self.metadatas[doc_id])
+            results.append({
+                'chunk_id': chunk_id_of(metadata),
+                'content': content,
+                'metadata': metadata,
+                'score': score,
+                'rank': len(results) + 1
+            })
+        
         return results
-
+    
     def delete_index(self):
-        """删除索引文件"""
-        if self.index_path.exists():
-            try:
-                os.remove(self.index_path)
-                logger.info(f"🗑️ BM25 索引已删除: {self.index_path}")
-            except Exception as e:
-                logger.error(f"❌ 删除 BM25 索引失败: {e}")
-
+        """删除索引文件（基础段与所有追加段）"""
+        get_bm25_registry().invalidate(self.novel_id)
+        paths = [self.index_path, self.tokens_path] + [path for _, path in self._list_segments()]
+        for path in paths:
+            if path.exists():
+                try:
+                    os.remove(path)
+                    logger.info(f"🗑️ BM25 索引已删除: {path}")
+                except Exception as e:
+                    logger.error(f"❌ 删除 BM25 索引失败: {e}")
@@ -0,0 +1,401 @@
+"""
+分块特征列存储
+
+与查询无关的Rerank信号只依赖分块本身，在索引/追加章节时计算一次，查询时只做查表：
+- quote_boost: 引号密度加成（与 _calculate_quote_boost 相同）
+- position: 章节位置比例 chapter_num / total_chapters（时间衰减使用）
+- token_count: 分块Token数
+- entities: 分块中出现的已知实体（图谱节点名），供实体属性过滤使用
+
+每本小说一个 .npz 文件（与BM25索引同目录），按分块ID（见 chunk_ids）定位行：
+ID排序后，查询时对一批候选用 searchsorted 一次定位。
+实体以 CSR 形式存储（实体名表 + 每行偏移 + 实体下标）。
+
+追加章节只计算新分块的特征；旧分块的实体列表不回溯新出现的实体
+"""
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.services.chunk_ids import chunk_id_of, make_chunk_ids
+from app.services.index_versions import get_index_versions
+from app.services.rerank_kernel import quote_boosts
+
+logger = logging.getLogger(__name__)
+
+# 特征文件格式版本
+FEATURES_FORMAT_VERSION = 1
+
+
+
+def find_entity_mentions(text: str, first_char_index: Dict[str, List[str]]) -> List[str]:
+    """
+    查找文本中出现的已知实体
+    
+    只检查首字出现在文本中的实体，再用子串查找确认
+    
+    Args:
+        text: 分块内容
+        first_char_index: 首字 -> 以该字开头的实体名列表
+    
+    Returns:
+        List[str]: 出现的实体名
+    """
+    mentions = []
+    for char in set(text):
+        for name in first_char_index.get(char, ()):
+            if name in text:
+                mentions.append(name)
+    return sorted(mentions)
+
+
+def build_first_char_index(entity_names: Iterable[str]) -> Dict[str, List[str]]:
+    """按首字分组实体名"""
+    index: Dict[str, List[str]] = {}
+    for name in entity_names:
+        if isinstance(name, str) and name:
+            index.setdefault(name[0], []).append(name)
+    return index
+
+
+class ChunkFeatures:
+    """单本小说的分块特征（只读列数组）"""
+    
+    def __init__(
+        self,
+        chapter_nums: np.ndarray,
+        chunk_indexes: np.ndarray,
+        quote_boost: np.ndarray,
+        token_count: np.ndarray,
+        entity_names: np.ndarray,
+        entity_indptr: np.ndarray,
+        entity_ids: np.ndarray,
+        total_chapters: int
+    ):
+        self.chapter_nums = chapter_nums
+        self.chunk_indexes = chunk_indexes
+        self.quote_boost = quote_boost
+        self.token_count = token_count
+        self.entity_names = entity_names
+        self.entity_indptr = entity_indptr
+        self.entity_ids = entity_ids
+        self.total_chapters = total_chapters
+        self.position = (
+            chapter_nums / total_chapters if total_chapters else np.zeros(len(chapter_nums), dtype=np.float64)
+        )
+        
+        keys = make_chunk_ids(chapter_nums, chunk_indexes)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+    
+    def __len__(self) -> int:
+        return len(self.chapter_nums)
+    
+    def lookup(self, metadatas: Sequence[dict], novel_id: Optional[int] = None) -> np.ndarray:
+        """
+        定位候选分块所在的行
+        
+        分块ID只在单本小说内唯一：多小说检索合并的候选中，来源小说（source_novel_id）
+        与本特征所属小说不同的分块视为找不到
+        
+        Args:
+            metadatas: 候选分块元数据（需包含 chunk_id，或 chapter_num 与 chunk_index）
+            novel_id: 本特征所属的小说ID（None表示不检查来源小说）
+        
+        Returns:
+            np.ndarray: 行号，找不到的为 -1
+        """
+        rows = np.full(len(metadatas), -1, dtype=np.int64)
+        if not len(self) or not metadatas:
+            return rows
+        
+        chunk_ids = [
+            None if novel_id is not None and metadata.get('source_novel_id', novel_id) != novel_id
+            else chunk_id_of(metadata)
+            for metadata in metadatas
+        ]
+        valid = np.fromiter((chunk_id is not None for chunk_id in chunk_ids), dtype=bool, count=len(chunk_ids))
+        keys = np.array([chunk_id for chunk_id in chunk_ids if chunk_id is not None], dtype=np.int64)
+        positions = np.searchsorted(self._sorted_keys, keys)
+        positions = np.minimum(positions, len(self._sorted_keys) - 1)
+        found = self._sorted_keys[positions] == keys
+        valid_rows = np.where(found, self._order[positions], -1)
+        rows[valid] = valid_rows
+        return rows
+    
+    def quote_boosts(self, rows: np.ndarray, texts: Sequence[str]) -> np.ndarray:
+        """
+        候选的引号密度加成（找不到预计算值的候选从文本现算）
+        
+        Args:
+            rows: lookup() 返回的行号
+            texts: 候选文档内容
+        
+        Returns:
+            np.ndarray: 权重加成系数 (1.0-1.5)
+        """
+        boosts = np.empty(len(rows), dtype=np.float64)
+        found = rows >= 0
+        boosts[found] = self.quote_boost[rows[found]]
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            boosts[missing] = quote_boosts([texts[i] for i in missing])
+        return boosts
+    
+    def positions(self, rows: np.ndarray, total_chapters: int) -> Optional[np.ndarray]:
+        """
+        候选的章节位置比例
+        
+        Args:
+            rows: lookup() 返回的行号
+            total_chapters: 查询时的总章节数
+        
+        Returns:
+            Optional[np.ndarray]: 位置比例；总章节数与特征不一致或有候选找不到时返回None（改为现算）
+        """
+        if total_chapters != self.total_chapters or not len(rows) or (rows < 0).any():
+            return None
+        return self.position[rows]
+    
+    def entities(self, row: int) -> List[str]:
+        """分块中出现的已知实体"""
+        if row < 0:
+            return []
+        ids = self.entity_ids[self.entity_indptr[row]:self.entity_indptr[row + 1]]
+        return [str(name) for name in self.entity_names[ids]]
+
+
+class ChunkFeatureStore:
+    """分块特征的构建与持久化"""
+    
+    def __init__(self, novel_id: int):
+        """
+        Args:
+            novel_id: 小说ID
+        """
+        self.novel_id = novel_id
+        self.index_dir = Path(settings.data_dir) / "indices"
+        self.path = self.index_dir / f"novel_{novel_id}_chunk_features.npz"
+    
+    @staticmethod
+    def compute(
+        chunks: List[Dict],
+        entity_names: Iterable[str] = ()
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[List[str]]]:
+        """
+        计算分块特征
+        
+        Args:
+            chunks: 分块列表（包含content和metadata）
+            entity_names: 已知实体名（图谱节点）
+        
+        Returns:
+            Tuple: (章节号, 块序号, 引号加成, Token数, 每块出现的实体)
+        """
+        from app.utils.token_counter import get_token_counter
+        token_counter = get_token_counter()
+        first_char_index = build_first_char_index(entity_names)
+        
+        texts = [chunk.get('content', '') for chunk in chunks]
+        chapter_nums = np.array([chunk['metadata'].get('chapter_num') or 0 for chunk in chunks], dtype=np.int64)
+        chunk_indexes = np.array([chunk['metadata'].get('chunk_index', i) for i, chunk in enumerate(chunks)], dtype=np.int64)
+        token_count = np.array([token_counter.count_tokens(text) for text in texts], dtype=np.int32)
+        mentions = [find_entity_mentions(text, first_char_index) if first_char_index else [] for text in texts]
+        return chapter_nums, chunk_indexes, quote_boosts(texts), token_count, mentions
+    
+    def load(self) -> Optional[ChunkFeatures]:
+        """
+        从磁盘加载特征
+        
+        Returns:
+            Optional[ChunkFeatures]: 特征，文件不存在或格式不符返回None
+        """
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['format_version']) != FEATURES_FORMAT_VERSION:
+                    return None
+                return ChunkFeatures(
+                    chapter_nums=data['chapter_nums'],
+                    chunk_indexes=data['chunk_indexes'],
+                    quote_boost=data['quote_boost'],
+                    token_count=data['token_count'],
+                    entity_names=data['entity_names'],
+                    entity_indptr=data['entity_indptr'],
+                    entity_ids=data['entity_ids'],
+                    total_chapters=int(data['total_chapters'])
+                )
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ 加载分块特征失败: {self.path}, {e}")
+            return None
+    
+    def _save(
+        self,
+        chapter_nums: np.ndarray,
+        chunk_indexes: np.ndarray,
+        quote_boost: np.ndarray,
+        token_count: np.ndarray,
+        mentions: List[List[str]],
+        total_chapters: int
+    ):
+        """写入特征文件（先写临时文件再原子替换）"""
+        names = sorted({name for row in mentions for name in row})
+        name_ids = {name: i for i, name in enumerate(names)}
+        entity_indptr = np.zeros(len(mentions) + 1, dtype=np.int64)
+        entity_indptr[1:] = np.cumsum([len(row) for row in mentions])
+        entity_ids = np.array([name_ids[name] for row in mentions for name in row], dtype=np.int32)
+        
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp.npz')
+        np.savez(
+            tmp_path,
+            format_version=np.int32(FEATURES_FORMAT_VERSION),
+            chapter_nums=chapter_nums.astype(np.int32),
+            chunk_indexes=chunk_indexes.astype(np.int32),
+            quote_boost=quote_boost.astype(np.float64),
+            token_count=token_count.astype(np.int32),
+            entity_names=np.array(names, dtype=str),
+            entity_indptr=entity_indptr,
+            entity_ids=entity_ids,
+            total_chapters=np.int64(total_chapters)
+        )
+        os.replace(tmp_path, self.path)
+        get_chunk_feature_registry().invalidate(self.novel_id)
+    
+    def build(self, chunks: List[Dict], total_chapters: int, entity_names: Iterable[str] = ()) -> bool:
+        """
+        为整本小说构建特征（覆盖已有文件）
+        
+        Args:
+            chunks: 所有分块
+            total_chapters: 总章节数
+            entity_names: 已知实体名（图谱节点）
+        
+        Returns:
+            bool: 是否成功
+        """
+        try:
+            chapter_nums, chunk_indexes, quote_boost, token_count, mentions = self.compute(chunks, entity_names)
+            self._save(chapter_nums, chunk_indexes, quote_boost, token_count, mentions, total_chapters)
+            logger.info(f"✅ 分块特征构建完成: {len(chunks)} 块")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 分块特征构建失败: {e}")
+            return False
+    
+    def append(self, chunks: List[Dict], total_chapters: int, entity_names: Iterable[str] = ()) -> bool:
+        """
+        追加新分块的特征（同一分块重复追加时以新值为准）
+        
+        Args:
+            chunks: 新分块
+            total_chapters: 追加后的总章节数
+            entity_names: 已知实体名（图谱节点）
+        
+        Returns:
+            bool: 是否成功
+        """
+        existing = self.load()
+        if existing is None:
+            if self.path.exists():
+                logger.warning(f"⚠️ 分块特征文件不可用，仅保存新分块特征")
+            return self.build(chunks, total_chapters, entity_names)
+        
+        try:
+            chapter_nums, chunk_indexes, quote_boost, token_count, mentions = self.compute(chunks, entity_names)
+            
+            # 去掉被新分块覆盖的旧行
+            new_keys = make_chunk_ids(chapter_nums, chunk_indexes)
+            old_keys = make_chunk_ids(existing.chapter_nums, existing.chunk_indexes)
+            keep = np.flatnonzero(~np.isin(old_keys, new_keys))
+            old_mentions = [existing.entities(int(row)) for row in keep]
+            
+            self._save(
+                np.concatenate([existing.chapter_nums[keep], chapter_nums]),
+                np.concatenate([existing.chunk_indexes[keep], chunk_indexes]),
+                np.concatenate([existing.quote_boost[keep], quote_boost]),
+                np.concatenate([existing.token_count[keep], token_count]),
+                old_mentions + mentions,
+                total_chapters
+            )
+            logger.info(f"✅ 分块特征追加完成: +{len(chunks)} 块（共 {len(keep) + len(chunks)} 块）")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 分块特征追加失败: {e}")
+            return False
+    
+    def delete(self):
+        """删除特征文件"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        get_chunk_feature_registry().invalidate(self.novel_id)
+
+
+class ChunkFeatureRegistry:
+    """进程级分块特征缓存（按文件 mtime/size 与索引版本号校验）"""
+    
+    def __init__(self, max_novels: int = 16):
+        self._cache: LRUCache = LRUCache(maxsize=max(1, max_novels))
+        self._lock = threading.Lock()
+    
+    def get(self, novel_id: int) -> Optional[ChunkFeatures]:
+        """
+        获取小说的分块特征
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            Optional[ChunkFeatures]: 特征，未构建时返回None
+        """
+        store = ChunkFeatureStore(novel_id)
+        try:
+            stat = store.path.stat()
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size, get_index_versions().get(novel_id))
+        
+        with self._lock:
+            entry = self._cache.get(novel_id)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        
+        features = store.load()
+        if features is not None:
+            with self._lock:
+                self._cache[novel_id] = (signature, features)
+        return features
+    
+    def invalidate(self, novel_id: int):
+        """使单本小说的缓存特征失效"""
+        with self._lock:
+            self._cache.pop(novel_id, None)
+
+
+# 全局分块特征缓存实例
+_chunk_feature_registry: Optional[ChunkFeatureRegistry] = None
+
+
+def get_chunk_feature_registry() -> ChunkFeatureRegistry:
+    """获取全局分块特征缓存实例（单例）"""
+    global _chunk_feature_registry
+    if _chunk_feature_registry is None:
+        _chunk_feature_registry = ChunkFeatureRegistry()
+    return _chunk_feature_registry
+
+
+def get_chunk_features(novel_id: Optional[int]) -> Optional[ChunkFeatures]:
+    """获取小说的分块特征（未构建或未提供小说ID时返回None）"""
+    if novel_id is None:
+        return None
+    return get_chunk_feature_registry().get(novel_id)
@@ -0,0 +1,57 @@
+"""
+分块整数ID
+
+分块在切分时获得稳定的整数ID：chapter_num << CHUNK_INDEX_BITS | chunk_index。
+同一分块在向量库、BM25、分块特征等所有索引中的ID相同，融合、去重、查表都按整数ID进行，
+不再用内容前缀做键（前缀相同的不同分块不会被误合并）。
+
+ID只由章节号与块序号决定：旧索引的元数据没有 chunk_id 字段时可由这两个字段还原出相同的ID
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# 块序号占用的低位数（单章最多 2^20 个分块）
+CHUNK_INDEX_BITS = 20
+
+
+def make_chunk_id(chapter_num: int, chunk_index: int) -> int:
+    """
+    生成分块ID
+    
+    Args:
+        chapter_num: 章节号
+        chunk_index: 章内块序号
+    
+    Returns:
+        int: 分块ID
+    """
+    return (int(chapter_num) << CHUNK_INDEX_BITS) | int(chunk_index)
+
+
+def make_chunk_ids(chapter_nums: np.ndarray, chunk_indexes: np.ndarray) -> np.ndarray:
+    """批量生成分块ID（int64数组）"""
+    return (chapter_nums.astype(np.int64) << CHUNK_INDEX_BITS) | chunk_indexes.astype(np.int64)
+
+
+def chunk_id_of(metadata: Optional[Dict]) -> Optional[int]:
+    """
+    获取分块ID（旧索引没有 chunk_id 字段时由章节号与块序号还原）
+    
+    Args:
+        metadata: 分块元数据
+    
+    Returns:
+        Optional[int]: 分块ID，元数据不足时返回None
+    """
+    if not metadata:
+        return None
+    chunk_id = metadata.get('chunk_id')
+    if chunk_id is not None:
+        return int(chunk_id)
+    chapter_num = metadata.get('chapter_num')
+    chunk_index = metadata.get('chunk_index')
+    if chapter_num is None or chunk_index is None:
+        return None
+    return make_chunk_id(chapter_num, chunk_index)
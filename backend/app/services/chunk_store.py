@@ -0,0 +1,504 @@
+"""
+分块文本中心存储
+
+每本小说的分块文本只存一份，向量库、BM25、证据收集共用（章节原文仍由原文件提供，不重复保存）。
+存储按代（generation）组织，每代一个目录 novel_{id}.{代号}/，其中三个文件都只追加：
+- blob: UTF-8 文本（分块文本、章节标题依次写入）
+- chunks: 分块偏移表，每条记录 (分块ID, 偏移, 字节数)，int64
+- chapters: 章节偏移表，每条记录 (章节号, 标题偏移, 标题字节数)，int64
+
+指针文件 novel_{id}.current 记录查询读取的当前代。重新索引整本小说时写入新的一代（novel_{id}.next 指向它），
+索引成功后用 os.replace 原子切换为当前代并删除旧代；索引期间查询仍读取旧代，索引失败时丢弃新代，旧文本不受影响。
+
+先写文本再写偏移表，偏移表中的记录即为已提交的数据；写入中断时blob尾部多出的文本不会被引用，
+偏移表中不完整的尾部记录在读取时忽略、下次追加时截断。同一分块/章节重复追加时以最后一条记录为准。
+
+读取时内存映射blob，只为最终需要的结果按ID解码文本；多个worker映射同一文件，
+操作系统页缓存中只有一份小说文本。分块元数据（章节号、块序号、标题、字数）由分块ID与章节表还原，
+BM25等索引只需保存分块ID
+"""
+
+import logging
+import mmap
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.services.chunk_ids import CHUNK_INDEX_BITS, chunk_id_of
+from app.services.index_versions import get_index_versions
+
+logger = logging.getLogger(__name__)
+
+# 偏移表每条记录的字段数（int64）
+CHUNK_RECORD_FIELDS = 3
+CHAPTER_RECORD_FIELDS = 3
+
+_write_locks: Dict[int, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+# 本进程内正在重建（尚未切换为当前代）的存储
+_rebuilding: Dict[int, "ChunkStore"] = {}
+
+
+def _get_write_lock(novel_id: int) -> threading.Lock:
+    """获取单本小说的写锁（同一进程内的追加串行执行）"""
+    with _write_locks_guard:
+        if novel_id not in _write_locks:
+            _write_locks[novel_id] = threading.Lock()
+        return _write_locks[novel_id]
+
+
+def _read_pointer(path: Path) -> Optional[str]:
+    """读取代号指针文件，不存在返回None"""
+    try:
+        return path.read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(path: Path, generation: str):
+    """原子写入代号指针文件"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(generation, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _read_records(path: Path, fields: int) -> np.ndarray:
+    """读取偏移表（忽略写入中断留下的不完整尾部记录）"""
+    try:
+        records = np.fromfile(path, dtype=np.int64)
+    except FileNotFoundError:
+        return np.empty((0, fields), dtype=np.int64)
+    complete = len(records) - len(records) % fields
+    return records[:complete].reshape(-1, fields)
+
+
+def _latest_rows(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    键排序并去重（重复追加的键以最后一条记录为准）
+    
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (排序后的唯一键, 对应的记录行号)
+    """
+    unique_keys, first_in_reversed = np.unique(keys[::-1], return_index=True)
+    return unique_keys, len(keys) - 1 - first_in_reversed
+
+
+def _find(keys: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    """在排序键中定位，找不到的为 -1"""
+    if not len(sorted_keys):
+        return np.full(len(keys), -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return np.where(sorted_keys[positions] == keys, positions, -1)
+
+
+class ChunkStoreReader:
+    """单本小说的只读文本存储（内存映射blob）"""
+    
+    def __init__(self, novel_id: int, blob_path: Path, chunk_records: np.ndarray, chapter_records: np.ndarray):
+        self.novel_id = novel_id
+        
+        self._chunk_ids, rows = _latest_rows(chunk_records[:, 0])
+        self._chunk_spans = chunk_records[rows, 1:]
+        
+        self._chapter_nums, rows = _latest_rows(chapter_records[:, 0])
+        self._chapter_spans = chapter_records[rows, 1:]
+        self._chapter_titles: Dict[int, str] = {}
+        
+        # 偏移表只引用已写入的文本，映射到当前blob末尾即可
+        self._mmap = None
+        with open(blob_path, 'rb') as f:
+            blob_size = os.fstat(f.fileno()).st_size
+            if blob_size > 0:
+                self._mmap = mmap.mmap(f.fileno(), blob_size, access=mmap.ACCESS_READ)
+    
+    def __len__(self) -> int:
+        return len(self._chunk_ids)
+    
+    def _decode(self, offset: int, length: int) -> str:
+        if length == 0:
+            return ''
+        return self._mmap[offset:offset + length].decode('utf-8')
+    
+    def contains(self, chunk_ids: Sequence[Optional[int]]) -> bool:
+        """是否包含所有给定分块"""
+        if any(chunk_id is None for chunk_id in chunk_ids):
+            return False
+        return bool((_find(np.asarray(chunk_ids, dtype=np.int64), self._chunk_ids) >= 0).all())
+    
+    def get_texts(self, chunk_ids: Sequence[Optional[int]]) -> List[Optional[str]]:
+        """
+        按分块ID批量读取文本
+        
+        Args:
+            chunk_ids: 分块ID列表（可含None）
+        
+        Returns:
+            List[Optional[str]]: 文本，不存在的为None
+        """
+        keys = np.array([-1 if chunk_id is None else chunk_id for chunk_id in chunk_ids], dtype=np.int64)
+        return [
+            self._decode(int(self._chunk_spans[p, 0]), int(self._chunk_spans[p, 1])) if p >= 0 else None
+            for p in _find(keys, self._chunk_ids)
+        ]
+    
+    def get_chapter_title(self, chapter_num: int) -> Optional[str]:
+        """读取章节标题，不存在返回None"""
+        if chapter_num not in self._chapter_titles:
+            position = int(_find(np.array([chapter_num], dtype=np.int64), self._chapter_nums)[0])
+            if position < 0:
+                return None
+            # 标题很短，解码后缓存
+            self._chapter_titles[chapter_num] = self._decode(
+                int(self._chapter_spans[position, 0]), int(self._chapter_spans[position, 1])
+            )
+        return self._chapter_titles[chapter_num]
+    
+    def get_metadata(self, chunk_id: int, text: str) -> Dict:
+        """
+        还原分块元数据（与切分时生成的元数据一致）
+        
+        Args:
+            chunk_id: 分块ID
+            text: 分块文本（用于计算字数）
+        
+        Returns:
+            Dict: 元数据
+        """
+        chapter_num = chunk_id >> CHUNK_INDEX_BITS
+        return {
+            'novel_id': self.novel_id,
+            'chapter_num': chapter_num,
+            'chapter_title': self.get_chapter_title(chapter_num) or f"第{chapter_num}章",
+            'chunk_index': chunk_id & ((1 << CHUNK_INDEX_BITS) - 1),
+            'chunk_size': len(text),
+            'chunk_id': chunk_id
+        }
+
+
+class ChunkStore:
+    """单本小说的文本存储（写入端）"""
+    
+    def __init__(self, novel_id: int, generation: Optional[str] = None):
+        """
+        Args:
+            novel_id: 小说ID
+            generation: 存储代号（默认为当前代，尚未构建时为None）
+        """
+        self.novel_id = novel_id
+        self.store_dir = Path(settings.data_dir) / "chunks"
+        self.current_path = self.store_dir / f"novel_{novel_id}.current"
+        self.next_path = self.store_dir / f"novel_{novel_id}.next"
+        self.generation = generation if generation is not None else _read_pointer(self.current_path)
+        self._chunk_ids = set()
+    
+    def _generation_dir(self, generation: str) -> Path:
+        return self.store_dir / f"novel_{self.novel_id}.{generation}"
+    
+    @property
+    def blob_path(self) -> Path:
+        return self._generation_dir(self.generation) / "blob"
+    
+    @property
+    def chunks_path(self) -> Path:
+        return self._generation_dir(self.generation) / "chunks"
+    
+    @property
+    def chapters_path(self) -> Path:
+        return self._generation_dir(self.generation) / "chapters"
+    
+    @staticmethod
+    def _new_generation() -> str:
+        return f"{time.time_ns():x}{os.getpid():x}"
+    
+    @classmethod
+    def begin_rebuild(cls, novel_id: int) -> "ChunkStore":
+        """
+        开始重建整本小说的存储：写入新的一代，查询仍读取当前代，publish 后切换
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            ChunkStore: 新一代存储（写入端）
+        """
+        store = cls(novel_id, generation=cls._new_generation())
+        with _get_write_lock(novel_id):
+            # 清理上次中断的重建
+            stale = _read_pointer(store.next_path)
+            if stale is not None:
+                shutil.rmtree(store._generation_dir(stale), ignore_errors=True)
+            store._generation_dir(store.generation).mkdir(parents=True, exist_ok=True)
+            _write_pointer(store.next_path, store.generation)
+            _rebuilding[novel_id] = store
+        return store
+    
+    def publish(self):
+        """将重建的新一代切换为当前代（索引成功后调用），并删除旧代"""
+        with _get_write_lock(self.novel_id):
+            previous = _read_pointer(self.current_path)
+            if _read_pointer(self.next_path) == self.generation:
+                os.replace(self.next_path, self.current_path)
+            else:
+                _write_pointer(self.current_path, self.generation)
+            if _rebuilding.get(self.novel_id) is self:
+                del _rebuilding[self.novel_id]
+            # 其他worker已打开的旧代读取器持有内存映射与内存中的偏移表，删除目录不影响其读取
+            if previous is not None and previous != self.generation:
+                shutil.rmtree(self._generation_dir(previous), ignore_errors=True)
+        get_chunk_store_registry().invalidate(self.novel_id)
+    
+    def discard(self):
+        """丢弃重建中的新一代（索引失败时调用），当前代保持不变"""
+        with _get_write_lock(self.novel_id):
+            if _read_pointer(self.next_path) == self.generation:
+                self.next_path.unlink(missing_ok=True)
+            if _rebuilding.get(self.novel_id) is self:
+                del _rebuilding[self.novel_id]
+            if _read_pointer(self.current_path) != self.generation:
+                shutil.rmtree(self._generation_dir(self.generation), ignore_errors=True)
+    
+    def contains(self, chunk_ids: Sequence[Optional[int]]) -> bool:
+        """本实例写入的分块是否包含所有给定分块（用于重建期间判断新一代是否已有文本）"""
+        return all(chunk_id is not None and chunk_id in self._chunk_ids for chunk_id in chunk_ids)
+    
+    def open(self) -> Optional[ChunkStoreReader]:
+        """
+        打开只读存储（通常通过 get_chunk_store 获取共享实例）
+        
+        Returns:
+            Optional[ChunkStoreReader]: 存储，不存在或读取失败返回None
+        """
+        if self.generation is None or not self.blob_path.exists():
+            return None
+        try:
+            return ChunkStoreReader(
+                self.novel_id,
+                self.blob_path,
+                _read_records(self.chunks_path, CHUNK_RECORD_FIELDS),
+                _read_records(self.chapters_path, CHAPTER_RECORD_FIELDS)
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 打开分块文本存储失败 (Novel ID: {self.novel_id}): {e}")
+            return None
+    
+    def delete(self):
+        """删除存储的所有代（删除小说时调用）"""
+        with _get_write_lock(self.novel_id):
+            self.current_path.unlink(missing_ok=True)
+            self.next_path.unlink(missing_ok=True)
+            _rebuilding.pop(self.novel_id, None)
+            for path in self.store_dir.glob(f"novel_{self.novel_id}.*"):
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+        get_chunk_store_registry().invalidate(self.novel_id)
+    
+    @staticmethod
+    def _append_records(path: Path, records: np.ndarray, fields: int):
+        """追加偏移表记录（先截断上次中断写入的不完整记录）"""
+        with open(path, 'ab') as f:
+            size = f.tell()
+            if size % (fields * 8):
+                f.truncate(size - size % (fields * 8))
+            f.write(records.tobytes())
+    
+    def append(
+        self,
+        chunks: Iterable[Dict],
+        chapters: Iterable[Tuple[int, str]] = ()
+    ) -> bool:
+        """
+        追加分块文本与章节标题（尚未构建存储时新建一代并设为当前代）
+        
+        Args:
+            chunks: 分块列表（包含content和metadata，元数据需能确定分块ID）
+            chapters: (章节号, 章节标题) 列表
+        
+        Returns:
+            bool: 是否成功
+        """
+        chunks = list(chunks)
+        chapters = list(chapters)
+        if not chunks and not chapters:
+            return True
+        
+        try:
+            chunk_ids = [chunk_id_of(chunk.get('metadata')) for chunk in chunks]
+            if any(chunk_id is None for chunk_id in chunk_ids):
+                raise ValueError("分块元数据缺少 chunk_id")
+            
+            with _get_write_lock(self.novel_id):
+                if self.generation is None:
+                    self.generation = _read_pointer(self.current_path) or self._new_generation()
+                self._generation_dir(self.generation).mkdir(parents=True, exist_ok=True)
+                chunk_records = np.empty((len(chunks), CHUNK_RECORD_FIELDS), dtype=np.int64)
+                chapter_records = np.empty((len(chapters), CHAPTER_RECORD_FIELDS), dtype=np.int64)
+                
+                with open(self.blob_path, 'ab') as f:
+                    offset = f.tell()
+                    
+                    def write(text: str) -> Tuple[int, int]:
+                        nonlocal offset
+                        encoded = text.encode('utf-8')
+                        f.write(encoded)
+                        span = (offset, len(encoded))
+                        offset += len(encoded)
+                        return span
+                    
+                    for row, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks)):
+                        chunk_records[row] = (chunk_id, *write(chunk['content']))
+                    for row, (chapter_num, title) in enumerate(chapters):
+                        chapter_records[row] = (chapter_num, *write(title or ''))
+                    
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                # 文本落盘后再提交偏移表
+                if len(chunk_records):
+                    self._append_records(self.chunks_path, chunk_records, CHUNK_RECORD_FIELDS)
+                if len(chapter_records):
+                    self._append_records(self.chapters_path, chapter_records, CHAPTER_RECORD_FIELDS)
+                self._chunk_ids.update(chunk_ids)
+                
+                # 首次构建（不经过重建流程）时直接设为当前代
+                if not self.current_path.exists() and _rebuilding.get(self.novel_id) is not self:
+                    _write_pointer(self.current_path, self.generation)
+            
+            get_chunk_store_registry().invalidate(self.novel_id)
+            return True
+        except Exception as e:
+            logger.error(f"❌ 写入分块文本存储失败 (Novel ID: {self.novel_id}): {e}")
+            return False
+
+
+class ChunkStoreRegistry:
+    """进程级只读存储缓存（按当前代号、偏移表的 mtime/size 与索引版本号校验）"""
+    
+    def __init__(self, max_novels: int = 32):
+        self._cache: LRUCache = LRUCache(maxsize=max(1, max_novels))
+        self._lock = threading.Lock()
+    
+    def get(self, novel_id: int) -> Optional[ChunkStoreReader]:
+        """
+        获取小说的只读存储
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            Optional[ChunkStoreReader]: 存储，未构建时返回None
+        """
+        store = ChunkStore(novel_id)
+        if store.generation is None:
+            return None
+        stats = []
+        for path in (store.chunks_path, store.chapters_path):
+            try:
+                stat = path.stat()
+                stats.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        signature = (store.generation, tuple(stats), get_index_versions().get(novel_id))
+        
+        with self._lock:
+            entry = self._cache.get(novel_id)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        
+        reader = store.open()
+        if reader is not None:
+            with self._lock:
+                # 被替换的旧映射在仍持有它的请求结束后随引用释放关闭
+                self._cache[novel_id] = (signature, reader)
+        return reader
+    
+    def invalidate(self, novel_id: int):
+        """使单本小说的缓存存储失效"""
+        with self._lock:
+            self._cache.pop(novel_id, None)
+
+
+# 全局只读存储缓存实例
+_chunk_store_registry: Optional[ChunkStoreRegistry] = None
+
+
+def get_chunk_store_registry() -> ChunkStoreRegistry:
+    """获取全局只读存储缓存实例（单例）"""
+    global _chunk_store_registry
+    if _chunk_store_registry is None:
+        _chunk_store_registry = ChunkStoreRegistry()
+    return _chunk_store_registry
+
+
+def get_chunk_store(novel_id: Optional[int]) -> Optional[ChunkStoreReader]:
+    """获取小说的只读文本存储（未构建或未提供小说ID时返回None）"""
+    if novel_id is None:
+        return None
+    return get_chunk_store_registry().get(novel_id)
+
+
+def has_chunk_texts(novel_id: Optional[int], chunk_ids: Sequence[Optional[int]]) -> bool:
+    """
+    写入端判断分块文本是否已在中心存储中（决定向量库、BM25 是否只保存分块ID）
+    
+    本进程正在重建该小说的存储时以新一代为准：新索引切换后读取的是新一代
+    
+    Args:
+        novel_id: 小说ID
+        chunk_ids: 分块ID列表
+    
+    Returns:
+        bool: 是否全部已存储
+    """
+    if novel_id is None:
+        return False
+    rebuilding = _rebuilding.get(novel_id)
+    if rebuilding is not None:
+        return rebuilding.contains(chunk_ids)
+    store = get_chunk_store(novel_id)
+    return store is not None and store.contains(chunk_ids)
+
+
+def resolve_documents(novel_id: Optional[int], results: Dict) -> Dict:
+    """
+    补全向量检索结果中的文本（文本由中心存储提供的小说，向量库只保存空文档）
+    
+    Args:
+        novel_id: 小说ID
+        results: Chroma格式的检索结果（原地修改）
+    
+    Returns:
+        Dict: 补全后的检索结果
+    """
+    documents = results.get('documents') or []
+    metadatas = results.get('metadatas') or []
+    missing = [
+        (row, i)
+        for row, documents_row in enumerate(documents)
+        for i, document in enumerate(documents_row or [])
+        if not document
+    ]
+    if not missing:
+        return results
+    
+    store = get_chunk_store(novel_id)
+    if store is None:
+        return results
+    
+    texts = store.get_texts([
+        chunk_id_of(metadatas[row][i]) if row < len(metadatas) and metadatas[row] else None
+        for row, i in missing
+    ])
+    for (row, i), text in zip(missing, texts):
+        if text is not None:
+            if not isinstance(documents[row], list):
+                documents[row] = list(documents[row])
+            documents[row][i] = text
+    return results
@@ -0,0 +1,288 @@
+"""
+Embedding 持久化缓存
+按 (模型, 维度, 规范化文本哈希) 内容寻址缓存向量，重复索引/重新上传/追加重叠内容时不再重复调用Embedding API
+
+存储格式（每个 模型-维度-精度 一个目录）：
+- vectors.bin: 定长行的向量块（float16/float32，按写入顺序追加）
+- index.bin:   定长16字节文本摘要，第i条摘要对应vectors.bin第i行（即偏移索引）
+两个文件都只追加：先写向量再写摘要，index.bin 中的摘要即为已提交的行
+
+多个 worker 进程共享同一命名空间：追加在排他文件锁内进行，行号由持锁时的文件大小计算；
+读取前检查 index.bin 是否增长，增长时只加载新增的摘要。
+写入中断留下的不完整记录只在持有排他锁的追加时截断（此时不会有其他进程正在写入）
+"""
+
+import hashlib
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.file_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+# 文本摘要字节数（blake2b-128）
+DIGEST_SIZE = 16
+
+SUPPORTED_DTYPES = ("float16", "float32")
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化文本（NFKC + 去除首尾空白），使全/半角、换行差异不影响缓存命中
+    
+    Args:
+        text: 原始文本
+    
+    Returns:
+        str: 规范化后的文本
+    """
+    return unicodedata.normalize("NFKC", text).strip()
+
+
+def text_digest(text: str) -> bytes:
+    """
+    计算规范化文本的内容摘要
+    
+    Args:
+        text: 原始文本
+    
+    Returns:
+        bytes: 16字节摘要
+    """
+    return hashlib.blake2b(
+        normalize_text(text).encode("utf-8"),
+        digest_size=DIGEST_SIZE
+    ).digest()
+
+
+class EmbeddingCache:
+    """内容寻址的Embedding磁盘缓存（单个 模型-维度-精度 命名空间）"""
+    
+    def __init__(
+        self,
+        cache_dir: Path,
+        model: str,
+        dimension: int,
+        dtype: str = "float16"
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            cache_dir: 缓存根目录
+            model: Embedding模型名称
+            dimension: 向量维度
+            dtype: 存储精度（float16 体积减半，float32 无损）
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支持的Embedding缓存精度: {dtype}（可选: {', '.join(SUPPORTED_DTYPES)}）")
+        
+        self.model = model
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype)
+        self.namespace = f"{model}-{dimension}-{dtype}"
+        self.cache_dir = Path(cache_dir) / self.namespace
+        self.vectors_path = self.cache_dir / "vectors.bin"
+        self.index_path = self.cache_dir / "index.bin"
+        self.lock_path = self.cache_dir / "lock"
+        self._row_bytes = dimension * self.dtype.itemsize
+        
+        self._rows: Dict[bytes, int] = {}
+        self._num_rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.RLock()
+        
+        self._load()
+    
+    def _load(self):
+        """加载偏移索引（只读取已提交的行，不截断其他进程可能正在写入的数据）"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_path, exclusive=False):
+            self.vectors_path.touch(exist_ok=True)
+            self.index_path.touch(exist_ok=True)
+            self._refresh()
+        
+        logger.info(f"✅ Embedding缓存已加载: {self.namespace}, {self._num_rows} 条向量")
+    
+    def _committed_rows(self) -> int:
+        """已提交的行数（摘要完整写入、且对应向量已写入的行）"""
+        index_rows = self.index_path.stat().st_size // DIGEST_SIZE
+        vector_rows = self.vectors_path.stat().st_size // self._row_bytes
+        return min(index_rows, vector_rows)
+    
+    def _refresh(self):
+        """其他进程追加了新行时加载新增的摘要（调用方持有线程锁）"""
+        num_rows = self._committed_rows()
+        if num_rows == self._num_rows:
+            return
+        if num_rows < self._num_rows:
+            # 缓存目录被清空重建，全量重新加载
+            self._rows = {}
+            self._num_rows = 0
+        
+        with open(self.index_path, "rb") as f:
+            f.seek(self._num_rows * DIGEST_SIZE)
+            raw = f.read((num_rows - self._num_rows) * DIGEST_SIZE)
+        for i in range(num_rows - self._num_rows):
+            self._rows[raw[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE]] = self._num_rows + i
+        self._num_rows = num_rows
+        self._vectors = None
+    
+    def _get_vectors(self) -> Optional[np.memmap]:
+        """获取向量文件的内存映射（写入新行后重新映射）"""
+        if self._num_rows == 0:
+            return None
+        if self._vectors is None or self._vectors.shape[0] != self._num_rows:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._num_rows, self.dimension)
+            )
+        return self._vectors
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        批量查询缓存
+        
+        Args:
+            texts: 文本列表
+        
+        Returns:
+            List[Optional[List[float]]]: 与输入一一对应的向量，未命中为None
+        """
+        digests = [text_digest(text) for text in texts]
+        
+        with self._lock:
+            self._refresh()
+            rows = [self._rows.get(digest) for digest in digests]
+            hit_positions = [i for i, row in enumerate(rows) if row is not None]
+            
+            results: List[Optional[List[float]]] = [None] * len(texts)
+            if hit_positions:
+                vectors = self._get_vectors()
+                block = vectors[[rows[i] for i in hit_positions]].astype(np.float32)
+                for position, vector in zip(hit_positions, block):
+                    results[position] = vector.tolist()
+        
+        return results
+    
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> int:
+        """
+        批量写入缓存（跳过已存在、维度不符或全零的失败占位向量）
+        
+        Args:
+            texts: 文本列表
+            embeddings: 与文本对应的向量列表
+        
+        Returns:
+            int: 实际新写入的条数
+        """
+        with self._lock:
+            new_digests = []
+            new_vectors = []
+            seen = set()
+            
+            for text, embedding in zip(texts, embeddings):
+                if embedding is None or len(embedding) != self.dimension:
+                    continue
+                digest = text_digest(text)
+                if digest in self._rows or digest in seen:
+                    continue
+                vector = np.asarray(embedding, dtype=np.float32)
+                if not vector.any():
+                    continue
+                seen.add(digest)
+                new_digests.append(digest)
+                new_vectors.append(vector)
+            
+            if not new_digests:
+                return 0
+            
+            with file_lock(self.lock_path, exclusive=True):
+                # 加载其他进程已写入的行，跳过它们已缓存的文本
+                self._refresh()
+                pending = [i for i, digest in enumerate(new_digests) if digest not in self._rows]
+                if not pending:
+                    return 0
+                new_digests = [new_digests[i] for i in pending]
+                block = np.stack([new_vectors[i] for i in pending]).astype(self.dtype)
+                
+                # 持有排他锁时没有其他写入者：截断写入中断留下的未提交尾部，新行紧接已提交的行
+                num_rows = self._num_rows
+                for path, row_size in ((self.vectors_path, self._row_bytes), (self.index_path, DIGEST_SIZE)):
+                    if path.stat().st_size != num_rows * row_size:
+                        with open(path, "r+b") as f:
+                            f.truncate(num_rows * row_size)
+                
+                # 先写向量再写摘要：摘要写入即提交
+                with open(self.vectors_path, "ab") as f:
+                    f.write(block.tobytes())
+                with open(self.index_path, "ab") as f:
+                    f.write(b"".join(new_digests))
+                
+                for offset, digest in enumerate(new_digests):
+                    self._rows[digest] = num_rows + offset
+                self._num_rows = num_rows + len(new_digests)
+                self._vectors = None
+            
+            logger.debug(f"💾 Embedding缓存写入 {len(new_digests)} 条（共 {self._num_rows} 条）")
+            return len(new_digests)
+    
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            Dict: 命名空间、条目数、磁盘占用
+        """
+        with self._lock:
+            return {
+                "namespace": self.namespace,
+                "entries": self._num_rows,
+                "disk_bytes": self._num_rows * (self._row_bytes + DIGEST_SIZE)
+            }
+
+
+# 全局缓存实例（按命名空间）
+_embedding_caches: Dict[str, EmbeddingCache] = {}
+_embedding_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(
+    model: Optional[str] = None,
+    dimension: Optional[int] = None
+) -> Optional[EmbeddingCache]:
+    """
+    获取全局Embedding缓存实例（未启用时返回None）
+    
+    Args:
+        model: Embedding模型名称（默认取配置）
+        dimension: 向量维度（默认取配置）
+    
+    Returns:
+        Optional[EmbeddingCache]: 缓存实例
+    """
+    if not settings.embedding_cache_enabled:
+        return None
+    
+    model = model or settings.embedding_model
+    dimension = dimension or settings.embedding_dimension
+    dtype = settings.embedding_cache_dtype
+    key = f"{model}-{dimension}-{dtype}"
+    
+    with _embedding_caches_lock:
+        if key not in _embedding_caches:
+            _embedding_caches[key] = EmbeddingCache(
+                cache_dir=Path(settings.data_dir) / "embedding_cache",
+                model=model,
+                dimension=dimension,
+                dtype=dtype
+            )
+        return _embedding_caches[key]
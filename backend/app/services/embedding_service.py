@@ -10,7 +10,10 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
 from app.services.zhipu_client import get_zhipu_client
-from app.core.chromadb_client import get_chroma_client
+from app.services.embedding_cache import get_embedding_cache
+from app.services.chunk_ids import chunk_id_of, make_chunk_id
+from app.services.chunk_store import has_chunk_texts, resolve_documents
+from app.core.vector_store import get_vector_store
 from app.core.config import settings
 from app.utils.token_counter import get_token_counter
 
@@ -23,8 +26,9 @@ class EmbeddingService:
     def __init__(self):
         """初始化向量化服务"""
         self.zhipu_client = get_zhipu_client()
-        self.chroma_client = get_chroma_client()
+        self.vector_store = get_vector_store()
         self.token_counter = get_token_counter()
+        self.embedding_cache = get_embedding_cache()  # 未启用时为None
         self.batch_size = settings.embedding_batch_size  # 批量处理大小（从配置读取）
         logger.info(f"✅ 向量化服务初始化完成 (batch_size={self.batch_size})")
     
@@ -43,9 +47,63 @@ class EmbeddingService:
         Returns:
             Tuple[List[List[float]], int]: (向量列表, 消耗的token数)
         """
+        embeddings, total_tokens, _ = self._embed_with_cache(texts, batch_size)
+        return embeddings, total_tokens
+    
+    def _embed_with_cache(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None
+    ) -> Tuple[List[List[float]], int, int]:
+        """
+        批量向量化文本（先查磁盘缓存，只对未命中的文本调用API）
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批处理大小
+        
+        Returns:
+            Tuple[List[List[float]], int, int]: (向量列表, 消耗的token数, 缓存命中数)
+        """
         if not texts:
-            return [], 0
+            return [], 0, 0
+        
+        if self.embedding_cache is None:
+            embeddings, total_tokens = self._embed_uncached(texts, batch_size)
+            return embeddings, total_tokens, 0
+        
+        embeddings = self.embedding_cache.get_many(texts)
+        miss_indices = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        cache_hits = len(texts) - len(miss_indices)
+        
+        if cache_hits:
+            logger.info(f"💾 Embedding缓存命中 {cache_hits}/{len(texts)}")
         
+        total_tokens = 0
+        if miss_indices:
+            miss_texts = [texts[i] for i in miss_indices]
+            miss_embeddings, total_tokens = self._embed_uncached(miss_texts, batch_size)
+            for i, embedding in zip(miss_indices, miss_embeddings):
+                embeddings[i] = embedding
+            self.embedding_cache.put_many(miss_texts, miss_embeddings)
+        
+        return embeddings, total_tokens, cache_hits
+    
+    def _embed_uncached(
+        self,
+        texts: List[str],
+        batch_size: Optional[int] = None
+    ) -> Tuple[List[List[float]], int]:
+        """
+        调用智谱AI批量向量化文本（不经过缓存）
+        
+        Args:
+            texts: 文本列表
+            batch_size: 批处理大小
+        
+        Returns:
+            Tuple[List[List[float]], int]: (向量列表, 消耗的token数)
+        """
         batch_size = batch_size or self.batch_size
         all_embeddings = []
         total_tokens = 0
@@ -92,8 +150,8 @@ class EmbeddingService:
         collection_name = f"novel_{novel_id}"
         
         try:
-            self.chroma_client.get_or_create_collection(
-                name=collection_name,
+            self.vector_store.create_collection(
+                collection_name,
                 metadata={
                     "novel_id": str(novel_id),
                     "hnsw:space": "cosine",
@@ -138,12 +196,17 @@ class EmbeddingService:
                 for metadata in metadata_list
             ]
             
-            # 添加到ChromaDB
-            self.chroma_client.add_documents(
-                collection_name=collection_name,
-                documents=chunks,
-                embeddings=embeddings,
+            # 文本已写入中心存储时向量库只保存空文档，检索后按分块ID读取
+            documents = chunks
+            if has_chunk_texts(metadata_list[0].get('novel_id'), [chunk_id_of(metadata) for metadata in metadata_list]):
+                documents = [''] * len(chunks)
+            
+            # 添加到向量存储
+            self.vector_store.add(
+                collection_name,
                 ids=ids,
+                embeddings=embeddings,
+                documents=documents,
                 metadatas=metadata_list
             )
             
@@ -151,7 +214,7 @@ class EmbeddingService:
             return True
             
         except Exception as e:
-            logger.error(f"❌ 添加到ChromaDB失败: {e}")
+            logger.error(f"❌ 添加到向量存储失败: {e}")
             return False
     
     def process_chapter(
@@ -181,8 +244,9 @@ class EmbeddingService:
             # 提取文本
             texts = [chunk['content'] for chunk in chapter_chunks]
             
-            # 向量化（获取token消耗）
-            embeddings, tokens_used = self.embed_texts(texts)
+            # 向量化（获取token消耗，缓存命中的文本不消耗token）
+            embeddings, tokens_used, cache_hits = self._embed_with_cache(texts)
+            self._report_cache_hits(novel_id, cache_hits, len(texts))
             
             # 准备元数据
             metadata_list = []
@@ -192,6 +256,7 @@ class EmbeddingService:
                     'chapter_num': chapter_num,
                     'chapter_title': chapter_title,
                     'chunk_index': i,
+                    'chunk_id': make_chunk_id(chapter_num, i),
                     'char_count': len(chunk['content']),
                 }
                 # 合并chunk自带的metadata
@@ -244,16 +309,30 @@ class EmbeddingService:
         # 先统计总请求数
         total_chunks_count = sum(len(chapter_data['chunks']) for chapter_data in all_chapters_data)
         
-        # 🎯 智能判断：请求数 < 阈值时使用实时API
-        if total_chunks_count < settings.batch_api_threshold:
-            logger.info(f"📊 请求数({total_chunks_count}) < 阈值({settings.batch_api_threshold})，使用实时API（更快）")
+        # 💾 先查询磁盘缓存，命中的文本块不再提交给API
+        all_texts = [
+            chunk['content']
+            for chapter_data in all_chapters_data
+            for chunk in chapter_data['chunks']
+        ]
+        if self.embedding_cache is not None:
+            cached_embeddings = self.embedding_cache.get_many(all_texts)
+        else:
+            cached_embeddings = [None] * len(all_texts)
+        cache_hits = sum(1 for embedding in cached_embeddings if embedding is not None)
+        miss_count = total_chunks_count - cache_hits
+        
+        # 🎯 智能判断：未命中缓存的请求数 < 阈值时使用实时API（实时路径同样会复用缓存）
+        if miss_count < settings.batch_api_threshold:
+            logger.info(f"📊 请求数({miss_count}，缓存命中{cache_hits}) < 阈值({settings.batch_api_threshold})，使用实时API（更快）")
             return await self._embed_chapters_realtime(novel_id, all_chapters_data)
         
-        logger.info(f"🚀 请求数({total_chunks_count}) ≥ 阈值({settings.batch_api_threshold})，使用Batch API（更省钱）")
+        logger.info(f"🚀 请求数({miss_count}，缓存命中{cache_hits}) ≥ 阈值({settings.batch_api_threshold})，使用Batch API（更省钱）")
         
-        # 收集所有chunks并构建batch任务
+        # 收集所有chunks并构建batch任务（仅缓存未命中的chunks）
         batch_tasks = []
         chunk_mapping = []  # 记录每个chunk对应的章节信息
+        text_position = 0
         for chapter_data in all_chapters_data:
             chapter_num = chapter_data['chapter_num']
             chapter_title = chapter_data['chapter_title']
@@ -261,19 +340,23 @@ class EmbeddingService:
             
             for chunk_idx, chunk in enumerate(chunks):
                 chunk_text = chunk['content']
-                custom_id = f"embedding-novel{novel_id}-ch{chapter_num}-chunk{chunk_idx}"
+                cached_embedding = cached_embeddings[text_position]
+                text_position += 1
                 
-                # 构建Batch API任务（使用embedding模型）
-                # Embedding 模型需要使用 /v4/embeddings 端点
-                batch_tasks.append({
-                    "custom_id": custom_id,
-                    "method": "POST",
-                    "url": "/v4/embeddings",
-                    "body": {
-                        "model": "embedding-3",
-                        "input": chunk_text
-                    }
-                })
+                if cached_embedding is None:
+                    custom_id = f"embedding-novel{novel_id}-ch{chapter_num}-chunk{chunk_idx}"
+                    
+                    # 构建Batch API任务（使用embedding模型）
+                    # Embedding 模型需要使用 /v4/embeddings 端点
+                    batch_tasks.append({
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": "/v4/embeddings",
+                        "body": {
+                            "model": "embedding-3",
+                            "input": chunk_text
+                        }
+                    })
                 
                 # 记录映射关系
                 chunk_mapping.append({
@@ -281,10 +364,11 @@ class EmbeddingService:
                     'chapter_title': chapter_title,
                     'chunk_index': chunk_idx,
                     'chunk': chunk,
-                    'novel_id': novel_id
+                    'novel_id': novel_id,
+                    'cached_embedding': cached_embedding
                 })
         
-        logger.info(f"📊 准备批量向量化 {total_chunks_count} 个文本块")
+        logger.info(f"📊 准备批量向量化 {len(batch_tasks)} 个文本块（另有 {cache_hits} 个命中缓存）")
         
         # 检查是否超过限制（10000个请求/批次）
         if len(batch_tasks) > 10000:
@@ -309,6 +393,7 @@ class EmbeddingService:
             
             total_tokens = token_stats.get('total_tokens', 0)
             logger.info(f"📊 Batch API向量化Token统计: {token_stats}")
+            self._report_cache_hits(novel_id, cache_hits, total_chunks_count)
             
         except Exception as e:
             logger.error(f"❌ Batch API调用失败，降级使用实时API: {e}")
@@ -319,16 +404,23 @@ class EmbeddingService:
         failed_chapters = set()
         
         embeddings_by_chapter = {}  # 按章节组织embeddings
+        new_cache_texts = []  # 本次新获取的向量，写回缓存
+        new_cache_embeddings = []
         
         for i, chunk_info in enumerate(chunk_mapping):
             custom_id = f"embedding-novel{novel_id}-ch{chunk_info['chapter_num']}-chunk{chunk_info['chunk_index']}"
             
-            if custom_id not in results_map:
+            if chunk_info['cached_embedding'] is not None:
+                result = {
+                    'status': 'success',
+                    'data': [{'embedding': chunk_info['cached_embedding']}]
+                }
+            elif custom_id not in results_map:
                 logger.warning(f"⚠️ 未找到结果: {custom_id}")
                 failed_chapters.add(chunk_info['chapter_num'])
                 continue
-            
-            result = results_map[custom_id]
+            else:
+                result = results_map[custom_id]
             
             if result['status'] != 'success':
                 logger.warning(f"⚠️ 向量化失败: {custom_id}, 错误: {result.get('error')}")
@@ -356,6 +448,10 @@ class EmbeddingService:
                     failed_chapters.add(chunk_info['chapter_num'])
                     continue
                 
+                if chunk_info['cached_embedding'] is None:
+                    new_cache_texts.append(chunk_info['chunk']['content'])
+                    new_cache_embeddings.append(embedding)
+                
                 # 按章节组织
                 chapter_num = chunk_info['chapter_num']
                 if chapter_num not in embeddings_by_chapter:
@@ -373,6 +469,7 @@ class EmbeddingService:
                     'chapter_num': chapter_num,
                     'chapter_title': chunk_info['chapter_title'],
                     'chunk_index': chunk_info['chunk_index'],
+                    'chunk_id': make_chunk_id(chapter_num, chunk_info['chunk_index']),
                     'char_count': len(chunk_info['chunk']['content'])
                 })
                 
@@ -380,6 +477,9 @@ class EmbeddingService:
                 logger.error(f"❌ 处理embedding结果失败: {custom_id}, 错误: {e}")
                 failed_chapters.add(chunk_info['chapter_num'])
         
+        if self.embedding_cache is not None and new_cache_texts:
+            self.embedding_cache.put_many(new_cache_texts, new_cache_embeddings)
+        
         # 批量存储到ChromaDB（按章节）
         for chapter_num, chapter_data in embeddings_by_chapter.items():
             try:
@@ -441,7 +541,16 @@ class EmbeddingService:
         降级到实时API处理
         """
         logger.warning("⚠️ 降级使用实时API处理向量化")
-        
+        return await self._embed_chapters_realtime(novel_id, all_chapters_data)
+    
+    async def _embed_chapters_realtime(
+        self,
+        novel_id: int,
+        all_chapters_data: List[Dict]
+    ) -> Tuple[bool, int, List[int]]:
+        """
+        使用实时API逐章节向量化（缓存命中的文本块不调用API）
+        """
         total_tokens = 0
         failed_chapters = []
         
@@ -466,6 +575,21 @@ class EmbeddingService:
         
         return len(failed_chapters) == 0, total_tokens, failed_chapters
     
+    def _report_cache_hits(self, novel_id: int, cache_hits: int, total: int):
+        """
+        将Embedding缓存命中数上报到索引进度追踪器
+        
+        Args:
+            novel_id: 小说ID
+            cache_hits: 缓存命中数
+            total: 文本块总数
+        """
+        if self.embedding_cache is None or total == 0:
+            return
+        
+        from app.services.indexing_progress_tracker import get_progress_tracker
+        get_progress_tracker().add_embedding_cache_hits(novel_id, cache_hits, total - cache_hits)
+    
     def query_similar_chunks(
         self,
         novel_id: int,
@@ -489,17 +613,17 @@ class EmbeddingService:
             # 向量化查询文本
             query_embedding = self.zhipu_client.embed_text(query_text)
             
-            # 从ChromaDB检索
+            # 从向量存储检索
             collection_name = f"novel_{novel_id}"
-            results = self.chroma_client.query_documents(
-                collection_name=collection_name,
+            results = self.vector_store.query(
+                collection_name,
                 query_embeddings=[query_embedding],
                 n_results=top_k,
                 where=chapter_filter
             )
             
             logger.info(f"✅ 检索到 {len(results.get('ids', [[]])[0])} 个相似块")
-            return results
+            return resolve_documents(novel_id, results)
             
         except Exception as e:
             logger.error(f"❌ 相似块查询失败: {e}")
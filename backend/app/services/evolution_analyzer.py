@@ -13,7 +13,8 @@ from sqlalchemy.orm import Session
 
 from app.models.database import Novel, Chapter
 from app.services.embedding_service import get_embedding_service
-from app.core.chromadb_client import get_chroma_client
+from app.services.chunk_store import resolve_documents
+from app.core.vector_store import get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +39,7 @@ class EvolutionAnalyzer:
     def __init__(self):
         """初始化演变分析器"""
         self.embedding_service = get_embedding_service()
-        self.chroma_client = get_chroma_client()
+        self.vector_store = get_vector_store()
         
         logger.info("✅ 演变分析器初始化完成")
     
@@ -89,17 +90,18 @@ class EvolutionAnalyzer:
         for period_name, (start_chapter, end_chapter) in periods.items():
             try:
                 # 按章节范围过滤检索
-                period_results = self.chroma_client.query_documents(
-                    collection_name=collection_name,
+                period_results = self.vector_store.query(
+                    collection_name,
                     query_embeddings=[query_embedding],
                     n_results=top_k_per_period * 2,  # 多检索一些以便过滤
                     where={
-                        "chapter_num": {
-                            "$gte": start_chapter,
-                            "$lte": end_chapter
-                        }
+                        "$and": [
+                            {"chapter_num": {"$gte": start_chapter}},
+                            {"chapter_num": {"$lte": end_chapter}}
+                        ]
                     }
                 )
+                period_results = resolve_documents(novel_id, period_results)
                 
                 # 转换为标准格式
                 documents = period_results.get('documents', [[]])[0]
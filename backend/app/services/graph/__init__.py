@@ -3,6 +3,7 @@
 
 包含:
 - GraphBuilder: 图谱构建
+- GraphRepository: 图谱缓存(共享只读实例)
 - GraphAnalyzer: 图谱分析(PageRank等)
 - GraphQuery: 图谱查询(时序、关系)
 - RelationExtractor: 关系提取
@@ -11,11 +12,14 @@
 
 from .graph_builder import GraphBuilder, get_graph_builder
 from .graph_analyzer import GraphAnalyzer, get_graph_analyzer
+from .graph_repository import GraphRepository, get_graph_repository
 
 __all__ = [
     'GraphBuilder',
     'get_graph_builder',
     'GraphAnalyzer',
-    'get_graph_analyzer'
+    'get_graph_analyzer',
+    'GraphRepository',
+    'get_graph_repository'
 ]
 
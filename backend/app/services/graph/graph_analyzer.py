@@ -6,15 +6,20 @@ T095-T096: 图谱分析器 (User Story 3: 知识图谱与GraphRAG)
 - 社区检测
 - 中心度分析
 - 章节重要性评分
+- 章节特征表预计算(随图谱持久化)
 """
 
 import networkx as nx
 import logging
-from typing import Dict, List, Tuple, Optional
-from collections import defaultdict
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple, Optional
+from collections import Counter, defaultdict
 
 logger = logging.getLogger(__name__)
 
+# 章节特征表格式版本（存储在 graph.graph['chapter_features'] 中）
+CHAPTER_FEATURES_VERSION = 1
+
 
 class GraphAnalyzer:
     """图谱分析器"""
@@ -124,6 +129,12 @@ class GraphAnalyzer:
         
         # 统计事件密度(关系数量/该章出现的实体数量)
         active_entities = self._count_active_entities(graph, chapter_num)
+        
+        return self._score_chapter(new_entities, relation_changes, active_entities)
+    
+    @staticmethod
+    def _score_chapter(new_entities: int, relation_changes: int, active_entities: int) -> float:
+        """按 新增实体/关系变化/事件密度 加权计算章节重要性(0-1)"""
         event_density = relation_changes / max(active_entities, 1)
         
         # 加权计算
@@ -135,6 +146,147 @@ class GraphAnalyzer:
         
         return importance
     
+    def compute_chapter_features(
+        self,
+        graph: nx.MultiDiGraph,
+        chapter_nums: Optional[Iterable[int]] = None
+    ) -> Dict:
+        """
+        预计算逐章节特征表
+        
+        一次遍历节点和边即可得到所有章节的重要性，结果与逐章节调用
+        compute_chapter_importance 一致，但复杂度从 O(章节数 × (节点+边)) 降为 O(节点+边)
+        
+        Args:
+            graph: 图谱对象
+            chapter_nums: 需要计算的章节号(可选，默认取图谱中出现过的所有章节)
+        
+        Returns:
+            {
+                'version': 特征表版本,
+                'chapters': {章节号: {'new_entities', 'relation_changes', 'active_entities', 'importance'}},
+                'evolution_chapters': {(实体1, 实体2): frozenset(演变章节号)}
+            }
+        """
+        chapters = set(chapter_nums or [])
+        new_entities = Counter()
+        relation_changes = Counter()
+        active_starts = []
+        active_ends = []
+        
+        for node, data in graph.nodes(data=True):
+            first_chapter = data.get('first_chapter')
+            if first_chapter:
+                new_entities[first_chapter] += 1
+                chapters.add(first_chapter)
+            
+            # 活跃区间 [first_chapter, last_chapter]，区间为空的实体不会在任何章节活跃
+            start = data.get('first_chapter', 1)
+            end = data.get('last_chapter')
+            if end is not None and end < start:
+                continue
+            active_starts.append(start)
+            if end is not None:
+                active_ends.append(end)
+        
+        evolution_chapters = {}
+        for u, v, data in graph.edges(data=True):
+            # 关系开始或结束(同一条边在同一章节只计一次)
+            for chapter in {data.get('start_chapter'), data.get('end_chapter')}:
+                if chapter is not None:
+                    relation_changes[chapter] += 1
+                    chapters.add(chapter)
+            
+            # 关系演变
+            evolution = data.get('evolution', [])
+            evolution_set = frozenset(
+                evt.get('chapter') for evt in evolution if evt.get('chapter') is not None
+            )
+            for chapter in evolution_set:
+                relation_changes[chapter] += 1
+                chapters.add(chapter)
+            
+            # 同一方向取第一条带演变记录的边(与 GraphQuery.get_relationship_evolution 一致)
+            if evolution and (u, v) not in evolution_chapters:
+                evolution_chapters[(u, v)] = evolution_set
+        
+        active_starts.sort()
+        active_ends.sort()
+        
+        chapter_features = {}
+        for chapter in sorted(chapters):
+            # 活跃实体 = 已出场 - 已退场(last_chapter < chapter)
+            active = bisect_right(active_starts, chapter) - bisect_left(active_ends, chapter)
+            chapter_features[chapter] = {
+                'new_entities': new_entities[chapter],
+                'relation_changes': relation_changes[chapter],
+                'active_entities': active,
+                'importance': self._score_chapter(
+                    new_entities[chapter], relation_changes[chapter], active
+                )
+            }
+        
+        return {
+            'version': CHAPTER_FEATURES_VERSION,
+            'chapters': chapter_features,
+            'evolution_chapters': evolution_chapters
+        }
+    
+    def attach_chapter_features(
+        self,
+        graph: nx.MultiDiGraph,
+        chapter_nums: Optional[Iterable[int]] = None
+    ) -> Dict:
+        """
+        计算章节特征表并存入图谱属性(随图谱一起持久化)
+        
+        Args:
+            graph: 图谱对象
+            chapter_nums: 需要计算的章节号(可选)
+        
+        Returns:
+            章节特征表
+        """
+        features = self.compute_chapter_features(graph, chapter_nums)
+        graph.graph['chapter_features'] = features
+        logger.info(f"章节特征表已生成: {len(features['chapters'])} 个章节")
+        return features
+    
+    def get_chapter_features(self, graph: nx.MultiDiGraph) -> Dict:
+        """
+        读取图谱中预计算的章节特征表(旧版图谱缺失时现场计算，不写回)
+        
+        Args:
+            graph: 图谱对象
+        
+        Returns:
+            章节特征表
+        """
+        features = graph.graph.get('chapter_features')
+        if features is None or features.get('version') != CHAPTER_FEATURES_VERSION:
+            features = self.compute_chapter_features(graph)
+        return features
+    
+    @staticmethod
+    def get_evolution_chapters(features: Dict, entity1: str, entity2: str) -> frozenset:
+        """
+        从章节特征表中查询两实体间关系的演变章节
+        
+        Args:
+            features: 章节特征表
+            entity1: 实体1
+            entity2: 实体2
+        
+        Returns:
+            演变章节号集合
+        """
+        evolution_chapters = features.get('evolution_chapters', {})
+        return (
+            evolution_chapters.get((entity1, entity2))
+            or evolution_chapters.get((entity2, entity1))
+            or frozenset()
+        )
+    
     def _count_new_entities(self, graph: nx.MultiDiGraph, chapter_num: int) -> int:
         """统计章节新增实体数量"""
         count = 0
@@ -143,6 +143,10 @@ class GraphBuilder:
         with open(file_path, 'wb') as f:
             pickle.dump(graph, f)
         
+        # 使共享图谱缓存失效，下次读取时加载新图谱
+        from app.services.graph.graph_repository import get_graph_repository
+        get_graph_repository().invalidate(novel_id)
+        
         logger.info(
             f"图谱已保存: {file_path} "
             f"({graph.number_of_nodes()} 节点, {graph.number_of_edges()} 边)"
@@ -192,6 +196,9 @@ class GraphBuilder:
         if file_path.exists():
             os.remove(file_path)
             logger.info(f"图谱已删除: {file_path}")
+            
+            from app.services.graph.graph_repository import get_graph_repository
+            get_graph_repository().invalidate(novel_id)
             return True
         
         return False
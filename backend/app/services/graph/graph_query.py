@@ -78,13 +78,13 @@ class GraphQuery:
             return []
         
         # 查找entity1 -> entity2的边
-        for _, _, data in graph.edges(entity1, entity2, data=True):
+        for data in graph.get_edge_data(entity1, entity2, default={}).values():
             evolution = data.get('evolution', [])
             if evolution:
                 return evolution
         
         # 查找entity2 -> entity1的边
-        for _, _, data in graph.edges(entity2, entity1, data=True):
+        for data in graph.get_edge_data(entity2, entity1, default={}).values():
             evolution = data.get('evolution', [])
             if evolution:
                 return evolution
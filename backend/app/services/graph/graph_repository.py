@@ -0,0 +1,174 @@
+"""
+知识图谱仓库
+
+进程内共享的图谱缓存:
+- 按小说ID缓存已加载的图谱（LRU，数量上限可配置）
+- 按图谱文件 mtime/size 与小说索引版本号校验，文件变化、重新索引/追加章节/删除后自动失效
+- 返回冻结（只读）的图谱实例，所有调用方共享同一份对象
+- 旧版图谱缺少章节特征表时，加载时补算一次
+"""
+
+import logging
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import networkx as nx
+from cachetools import LRUCache
+
+from app.core.config import settings
+from app.services.graph.graph_analyzer import CHAPTER_FEATURES_VERSION, get_graph_analyzer
+from app.services.index_versions import get_index_versions
+
+logger = logging.getLogger(__name__)
+
+
+class GraphRepository:
+    """知识图谱仓库（共享只读图谱缓存）"""
+    
+    def __init__(self, graph_dir: str, max_graphs: int = 8):
+        """
+        Args:
+            graph_dir: 图谱文件存储目录
+            max_graphs: 最多缓存的图谱数量
+        """
+        self.graph_dir = Path(graph_dir)
+        self._cache: LRUCache = LRUCache(maxsize=max(1, max_graphs))
+        self._lock = threading.Lock()
+        self._load_locks: Dict[int, threading.Lock] = {}
+        
+        self.hit_count = 0
+        self.miss_count = 0
+        
+        logger.info(f"✅ 图谱仓库初始化完成 (max_graphs={max_graphs})")
+    
+    def get_graph_path(self, novel_id: int) -> Path:
+        """获取图谱文件路径"""
+        return self.graph_dir / f"novel_{novel_id}_graph.pkl"
+    
+    def _signature(self, novel_id: int) -> Optional[Tuple[int, int, int]]:
+        """图谱签名 (mtime_ns, size, 索引版本号)，文件不存在时返回None"""
+        try:
+            stat = self.get_graph_path(novel_id).stat()
+        except FileNotFoundError:
+            return None
+        # 其他worker重建图谱时本进程不会收到 invalidate()，索引版本号使其缓存失效
+        return stat.st_mtime_ns, stat.st_size, get_index_versions().get(novel_id)
+    
+    def _get_load_lock(self, novel_id: int) -> threading.Lock:
+        """获取单本小说的加载锁（并发请求只反序列化一次）"""
+        with self._lock:
+            if novel_id not in self._load_locks:
+                self._load_locks[novel_id] = threading.Lock()
+            return self._load_locks[novel_id]
+    
+    def _lookup(self, novel_id: int, signature: Tuple[int, int, int]) -> Optional[nx.MultiDiGraph]:
+        """查找签名一致的缓存图谱"""
+        with self._lock:
+            entry = self._cache.get(novel_id)
+            if entry is not None and entry[0] == signature:
+                self.hit_count += 1
+                return entry[1]
+        return None
+    
+    def get_graph(self, novel_id: int) -> Optional[nx.MultiDiGraph]:
+        """
+        获取小说的知识图谱（只读共享实例）
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            冻结的图谱对象，不存在或加载失败返回None
+        """
+        signature = self._signature(novel_id)
+        if signature is None:
+            self.invalidate(novel_id)
+            return None
+        
+        graph = self._lookup(novel_id, signature)
+        if graph is not None:
+            return graph
+        
+        with self._get_load_lock(novel_id):
+            # 等待锁期间其他请求可能已完成加载
+            graph = self._lookup(novel_id, signature)
+            if graph is not None:
+                return graph
+            
+            file_path = self.get_graph_path(novel_id)
+            try:
+                with open(file_path, 'rb') as f:
+                    graph = pickle.load(f)
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                logger.error(f"❌ 加载图谱失败: {file_path}, {e}")
+                return None
+            
+            # 旧版图谱没有预计算的章节特征表，加载时补算一次（只存在内存中）
+            features = graph.graph.get('chapter_features')
+            if features is None or features.get('version') != CHAPTER_FEATURES_VERSION:
+                get_graph_analyzer().attach_chapter_features(graph)
+            
+            nx.freeze(graph)
+            
+            with self._lock:
+                self.miss_count += 1
+                self._cache[novel_id] = (signature, graph)
+            
+            logger.info(
+                f"📥 图谱已加载到缓存: novel_id={novel_id} "
+                f"({graph.number_of_nodes()} 节点, {graph.number_of_edges()} 边)"
+            )
+            return graph
+    
+    def invalidate(self, novel_id: int):
+        """
+        使单本小说的缓存图谱失效（图谱重建/更新/删除后调用）
+        
+        Args:
+            novel_id: 小说ID
+        """
+        with self._lock:
+            if self._cache.pop(novel_id, None) is not None:
+                logger.info(f"🗑️ 图谱缓存已失效: novel_id={novel_id}")
+    
+    def clear(self):
+        """清空所有缓存图谱"""
+        with self._lock:
+            self._cache.clear()
+    
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            Dict: 缓存数量、命中统计
+        """
+        with self._lock:
+            total = self.hit_count + self.miss_count
+            return {
+                'size': len(self._cache),
+                'max_graphs': self._cache.maxsize,
+                'hit_count': self.hit_count,
+                'miss_count': self.miss_count,
+                'hit_rate': self.hit_count / total if total > 0 else 0.0,
+                'novel_ids': list(self._cache.keys())
+            }
+
+
+# 全局单例
+_graph_repository = None
+
+
+def get_graph_repository() -> GraphRepository:
+    """获取全局图谱仓库实例"""
+    global _graph_repository
+    if _graph_repository is None:
+        _graph_repository = GraphRepository(
+            graph_dir=settings.graph_dir,
+            max_graphs=settings.graph_cache_max_graphs
+        )
+    return _graph_repository
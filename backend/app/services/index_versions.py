@@ -0,0 +1,140 @@
+"""
+小说索引版本号
+
+每本小说一个单调递增的版本号，在索引完成、追加章节、删除小说时递增。
+查询缓存、章节缓存、图谱缓存的键都包含版本号：失效只需O(1)递增版本号，
+旧版本的条目不会再被读到，随TTL/LRU自然淘汰，不需要清空其他小说的缓存。
+
+版本号保存在SQLite表中（与查询缓存L2同一数据库文件，WAL模式），同一节点的所有worker共享、重启后保留；
+进程内缓存读取结果 refresh_seconds 秒，其他worker的递增最多延迟这么久可见（本进程递增立即可见）
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_versions (
+    novel_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class IndexVersionRegistry:
+    """跨进程共享的小说索引版本号"""
+    
+    def __init__(self, path: str, refresh_seconds: float = 1.0):
+        """
+        Args:
+            path: SQLite数据库文件路径
+            refresh_seconds: 进程内缓存版本号的时间（秒）
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.refresh_seconds = refresh_seconds
+        self._local = threading.local()
+        self._cache: Dict[int, Tuple[int, float]] = {}  # novel_id -> (版本号, 读取时间)
+        self._lock = threading.Lock()
+        
+        self._connect().executescript(SCHEMA)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+    
+    def get(self, novel_id: int) -> int:
+        """
+        获取小说的当前索引版本号（从未递增过为0）
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            int: 版本号
+        """
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(novel_id)
+        if cached is not None and now - cached[1] < self.refresh_seconds:
+            return cached[0]
+        
+        try:
+            row = self._connect().execute(
+                "SELECT version FROM index_versions WHERE novel_id = ?", (novel_id,)
+            ).fetchone()
+            version = row[0] if row else 0
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 读取索引版本号失败: {e}")
+            return cached[0] if cached is not None else 0
+        
+        with self._lock:
+            self._cache[novel_id] = (version, now)
+        return version
+    
+    def bump(self, novel_id: int) -> int:
+        """
+        递增小说的索引版本号（索引完成、追加章节、删除小说后调用）
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            int: 递增后的版本号
+        """
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO index_versions (novel_id, version, updated_at) VALUES (?, 1, ?) "
+                    "ON CONFLICT(novel_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+                    (novel_id, time.time())
+                )
+                version = conn.execute(
+                    "SELECT version FROM index_versions WHERE novel_id = ?", (novel_id,)
+                ).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            # 写入失败时至少让本进程的缓存失效
+            logger.warning(f"⚠️ 递增索引版本号失败，仅本进程生效: {e}")
+            with self._lock:
+                cached = self._cache.get(novel_id)
+            version = (cached[0] if cached is not None else 0) + 1
+        
+        with self._lock:
+            # 本进程递增立即可见
+            self._cache[novel_id] = (version, time.monotonic())
+        logger.info(f"🔖 索引版本号递增: novel_id={novel_id} → v{version}")
+        return version
+
+
+# 全局索引版本号实例
+_index_versions: Optional[IndexVersionRegistry] = None
+
+
+def get_index_versions() -> IndexVersionRegistry:
+    """获取全局索引版本号实例（单例）"""
+    global _index_versions
+    if _index_versions is None:
+        _index_versions = IndexVersionRegistry(
+            settings.query_cache_l2_path,
+            refresh_seconds=settings.index_version_refresh_seconds
+        )
+    return _index_versions
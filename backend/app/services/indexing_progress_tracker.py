@@ -79,6 +79,10 @@ class IndexingProgressTracker:
                         'estimated_cost': 0.0
                     }
                 },
+                'embedding_cache': {
+                    'hits': 0,
+                    'misses': 0
+                },
                 'warnings': []
             }
             logger.info(f"📋 初始化索引进度追踪: novel_id={novel_id}")
@@ -133,6 +137,16 @@ class IndexingProgressTracker:
             
             self._details[novel_id]['warnings'].append(warning)
     
+    def add_embedding_cache_hits(self, novel_id: int, hits: int, misses: int):
+        """累加Embedding缓存命中统计"""
+        with self._lock:
+            if novel_id not in self._details:
+                return
+            
+            cache_stats = self._details[novel_id].setdefault('embedding_cache', {'hits': 0, 'misses': 0})
+            cache_stats['hits'] += hits
+            cache_stats['misses'] += misses
+    
     def add_token_usage(
         self, 
         novel_id: int, 
@@ -15,14 +15,18 @@ from app.services.parser.chapter_detector import ChapterDetector
 from app.services.text_splitter import get_text_splitter
 from app.services.embedding_service import get_embedding_service
 from app.services.bm25_retriever import BM25Retriever
+from app.services.chunk_features import ChunkFeatureStore
+from app.services.chunk_store import ChunkStore
 from app.services.nlp.entity_extractor import EntityExtractor
 from app.services.nlp.entity_merger import EntityMerger
 from app.services.entity_service import EntityService
 from app.services.graph.graph_builder import GraphBuilder
 from app.services.graph.graph_analyzer import GraphAnalyzer
+from app.services.graph.graph_repository import get_graph_repository
 from app.services.graph.relation_classifier import RelationshipClassifier
 from app.services.graph.evolution_tracker import RelationshipEvolutionTracker
 from app.services.graph.attribute_extractor import EntityAttributeExtractor
+from app.services.index_versions import get_index_versions
 from app.models.database import Novel, Chapter, Entity
 from app.models.schemas import IndexStatus, FileFormat
 from app.core.config import settings
@@ -88,6 +92,7 @@ class IndexingService:
         Returns:
             bool: 是否成功
         """
+        chunk_store = None
         try:
             # 更新状态为处理中
             novel = db.query(Novel).filter(Novel.id == novel_id).first()
@@ -138,6 +143,10 @@ class IndexingService:
             # 2. 创建ChromaDB集合
             collection_name = self.embedding_service.create_collection(novel_id)
             
+            # 重建分块文本中心存储（各索引只保存分块ID，文本在此存一份）
+            # 写入新的一代，索引成功后才切换，期间查询仍读取旧文本
+            chunk_store = ChunkStore.begin_rebuild(novel_id)
+            
             # 3. 处理每个章节（向量化并存储）
             total_chapters = len(chapters_data)
             total_chunks = 0
@@ -157,6 +166,7 @@ class IndexingService:
                 
                 # 收集所有章节的分块数据
                 all_chapters_chunks = []
+                stored_chapters = []
                 
                 for i, chapter_data in enumerate(chapters_data):
                     chapter_num = chapter_data['chapter_num']
@@ -198,9 +208,16 @@ class IndexingService:
                         'chapter_title': chapter_title,
                         'chunks': chunks
                     })
+                    stored_chapters.append((chapter_num, chapter_title))
                 
                 db.commit()
                 
+                # 文本先写入中心存储，向量库随后只保存分块ID
+                chunk_store.append(
+                    (chunk for chapter_data in all_chapters_chunks for chunk in chapter_data['chunks']),
+                    stored_chapters
+                )
+                
                 # 使用 Batch API 批量处理向量化
                 success, total_embedding_tokens, failed_chapters = await self.embedding_service.process_novel_with_batch_api(
                     novel_id, all_chapters_chunks
@@ -262,6 +279,9 @@ class IndexingService:
                     chapter.chunk_count = len(chunks)
                     total_chunks += len(chunks)
                     
+                    # 文本先写入中心存储，向量库随后只保存分块ID
+                    chunk_store.append(chunks, [(chapter_num, chapter_title)])
+                    
                     # 向量化并存储（获取token消耗）
                     success, chapter_tokens = self.embedding_service.process_chapter(
                         novel_id,
@@ -326,11 +346,11 @@ class IndexingService:
             
             # 3.5. 构建 BM25 索引（轻量级操作，不占用进度）
             logger.info(f"🔍 开始构建 BM25 索引...")
+            # 收集所有 chunks 用于构建 BM25（之后也用于预计算分块特征）
+            all_chunks_for_bm25 = []
             try:
                 bm25_retriever = BM25Retriever(novel_id)
                 
-                # 收集所有 chunks 用于构建 BM25
-                all_chunks_for_bm25 = []
                 if use_batch_api_for_embedding:
                     # 如果使用了 Batch API，从 all_chapters_chunks 中提取
                     for chapter_data in all_chapters_chunks:
@@ -364,6 +384,7 @@ class IndexingService:
             
             # 初始化图谱token统计变量
             graph_attribute_tokens = 0
+            graph_entity_names = []
             graph_relation_tokens = 0
             graph_evolution_tokens = 0
             
@@ -841,16 +862,13 @@ class IndexingService:
                 if progress_callback:
                     await progress_callback(novel_id, 0.93, "PageRank计算完成")
                 
-                # 4.6 计算章节重要性
+                # 4.6 计算章节重要性（预计算章节特征表，随图谱保存供Rerank查表）
                 logger.info(f"📈 计算章节重要性...")
                 if graph.number_of_nodes() > 0:
-                    # 为每个章节计算重要性
-                    for chapter in db.query(Chapter).filter(Chapter.novel_id == novel_id).all():
-                        importance = self.graph_analyzer.compute_chapter_importance(graph, chapter.chapter_num)
-                        chapter.importance_score = importance
-                    db.commit()
+                    self._refresh_chapter_features(db, novel_id, graph)
                     logger.info(f"✅ 章节重要性计算完成")
                 else:
+                    self.graph_analyzer.attach_chapter_features(graph)
                     logger.warning(f"⚠️ 图谱为空，跳过章节重要性计算")
                 
                 # 更新进度：章节重要性计算完成（93%-96%）
@@ -863,6 +881,7 @@ class IndexingService:
                 # 4.7 保存知识图谱
                 logger.info(f"💾 保存知识图谱...")
                 self.graph_builder.save_graph(graph, novel_id)
+                graph_entity_names = list(graph.nodes)
                 
                 logger.info(f"✅ 知识图谱构建完成: {graph.number_of_nodes()}节点, {graph.number_of_edges()}边")
                 
@@ -926,6 +945,13 @@ class IndexingService:
             )
             logger.info(f"📊 关系分类Token: {graph_relation_tokens}")
             
+            # 4.8 预计算分块特征（引号加成、章节位置、Token数、出现的实体），查询时Rerank只查表
+            if not ChunkFeatureStore(novel_id).build(all_chunks_for_bm25, total_chapters, graph_entity_names):
+                tracker.add_warning(novel_id, "分块特征预计算失败，查询时将从文本现算")
+            
+            # 4.9 索引成功，切换为新一代分块文本存储
+            chunk_store.publish()
+            
             # 5. 更新小说统计信息并保存token统计
             novel.total_chunks = total_chunks
             novel.embedding_tokens = total_embedding_tokens  # 保存embedding token消耗
@@ -934,6 +960,9 @@ class IndexingService:
             novel.indexed_date = novel.updated_at
             db.commit()
             
+            # 🔖 递增索引版本号：该小说的查询/章节/图谱缓存失效
+            get_index_versions().bump(novel_id)
+            
             # 计算图谱构建总token
             total_graph_tokens = graph_attribute_tokens + graph_relation_tokens + graph_evolution_tokens
             
@@ -988,12 +1017,19 @@ class IndexingService:
         except Exception as e:
             logger.error(f"❌ 索引失败: {e}")
             
+            # 丢弃重建中的分块文本存储，保留旧文本
+            if chunk_store is not None:
+                chunk_store.discard()
+            
             # 更新状态为失败
             novel = db.query(Novel).filter(Novel.id == novel_id).first()
             if novel:
                 novel.index_status = IndexStatus.FAILED.value
                 db.commit()
             
+            # 失败前可能已写入部分向量/图谱，同样使缓存失效
+            get_index_versions().bump(novel_id)
+            
             if progress_callback:
                 await progress_callback(novel_id, 0.0, f"索引失败: {str(e)}")
             
@@ -1236,12 +1272,11 @@ class IndexingService:
             # 3. 向量化新章节（10%-60%）
             total_new_chunks = 0
             total_new_embedding_tokens = 0
+            new_chunks_for_bm25 = []
             
-            # 获取或创建ChromaDB集合
+            # 获取或创建向量集合
             collection_name = f"novel_{novel_id}"
-            try:
-                self.embedding_service.chroma_client.get_collection(collection_name)
-            except:
+            if not self.embedding_service.vector_store.has_collection(collection_name):
                 # 集合不存在，创建它
                 self.embedding_service.create_collection(novel_id)
             
@@ -1288,6 +1323,10 @@ class IndexingService:
                 
                 chapter.chunk_count = len(chunks)
                 total_new_chunks += len(chunks)
+                new_chunks_for_bm25.extend(chunks)
+                
+                # 文本先写入中心存储，向量库随后只保存分块ID
+                ChunkStore(novel_id).append(chunks, [(chapter_num, chapter_title)])
                 
                 # 向量化并存储
                 success, chapter_tokens = self.embedding_service.process_chapter(
@@ -1325,6 +1364,10 @@ class IndexingService:
             
             logger.info(f"✅ 新章节向量化完成: {new_chapter_count}章, {total_new_chunks}块, {total_new_embedding_tokens} tokens")
             
+            # 3.5. 写入 BM25 增量段（只索引新章节，不重建整本小说）
+            if not BM25Retriever(novel_id).append_segment(new_chunks_for_bm25):
+                tracker.add_warning(novel_id, "BM25增量索引写入失败，新章节暂时无法被关键词检索")
+            
             tracker.update_step(novel_id, 2, 'completed', 1.0, f'新章节处理完成({new_chapter_count}章)')
             tracker.update_step(novel_id, 3, 'processing', 0.0, '更新知识图谱...')
             
@@ -1347,6 +1390,12 @@ class IndexingService:
                 tracker.update_step(novel_id, 3, 'failed', 0.0, "知识图谱更新失败", error=str(e))
                 tracker.add_warning(novel_id, f"知识图谱更新失败: {str(e)}")
             
+            # 4.5 预计算新分块的特征（使用更新后的图谱实体）
+            graph = get_graph_repository().get_graph(novel_id)
+            graph_entity_names = list(graph.nodes) if graph is not None else []
+            if not ChunkFeatureStore(novel_id).append(new_chunks_for_bm25, total_detected_chapters, graph_entity_names):
+                tracker.add_warning(novel_id, "分块特征预计算失败，新章节查询时将从文本现算")
+            
             # 5. 更新小说统计信息（90%-100%）
             novel.total_chapters = total_detected_chapters
             novel.total_chars = metadata.get('total_chars', len(content))
@@ -1357,6 +1406,9 @@ class IndexingService:
             novel.indexed_date = novel.updated_at
             db.commit()
             
+            # 🔖 递增索引版本号：该小说的查询/章节/图谱缓存失效
+            get_index_versions().bump(novel_id)
+            
             # 保存token统计
             try:
                 from app.services.token_stats_service import get_token_stats_service
@@ -1406,11 +1458,37 @@ class IndexingService:
                 novel.index_status = IndexStatus.FAILED.value
                 db.commit()
             
+            # 已处理的章节不回滚，同样使缓存失效
+            get_index_versions().bump(novel_id)
+            
             if progress_callback:
                 await progress_callback(novel_id, 0.0, f"追加章节失败: {str(e)}")
             
             return False
     
+    def _refresh_chapter_features(self, db: Session, novel_id: int, graph) -> Dict:
+        """
+        预计算章节特征表并写回图谱，同时更新 Chapter.importance_score
+        
+        Args:
+            db: 数据库会话
+            novel_id: 小说ID
+            graph: 知识图谱（特征表存入 graph.graph，随图谱一起保存）
+        
+        Returns:
+            Dict: 章节特征表
+        """
+        chapters = db.query(Chapter).filter(Chapter.novel_id == novel_id).all()
+        features = self.graph_analyzer.attach_chapter_features(
+            graph, [chapter.chapter_num for chapter in chapters]
+        )
+        
+        for chapter in chapters:
+            chapter.importance_score = features['chapters'][chapter.chapter_num]['importance']
+        db.commit()
+        
+        return features
+    
     async def _append_to_knowledge_graph(
         self,
         db: Session,
@@ -1581,6 +1659,10 @@ class IndexingService:
                 pagerank = self.graph_analyzer.compute_pagerank(graph)
                 self.graph_analyzer.update_node_importance(graph, pagerank)
             
+            # 重新计算章节特征表（新章节会改变已有章节的活跃实体数）
+            if graph.number_of_nodes() > 0:
+                self._refresh_chapter_features(db, novel_id, graph)
+            
             # 保存更新后的图谱
             self.graph_builder.save_graph(graph, novel_id)
             
@@ -3,7 +3,9 @@ LLM客户端抽象基类
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Generator, Any
+from typing import Dict, List, Generator, AsyncGenerator, Any
+
+from app.core.executors import run_blocking, stream_blocking
 
 
 class BaseLLMClient(ABC):
@@ -57,6 +59,51 @@ class BaseLLMClient(ABC):
         """
         pass
     
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步非流式对话生成
+        
+        默认在有界线程池中执行同步的 chat_completion，不阻塞事件循环；
+        提供原生异步SDK的客户端应覆盖此方法
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称（不含provider前缀）
+            **kwargs: 其他参数
+        
+        Returns:
+            与 chat_completion 相同格式的字典
+        """
+        return await run_blocking("llm", self.chat_completion, messages, model, **kwargs)
+    
+    async def achat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式对话生成
+        
+        默认在流式线程池中迭代同步的 chat_completion_stream，经有界队列桥接到事件循环，
+        消费端变慢时反压生产线程；提供原生异步流的客户端应覆盖此方法
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称（不含provider前缀）
+            **kwargs: 其他参数
+        
+        Yields:
+            与 chat_completion_stream 相同格式的字典
+        """
+        async for chunk in stream_blocking("stream", self.chat_completion_stream, messages, model, **kwargs):
+            yield chunk
+    
     def embed_text(self, text: str) -> List[float]:
         """
         文本向量化（可选实现）
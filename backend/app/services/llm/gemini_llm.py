@@ -3,7 +3,7 @@ Gemini LLM客户端实现
 """
 
 import logging
-from typing import Dict, List, Generator, Any
+from typing import Dict, List, Generator, AsyncGenerator, Any
 from google import genai
 from google.genai import types
 from app.services.llm.base import BaseLLMClient
@@ -74,47 +74,91 @@ class GeminiLLMClient(BaseLLMClient):
             包含content和usage的字典
         """
         try:
-            contents, system_instruction = self._convert_messages_to_contents(messages)
-            
-            # 构建配置
-            config_params = {}
-            if system_instruction:
-                config_params["system_instruction"] = system_instruction
-            
-            # 添加其他配置参数
-            if "temperature" in kwargs:
-                config_params["temperature"] = kwargs["temperature"]
-            if "max_tokens" in kwargs:
-                config_params["max_output_tokens"] = kwargs["max_tokens"]
-            
-            config = types.GenerateContentConfig(**config_params) if config_params else None
+            contents, config = self._build_request(messages, kwargs)
             
             # 调用API
             response = self.client.models.generate_content(
                 model=model,
-                contents="\n\n".join(contents),
+                contents=contents,
                 config=config
             )
+            return self._parse_response(response)
             
-            result = {
-                "content": response.text or "",
-                "finish_reason": "stop",  # Gemini不返回finish_reason，默认为stop
-            }
-            
-            # 添加token使用统计（如果有）
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                result["usage"] = {
-                    "prompt_tokens": response.usage_metadata.prompt_token_count,
-                    "completion_tokens": response.usage_metadata.candidates_token_count,
-                    "total_tokens": response.usage_metadata.total_token_count,
-                }
-            
-            return result
+        except Exception as e:
+            logger.error(f"❌ Gemini对话生成失败: {e}")
+            raise
+    
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步非流式对话生成（原生异步SDK: client.aio）
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称（如"gemini-1.5-pro"）
+            **kwargs: 其他参数
+        
+        Returns:
+            包含content和usage的字典
+        """
+        try:
+            contents, config = self._build_request(messages, kwargs)
             
+            response = await self.client.aio.models.generate_content(
+                model=model,
+                contents=contents,
+                config=config
+            )
+            return self._parse_response(response)
+        
         except Exception as e:
             logger.error(f"❌ Gemini对话生成失败: {e}")
             raise
     
+    def _build_request(self, messages: List[Dict[str, str]], kwargs: Dict[str, Any]):
+        """
+        构建Gemini请求的contents和config
+        
+        Returns:
+            (contents文本, GenerateContentConfig或None)
+        """
+        contents, system_instruction = self._convert_messages_to_contents(messages)
+        
+        # 构建配置
+        config_params = {}
+        if system_instruction:
+            config_params["system_instruction"] = system_instruction
+        
+        # 添加其他配置参数
+        if "temperature" in kwargs:
+            config_params["temperature"] = kwargs["temperature"]
+        if "max_tokens" in kwargs:
+            config_params["max_output_tokens"] = kwargs["max_tokens"]
+        
+        config = types.GenerateContentConfig(**config_params) if config_params else None
+        return "\n\n".join(contents), config
+    
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """将非流式响应转换为统一返回格式"""
+        result = {
+            "content": response.text or "",
+            "finish_reason": "stop",  # Gemini不返回finish_reason，默认为stop
+        }
+        
+        # 添加token使用统计（如果有）
+        if hasattr(response, 'usage_metadata') and response.usage_metadata:
+            result["usage"] = {
+                "prompt_tokens": response.usage_metadata.prompt_token_count,
+                "completion_tokens": response.usage_metadata.candidates_token_count,
+                "total_tokens": response.usage_metadata.total_token_count,
+            }
+        
+        return result
+    
     def chat_completion_stream(
         self,
         messages: List[Dict[str, str]],
@@ -133,48 +177,17 @@ class GeminiLLMClient(BaseLLMClient):
             包含content增量的字典
         """
         try:
-            contents, system_instruction = self._convert_messages_to_contents(messages)
-            
-            # 构建配置
-            config_params = {}
-            if system_instruction:
-                config_params["system_instruction"] = system_instruction
-            
-            if "temperature" in kwargs:
-                config_params["temperature"] = kwargs["temperature"]
-            if "max_tokens" in kwargs:
-                config_params["max_output_tokens"] = kwargs["max_tokens"]
-            
-            config = types.GenerateContentConfig(**config_params) if config_params else None
+            contents, config = self._build_request(messages, kwargs)
             
             # 流式调用
             stream = self.client.models.generate_content_stream(
                 model=model,
-                contents="\n\n".join(contents),
+                contents=contents,
                 config=config
             )
             
-            total_prompt_tokens = 0
-            total_completion_tokens = 0
-            
             for chunk in stream:
-                result = {}
-                
-                # 内容增量
-                if hasattr(chunk, 'text') and chunk.text:
-                    result["content"] = chunk.text
-                
-                # Token统计（通常在最后一个chunk）
-                if hasattr(chunk, 'usage_metadata') and chunk.usage_metadata:
-                    total_prompt_tokens = chunk.usage_metadata.prompt_token_count
-                    total_completion_tokens = chunk.usage_metadata.candidates_token_count
-                    
-                    result["usage"] = {
-                        "prompt_tokens": total_prompt_tokens,
-                        "completion_tokens": total_completion_tokens,
-                        "total_tokens": total_prompt_tokens + total_completion_tokens,
-                    }
-                
+                result = self._parse_stream_chunk(chunk)
                 if result:
                     yield result
             
@@ -187,6 +200,67 @@ class GeminiLLMClient(BaseLLMClient):
             logger.error(f"❌ Gemini流式生成失败: {e}")
             raise
     
+    async def achat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式对话生成（原生异步SDK: client.aio）
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称
+            **kwargs: 其他参数
+        
+        Yields:
+            包含content增量的字典
+        """
+        try:
+            contents, config = self._build_request(messages, kwargs)
+            
+            stream = await self.client.aio.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config
+            )
+            
+            async for chunk in stream:
+                result = self._parse_stream_chunk(chunk)
+                if result:
+                    yield result
+            
+            # 流式结束，发送finish_reason
+            yield {
+                "finish_reason": "stop",
+            }
+        
+        except Exception as e:
+            logger.error(f"❌ Gemini流式生成失败: {e}")
+            raise
+    
+    def _parse_stream_chunk(self, chunk) -> Dict[str, Any]:
+        """将流式chunk转换为统一返回格式（无内容时返回空字典）"""
+        result = {}
+        
+        # 内容增量
+        if hasattr(chunk, 'text') and chunk.text:
+            result["content"] = chunk.text
+        
+        # Token统计（通常在最后一个chunk）
+        if hasattr(chunk, 'usage_metadata') and chunk.usage_metadata:
+            prompt_tokens = chunk.usage_metadata.prompt_token_count
+            completion_tokens = chunk.usage_metadata.candidates_token_count
+            
+            result["usage"] = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        
+        return result
+    
     def supports_thinking(self, model: str) -> bool:
         """Gemini标准模型不支持thinking模式"""
         return False
@@ -3,8 +3,8 @@ OpenAI LLM客户端实现
 """
 
 import logging
-from typing import Dict, List, Generator, Any
-from openai import OpenAI
+from typing import Dict, List, Generator, AsyncGenerator, Any
+from openai import OpenAI, AsyncOpenAI
 from app.services.llm.base import BaseLLMClient
 from app.core.config import settings
 
@@ -20,6 +20,11 @@ class OpenAILLMClient(BaseLLMClient):
             api_key=settings.openai_api_key,
             base_url=settings.openai_base_url,
         )
+        # 异步客户端（异步查询管道使用，不占用线程池）
+        self.async_client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+        )
         logger.info(f"✅ OpenAI客户端初始化完成")
     
     @property
@@ -50,26 +55,59 @@ class OpenAILLMClient(BaseLLMClient):
                 stream=False,
                 **kwargs
             )
-            
-            result = {
-                "content": response.choices[0].message.content or "",
-                "finish_reason": response.choices[0].finish_reason,
-            }
-            
-            # 添加token使用统计
-            if response.usage:
-                result["usage"] = {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                }
-            
-            return result
+            return self._parse_response(response)
             
         except Exception as e:
             logger.error(f"❌ OpenAI对话生成失败: {e}")
             raise
     
+    async def achat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        异步非流式对话生成（原生异步SDK）
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称（如"gpt-4o"）
+            **kwargs: 其他参数
+        
+        Returns:
+            包含content和usage的字典
+        """
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=False,
+                **kwargs
+            )
+            return self._parse_response(response)
+        
+        except Exception as e:
+            logger.error(f"❌ OpenAI对话生成失败: {e}")
+            raise
+    
+    def _parse_response(self, response) -> Dict[str, Any]:
+        """将非流式响应转换为统一返回格式"""
+        result = {
+            "content": response.choices[0].message.content or "",
+            "finish_reason": response.choices[0].finish_reason,
+        }
+        
+        # 添加token使用统计
+        if response.usage:
+            result["usage"] = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        
+        return result
+    
     def chat_completion_stream(
         self,
         messages: List[Dict[str, str]],
@@ -97,37 +135,7 @@ class OpenAILLMClient(BaseLLMClient):
             )
             
             for chunk in stream:
-                if not chunk.choices:
-                    # 某些chunk可能只包含usage信息
-                    if hasattr(chunk, 'usage') and chunk.usage:
-                        yield {
-                            "usage": {
-                                "prompt_tokens": chunk.usage.prompt_tokens,
-                                "completion_tokens": chunk.usage.completion_tokens,
-                                "total_tokens": chunk.usage.total_tokens,
-                            }
-                        }
-                    continue
-                
-                choice = chunk.choices[0]
-                result = {}
-                
-                # 内容增量
-                if choice.delta.content:
-                    result["content"] = choice.delta.content
-                
-                # 结束原因
-                if choice.finish_reason:
-                    result["finish_reason"] = choice.finish_reason
-                
-                # Token使用统计（通常在最后一个chunk）
-                if hasattr(chunk, 'usage') and chunk.usage:
-                    result["usage"] = {
-                        "prompt_tokens": chunk.usage.prompt_tokens,
-                        "completion_tokens": chunk.usage.completion_tokens,
-                        "total_tokens": chunk.usage.total_tokens,
-                    }
-                
+                result = self._parse_stream_chunk(chunk)
                 if result:
                     yield result
                     
@@ -135,6 +143,80 @@ class OpenAILLMClient(BaseLLMClient):
             logger.error(f"❌ OpenAI流式生成失败: {e}")
             raise
     
+    async def achat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: str,
+        **kwargs
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        异步流式对话生成（原生异步SDK）
+        
+        Args:
+            messages: 对话消息列表
+            model: 模型名称
+            **kwargs: 其他参数
+        
+        Yields:
+            包含content增量的字典
+        """
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},  # 请求返回usage
+                **kwargs
+            )
+            
+            try:
+                async for chunk in stream:
+                    result = self._parse_stream_chunk(chunk)
+                    if result:
+                        yield result
+            finally:
+                # 消费端提前退出时关闭HTTP连接
+                await stream.close()
+        
+        except Exception as e:
+            logger.error(f"❌ OpenAI流式生成失败: {e}")
+            raise
+    
+    def _parse_stream_chunk(self, chunk) -> Dict[str, Any]:
+        """将流式chunk转换为统一返回格式（无内容时返回空字典）"""
+        if not chunk.choices:
+            # 某些chunk可能只包含usage信息
+            if hasattr(chunk, 'usage') and chunk.usage:
+                return {
+                    "usage": {
+                        "prompt_tokens": chunk.usage.prompt_tokens,
+                        "completion_tokens": chunk.usage.completion_tokens,
+                        "total_tokens": chunk.usage.total_tokens,
+                    }
+                }
+            return {}
+        
+        choice = chunk.choices[0]
+        result = {}
+        
+        # 内容增量
+        if choice.delta.content:
+            result["content"] = choice.delta.content
+        
+        # 结束原因
+        if choice.finish_reason:
+            result["finish_reason"] = choice.finish_reason
+        
+        # Token使用统计（通常在最后一个chunk）
+        if hasattr(chunk, 'usage') and chunk.usage:
+            result["usage"] = {
+                "prompt_tokens": chunk.usage.prompt_tokens,
+                "completion_tokens": chunk.usage.completion_tokens,
+                "total_tokens": chunk.usage.total_tokens,
+            }
+        
+        return result
+    
     def supports_thinking(self, model: str) -> bool:
         """OpenAI标准模型不支持thinking模式"""
         return False
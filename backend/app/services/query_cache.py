@@ -1,32 +1,155 @@
 """
 查询缓存服务
 实现内存缓存以提升高频查询的响应速度
+
+两级存储：
+- L1: 进程内 TTLCache
+- L2: 同一节点所有worker共享的SQLite（WAL）持久化缓存（见 query_cache_store.py），
+  L1未命中时读取并回填L1，worker冷启动、重启或部署后仍可命中
+
+缓存键包含小说的索引版本号（见 index_versions.py）：重新索引/追加章节/删除后递增版本号即可使该小说的缓存失效，
+旧版本条目随TTL/LRU自然淘汰，其他小说的缓存不受影响
+
+两种命中：
+- 精确命中: 查询文本 + 模型 + 配置参数的MD5完全一致
+- 语义命中: 每本小说保留最近查询的向量，同义改述（如“萧炎和药老是什么关系”/“药老与萧炎的关系”）
+  余弦相似度达到阈值且模型与配置参数一致时复用结果
 """
 
 import hashlib
 import logging
+import threading
 import time
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Tuple
 from cachetools import TTLCache
+import numpy as np
+
+from app.core.config import settings
+from app.services.index_versions import IndexVersionRegistry
+from app.services.query_cache_store import SQLiteCacheStore
 
 logger = logging.getLogger(__name__)
 
+# 缓存条目格式版本（包含在缓存键中，条目结构变化时递增，旧条目自然失效）
+CACHE_FORMAT_VERSION = 2
+
+
+class SemanticCacheIndex:
+    """
+    单本小说的最近查询向量索引（环形缓冲区，写满后覆盖最旧的条目）
+    
+    只保存归一化向量与对应的精确缓存键，结果本身仍存放在精确缓存中（过期与淘汰规则一致）
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: 最多保留的查询数
+        """
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None  # (capacity, dimension)，首次写入时按维度分配
+        self.keys: List[Optional[str]] = [None] * capacity
+        self.tags: List[Optional[Tuple]] = [None] * capacity
+        self.next_slot = 0
+        self.filled = 0
+    
+    def add(self, embedding: np.ndarray, key: str, tag: Tuple):
+        """写入一条查询向量（同一缓存键重复写入时覆盖原条目）"""
+        if self.vectors is None or self.vectors.shape[1] != embedding.shape[0]:
+            self.vectors = np.zeros((self.capacity, embedding.shape[0]), dtype=np.float32)
+            self.keys = [None] * self.capacity
+            self.tags = [None] * self.capacity
+            self.next_slot = 0
+            self.filled = 0
+        
+        if key in self.keys:
+            slot = self.keys.index(key)
+        else:
+            slot = self.next_slot
+            self.next_slot = (self.next_slot + 1) % self.capacity
+            self.filled = min(self.filled + 1, self.capacity)
+        self.vectors[slot] = embedding
+        self.keys[slot] = key
+        self.tags[slot] = tag
+    
+    def search(self, embedding: np.ndarray, tag: Tuple) -> Optional[Tuple[str, float]]:
+        """
+        查找同配置下最相似的查询
+        
+        Returns:
+            Optional[Tuple[str, float]]: (精确缓存键, 余弦相似度)，无同配置条目时返回None
+        """
+        if self.filled == 0 or self.vectors.shape[1] != embedding.shape[0]:
+            return None
+        
+        slots = [slot for slot in range(self.filled) if self.tags[slot] == tag]
+        if not slots:
+            return None
+        
+        similarities = self.vectors[slots] @ embedding
+        best = int(np.argmax(similarities))
+        return self.keys[slots[best]], float(similarities[best])
+    
+    def remove(self, key: str):
+        """删除指定缓存键的条目（结果已过期或被淘汰）"""
+        if key in self.keys:
+            self.tags[self.keys.index(key)] = None
+
 
 class QueryCacheService:
     """查询缓存服务"""
     
-    def __init__(self, maxsize: int = 1000, ttl: int = 3600):
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: int = 3600,
+        semantic_threshold: float = 0.95,
+        semantic_max_per_novel: int = 256,
+        l2: Optional[SQLiteCacheStore] = None,
+        versions: Optional[IndexVersionRegistry] = None
+    ):
         """
         初始化缓存服务
         
         Args:
             maxsize: 最大缓存条目数
             ttl: 缓存过期时间（秒），默认 1 小时
+            semantic_threshold: 语义命中的余弦相似度阈值
+            semantic_max_per_novel: 每本小说保留的最近查询向量数
+            l2: 跨进程持久化的二级缓存（None表示只使用进程内缓存）
+            versions: 小说索引版本号（None表示版本号恒为0）
         """
         self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.l2 = l2
+        self.versions = versions
+        # cachetools 的缓存与命中计数不是线程安全的（检索线程池并发访问），只在字典操作/计数时持锁
+        self._lock = threading.Lock()
         self.hit_count = 0
+        self.l2_hit_count = 0
+        self.semantic_hit_count = 0
         self.miss_count = 0
-        logger.info(f"✅ 查询缓存服务初始化 (maxsize={maxsize}, ttl={ttl}s)")
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_per_novel = semantic_max_per_novel
+        self._semantic_indexes: Dict[int, SemanticCacheIndex] = {}
+        self._semantic_lock = threading.Lock()
+        logger.info(
+            f"✅ 查询缓存服务初始化 (maxsize={maxsize}, ttl={ttl}s, "
+            f"语义阈值={semantic_threshold}, 每本小说{semantic_max_per_novel}条)"
+        )
+    
+    def get_index_version(self, novel_id: int) -> int:
+        """
+        获取小说当前的索引版本号
+        
+        查询开始时读取一次并在写入缓存时传回，避免查询期间重新索引导致旧结果写入新版本
+        
+        Args:
+            novel_id: 小说ID
+        
+        Returns:
+            int: 版本号
+        """
+        return self.versions.get(novel_id) if self.versions is not None else 0
     
     def _generate_key(
         self, 
@@ -34,7 +157,8 @@ class QueryCacheService:
         query: str, 
         model: str,
         enable_query_rewrite: bool = True,
-        enable_query_decomposition: bool = True
+        enable_query_decomposition: bool = True,
+        index_version: Optional[int] = None
     ) -> str:
         """
         生成缓存键
@@ -45,21 +169,48 @@ class QueryCacheService:
             model: 模型名称
             enable_query_rewrite: 是否启用查询改写
             enable_query_decomposition: 是否启用查询分解
+            index_version: 索引版本号（None表示当前版本）
         
         Returns:
             str: 缓存键（哈希值）
         """
-        # 将配置参数也包含在key中，确保不同配置不会使用相同缓存
-        key_string = f"{novel_id}:{query}:{model}:{enable_query_rewrite}:{enable_query_decomposition}"
+        if index_version is None:
+            index_version = self.get_index_version(novel_id)
+        # 将配置参数和索引版本号也包含在key中，确保不同配置/不同版本的索引不会使用相同缓存
+        key_string = f"{novel_id}:v{index_version}:f{CACHE_FORMAT_VERSION}:{query}:{model}:{enable_query_rewrite}:{enable_query_decomposition}"
         return hashlib.md5(key_string.encode('utf-8')).hexdigest()
     
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        按缓存键读取条目：先L1，未命中再读L2并回填L1
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            Optional[Dict]: 缓存条目 {'key', 'result', 'cached_at'}
+        """
+        with self._lock:
+            entry = self.cache.get(key)
+        if entry is not None or self.l2 is None:
+            return entry
+        
+        # 读取L2时不持锁
+        entry = self.l2.get(key)
+        if entry is not None:
+            with self._lock:
+                self.l2_hit_count += 1
+                self.cache[key] = entry
+        return entry
+    
     def get(
         self, 
         novel_id: int, 
         query: str, 
         model: str,
         enable_query_rewrite: bool = True,
-        enable_query_decomposition: bool = True
+        enable_query_decomposition: bool = True,
+        index_version: Optional[int] = None
     ) -> Optional[Dict[str, Any]]:
         """
         获取缓存结果
@@ -70,23 +221,86 @@ class QueryCacheService:
             model: 模型名称
             enable_query_rewrite: 是否启用查询改写
             enable_query_decomposition: 是否启用查询分解
+            index_version: 索引版本号（None表示当前版本）
         
         Returns:
             Optional[Dict]: 缓存的结果，如果不存在返回 None
         """
-        key = self._generate_key(novel_id, query, model, enable_query_rewrite, enable_query_decomposition)
+        key = self._generate_key(
+            novel_id, query, model, enable_query_rewrite, enable_query_decomposition, index_version
+        )
+        entry = self._get_entry(key)
         
-        if key in self.cache:
-            self.hit_count += 1
+        if entry is not None:
+            with self._lock:
+                self.hit_count += 1
             logger.info(f"🎯 缓存命中 (命中率: {self.get_hit_rate():.1%})")
             logger.debug(f"🔧 [DEBUG] 缓存key参数: rewrite={enable_query_rewrite}, decomposition={enable_query_decomposition}")
-            return self.cache[key]
+            return entry
         else:
-            self.miss_count += 1
+            with self._lock:
+                self.miss_count += 1
             logger.debug(f"⚪ 缓存未命中")
             logger.debug(f"🔧 [DEBUG] 缓存key参数: rewrite={enable_query_rewrite}, decomposition={enable_query_decomposition}")
             return None
     
+    def get_semantic(
+        self,
+        novel_id: int,
+        query_embedding: List[float],
+        model: str,
+        enable_query_rewrite: bool = True,
+        enable_query_decomposition: bool = True,
+        index_version: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        语义缓存查询（在 get() 精确未命中之后调用）
+        
+        Args:
+            novel_id: 小说ID
+            query_embedding: 原始查询的向量
+            model: 模型名称
+            enable_query_rewrite: 是否启用查询改写
+            enable_query_decomposition: 是否启用查询分解
+            index_version: 索引版本号（None表示当前版本）
+        
+        Returns:
+            Optional[Dict]: 相似查询的缓存结果，如果不存在返回 None
+        """
+        if index_version is None:
+            index_version = self.get_index_version(novel_id)
+        embedding = self._normalize(query_embedding)
+        tag = (model, enable_query_rewrite, enable_query_decomposition, index_version)
+        
+        while True:
+            with self._semantic_lock:
+                index = self._semantic_indexes.get(novel_id)
+                match = index.search(embedding, tag) if index is not None else None
+            if match is None:
+                return None
+            
+            key, similarity = match
+            if similarity < self.semantic_threshold:
+                logger.debug(f"⚪ 语义缓存未命中 (最高相似度 {similarity:.3f} < {self.semantic_threshold})")
+                return None
+            
+            # 读取结果（可能读取L2）时不持有语义索引锁
+            entry = self._get_entry(key)
+            if entry is not None:
+                break
+            
+            # 最相似的条目已过期或被淘汰：移除后继续尝试次相似的条目
+            with self._semantic_lock:
+                index.remove(key)
+        
+        with self._lock:
+            # 精确未命中已计入miss，语义命中后改记为语义命中
+            self.semantic_hit_count += 1
+            self.miss_count -= 1
+        
+        logger.info(f"🎯 语义缓存命中 (相似度 {similarity:.3f}，语义命中率: {self.get_semantic_hit_rate():.1%})")
+        return entry
+    
     def set(
         self, 
         novel_id: int, 
@@ -94,7 +308,9 @@ class QueryCacheService:
         model: str, 
         result: Dict[str, Any],
         enable_query_rewrite: bool = True,
-        enable_query_decomposition: bool = True
+        enable_query_decomposition: bool = True,
+        query_embedding: Optional[List[float]] = None,
+        index_version: Optional[int] = None
     ):
         """
         设置缓存
@@ -103,47 +319,125 @@ class QueryCacheService:
             novel_id: 小说ID
             query: 查询文本
             model: 模型名称
-            result: 查询结果
+            result: 查询结果（需可JSON序列化，L2只存JSON数据）
             enable_query_rewrite: 是否启用查询改写
             enable_query_decomposition: 是否启用查询分解
+            query_embedding: 原始查询的向量（提供时同时写入语义缓存）
+            index_version: 检索时的索引版本号（None表示当前版本）
         """
-        key = self._generate_key(novel_id, query, model, enable_query_rewrite, enable_query_decomposition)
-        self.cache[key] = {
+        if index_version is None:
+            index_version = self.get_index_version(novel_id)
+        key = self._generate_key(
+            novel_id, query, model, enable_query_rewrite, enable_query_decomposition, index_version
+        )
+        entry = {
+            'key': key,
             'result': result,
             'cached_at': time.time()
         }
-        logger.debug(f"💾 结果已缓存 (当前缓存数: {len(self.cache)})")
+        with self._lock:
+            self.cache[key] = entry
+        if self.l2 is not None:
+            self.l2.set(key, entry, novel_id=novel_id)
+        
+        if query_embedding is not None:
+            tag = (model, enable_query_rewrite, enable_query_decomposition, index_version)
+            with self._semantic_lock:
+                index = self._semantic_indexes.get(novel_id)
+                if index is None:
+                    index = SemanticCacheIndex(self.semantic_max_per_novel)
+                    self._semantic_indexes[novel_id] = index
+                index.add(self._normalize(query_embedding), key, tag)
+        
+        with self._lock:
+            size = len(self.cache)
+        logger.debug(f"💾 结果已缓存 (当前缓存数: {size})")
+    
+    def discard(self, key: Optional[str]):
+        """
+        删除单个缓存条目（L1与L2），用于无法还原为查询结果的损坏条目
+        
+        Args:
+            key: 缓存键（即条目的 'key'）
+        """
+        if key is None:
+            return
+        with self._lock:
+            self.cache.pop(key, None)
+        if self.l2 is not None:
+            self.l2.delete(key)
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """归一化查询向量（内积即余弦相似度）"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
     
     def clear(self):
         """清空所有缓存"""
-        self.cache.clear()
-        self.hit_count = 0
-        self.miss_count = 0
+        with self._lock:
+            self.cache.clear()
+            self.hit_count = 0
+            self.l2_hit_count = 0
+            self.semantic_hit_count = 0
+            self.miss_count = 0
+        if self.l2 is not None:
+            self.l2.clear()
+        with self._semantic_lock:
+            self._semantic_indexes.clear()
         logger.info("🗑️ 缓存已清空")
     
     def clear_novel(self, novel_id: int):
         """
-        清空指定小说的缓存
+        使指定小说的缓存失效（递增索引版本号，旧条目随TTL/LRU自然淘汰）
         
         Args:
             novel_id: 小说ID
         """
-        # 由于我们使用哈希键，无法直接按 novel_id 过滤
-        # 简单实现：清空所有缓存（实际使用中可以改进为带前缀的键）
-        logger.warning(f"⚠️ 清空所有缓存（包含 novel_id={novel_id}）")
-        self.clear()
+        with self._semantic_lock:
+            self._semantic_indexes.pop(novel_id, None)
+        if self.versions is not None:
+            self.versions.bump(novel_id)
+        else:
+            # 没有版本号时无法按 novel_id 过滤哈希键，只能整体清空
+            logger.warning(f"⚠️ 清空所有缓存（包含 novel_id={novel_id}）")
+            self.clear()
+    
+    def _rate(self, *counters: str) -> float:
+        """指定计数之和占查询缓存总次数的比例"""
+        with self._lock:
+            total = self.hit_count + self.semantic_hit_count + self.miss_count
+            if total == 0:
+                return 0.0
+            return sum(getattr(self, counter) for counter in counters) / total
     
     def get_hit_rate(self) -> float:
         """
-        获取缓存命中率
+        获取缓存命中率（精确 + 语义）
         
         Returns:
             float: 命中率 (0.0-1.0)
         """
-        total = self.hit_count + self.miss_count
-        if total == 0:
-            return 0.0
-        return self.hit_count / total
+        return self._rate('hit_count', 'semantic_hit_count')
+    
+    def get_exact_hit_rate(self) -> float:
+        """
+        获取精确命中率
+        
+        Returns:
+            float: 命中率 (0.0-1.0)
+        """
+        return self._rate('hit_count')
+    
+    def get_semantic_hit_rate(self) -> float:
+        """
+        获取语义命中率
+        
+        Returns:
+            float: 命中率 (0.0-1.0)
+        """
+        return self._rate('semantic_hit_count')
     
     def get_stats(self) -> Dict[str, Any]:
         """
@@ -152,12 +446,28 @@ class QueryCacheService:
         Returns:
             Dict: 统计信息
         """
+        with self._semantic_lock:
+            semantic_size = sum(index.filled for index in self._semantic_indexes.values())
+        
+        with self._lock:
+            counts = {
+                'size': len(self.cache),
+                'maxsize': self.cache.maxsize,
+                'hit_count': self.hit_count + self.semantic_hit_count,
+                'exact_hit_count': self.hit_count,
+                'l2_hit_count': self.l2_hit_count,
+                'semantic_hit_count': self.semantic_hit_count,
+                'miss_count': self.miss_count
+            }
+        
         return {
-            'size': len(self.cache),
-            'maxsize': self.cache.maxsize,
-            'hit_count': self.hit_count,
-            'miss_count': self.miss_count,
-            'hit_rate': self.get_hit_rate()
+            **counts,
+            'hit_rate': self.get_hit_rate(),
+            'exact_hit_rate': self.get_exact_hit_rate(),
+            'semantic_hit_rate': self.get_semantic_hit_rate(),
+            'semantic_size': semantic_size,
+            'semantic_threshold': self.semantic_threshold,
+            'l2': self.l2.get_stats() if self.l2 is not None else None
         }
 
 
@@ -169,6 +479,20 @@ def get_query_cache() -> QueryCacheService:
     """获取全局查询缓存实例（单例）"""
     global _query_cache
     if _query_cache is None:
-        _query_cache = QueryCacheService()
+        l2 = None
+        if settings.query_cache_l2_enabled:
+            l2 = SQLiteCacheStore(
+                settings.query_cache_l2_path,
+                ttl=settings.query_cache_l2_ttl,
+                max_bytes=settings.query_cache_l2_max_mb * 1024 * 1024
+            )
+        from app.services.index_versions import get_index_versions
+        _query_cache = QueryCacheService(
+            ttl=settings.query_cache_ttl,
+            semantic_threshold=settings.semantic_cache_threshold,
+            semantic_max_per_novel=settings.semantic_cache_max_per_novel,
+            l2=l2,
+            versions=get_index_versions()
+        )
     return _query_cache
 
@@ -0,0 +1,227 @@
+"""
+查询缓存二级存储（L2）
+
+同一节点上的所有uvicorn worker共享一个SQLite数据库文件（WAL模式，读写互不阻塞），
+进程重启或部署后缓存仍然有效。
+
+- 值序列化: JSON + zlib 压缩（缓存结果包含Prompt与Rerank片段，压缩后通常只有原来的1/4左右）；
+  只存JSON数据，不存对象，代码升级后旧记录不会因类定义变化而无法读取
+- 过期: 每条记录保存 expires_at，读取时忽略过期记录，写入时定期清理
+- 容量: 所有值的压缩后总字节数超过上限时，按最近访问时间淘汰到上限的90%
+
+L2出错（数据库被锁、磁盘问题、记录无法解码）时只记录警告并按未命中处理，不影响查询；无法解码的记录直接删除
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每写入多少次执行一次过期清理与容量检查
+EVICT_EVERY_WRITES = 32
+
+# 命中时更新最近访问时间的最小间隔（秒），避免每次读取都产生写入
+TOUCH_INTERVAL = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_cache (
+    key TEXT PRIMARY KEY,
+    novel_id INTEGER,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_query_cache_expires ON query_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_query_cache_accessed ON query_cache(accessed_at);
+CREATE INDEX IF NOT EXISTS idx_query_cache_novel ON query_cache(novel_id);
+"""
+
+
+class SQLiteCacheStore:
+    """基于SQLite（WAL）的跨进程持久化缓存"""
+    
+    def __init__(self, path: str, ttl: int = 86400, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            path: 数据库文件路径
+            ttl: 记录过期时间（秒）
+            max_bytes: 所有值压缩后的总字节数上限
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._write_count = 0
+        self._write_lock = threading.Lock()
+        
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        logger.info(f"✅ 查询缓存L2初始化: {self.path} (ttl={ttl}s, 上限={max_bytes // (1024 * 1024)}MB)")
+    
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（sqlite3连接不能跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _dumps(value: Any) -> bytes:
+        return zlib.compress(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+    
+    @staticmethod
+    def _loads(blob: bytes) -> Any:
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+    
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存
+        
+        Args:
+            key: 缓存键
+        
+        Returns:
+            Optional[Any]: 缓存值，不存在或已过期返回 None
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, accessed_at FROM query_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            value, accessed_at = row
+            if now - accessed_at > TOUCH_INTERVAL:
+                conn.execute("UPDATE query_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2读取失败: {e}")
+            return None
+        
+        try:
+            return self._loads(value)
+        except Exception as e:
+            logger.warning(f"⚠️ 查询缓存L2记录无法解码，已删除: {e}")
+            self.delete(key)
+            return None
+    
+    def set(self, key: str, value: Any, novel_id: Optional[int] = None):
+        """
+        写入缓存（覆盖同键记录）
+        
+        Args:
+            key: 缓存键
+            value: 缓存值（需可JSON序列化）
+            novel_id: 所属小说ID（用于按小说删除）
+        """
+        try:
+            blob = self._dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ 查询缓存L2写入失败（值无法JSON序列化）: {e}")
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache "
+                "(key, novel_id, value, size, created_at, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, novel_id, blob, len(blob), now, now + self.ttl, now)
+            )
+            
+            with self._write_lock:
+                self._write_count += 1
+                should_evict = self._write_count % EVICT_EVERY_WRITES == 0
+            if should_evict:
+                self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2写入失败: {e}")
+    
+    def _evict(self, conn: sqlite3.Connection):
+        """删除过期记录，总大小超过上限时按最近访问时间淘汰到上限的90%"""
+        expired = conn.execute("DELETE FROM query_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM query_cache").fetchone()[0]
+        evicted = 0
+        if total > self.max_bytes:
+            target = int(self.max_bytes * 0.9)
+            rows = conn.execute("SELECT key, size FROM query_cache ORDER BY accessed_at").fetchall()
+            victims = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                victims.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM query_cache WHERE key = ?", victims)
+            evicted = len(victims)
+        
+        if expired or evicted:
+            logger.info(f"🗑️ 查询缓存L2清理: 过期 {expired} 条，容量淘汰 {evicted} 条")
+    
+    def delete(self, key: str):
+        """
+        删除单条记录
+        
+        Args:
+            key: 缓存键
+        """
+        try:
+            self._connect().execute("DELETE FROM query_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2删除失败: {e}")
+    
+    def delete_novel(self, novel_id: int) -> int:
+        """
+        删除指定小说的所有记录
+        
+        Returns:
+            int: 删除条数
+        """
+        try:
+            return self._connect().execute("DELETE FROM query_cache WHERE novel_id = ?", (novel_id,)).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2删除失败: {e}")
+            return 0
+    
+    def clear(self):
+        """清空所有记录"""
+        try:
+            self._connect().execute("DELETE FROM query_cache")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2清空失败: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取统计信息
+        
+        Returns:
+            Dict: 记录数、压缩后总字节数、容量上限
+        """
+        try:
+            entries, total = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM query_cache WHERE expires_at > ?",
+                (time.time(),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 查询缓存L2统计失败: {e}")
+            entries, total = 0, 0
+        return {
+            'path': str(self.path),
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes
+        }
@@ -10,6 +10,7 @@ import re
 from typing import List, Optional, Dict, Tuple
 from app.services.zhipu_client import ZhipuAIClient
 from app.core.trace_logger import get_trace_logger
+from app.services.query_plan_cache import get_query_plan_cache
 
 logger = logging.getLogger(__name__)
 trace_logger = get_trace_logger()
@@ -139,26 +140,17 @@ class QueryDecomposer:
         
         logger.info(f"🔨 查询需要分解: {reason}")
         
-        # 构建LLM Prompt
-        prompt = self._build_decomposition_prompt(query)
-        
         try:
-            # 调用LLM
-            response = self.zhipu_client.chat_completion(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model,
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            content = response["content"].strip()
-            logger.debug(f"LLM分解结果: {content}")
-            
-            # 解析JSON结果
-            sub_queries = self._parse_subqueries(content)
-            
-            # 验证和清理
-            sub_queries = self._validate_subqueries(sub_queries, query)
+            # LLM的分解结果（包括"无需分解"的判断）跨答案模型复用
+            plan_cache = get_query_plan_cache()
+            sub_queries = None
+            if plan_cache is not None:
+                sub_queries = plan_cache.get("decompose", self.model, query, self.max_subqueries)
+            if sub_queries is None:
+                sub_queries = self._llm_decompose(query)
+                if plan_cache is not None:
+                    plan_cache.set("decompose", self.model, query, tuple(sub_queries), self.max_subqueries)
+            sub_queries = list(sub_queries)
             
             if len(sub_queries) > 1:
                 logger.info(f"✅ 查询分解成功: {len(sub_queries)}个子查询")
@@ -209,6 +201,31 @@ class QueryDecomposer:
                 )
             return []
     
+    def _llm_decompose(self, query: str) -> List[str]:
+        """
+        调用LLM分解查询并清理结果
+        
+        Args:
+            query: 原始查询
+        
+        Returns:
+            List[str]: 清理后的子查询列表（LLM判断无需分解时为空列表）
+        """
+        prompt = self._build_decomposition_prompt(query)
+        response = self.zhipu_client.chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            model=self.model,
+            temperature=0.3,
+            max_tokens=500
+        )
+        
+        content = response["content"].strip()
+        logger.debug(f"LLM分解结果: {content}")
+        
+        # 解析JSON结果并验证清理
+        sub_queries = self._parse_subqueries(content)
+        return self._validate_subqueries(sub_queries, query)
+    
     def _build_decomposition_prompt(self, query: str) -> str:
         """构建查询分解的Prompt"""
         prompt = f"""你是查询分解专家。请将复杂查询拆分为多个独立的子查询。
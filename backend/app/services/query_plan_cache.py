@@ -0,0 +1,121 @@
+"""
+查询规划阶段缓存
+
+缓存查询改写、查询分解的LLM输出，与答案缓存（query_cache.py）相互独立：
+- 键只包含 阶段 + 规划模型 + 规范化查询（+ 影响输出的参数），不包含答案模型、Self-RAG等生成配置
+- 切换答案模型、开关Self-RAG、索引版本变化时，不再重复支付改写/分解的LLM往返延迟
+- 只缓存LLM成功返回的结果（包括"无需改写/无需分解"的判断），调用失败不缓存
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.core.config import settings
+from app.services.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class QueryPlanCache:
+    """查询改写/分解结果的进程内缓存（独立TTL与LRU淘汰）"""
+    
+    def __init__(self, maxsize: int = 4096, ttl: int = 86400):
+        """
+        Args:
+            maxsize: 最大缓存条目数
+            ttl: 过期时间（秒）
+        """
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hit_count = 0
+        self.miss_count = 0
+        
+        logger.info(f"✅ 查询规划缓存初始化: maxsize={maxsize}, ttl={ttl}s")
+    
+    @staticmethod
+    def _key(stage: str, model: str, query: str, extra: Tuple[Hashable, ...]) -> Tuple:
+        """缓存键：阶段 + 模型 + 规范化查询（空白差异不影响命中）+ 附加参数"""
+        return (stage, model, " ".join(normalize_text(query).split()), extra)
+    
+    def get(self, stage: str, model: str, query: str, *extra: Hashable) -> Optional[Any]:
+        """
+        获取缓存的阶段输出
+        
+        Args:
+            stage: 阶段名称（rewrite / decompose）
+            model: 该阶段使用的LLM模型
+            query: 查询文本
+            *extra: 其他影响输出的参数（如查询类型、最大子查询数）
+        
+        Returns:
+            Optional[Any]: 缓存的输出，不存在返回 None
+        """
+        key = self._key(stage, model, query, extra)
+        with self._lock:
+            value = self.cache.get(key)
+            if value is None:
+                self.miss_count += 1
+                return None
+            self.hit_count += 1
+        logger.info(f"♻️ 查询规划缓存命中 [{stage}]: {query[:50]}")
+        return value
+    
+    def set(self, stage: str, model: str, query: str, value: Any, *extra: Hashable):
+        """
+        写入阶段输出
+        
+        Args:
+            stage: 阶段名称（rewrite / decompose）
+            model: 该阶段使用的LLM模型
+            query: 查询文本
+            value: 阶段输出（不可为None）
+            *extra: 其他影响输出的参数
+        """
+        key = self._key(stage, model, query, extra)
+        with self._lock:
+            self.cache[key] = value
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self.cache.clear()
+            self.hit_count = 0
+            self.miss_count = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+        
+        Returns:
+            Dict: 缓存数量、命中统计
+        """
+        with self._lock:
+            total = self.hit_count + self.miss_count
+            return {
+                'size': len(self.cache),
+                'maxsize': self.cache.maxsize,
+                'ttl': self.cache.ttl,
+                'hit_count': self.hit_count,
+                'miss_count': self.miss_count,
+                'hit_rate': self.hit_count / total if total > 0 else 0.0
+            }
+
+
+# 全局查询规划缓存实例
+_query_plan_cache: Optional[QueryPlanCache] = None
+
+
+def get_query_plan_cache() -> Optional[QueryPlanCache]:
+    """获取全局查询规划缓存实例（单例，未启用时返回None）"""
+    global _query_plan_cache
+    if not settings.query_plan_cache_enabled:
+        return None
+    if _query_plan_cache is None:
+        _query_plan_cache = QueryPlanCache(
+            maxsize=settings.query_plan_cache_maxsize,
+            ttl=settings.query_plan_cache_ttl
+        )
+    return _query_plan_cache
@@ -11,6 +11,7 @@ import logging
 from typing import Optional, Dict
 from app.services.zhipu_client import get_zhipu_client
 from app.services.query_router import QueryType, query_router
+from app.services.query_plan_cache import get_query_plan_cache
 from app.core.trace_logger import get_trace_logger
 
 logger = logging.getLogger(__name__)
@@ -78,8 +79,15 @@ class QueryRewriter:
         result["query_type"] = query_type.value
         
         try:
-            # 根据查询类型选择改写策略
-            rewritten = self._rewrite_by_type(original_query, query_type)
+            # 根据查询类型选择改写策略（相同查询的改写结果跨答案模型复用）
+            plan_cache = get_query_plan_cache()
+            rewritten = None
+            if plan_cache is not None:
+                rewritten = plan_cache.get("rewrite", self.rewrite_model, original_query, query_type.value)
+            if rewritten is None:
+                rewritten = self._rewrite_by_type(original_query, query_type)
+                if plan_cache is not None:
+                    plan_cache.set("rewrite", self.rewrite_model, original_query, rewritten, query_type.value)
             
             # 如果改写成功且与原查询不同
             if rewritten and rewritten.strip() != original_query.strip():
@@ -211,7 +219,7 @@ class QueryRewriter:
         
         except Exception as e:
             logger.error(f"❌ 对话类查询改写失败: {e}")
-            return query
+            raise  # 由 rewrite_query 降级为原始查询（失败结果不写入缓存）
     
     def _rewrite_analysis_query(self, query: str) -> str:
         """
@@ -260,7 +268,7 @@ class QueryRewriter:
         
         except Exception as e:
             logger.error(f"❌ 分析类查询改写失败: {e}")
-            return query
+            raise  # 由 rewrite_query 降级为原始查询（失败结果不写入缓存）
     
     def _rewrite_fact_query(self, query: str) -> str:
         """
@@ -308,7 +316,7 @@ class QueryRewriter:
         
         except Exception as e:
             logger.error(f"❌ 事实类查询改写失败: {e}")
-            return query
+            raise  # 由 rewrite_query 降级为原始查询（失败结果不写入缓存）
 
 
 # 全局查询改写器实例
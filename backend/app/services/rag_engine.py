@@ -4,9 +4,15 @@ RAG引擎 - 检索增强生成
 """
 
 import logging
+import heapq
 import math
 import re
-from typing import List, Dict, Optional, Tuple
+import time
+from contextlib import aclosing
+from dataclasses import dataclass, field, replace
+from itertools import islice
+from typing import AsyncGenerator, Callable, List, Dict, Optional, Tuple, Union
+import numpy as np
 from sqlalchemy.orm import Session
 
 from app.services.embedding_service import get_embedding_service
@@ -21,11 +27,82 @@ from app.models.database import Novel, Chapter
 from app.models.schemas import Citation, Confidence
 from app.core.trace_logger import get_trace_logger
 from app.core.config import settings
+from app.core.executors import run_blocking, submit_blocking
+from app.core.single_flight import get_single_flight
+from app.services.chunk_ids import chunk_id_of
+from app.services.chunk_features import get_chunk_features
+from app.services.chunk_store import resolve_documents
+from app.services.rerank_kernel import (
+    EntityMatcher, chapter_numbers, recency_biases, score_candidates, score_unified
+)
 
 logger = logging.getLogger(__name__)
 trace_logger = get_trace_logger()
 
 
+@dataclass
+class RAGQueryResult:
+    """
+    RAG查询结果
+    
+    除答案与引用外，还包含生成答案时实际使用的中间产物（Prompt、Rerank结果、检索数量、
+    LLM返回的Token用量），API层据此计算Token统计与置信度，无需再次检索
+    """
+    answer: str
+    citations: List[Citation]
+    stats: Dict
+    rewritten_query: Optional[str] = None
+    prompt: str = ""
+    reranked_chunks: List[Dict] = field(default_factory=list)
+    retrieved_count: int = 0
+    usage: Optional[Dict] = None  # LLM提供商返回的token用量（prompt_tokens/completion_tokens/total_tokens）
+    from_cache: bool = False
+
+
+@dataclass
+class PreparedQuery:
+    """
+    检索阶段产物（生成答案之前）
+    
+    同步与异步查询共用检索流程，仅答案生成方式不同
+    """
+    novel_id: int
+    query: str
+    model: str
+    prompt: str
+    reranked_chunks: List[Dict]
+    retrieved_count: int
+    stats: Dict
+    rewritten_query: Optional[str] = None
+    enable_query_rewrite: bool = True
+    enable_query_decomposition: bool = True
+    query_embedding: Optional[List[float]] = None  # 原始查询向量（写入语义缓存）
+    index_version: Optional[int] = None  # 查询开始时的索引版本号（写入缓存时使用）
+
+
+@dataclass
+class RerankContext:
+    """
+    Rerank所需的查询侧上下文
+    
+    与候选文档无关，可与向量/BM25检索并发准备
+    """
+    query_entities: List[str]
+    query_type: QueryType
+    total_chapters: int = 0
+    graph: Optional[object] = None
+    graph_features: Dict = field(default_factory=dict)
+
+
+@dataclass
+class RetrievalStage:
+    """检索阶段各分支的结果与耗时（毫秒）"""
+    vector_results: Dict
+    keyword_results: List[Dict]
+    rerank_context: RerankContext
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
 class RAGEngine:
     """RAG引擎"""
     
@@ -49,10 +126,12 @@ class RAGEngine:
         from app.services.graph.graph_query import GraphQuery
         from app.services.graph.graph_analyzer import GraphAnalyzer
         from app.services.graph.graph_builder import GraphBuilder
+        from app.services.graph.graph_repository import get_graph_repository
         
         self.graph_query = GraphQuery()
         self.graph_analyzer = GraphAnalyzer()
         self.graph_builder = GraphBuilder()
+        self.graph_repository = get_graph_repository()  # 共享只读图谱缓存
         
         logger.info("✅ RAG引擎初始化完成（含查询优化、GraphRAG支持、缓存）")
     
@@ -79,6 +158,30 @@ class RAGEngine:
         
         return embedding
     
+    def query_embeddings(self, queries: List[str], query_id: Optional[int] = None) -> List[List[float]]:
+        """
+        批量查询向量化（一次Embedding请求）
+        
+        Args:
+            queries: 查询文本列表
+            query_id: 查询ID（用于日志记录）
+        
+        Returns:
+            List[List[float]]: 与 queries 一一对应的查询向量
+        """
+        embeddings = self.zhipu_client.embed_texts(queries)
+        
+        # 详细日志
+        if query_id:
+            for query, embedding in zip(queries, embeddings):
+                trace_logger.trace_embedding(
+                    query_id=query_id,
+                    query_text=query,
+                    embedding_vector=embedding
+                )
+        
+        return embeddings
+    
     def vector_search(
         self,
         novel_id: int,
@@ -89,6 +192,9 @@ class RAGEngine:
         """
         语义检索
         
+        NumPy后端配置 VECTOR_STORE_QUANTIZATION=truncate 时为两阶段检索：
+        先用前 VECTOR_STORE_TRUNCATE_DIM 维粗排，再对前 VECTOR_STORE_RESCORE_SIZE 个候选用全维度向量重排
+        
         Args:
             novel_id: 小说ID
             query_embedding: 查询向量
@@ -98,93 +204,217 @@ class RAGEngine:
         Returns:
             Dict: 检索结果
         """
+        return self.vector_search_batch(novel_id, [query_embedding], top_k=top_k, query_id=query_id)[0]
+    
+    def vector_search_batch(
+        self,
+        novel_id: int,
+        query_embeddings: List[List[float]],
+        top_k: int = None,
+        query_id: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        多查询语义检索（所有查询向量在一次向量存储请求中检索）
+        
+        Args:
+            novel_id: 小说ID
+            query_embeddings: 查询向量列表
+            top_k: 每个查询返回Top-K结果
+            query_id: 查询ID（用于日志记录）
+        
+        Returns:
+            List[Dict]: 与 query_embeddings 一一对应的检索结果（单查询Chroma格式）
+        """
         top_k = top_k or self.top_k_retrieval
         
-        from app.core.chromadb_client import get_chroma_client
-        chroma_client = get_chroma_client()
+        from app.core.vector_store import get_vector_store
+        vector_store = get_vector_store()
         
         collection_name = f"novel_{novel_id}"
         
         try:
-            results = chroma_client.query_documents(
-                collection_name=collection_name,
-                query_embeddings=[query_embedding],
+            results = vector_store.query(
+                collection_name,
+                query_embeddings=query_embeddings,
                 n_results=top_k
             )
+            return [
+                self._filter_vector_results(results, index, top_k, query_id, novel_id=novel_id)
+                for index in range(len(query_embeddings))
+            ]
             
-            original_count = len(results.get('ids', [[]])[0])
-            
-            # 🎯 相似度阈值过滤
-            ids = results.get('ids', [[]])[0]
-            documents = results.get('documents', [[]])[0]
-            metadatas = results.get('metadatas', [[]])[0]
-            distances = results.get('distances', [[]])[0]
-            
-            # 过滤低相似度结果
-            filtered_ids = []
-            filtered_documents = []
-            filtered_metadatas = []
-            filtered_distances = []
-            
-            for doc_id, content, metadata, distance in zip(ids, documents, metadatas, distances):
-                # L2距离：距离越小越相似，过滤掉距离大于阈值的结果
-                if distance <= self.min_similarity_threshold:
-                    filtered_ids.append(doc_id)
-                    filtered_documents.append(content)
-                    filtered_metadatas.append(metadata)
-                    filtered_distances.append(distance)
-            
-            # 更新结果
-            results['ids'] = [filtered_ids]
-            results['documents'] = [filtered_documents]
-            results['metadatas'] = [filtered_metadatas]
-            results['distances'] = [filtered_distances]
+        except Exception as e:
+            logger.error(f"❌ 语义检索失败: {e}")
+            return [
+                {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+                for _ in query_embeddings
+            ]
+    
+    def _filter_vector_results(
+        self,
+        results: Dict,
+        index: int,
+        top_k: int,
+        query_id: Optional[int] = None,
+        novel_id: Optional[int] = None
+    ) -> Dict:
+        """
+        取出第 index 个查询的检索结果并按相似度阈值过滤
+        
+        向量库未存储文本时，只为过滤后保留的结果从中心存储读取文本
+        
+        Args:
+            results: 向量存储返回的多查询结果
+            index: 查询序号
+            top_k: 检索Top-K（用于日志记录）
+            query_id: 查询ID（用于日志记录）
+            novel_id: 小说ID（用于读取中心存储中的文本）
+        
+        Returns:
+            Dict: 单查询的检索结果
+        """
+        original_count = len(results.get('ids', [[]])[index])
+        
+        # 🎯 相似度阈值过滤
+        ids = results.get('ids', [[]])[index]
+        documents = results.get('documents', [[]])[index]
+        metadatas = results.get('metadatas', [[]])[index]
+        distances = results.get('distances', [[]])[index]
+        
+        # 过滤低相似度结果
+        filtered_ids = []
+        filtered_documents = []
+        filtered_metadatas = []
+        filtered_distances = []
+        
+        for doc_id, content, metadata, distance in zip(ids, documents, metadatas, distances):
+            # L2距离：距离越小越相似，过滤掉距离大于阈值的结果
+            if distance <= self.min_similarity_threshold:
+                filtered_ids.append(doc_id)
+                filtered_documents.append(content)
+                filtered_metadatas.append(metadata)
+                filtered_distances.append(distance)
+        
+        filtered_documents = resolve_documents(novel_id, {
+            'documents': [filtered_documents],
+            'metadatas': [filtered_metadatas]
+        })['documents'][0]
+        
+        filtered_count = len(filtered_ids)
+        logger.info(f"✅ 语义检索完成: {original_count} 个结果 → 过滤后 {filtered_count} 个 (阈值: {self.min_similarity_threshold:.2f})")
+        
+        # 详细日志
+        if query_id:
+            # 格式化检索结果
+            formatted_results = []
+            for i, (doc_id, content, metadata, distance) in enumerate(zip(filtered_ids, filtered_documents, filtered_metadatas, filtered_distances), 1):
+                # L2距离：distance本身就是距离值（越小越相似）
+                formatted_results.append({
+                    'id': doc_id,
+                    'content': content,
+                    'metadata': metadata,
+                    'distance': distance,
+                    'l2_distance': f"{distance:.4f}"
+                })
             
-            filtered_count = len(filtered_ids)
-            logger.info(f"✅ 语义检索完成: {original_count} 个结果 → 过滤后 {filtered_count} 个 (阈值: {self.min_similarity_threshold:.2f})")
+            trace_logger.trace_retrieval(
+                query_id=query_id,
+                top_k=top_k,
+                results=formatted_results
+            )
             
-            # 详细日志
-            if query_id:
-                # 格式化检索结果
-                formatted_results = []
-                for i, (doc_id, content, metadata, distance) in enumerate(zip(filtered_ids, filtered_documents, filtered_metadatas, filtered_distances), 1):
-                    # L2距离：distance本身就是距离值（越小越相似）
-                    formatted_results.append({
-                        'id': doc_id,
-                        'content': content,
-                        'metadata': metadata,
-                        'distance': distance,
-                        'l2_distance': f"{distance:.4f}"
-                    })
-                
-                trace_logger.trace_retrieval(
+            # 如果过滤掉了结果，记录详情
+            if original_count > filtered_count:
+                trace_logger.trace_step(
                     query_id=query_id,
-                    top_k=top_k,
-                    results=formatted_results
+                    step_name="L2距离过滤",
+                    emoji="🔍",
+                    input_data=f"原始结果: {original_count} 个",
+                    output_data={
+                        "过滤后结果": filtered_count,
+                        "过滤掉": original_count - filtered_count,
+                        "L2距离阈值": self.min_similarity_threshold,
+                        "最小L2距离": f"{min(filtered_distances):.4f}" if filtered_distances else "N/A",
+                        "最大L2距离": f"{max(filtered_distances):.4f}" if filtered_distances else "N/A"
+                    },
+                    status="success"
                 )
-                
-                # 如果过滤掉了结果，记录详情
-                if original_count > filtered_count:
-                    trace_logger.trace_step(
-                        query_id=query_id,
-                        step_name="L2距离过滤",
-                        emoji="🔍",
-                        input_data=f"原始结果: {original_count} 个",
-                        output_data={
-                            "过滤后结果": filtered_count,
-                            "过滤掉": original_count - filtered_count,
-                            "L2距离阈值": self.min_similarity_threshold,
-                            "最小L2距离": f"{min(filtered_distances):.4f}" if filtered_distances else "N/A",
-                            "最大L2距离": f"{max(filtered_distances):.4f}" if filtered_distances else "N/A"
-                        },
-                        status="success"
-                    )
+        
+        return {
+            'ids': [filtered_ids],
+            'documents': [filtered_documents],
+            'metadatas': [filtered_metadatas],
+            'distances': [filtered_distances]
+        }
+    
+    def _search_novels_adaptive(
+        self,
+        novel_ids: List[int],
+        top_k: int,
+        search: Callable[[int, int], List],
+        sort_key: Callable[[object], float]
+    ) -> List[Tuple[int, object]]:
+        """
+        多小说并发检索 + k路堆合并 + 自适应每本k
+        
+        先以较小的k并发检索每本小说，按全局第top_k名确定截断值；只有"结果已取满且最差一条仍优于
+        截断值"的小说（即其未返回的结果仍可能进入全局Top-K）才加倍k重新检索，直至k达到top_k。
+        最终结果与每本小说各取top_k后全局排序完全一致。
+        
+        Args:
+            novel_ids: 小说ID列表
+            top_k: 全局返回数量
+            search: 单本检索函数 (novel_id, k) -> 按优劣排好序的结果列表
+            sort_key: 排序键（越小越好）
+        
+        Returns:
+            List[Tuple[int, object]]: 全局Top-K的 (小说ID, 结果) 列表
+        """
+        k = max(1, min(top_k, settings.multi_novel_initial_k))
+        per_novel: Dict[int, List] = {}
+        requested: Dict[int, int] = {}
+        pending = list(novel_ids)
+        rounds = 0
+        
+        while pending:
+            rounds += 1
+            futures = {
+                novel_id: submit_blocking("retrieval_branch", search, novel_id, k)
+                for novel_id in pending
+            }
+            for novel_id, future in futures.items():
+                try:
+                    per_novel[novel_id] = future.result() or []
+                except Exception as e:
+                    logger.warning(f"⚠️ 小说{novel_id}检索失败: {e}")
+                    per_novel[novel_id] = []
+                requested[novel_id] = k
             
-            return results
+            # 每本小说的结果已有序，k路堆合并取全局Top-K
+            merged = list(islice(
+                heapq.merge(
+                    *[[(novel_id, item) for item in per_novel[novel_id]] for novel_id in novel_ids],
+                    key=lambda pair: sort_key(pair[1])
+                ),
+                top_k
+            ))
             
-        except Exception as e:
-            logger.error(f"❌ 语义检索失败: {e}")
-            return {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+            if k >= top_k:
+                break
+            
+            cutoff = sort_key(merged[-1][1]) if len(merged) >= top_k else math.inf
+            pending = [
+                novel_id for novel_id in novel_ids
+                if len(per_novel[novel_id]) >= requested[novel_id]
+                and sort_key(per_novel[novel_id][-1]) < cutoff
+            ]
+            k = min(top_k, k * 2)
+            
+            if pending:
+                logger.debug(f"🔁 自适应扩展: {len(pending)} 本小说 k→{k}")
+        
+        logger.info(f"🔀 多小说合并完成: {len(novel_ids)} 本小说, {rounds} 轮检索, 合并后 {len(merged)} 个结果")
+        return merged
     
     def vector_search_multi(
         self,
@@ -195,7 +425,7 @@ class RAGEngine:
     ) -> Dict:
         """
         多小说语义检索
-        从多本小说中检索，合并结果后统一排序
+        并发检索多本小说，按距离k路堆合并（见 _search_novels_adaptive）
         
         Args:
             novel_ids: 多个小说ID列表
@@ -207,47 +437,32 @@ class RAGEngine:
             Dict: 合并后的检索结果
         """
         top_k = top_k or self.top_k_retrieval
-        per_novel_k = max(5, top_k // len(novel_ids))  # 每本小说分配的检索数量
         
-        logger.info(f"🔍 多小说检索: {len(novel_ids)} 本小说, 每本检索 {per_novel_k} 个结果")
+        logger.info(f"🔍 多小说检索: {len(novel_ids)} 本小说, 全局Top-{top_k}")
         
-        # 从每本小说检索
-        all_ids = []
-        all_documents = []
-        all_metadatas = []
-        all_distances = []
+        def search(novel_id: int, k: int) -> List[Tuple]:
+            results = self.vector_search(novel_id, query_embedding, k, query_id)
+            return list(zip(
+                results.get('ids', [[]])[0],
+                results.get('documents', [[]])[0],
+                results.get('metadatas', [[]])[0],
+                results.get('distances', [[]])[0]
+            ))
         
-        for novel_id in novel_ids:
-            results = self.vector_search(novel_id, query_embedding, per_novel_k, query_id)
-            
-            # 为每个结果添加 novel_id 标记
-            ids = results.get('ids', [[]])[0]
-            documents = results.get('documents', [[]])[0]
-            metadatas = results.get('metadatas', [[]])[0]
-            distances = results.get('distances', [[]])[0]
-            
-            for i in range(len(ids)):
-                all_ids.append(ids[i])
-                all_documents.append(documents[i])
-                # 添加来源小说ID到metadata
-                metadata = metadatas[i].copy() if i < len(metadatas) else {}
-                metadata['source_novel_id'] = novel_id
-                all_metadatas.append(metadata)
-                all_distances.append(distances[i])
-        
-        # 按距离排序（距离越小越相似）
-        sorted_indices = sorted(range(len(all_distances)), key=lambda i: all_distances[i])
-        
-        # 取top_k
-        sorted_indices = sorted_indices[:top_k]
-        
-        # 重新组织结果
-        merged_results = {
-            'ids': [[all_ids[i] for i in sorted_indices]],
-            'documents': [[all_documents[i] for i in sorted_indices]],
-            'metadatas': [[all_metadatas[i] for i in sorted_indices]],
-            'distances': [[all_distances[i] for i in sorted_indices]]
-        }
+        merged = self._search_novels_adaptive(
+            novel_ids, top_k, search,
+            sort_key=lambda item: item[3]  # 距离越小越相似
+        )
+        
+        merged_results = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        for novel_id, (doc_id, document, metadata, distance) in merged:
+            # 添加来源小说ID到metadata
+            metadata = dict(metadata or {})
+            metadata['source_novel_id'] = novel_id
+            merged_results['ids'][0].append(doc_id)
+            merged_results['documents'][0].append(document)
+            merged_results['metadatas'][0].append(metadata)
+            merged_results['distances'][0].append(distance)
         
         logger.info(f"✅ 多小说检索完成: 合并后 {len(merged_results['ids'][0])} 个结果")
         
@@ -290,6 +505,7 @@ class RAGEngine:
     ) -> List[Dict]:
         """
         多小说BM25关键词检索
+        并发检索多本小说，按分数k路堆合并（见 _search_novels_adaptive）
         
         Args:
             db: 数据库会话
@@ -300,27 +516,21 @@ class RAGEngine:
         Returns:
             List[Dict]: 合并后的检索结果
         """
-        per_novel_k = max(3, top_k // len(novel_ids))
-        all_results = []
+        def search(novel_id: int, k: int) -> List[Dict]:
+            bm25_retriever = BM25Retriever(novel_id)
+            return bm25_retriever.search(query, top_k=k)
         
-        for novel_id in novel_ids:
-            try:
-                bm25_retriever = BM25Retriever(novel_id)
-                results = bm25_retriever.search(query, top_k=per_novel_k)
-                
-                # 为每个结果添加来源小说ID
-                for result in results:
-                    if 'metadata' not in result:
-                        result['metadata'] = {}
-                    result['metadata']['source_novel_id'] = novel_id
-                    all_results.append(result)
-            except Exception as e:
-                logger.warning(f"⚠️ 小说{novel_id}的BM25检索失败: {e}")
-                continue
+        merged = self._search_novels_adaptive(
+            novel_ids, top_k, search,
+            sort_key=lambda result: -result.get('score', 0)  # 分数越高越相关
+        )
         
-        # 按分数排序并取top_k
-        all_results.sort(key=lambda x: x.get('score', 0), reverse=True)
-        all_results = all_results[:top_k]
+        all_results = []
+        for novel_id, result in merged:
+            # 为每个结果添加来源小说ID
+            result = dict(result)
+            result['metadata'] = {**result.get('metadata', {}), 'source_novel_id': novel_id}
+            all_results.append(result)
         
         logger.info(f"✅ 多小说BM25检索完成: {len(all_results)} 个结果")
         return all_results
@@ -525,40 +735,330 @@ class RAGEngine:
         Returns:
             List[Dict]: 融合后的结果列表
         """
-        # 构建文档ID到结果的映射（使用 content 作为唯一标识）
-        doc_scores = {}
-        doc_data = {}
-        
-        # 处理向量检索结果
-        for rank, result in enumerate(vector_results, 1):
-            doc_id = result.get('content', '')[:100]  # 使用前100字符作为ID
-            if doc_id not in doc_scores:
-                doc_scores[doc_id] = 0.0
-                doc_data[doc_id] = result
-            # RRF 分数: 1 / (k + rank)
-            doc_scores[doc_id] += 1.0 / (k + rank)
-        
-        # 处理 BM25 检索结果
-        for rank, result in enumerate(bm25_results, 1):
-            doc_id = result.get('content', '')[:100]
-            if doc_id not in doc_scores:
-                doc_scores[doc_id] = 0.0
-                doc_data[doc_id] = result
-            doc_scores[doc_id] += 1.0 / (k + rank)
-        
-        # 按 RRF 分数排序
-        sorted_docs = sorted(doc_scores.items(), key=lambda x: -x[1])
-        
-        # 构建融合结果
+        results = list(vector_results) + list(bm25_results)
+        if not results:
+            return []
+        
+        # 按分块整数ID聚合两路排名：RRF 分数 = Σ 1 / (k + rank)
+        ranks = np.concatenate([
+            np.arange(1, len(vector_results) + 1),
+            np.arange(1, len(bm25_results) + 1)
+        ])
+        chunk_ids = self._chunk_keys(results)
+        unique_ids, first_index, inverse = np.unique(chunk_ids, return_index=True, return_inverse=True)
+        rrf_scores = np.bincount(inverse, weights=1.0 / (k + ranks), minlength=len(unique_ids))
+        
+        # 按 RRF 分数排序（同分按首次出现顺序），保留每个分块首次出现的结果
+        order = np.lexsort((first_index, -rrf_scores))
         fused_results = []
-        for doc_id, rrf_score in sorted_docs:
-            result = doc_data[doc_id].copy()
-            result['rrf_score'] = rrf_score
-            result['score'] = rrf_score  # 覆盖原始分数
+        for group in order:
+            result = results[first_index[group]].copy()
+            result['chunk_id'] = int(unique_ids[group])
+            result['rrf_score'] = float(rrf_scores[group])
+            result['score'] = result['rrf_score']  # 覆盖原始分数
             fused_results.append(result)
         
         return fused_results
     
+    @staticmethod
+    def _chunk_keys(chunks: List[Dict]) -> np.ndarray:
+        """
+        分块的整数键（用于融合与去重）
+        
+        优先使用分块ID（见 chunk_ids）；元数据不足以确定ID的分块按完整内容分配负数键
+        
+        Returns:
+            np.ndarray: int64 键数组
+        """
+        keys = np.empty(len(chunks), dtype=np.int64)
+        fallback: Dict[str, int] = {}
+        for i, chunk in enumerate(chunks):
+            chunk_id = chunk.get('chunk_id')
+            if chunk_id is None:
+                chunk_id = chunk_id_of(chunk.get('metadata'))
+            if chunk_id is None:
+                chunk_id = fallback.setdefault(chunk.get('content', ''), -(len(fallback) + 1))
+            keys[i] = chunk_id
+        return keys
+    
+    def _get_total_chapters(self, novel_id: Optional[int], db: Optional[Session]) -> int:
+        """获取小说总章节数（用于时间衰减计算），失败返回0"""
+        if not novel_id or not db:
+            return 0
+        try:
+            novel = db.query(Novel).filter(Novel.id == novel_id).first()
+            if novel:
+                logger.debug(f"📚 小说总章节数: {novel.total_chapters}")
+                return novel.total_chapters
+        except Exception as e:
+            logger.warning(f"⚠️ 获取章节数失败: {e}")
+        return 0
+    
+    def _load_graph_features(self, novel_id: Optional[int]) -> Tuple[Optional[object], Dict]:
+        """
+        加载知识图谱及索引时预计算的章节特征表
+        
+        Returns:
+            Tuple: (图谱或None, 特征表；无图谱时为空字典)
+        """
+        if novel_id is None:
+            return None, {}
+        try:
+            graph = self.graph_repository.get_graph(novel_id)
+            
+            # 读取索引时预计算的章节特征表（每个候选O(1)查表）
+            if graph:
+                graph_features = self.graph_analyzer.get_chapter_features(graph)
+                logger.info(f"✅ GraphRAG: 加载图谱成功，章节特征表覆盖{len(graph_features['chapters'])}个章节")
+                return graph, graph_features
+        except Exception as e:
+            logger.warning(f"⚠️ GraphRAG加载失败（继续使用纯向量检索）: {e}")
+        return None, {}
+    
+    def build_rerank_context(
+        self,
+        query: str,
+        novel_id: Optional[int] = None,
+        db: Optional[Session] = None,
+        query_type: QueryType = None
+    ) -> RerankContext:
+        """
+        顺序准备Rerank上下文（实体提取、别名解析、查询分类、图谱特征、总章节数）
+        
+        Args:
+            query: 查询文本
+            novel_id: 小说ID（用于别名解析和GraphRAG）
+            db: 数据库会话
+            query_type: 查询类型（为None时自动检测）
+        
+        Returns:
+            RerankContext: Rerank上下文
+        """
+        query_entities = self._extract_entities(query)
+        logger.info(f"🎯 提取查询实体: {query_entities}")
+        
+        # 解析实体别名为规范名称
+        query_entities = self._resolve_entity_aliases(query_entities, novel_id, db)
+        if query_entities:
+            logger.info(f"✅ 别名解析后实体: {query_entities}")
+        
+        graph, graph_features = self._load_graph_features(novel_id)
+        
+        return RerankContext(
+            query_entities=query_entities,
+            query_type=query_type or query_router.classify_query(query),
+            total_chapters=self._get_total_chapters(novel_id, db),
+            graph=graph,
+            graph_features=graph_features
+        )
+    
+    def retrieve_parallel(
+        self,
+        db: Session,
+        novel_id: int,
+        query: str,
+        query_id: Optional[int] = None,
+        top_k: int = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> RetrievalStage:
+        """
+        并发执行检索阶段的各分支，在融合前汇合
+        
+        分支（在 retrieval_branch 线程池中并发执行）：
+        - vector: 查询向量化 + 向量检索
+        - bm25: BM25关键词检索
+        - ner: 查询实体提取
+        - graph: 图谱与章节特征表加载
+        
+        SQLAlchemy会话非线程安全，总章节数查询与别名解析留在调用线程执行
+        （与上述分支重叠），因此检索延迟约为最慢分支而不是各分支之和
+        
+        Args:
+            db: 数据库会话
+            novel_id: 小说ID
+            query: 检索用查询文本
+            query_id: 查询ID（用于日志记录）
+            top_k: 向量检索Top-K
+            query_embedding: 已计算的查询向量（提供时跳过向量化）
+        
+        Returns:
+            RetrievalStage: 检索结果、Rerank上下文与各分支耗时
+        """
+        stage_start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        
+        def timed(name: str, func, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        
+        def vector_branch():
+            embedding = query_embedding or self.query_embedding(query, query_id=query_id)
+            return self.vector_search(novel_id, embedding, top_k=top_k, query_id=query_id)
+        
+        futures = {
+            'vector': submit_blocking("retrieval_branch", timed, 'vector', vector_branch),
+            'bm25': submit_blocking("retrieval_branch", timed, 'bm25', self.keyword_search, db, novel_id, query),
+            'ner': submit_blocking("retrieval_branch", timed, 'ner', self._extract_entities, query),
+            'graph': submit_blocking("retrieval_branch", timed, 'graph', self._load_graph_features, novel_id),
+        }
+        
+        try:
+            # 调用线程：数据库相关步骤
+            total_chapters = timed('chapters', self._get_total_chapters, novel_id, db)
+            query_type = query_router.classify_query(query)
+            
+            query_entities = futures['ner'].result()
+            query_entities = timed('alias', self._resolve_entity_aliases, query_entities, novel_id, db)
+            logger.info(f"🎯 查询实体（别名解析后）: {query_entities}")
+            
+            graph, graph_features = futures['graph'].result()
+            keyword_results = futures['bm25'].result()
+            vector_results = futures['vector'].result()
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+        
+        timings['total'] = round((time.perf_counter() - stage_start) * 1000, 1)
+        branch_sum = sum(v for k, v in timings.items() if k != 'total')
+        logger.info(
+            f"⏱️ 检索分支耗时(ms): {timings} | 串行合计 {branch_sum:.1f}ms → 并发 {timings['total']:.1f}ms"
+        )
+        
+        if query_id:
+            trace_logger.trace_step(
+                query_id=query_id,
+                step_name="并发检索",
+                emoji="⏱️",
+                input_data={"分支": list(futures.keys())},
+                output_data={"各分支耗时(ms)": timings, "串行合计(ms)": round(branch_sum, 1)},
+                status="success"
+            )
+        
+        return RetrievalStage(
+            vector_results=vector_results,
+            keyword_results=keyword_results,
+            rerank_context=RerankContext(
+                query_entities=query_entities,
+                query_type=query_type,
+                total_chapters=total_chapters,
+                graph=graph,
+                graph_features=graph_features
+            ),
+            timings=timings
+        )
+    
+    def retrieve_parallel_batch(
+        self,
+        db: Session,
+        novel_id: int,
+        queries: List[str],
+        query_id: Optional[int] = None,
+        top_k: int = None
+    ) -> List[RetrievalStage]:
+        """
+        多个查询（查询分解的子查询）的批量检索
+        
+        与逐个调用 retrieve_parallel 相比：
+        - 所有查询在一次Embedding请求中向量化，并在一次向量存储请求中检索
+        - 图谱与章节特征表、总章节数只加载一次，所有查询共享
+        - 别名解析对所有查询实体的并集只执行一次
+        BM25检索与实体提取按查询并发执行
+        
+        Args:
+            db: 数据库会话
+            novel_id: 小说ID
+            queries: 检索用查询文本列表
+            query_id: 查询ID（用于日志记录）
+            top_k: 每个查询的向量检索Top-K
+        
+        Returns:
+            List[RetrievalStage]: 与 queries 一一对应的检索结果（Rerank上下文中的图谱等共享，耗时为整批耗时）
+        """
+        stage_start = time.perf_counter()
+        timings: Dict[str, float] = {}
+        
+        def timed(name: str, func, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        
+        def vector_branch():
+            embeddings = self.query_embeddings(queries, query_id=query_id)
+            return self.vector_search_batch(novel_id, embeddings, top_k=top_k, query_id=query_id)
+        
+        futures = {
+            'vector': submit_blocking("retrieval_branch", timed, 'vector', vector_branch),
+            'graph': submit_blocking("retrieval_branch", timed, 'graph', self._load_graph_features, novel_id),
+        }
+        bm25_futures = [
+            submit_blocking("retrieval_branch", timed, f'bm25_{i}', self.keyword_search, db, novel_id, query)
+            for i, query in enumerate(queries)
+        ]
+        ner_futures = [
+            submit_blocking("retrieval_branch", timed, f'ner_{i}', self._extract_entities, query)
+            for i, query in enumerate(queries)
+        ]
+        
+        try:
+            # 调用线程：数据库相关步骤
+            total_chapters = timed('chapters', self._get_total_chapters, novel_id, db)
+            query_types = [query_router.classify_query(query) for query in queries]
+            
+            # 别名解析：所有查询实体的并集只解析一次
+            entities_per_query = [future.result() for future in ner_futures]
+            distinct_entities = list(dict.fromkeys(
+                entity for entities in entities_per_query for entity in entities
+            ))
+            canonical_entities = timed('alias', self._resolve_entity_aliases, distinct_entities, novel_id, db)
+            alias_map = dict(zip(distinct_entities, canonical_entities))
+            entities_per_query = [
+                [alias_map.get(entity, entity) for entity in entities]
+                for entities in entities_per_query
+            ]
+            
+            graph, graph_features = futures['graph'].result()
+            keyword_results = [future.result() for future in bm25_futures]
+            vector_results = futures['vector'].result()
+        except BaseException:
+            for future in [*futures.values(), *bm25_futures, *ner_futures]:
+                future.cancel()
+            raise
+        
+        timings['total'] = round((time.perf_counter() - stage_start) * 1000, 1)
+        logger.info(f"⏱️ 批量检索({len(queries)}个查询)分支耗时(ms): {timings}")
+        
+        if query_id:
+            trace_logger.trace_step(
+                query_id=query_id,
+                step_name="批量并发检索",
+                emoji="⏱️",
+                input_data={"查询数": len(queries), "查询列表": queries},
+                output_data={"各分支耗时(ms)": timings},
+                status="success"
+            )
+        
+        return [
+            RetrievalStage(
+                vector_results=vector_results[i],
+                keyword_results=keyword_results[i],
+                rerank_context=RerankContext(
+                    query_entities=entities_per_query[i],
+                    query_type=query_types[i],
+                    total_chapters=total_chapters,
+                    graph=graph,
+                    graph_features=graph_features
+                ),
+                timings=timings
+            )
+            for i in range(len(queries))
+        ]
+    
     def rerank(
         self,
         query: str,
@@ -569,7 +1069,8 @@ class RAGEngine:
         novel_id: int = None,
         db: Session = None,
         query_id: Optional[int] = None,
-        recency_bias_weight: float = 0.15
+        recency_bias_weight: float = 0.15,
+        context: Optional[RerankContext] = None
     ) -> List[Dict]:
         """
         混合Rerank，支持查询类型特定策略 + GraphRAG增强 + 实体匹配 + RRF融合
@@ -582,64 +1083,25 @@ class RAGEngine:
             query_type: 查询类型（自动检测或手动指定）
             novel_id: 小说ID（用于GraphRAG）
             db: 数据库会话（用于GraphRAG）
+            context: 已并发准备好的Rerank上下文（见 retrieve_parallel），为None时顺序准备
         
         Returns:
             List[Dict]: Rerank后的结果
         """
         top_k = top_k or self.top_k_rerank
         
-        # 提取查询中的关键实体
-        query_entities = self._extract_entities(query)
-        logger.info(f"🎯 提取查询实体: {query_entities}")
-        
-        # 解析实体别名为规范名称
-        query_entities = self._resolve_entity_aliases(query_entities, novel_id, db)
-        if query_entities:
-            logger.info(f"✅ 别名解析后实体: {query_entities}")
+        if context is None:
+            context = self.build_rerank_context(query, novel_id, db, query_type)
         
-        # 自动检测查询类型
-        if query_type is None:
-            query_type = query_router.classify_query(query)
+        query_entities = context.query_entities
+        query_type = query_type or context.query_type
+        total_chapters = context.total_chapters
+        graph = context.graph
+        graph_features = context.graph_features
+        chapter_features = graph_features.get('chapters', {})
         
         logger.info(f"🔍 查询类型: {query_type.value}")
         
-        # 获取总章节数（用于时间衰减计算）
-        total_chapters = 0
-        if novel_id and db:
-            try:
-                novel = db.query(Novel).filter(Novel.id == novel_id).first()
-                if novel:
-                    total_chapters = novel.total_chapters
-                    logger.debug(f"📚 小说总章节数: {total_chapters}")
-            except Exception as e:
-                logger.warning(f"⚠️ 获取章节数失败: {e}")
-        
-        # GraphRAG: 加载知识图谱（如果提供了novel_id）
-        graph = None
-        chapter_importance_map = {}
-        
-        if novel_id is not None:
-            try:
-                graph = self.graph_builder.load_graph(novel_id)
-                
-                # 计算所有章节的重要性评分（缓存）
-                if graph:
-                    # 获取所有章节号
-                    chapters = set()
-                    for node in graph.nodes():
-                        first_chapter = graph.nodes[node].get('first_chapter')
-                        if first_chapter:
-                            chapters.add(first_chapter)
-                    
-                    # 计算每个章节的重要性
-                    for chapter in chapters:
-                        importance = self.graph_analyzer.compute_chapter_importance(graph, chapter)
-                        chapter_importance_map[chapter] = importance
-                    
-                    logger.info(f"✅ GraphRAG: 加载图谱成功，计算了{len(chapter_importance_map)}个章节的重要性")
-            except Exception as e:
-                logger.warning(f"⚠️ GraphRAG加载失败（继续使用纯向量检索）: {e}")
-        
         # 🔥 RRF 融合：如果有 BM25 结果，先进行融合
         if keyword_results and len(keyword_results) > 0:
             logger.info(f"🔀 执行 RRF 融合: 向量检索 {len(vector_results.get('documents', [[]])[0])} + BM25 {len(keyword_results)}")
@@ -676,133 +1138,103 @@ class RAGEngine:
             distances = vector_results.get('distances', [[]])[0]
             rrf_scores = None
         
-        # 构建候选文档
-        candidates = []
-        for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
-            # 计算 base_score
-            if rrf_scores is not None:
-                # 使用 RRF 融合分数（已经是 0-1 范围的正值）
-                base_score = rrf_scores[i]
-            else:
-                # 使用 L2 距离转换为相似度
-                distance = distances[i]
-                base_score = math.exp(-distance**2 / 2)
-            
-            # 🎯 实体匹配得分
-            entity_match_score = self._calculate_entity_match_score(doc, query_entities)
-            
-            # GraphRAG: 获取章节重要性（时序权重）
-            chapter_num = metadata.get('chapter_num')
-            chapter_importance = 0.5  # 默认中等重要性
-            
-            if chapter_num and chapter_num in chapter_importance_map:
-                chapter_importance = chapter_importance_map[chapter_num]
-            
-            # 应用查询类型特定的权重
-            if query_type == QueryType.DIALOGUE:
-                # 对话类查询：提升包含引号的内容权重 + 实体匹配
-                quote_boost = self._calculate_quote_boost(doc)
-                
-                # 动态调整：高相似度时降低quote_boost影响
-                if base_score > 0.85:
-                    quote_boost = 1.0 + (quote_boost - 1.0) * 0.5  # 减弱quote影响
-                    logger.debug(f"🔥 高相似度({base_score:.3f})：降低对话标记权重影响")
-                
-                # 应用时间衰减
-                recency_bias = self._calculate_recency_bias(
-                    chapter_num, total_chapters, recency_bias_weight
-                )
-                
-                final_score = base_score * quote_boost * entity_match_score * recency_bias
-            elif query_type == QueryType.ANALYSIS:
-                # 分析类查询：提升重要章节权重（使用图谱章节重要性）+ 实体匹配
-                importance_boost = chapter_importance + 0.5
-                
-                # 动态调整：低相似度时增强章节重要性影响
-                if base_score < 0.60:
-                    importance_boost = importance_boost * 1.3  # 增强30%
-                    logger.debug(f"⚠️ 低相似度({base_score:.3f})：增强章节重要性权重")
-                
-                # 应用时间衰减
-                recency_bias = self._calculate_recency_bias(
-                    chapter_num, total_chapters, recency_bias_weight
-                )
-                
-                final_score = base_score * importance_boost * entity_match_score * recency_bias
-            else:
-                # 事实类查询 - 动态权重调整
-                # 基础权重配比
-                w_semantic = 0.50
-                w_temporal = 0.10
-                w_entity = 0.40
-                
-                # 🚀 动态调整策略
-                if base_score > 0.85:
-                    # 高相似度（>0.85）：显著增强语义权重
-                    w_semantic = 0.60  # +0.10
-                    w_entity = 0.30    # -0.10
-                    logger.debug(f"🔥 高相似度检测({base_score:.3f})：增强语义权重")
-                
-                elif base_score < 0.50:
-                    # 低相似度（<0.50）：大幅增强实体匹配权重
-                    w_semantic = 0.30  # -0.20
-                    w_entity = 0.60    # +0.20
-                    logger.debug(f"⚠️ 低相似度检测({base_score:.3f})：增强实体权重")
-                
-                # 实体匹配情况动态调整
-                if entity_match_score > 1.3:
-                    # 实体匹配优秀：进一步提升实体权重
-                    w_entity = min(w_entity + 0.10, 0.70)  # 最高不超过70%
-                    w_semantic = max(w_semantic - 0.10, 0.20)
-                    logger.debug(f"✨ 实体匹配优秀({entity_match_score:.2f})：进一步提升实体权重")
-                
-                elif entity_match_score < 0.5:
-                    # 实体匹配差：降低实体权重，提升语义权重
-                    w_entity = max(w_entity - 0.15, 0.15)
-                    w_semantic = min(w_semantic + 0.15, 0.75)
-                    logger.debug(f"🔻 实体匹配不佳({entity_match_score:.2f})：降低实体权重")
-                
-                # 计算最终得分（确保权重和为1.0）
-                total_weight = w_semantic + w_temporal + w_entity
-                semantic_weight = (base_score * w_semantic) / total_weight
-                temporal_weight = (chapter_importance * w_temporal) / total_weight
-                entity_weight = (entity_match_score * w_entity) / total_weight
-                
-                final_score = semantic_weight + temporal_weight + entity_weight
-                
-                # 应用时间衰减
-                recency_bias = self._calculate_recency_bias(
-                    chapter_num, total_chapters, recency_bias_weight
+        # 候选特征列（向量化打分，见 rerank_kernel）
+        documents = list(documents)
+        metadatas = list(metadatas)
+        if rrf_scores is not None:
+            # 使用 RRF 融合分数（已经是 0-1 范围的正值）
+            base_scores = np.asarray(rrf_scores, dtype=np.float64)
+        else:
+            # 使用 L2 距离转换为相似度
+            base_scores = np.fromiter(
+                (math.exp(-distance**2 / 2) for distance in distances),
+                dtype=np.float64,
+                count=len(documents)
+            )
+        
+        chapter_nums = chapter_numbers(metadatas)
+        
+        # 索引时预计算的分块特征（引号加成、章节位置、Token数、出现的实体），未构建时现算
+        # 多小说检索的候选只有来自 novel_id 的分块使用其特征，其余现算
+        chunk_features = get_chunk_features(novel_id)
+        feature_rows = chunk_features.lookup(metadatas, novel_id) if chunk_features is not None else None
+        
+        # 🎯 实体匹配得分（每个查询编译一次匹配器）
+        entity_scores = EntityMatcher(query_entities).scores(documents)
+        
+        # GraphRAG: 章节重要性（时序权重），默认中等重要性
+        importances = np.fromiter(
+            (
+                chapter_features[metadata.get('chapter_num')]['importance']
+                if metadata.get('chapter_num') and metadata.get('chapter_num') in chapter_features
+                else 0.5
+                for metadata in metadatas
+            ),
+            dtype=np.float64,
+            count=len(metadatas)
+        )
+        
+        positions = chunk_features.positions(feature_rows, total_chapters) if chunk_features is not None else None
+        recency = recency_biases(chapter_nums, total_chapters, recency_bias_weight, positions=positions)
+        
+        quote_boost = None
+        if query_type == QueryType.DIALOGUE and chunk_features is not None:
+            quote_boost = chunk_features.quote_boosts(feature_rows, documents)
+        
+        # 应用查询类型特定的权重
+        scores = score_candidates(
+            query_type, base_scores, entity_scores, importances, recency,
+            texts=documents, quote_boost=quote_boost
+        )
+        
+        # 演变节点优先rerank：提升演变章节的权重
+        if graph and query_entities and len(query_entities) >= 2:
+            evolution_chapters = self.graph_analyzer.get_evolution_chapters(
+                graph_features, query_entities[0], query_entities[1]
+            )
+            if evolution_chapters:
+                evolution_mask = np.fromiter(
+                    (bool(metadata.get('chapter_num')) and metadata.get('chapter_num') in evolution_chapters for metadata in metadatas),
+                    dtype=bool,
+                    count=len(metadatas)
                 )
-                final_score = final_score * recency_bias
-            
-            candidates.append({
-                'content': doc,
+                if evolution_mask.any():
+                    scores[evolution_mask] *= 1.5  # 演变节点权重提升50%
+                    logger.info(f"🔄 检测到关系演变章节{sorted({int(c) for c in chapter_nums[evolution_mask]})}，提升权重")
+        
+        # 排序（稳定排序，同分保持原顺序）
+        order = np.argsort(-scores, kind='stable')
+        
+        def build_candidate(i: int) -> Dict:
+            metadata = metadatas[i]
+            if feature_rows is not None and feature_rows[i] >= 0:
+                # 附加预计算的分块特征（复制元数据，不修改向量库返回的对象）
+                row = int(feature_rows[i])
+                metadata = {
+                    **metadata,
+                    'entities': chunk_features.entities(row),
+                    'token_count': int(chunk_features.token_count[row])
+                }
+            return {
+                'chunk_id': chunk_id_of(metadata),
+                'content': documents[i],
                 'metadata': metadata,
-                'score': final_score,
-                'base_score': base_score,
-                'entity_match_score': entity_match_score,  # 新增：实体匹配分数
+                'score': float(scores[i]),
+                'base_score': float(base_scores[i]),
+                'entity_match_score': float(entity_scores[i]),  # 新增：实体匹配分数
                 'rank': i + 1,
                 'query_type': query_type.value
-            })
-        
-        # 演变节点优先rerank：提升演变章节的权重
-        if graph and query_entities and len(query_entities) >= 2:
-            for candidate in candidates:
-                chapter_num = candidate['metadata'].get('chapter_num')
-                if chapter_num and self._is_relation_evolution_chapter(graph, chapter_num, query_entities):
-                    candidate['score'] *= 1.5  # 演变节点权重提升50%
-                    logger.info(f"🔄 检测到关系演变章节{chapter_num}，提升权重")
-        
-        # 排序
-        candidates.sort(key=lambda x: -x['score'])
+            }
         
-        # 分析类查询：合并相邻块
         if query_type == QueryType.ANALYSIS:
-            candidates = self._merge_adjacent_chunks(candidates)
-        
-        # 返回Top-K
-        reranked = candidates[:top_k]
+            # 分析类查询：合并相邻块
+            candidates = self._merge_adjacent_chunks([build_candidate(i) for i in order])
+            reranked = candidates[:top_k]
+        else:
+            # 只为Top-K候选构建结果
+            candidates = [build_candidate(i) for i in order[:max(top_k, 5)]]
+            reranked = candidates[:top_k]
+        candidate_count = len(candidates) if query_type == QueryType.ANALYSIS else len(documents)
         logger.info(f"✅ Rerank完成 ({query_type.value}): 返回 {len(reranked)} 个结果")
         
         # 📊 记录权重使用情况（仅记录前5个候选）
@@ -835,7 +1267,7 @@ class RAGEngine:
             trace_logger.trace_rerank(
                 query_id=query_id,
                 query=query,
-                candidates_count=len(candidates),
+                candidates_count=candidate_count,
                 reranked_results=reranked_with_entity_info,
                 top_k=top_k
             )
@@ -848,7 +1280,7 @@ class RAGEngine:
                     emoji="🎯",
                     input_data={
                         "查询实体": query_entities,
-                        "候选文档数": len(candidates)
+                        "候选文档数": candidate_count
                     },
                     output_data={
                         "Top-10实体匹配情况": [
@@ -1034,6 +1466,43 @@ class RAGEngine:
         Returns:
             str | Generator: 答案文本或生成器
         """
+        if stream:
+            return self._generate_answer_stream(prompt, model)
+        return self.generate_answer_with_usage(prompt, model).get("content", "")
+    
+    def _generate_answer_stream(self, prompt: str, model: str):
+        """流式生成答案文本增量"""
+        try:
+            from app.services.llm.factory import get_llm_client_for_model
+            
+            llm_client, model_name = get_llm_client_for_model(model)
+            messages = [{"role": "user", "content": prompt}]
+            
+            for chunk in llm_client.chat_completion_stream(
+                messages=messages,
+                model=model_name
+            ):
+                if chunk.get("content"):
+                    yield chunk["content"]
+        except Exception as e:
+            logger.error(f"❌ 生成答案失败: {e}")
+            raise
+    
+    def generate_answer_with_usage(
+        self,
+        prompt: str,
+        model: str = "zhipu/GLM-4.5-Flash"
+    ) -> Dict:
+        """
+        非流式生成答案，同时返回提供商报告的Token用量
+        
+        Args:
+            prompt: 完整的Prompt
+            model: 使用的模型（格式：provider/model_name）
+        
+        Returns:
+            Dict: 包含 content 与 usage（提供商未返回时为 None）
+        """
         try:
             from app.services.llm.factory import get_llm_client_for_model
             
@@ -1041,22 +1510,47 @@ class RAGEngine:
             llm_client, model_name = get_llm_client_for_model(model)
             
             messages = [{"role": "user", "content": prompt}]
+            response = llm_client.chat_completion(
+                messages=messages,
+                model=model_name
+            )
+            return {
+                "content": response.get("content", ""),
+                "usage": response.get("usage") or None
+            }
+        except Exception as e:
+            logger.error(f"❌ 生成答案失败: {e}")
+            raise
+    
+    async def agenerate_answer_with_usage(
+        self,
+        prompt: str,
+        model: str = "zhipu/GLM-4.5-Flash"
+    ) -> Dict:
+        """
+        异步非流式生成答案（原生异步SDK优先），同时返回提供商报告的Token用量
+        
+        Args:
+            prompt: 完整的Prompt
+            model: 使用的模型（格式：provider/model_name）
+        
+        Returns:
+            Dict: 包含 content 与 usage（提供商未返回时为 None）
+        """
+        try:
+            from app.services.llm.factory import get_llm_client_for_model
             
-            if stream:
-                # 流式生成
-                for chunk in llm_client.chat_completion_stream(
-                    messages=messages,
-                    model=model_name
-                ):
-                    if chunk.get("content"):
-                        yield chunk["content"]
-            else:
-                # 非流式生成
-                response = llm_client.chat_completion(
-                    messages=messages,
-                    model=model_name
-                )
-                return response.get("content", "")
+            llm_client, model_name = get_llm_client_for_model(model)
+            
+            messages = [{"role": "user", "content": prompt}]
+            response = await llm_client.achat_completion(
+                messages=messages,
+                model=model_name
+            )
+            return {
+                "content": response.get("content", ""),
+                "usage": response.get("usage") or None
+            }
         except Exception as e:
             logger.error(f"❌ 生成答案失败: {e}")
             raise
@@ -1113,6 +1607,42 @@ class RAGEngine:
             else:
                 return "抱歉，生成答案时出现错误。"
     
+    async def agenerate_answer_stream(
+        self,
+        prompt: str,
+        model: str = "zhipu/GLM-4.5-Flash"
+    ) -> AsyncGenerator[Dict, None]:
+        """
+        异步流式生成答案（不阻塞事件循环）- 支持多提供商
+        
+        有原生异步流的提供商直接使用异步SDK，其余通过线程+有界队列桥接，
+        消费端（WebSocket发送）变慢时反压生成线程
+        
+        Args:
+            prompt: 完整的Prompt
+            model: 使用的模型（格式：provider/model_name）
+        
+        Yields:
+            Dict: 包含content、reasoning_content、usage、finish_reason的增量
+        """
+        try:
+            from app.services.llm.factory import get_llm_client_for_model
+            
+            llm_client, model_name = get_llm_client_for_model(model)
+            
+            messages = [{"role": "user", "content": prompt}]
+            stream = llm_client.achat_completion_stream(
+                messages=messages,
+                model=model_name
+            )
+            async with aclosing(stream):
+                async for chunk_data in stream:
+                    yield chunk_data
+        
+        except Exception as e:
+            logger.error(f"❌ 答案生成失败: {e}")
+            yield {"content": "抱歉，生成答案时出现错误。"}
+    
     def query(
         self,
         db: Session,
@@ -1123,7 +1653,7 @@ class RAGEngine:
         enable_query_decomposition: bool = True,
         query_id: Optional[int] = None,
         recency_bias_weight: float = 0.15
-    ) -> Tuple[str, List[Citation], Dict, Optional[str]]:
+    ) -> RAGQueryResult:
         """
         完整RAG查询流程（含查询优化和缓存）
         
@@ -1135,9 +1665,214 @@ class RAGEngine:
             enable_query_rewrite: 是否启用查询改写
             enable_query_decomposition: 是否启用查询分解
             query_id: 查询ID（用于日志记录）
+            recency_bias_weight: 时间衰减权重
+        
+        Returns:
+            RAGQueryResult: 答案、引用、统计信息、改写后的查询，以及Prompt、Rerank结果和Token用量
+        """
+        def compute() -> RAGQueryResult:
+            prepared = self.prepare_query(
+                db, novel_id, query, model,
+                enable_query_rewrite=enable_query_rewrite,
+                enable_query_decomposition=enable_query_decomposition,
+                query_id=query_id,
+                recency_bias_weight=recency_bias_weight
+            )
+            if isinstance(prepared, RAGQueryResult):
+                return prepared
+            
+            generation = self.generate_answer_with_usage(prepared.prompt, model)
+            return self.finalize_query(prepared, generation)
+        
+        if not settings.query_coalescing_enabled:
+            return compute()
+        
+        # 🔗 相同的并发查询合并为一次计算
+        key = self._coalescing_key(
+            novel_id, query, model, enable_query_rewrite, enable_query_decomposition, recency_bias_weight
+        )
+        result, coalesced = get_single_flight().do(key, compute)
+        return replace(result, from_cache=True) if coalesced else result
+    
+    async def aquery(
+        self,
+        db: Session,
+        novel_id: int,
+        query: str,
+        model: str = "glm-4",
+        enable_query_rewrite: bool = True,
+        enable_query_decomposition: bool = True,
+        query_id: Optional[int] = None,
+        recency_bias_weight: float = 0.15
+    ) -> RAGQueryResult:
+        """
+        异步RAG查询流程（不阻塞事件循环）
+        
+        检索阶段（查询改写/分解、向量化、Chroma、BM25、NER、图谱、Prompt构建）在有界线程池中执行，
+        答案生成使用提供商的原生异步SDK（无异步SDK时在LLM线程池中执行）
+        
+        Args:
+            与 query() 相同
+        
+        Returns:
+            RAGQueryResult: 与 query() 相同
+        """
+        async def compute() -> RAGQueryResult:
+            prepared = await run_blocking(
+                "retrieval",
+                self.prepare_query,
+                db, novel_id, query, model,
+                enable_query_rewrite=enable_query_rewrite,
+                enable_query_decomposition=enable_query_decomposition,
+                query_id=query_id,
+                recency_bias_weight=recency_bias_weight
+            )
+            if isinstance(prepared, RAGQueryResult):
+                return prepared
+            
+            generation = await self.agenerate_answer_with_usage(prepared.prompt, model)
+            return self.finalize_query(prepared, generation)
+        
+        if not settings.query_coalescing_enabled:
+            return await compute()
+        
+        # 🔗 相同的并发查询合并为一次计算（计算在独立任务中进行，发起者断开不影响其他等待者）
+        key = self._coalescing_key(
+            novel_id, query, model, enable_query_rewrite, enable_query_decomposition, recency_bias_weight
+        )
+        result, coalesced = await get_single_flight().ado(key, compute)
+        return replace(result, from_cache=True) if coalesced else result
+    
+    def _coalescing_key(
+        self,
+        novel_id: int,
+        query: str,
+        model: str,
+        enable_query_rewrite: bool,
+        enable_query_decomposition: bool,
+        recency_bias_weight: float
+    ) -> Tuple:
+        """
+        并发查询合并键（与查询缓存键相同的配置参数，另含时间衰减权重）
+        
+        不含索引版本号：只合并进行中的计算，重新索引后到达的请求最多复用一次刚开始的计算，
+        结果仍按计算开始时的版本号写入缓存
+        
+        Returns:
+            Tuple: 合并键
+        """
+        return (
+            novel_id, query, model, enable_query_rewrite, enable_query_decomposition, recency_bias_weight
+        )
+    
+    def finalize_query(self, prepared: PreparedQuery, generation: Dict) -> RAGQueryResult:
+        """
+        根据检索产物和生成结果构建最终结果（引用、统计）并写入缓存
+        
+        Args:
+            prepared: 检索阶段产物
+            generation: 生成结果（content/usage）
+        
+        Returns:
+            RAGQueryResult: 查询结果
+        """
+        answer = generation["content"]
+        
+        # 构建引用列表
+        citations = []
+        
+        # 返回前10条引用（或所有chunk，取较小值）
+        # 不进行章节去重，因为同一章节可能有多个相关片段
+        max_citations = min(10, len(prepared.reranked_chunks))
+        
+        for chunk in prepared.reranked_chunks[:max_citations]:
+            metadata = chunk['metadata']
+            chapter_num = metadata.get('chapter_num')
+            
+            citations.append(Citation(
+                novel_id=metadata.get('source_novel_id', prepared.novel_id),
+                chapter_num=chapter_num,
+                chapter_title=metadata.get('chapter_title'),
+                text=chunk['content'][:200] + "...",  # 截断显示
+                score=chunk.get('score')
+            ))
+        
+        stats = {**prepared.stats, 'citations': len(citations)}
+        
+        logger.info(f"✅ RAG查询完成: {len(citations)} 条引用")
+        
+        result = RAGQueryResult(
+            answer=answer,
+            citations=citations,
+            stats=stats,
+            rewritten_query=prepared.rewritten_query,
+            prompt=prepared.prompt,
+            reranked_chunks=prepared.reranked_chunks,
+            retrieved_count=prepared.retrieved_count,
+            usage=generation["usage"]
+        )
+        
+        # 💾 保存结果到缓存（包含配置参数）
+        self.query_cache.set(
+            prepared.novel_id, prepared.query, prepared.model,
+            {**vars(result), 'citations': [citation.model_dump() for citation in citations]},
+            prepared.enable_query_rewrite, prepared.enable_query_decomposition,
+            query_embedding=prepared.query_embedding,
+            index_version=prepared.index_version
+        )
+        
+        return result
+    
+    def _result_from_cache(self, cached_result: Optional[Dict]) -> Optional[RAGQueryResult]:
+        """
+        缓存条目还原为查询结果（引用从JSON数据重建）
+        
+        Args:
+            cached_result: query_cache.get / get_semantic 返回的缓存条目
+        
+        Returns:
+            Optional[RAGQueryResult]: 查询结果；未命中或条目无法还原时返回None（并删除损坏条目）
+        """
+        if cached_result is None:
+            return None
+        try:
+            data = cached_result['result']
+            return RAGQueryResult(**{
+                **data,
+                'citations': [Citation.model_validate(citation) for citation in data['citations']],
+                'from_cache': True
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ 缓存条目无法还原为查询结果，已删除: {e}")
+            self.query_cache.discard(cached_result.get('key') if isinstance(cached_result, dict) else None)
+            return None
+    
+    def prepare_query(
+        self,
+        db: Session,
+        novel_id: int,
+        query: str,
+        model: str = "glm-4",
+        enable_query_rewrite: bool = True,
+        enable_query_decomposition: bool = True,
+        query_id: Optional[int] = None,
+        recency_bias_weight: float = 0.15
+    ) -> Union[RAGQueryResult, PreparedQuery]:
+        """
+        RAG检索阶段：缓存查询、查询改写/分解、检索、Rerank、构建Prompt（不生成答案）
+        
+        Args:
+            db: 数据库会话
+            novel_id: 小说ID
+            query: 查询文本
+            model: 使用的模型
+            enable_query_rewrite: 是否启用查询改写
+            enable_query_decomposition: 是否启用查询分解
+            query_id: 查询ID（用于日志记录）
+            recency_bias_weight: 时间衰减权重
         
         Returns:
-            Tuple[str, List[Citation], Dict, Optional[str]]: (答案, 引用列表, 统计信息, 改写后的查询)
+            Union[RAGQueryResult, PreparedQuery]: 命中缓存或未检索到内容时直接返回结果，否则返回检索产物
         """
         logger.info(f"📝 开始RAG查询: {query[:50]}...")
         logger.info(f"🔧 [DEBUG] ========== 查询配置 ==========")
@@ -1147,19 +1882,35 @@ class RAGEngine:
         logger.info(f"🔧 [DEBUG] ================================")
         
         # 🎯 尝试从缓存获取结果（包含配置参数以区分不同配置的查询）
+        # 索引版本号只在开始时读取一次：查询期间重新索引时，旧索引的结果写入旧版本的键
+        index_version = self.query_cache.get_index_version(novel_id)
         cached_result = self.query_cache.get(
             novel_id, query, model, 
-            enable_query_rewrite, enable_query_decomposition
+            enable_query_rewrite, enable_query_decomposition,
+            index_version=index_version
         )
-        if cached_result is not None:
-            cached_data = cached_result['result']
+        cached = self._result_from_cache(cached_result)
+        if cached is not None:
             logger.info(f"✅ 使用缓存结果（跳过检索和生成）")
-            return (
-                cached_data['answer'],
-                cached_data['citations'],
-                cached_data['stats'],
-                cached_data.get('rewritten_query')
-            )
+            return cached
+        
+        # 🎯 语义缓存：同义改述的查询直接复用结果（在查询改写/分解的LLM调用之前）
+        query_embedding = None
+        if settings.semantic_cache_enabled:
+            try:
+                query_embedding = self.query_embedding(query)
+            except Exception as e:
+                logger.warning(f"⚠️ 查询向量化失败，跳过语义缓存: {e}")
+            if query_embedding is not None:
+                cached_result = self.query_cache.get_semantic(
+                    novel_id, query_embedding, model,
+                    enable_query_rewrite, enable_query_decomposition,
+                    index_version=index_version
+                )
+                cached = self._result_from_cache(cached_result)
+                if cached is not None:
+                    logger.info(f"✅ 使用语义缓存结果（跳过改写、检索和生成）")
+                    return cached
         
         # 0. 查询改写（可选）
         rewrite_result = self.query_rewriter.rewrite_query(
@@ -1184,7 +1935,6 @@ class RAGEngine:
             logger.info(f"🔧 [DEBUG] 进入查询分解逻辑")
             try:
                 from app.services.query_decomposer import QueryDecomposer
-                from app.core.config import settings
                 
                 logger.info(f"🔧 [DEBUG] 导入QueryDecomposer成功")
                 logger.info(f"🔧 [DEBUG] 配置 - max_subqueries={settings.query_decomposition_max_subqueries}, "
@@ -1216,7 +1966,7 @@ class RAGEngine:
                     if sub_queries and len(sub_queries) > 1:
                         logger.info(f"🔨 使用查询分解流程: {len(sub_queries)}个子查询")
                         logger.info(f"🔧 [DEBUG] 子查询列表: {sub_queries}")
-                        return self._query_with_decomposition(
+                        prepared = self._prepare_with_decomposition(
                             db=db,
                             novel_id=novel_id,
                             original_query=query,
@@ -1228,6 +1978,10 @@ class RAGEngine:
                             enable_query_rewrite=enable_query_rewrite,
                             enable_query_decomposition=enable_query_decomposition
                         )
+                        if isinstance(prepared, PreparedQuery):
+                            prepared.query_embedding = query_embedding
+                            prepared.index_version = index_version
+                        return prepared
                     else:
                         logger.info(f"🔧 [DEBUG] 分解失败或子查询数量不足，继续原流程")
                 else:
@@ -1247,28 +2001,38 @@ class RAGEngine:
         
         logger.info(f"🔧 [DEBUG] ========== 查询分解流程结束 ==========")
         
-        # 1. 查询向量化（使用改写后的查询）
-        query_embedding = self.query_embedding(query_for_retrieval, query_id=query_id)
-        
-        # 2. 并行执行语义检索和关键词检索
-        logger.info(f"🚀 并行执行向量检索和 BM25 检索...")
-        vector_results = self.vector_search(novel_id, query_embedding, query_id=query_id)
-        keyword_results = self.keyword_search(db, novel_id, query_for_retrieval)
+        # 1-3. 并发执行检索分支：向量化+向量检索、BM25、查询实体提取、图谱加载（使用改写后的查询）
+        logger.info(f"🚀 并发执行向量检索、BM25、实体提取和图谱加载...")
+        # 未改写时检索直接复用语义缓存阶段的查询向量
+        retrieval = self.retrieve_parallel(
+            db, novel_id, query_for_retrieval, query_id=query_id,
+            query_embedding=query_embedding if query_for_retrieval == query else None
+        )
+        vector_results = retrieval.vector_results
         
         # 4. 混合Rerank
         reranked_chunks = self.rerank(
             query_for_retrieval, 
             vector_results, 
-            keyword_results,
+            retrieval.keyword_results,
             novel_id=novel_id,
             db=db,
             query_id=query_id,
-            recency_bias_weight=recency_bias_weight
+            recency_bias_weight=recency_bias_weight,
+            context=retrieval.rerank_context
         )
         
+        retrieved_count = len(vector_results.get('ids', [[]])[0])
+        
         if not reranked_chunks:
             logger.warning("⚠️ 未找到相关内容")
-            return "抱歉，在小说中未找到相关内容。", [], {}, rewritten_query
+            return RAGQueryResult(
+                answer="抱歉，在小说中未找到相关内容。",
+                citations=[],
+                stats={},
+                rewritten_query=rewritten_query,
+                retrieved_count=retrieved_count
+            )
         
         # 5. 构建自适应Prompt（使用原始查询）
         prompt = self.prompt_builder.build_prompt(
@@ -1277,50 +2041,28 @@ class RAGEngine:
             query_id=query_id
         )
         
-        # 6. 生成答案
-        answer = self.generate_answer(prompt, model, stream=False)
-        
-        # 7. 构建引用列表
-        citations = []
-        
-        # 返回前10条引用（或所有chunk，取较小值）
-        # 不进行章节去重，因为同一章节可能有多个相关片段
-        max_citations = min(10, len(reranked_chunks))
-        
-        for chunk in reranked_chunks[:max_citations]:
-            metadata = chunk['metadata']
-            chapter_num = metadata.get('chapter_num')
-            
-            citations.append(Citation(
-                chapter_num=chapter_num,
-                chapter_title=metadata.get('chapter_title'),
-                text=chunk['content'][:200] + "...",  # 截断显示
-                score=chunk.get('score')
-            ))
-        
-        # 统计信息
+        # 统计信息（引用数在生成答案后补充）
         stats = {
-            'retrieved_chunks': len(vector_results.get('ids', [[]])[0]),
+            'retrieved_chunks': retrieved_count,
             'reranked_chunks': len(reranked_chunks),
-            'citations': len(citations),
-            'query_rewrite_applied': rewrite_result["rewrite_applied"]
+            'query_rewrite_applied': rewrite_result["rewrite_applied"],
+            'retrieval_timings_ms': retrieval.timings
         }
         
-        logger.info(f"✅ RAG查询完成: {len(citations)} 条引用")
-        
-        # 💾 保存结果到缓存（包含配置参数）
-        cache_data = {
-            'answer': answer,
-            'citations': citations,
-            'stats': stats,
-            'rewritten_query': rewritten_query
-        }
-        self.query_cache.set(
-            novel_id, query, model, cache_data,
-            enable_query_rewrite, enable_query_decomposition
+        return PreparedQuery(
+            novel_id=novel_id,
+            query=query,
+            model=model,
+            prompt=prompt,
+            reranked_chunks=reranked_chunks,
+            retrieved_count=retrieved_count,
+            stats=stats,
+            rewritten_query=rewritten_query,
+            enable_query_rewrite=enable_query_rewrite,
+            enable_query_decomposition=enable_query_decomposition,
+            query_embedding=query_embedding,
+            index_version=index_version
         )
-        
-        return answer, citations, stats, rewritten_query
     
     def _is_relationship_query(self, query: str) -> bool:
         """
@@ -1335,39 +2077,6 @@ class RAGEngine:
         relation_keywords = ['关系', '什么样', '如何', '是不是', '变化', '演变', '对待', '看待']
         return any(kw in query for kw in relation_keywords)
     
-    def _is_relation_evolution_chapter(
-        self,
-        graph,
-        chapter_num: int,
-        query_entities: List[str]
-    ) -> bool:
-        """
-        检查章节是否为演变节点
-        
-        Args:
-            graph: 知识图谱
-            chapter_num: 章节号
-            query_entities: 查询实体列表
-        
-        Returns:
-            bool: 是否为演变节点
-        """
-        if len(query_entities) < 2 or not graph:
-            return False
-        
-        try:
-            # 获取两实体间的关系演变
-            evolution = self.graph_query.get_relationship_evolution(
-                graph, query_entities[0], query_entities[1]
-            )
-            
-            # 检查该章节是否在演变列表中
-            evolution_chapters = [evt['chapter'] for evt in evolution]
-            return chapter_num in evolution_chapters
-        except Exception as e:
-            logger.debug(f"检查演变节点失败: {e}")
-            return False
-    
     def _filter_by_entity_attributes(
         self,
         candidates: List[Dict],
@@ -1409,7 +2118,7 @@ class RAGEngine:
         
         return filtered
     
-    def _query_with_decomposition(
+    def _prepare_with_decomposition(
         self,
         db: Session,
         novel_id: int,
@@ -1421,16 +2130,15 @@ class RAGEngine:
         rewritten_query: Optional[str] = None,
         enable_query_rewrite: bool = True,
         enable_query_decomposition: bool = True
-    ) -> Tuple[str, List[Citation], Dict, Optional[str]]:
+    ) -> Union[RAGQueryResult, PreparedQuery]:
         """
         使用查询分解的检索流程
         
         流程：
-        1. 并行检索所有子查询
+        1. 批量检索所有子查询（一次向量化、一次向量检索，共享图谱与别名解析）
         2. 合并去重所有chunk结果
         3. Rerank合并后的结果
-        4. 使用原始查询构建统一的Prompt
-        5. 一次性生成完整答案
+        4. 使用原始查询构建统一的Prompt（之后一次性生成完整答案）
         
         Args:
             db: 数据库会话
@@ -1443,40 +2151,37 @@ class RAGEngine:
             rewritten_query: 改写后的查询
         
         Returns:
-            Tuple[str, List[Citation], Dict, Optional[str]]: (答案, 引用列表, 统计信息, 改写后的查询)
+            Union[RAGQueryResult, PreparedQuery]: 未检索到内容时直接返回结果，否则返回检索产物
         """
         logger.info(f"🔨 开始查询分解检索流程: {len(sub_queries)}个子查询")
         
-        # 1. 并行检索所有子查询
+        # 1. 批量检索所有子查询（一次向量化、一次向量检索，图谱/章节数/别名解析共享）
+        stages = self.retrieve_parallel_batch(db, novel_id, sub_queries, query_id=query_id)
+        
         all_chunks = []
         sub_query_stats = []
-        
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        
-        with ThreadPoolExecutor(max_workers=min(len(sub_queries), 5)) as executor:
-            # 提交所有子查询任务
-            future_to_subquery = {}
-            for idx, sub_q in enumerate(sub_queries):
-                future = executor.submit(
-                    self._retrieve_single_subquery,
-                    db, novel_id, sub_q, query_id, recency_bias_weight, idx
-                )
-                future_to_subquery[future] = sub_q
-            
-            # 收集结果
-            for future in as_completed(future_to_subquery):
-                sub_q = future_to_subquery[future]
-                try:
-                    sub_chunks, sub_stats = future.result()
-                    all_chunks.extend(sub_chunks)
-                    sub_query_stats.append({
-                        'sub_query': sub_q,
-                        'chunks_count': len(sub_chunks),
-                        **sub_stats
-                    })
-                    logger.info(f"  ✅ 子查询完成: \"{sub_q}\" -> {len(sub_chunks)}个chunks")
-                except Exception as e:
-                    logger.warning(f"  ⚠️ 子查询失败: \"{sub_q}\" - {e}")
+        for sub_q, retrieval in zip(sub_queries, stages):
+            # Rerank子查询结果（每个子查询取Top20）
+            sub_reranked = self.rerank(
+                sub_q,
+                retrieval.vector_results,
+                retrieval.keyword_results,
+                novel_id=novel_id,
+                db=db,
+                query_id=query_id,
+                recency_bias_weight=recency_bias_weight,
+                top_k=20,  # 每个子查询取Top20
+                context=retrieval.rerank_context
+            )
+            all_chunks.extend(sub_reranked)
+            sub_query_stats.append({
+                'sub_query': sub_q,
+                'chunks_count': len(sub_reranked),
+                'vector_count': len(retrieval.vector_results.get('ids', [[]])[0]),
+                'keyword_count': len(retrieval.keyword_results) if retrieval.keyword_results else 0,
+                'reranked_count': len(sub_reranked)
+            })
+            logger.info(f"  ✅ 子查询完成: \"{sub_q}\" -> {len(sub_reranked)}个chunks")
         
         logger.info(f"📊 总共检索到 {len(all_chunks)} 个chunks（合并前）")
         
@@ -1484,26 +2189,35 @@ class RAGEngine:
         unique_chunks = self._deduplicate_chunks(all_chunks)
         logger.info(f"🔄 去重后剩余 {len(unique_chunks)} 个chunks")
         
+        retrieved_count = sum(s.get('vector_count', 0) for s in sub_query_stats)
+        
         # 如果没有任何结果，返回空
         if not unique_chunks:
             logger.warning("⚠️ 所有子查询均未找到相关内容")
-            return "抱歉，在小说中未找到相关内容。", [], {
-                'decomposed': True,
-                'sub_queries_count': len(sub_queries),
-                'sub_queries': sub_queries,
-                'total_chunks_before_dedup': len(all_chunks),
-                'unique_chunks': 0,
-                'final_chunks': 0
-            }, rewritten_query
-        
-        # 3. 对合并结果进行全局Rerank（基于原始查询）
+            return RAGQueryResult(
+                answer="抱歉，在小说中未找到相关内容。",
+                citations=[],
+                stats={
+                    'decomposed': True,
+                    'sub_queries_count': len(sub_queries),
+                    'sub_queries': sub_queries,
+                    'total_chunks_before_dedup': len(all_chunks),
+                    'unique_chunks': 0,
+                    'final_chunks': 0
+                },
+                rewritten_query=rewritten_query,
+                retrieved_count=retrieved_count
+            )
+        
+        # 3. 对合并结果进行全局Rerank（基于原始查询，复用子查询检索时加载的图谱与总章节数）
         final_reranked = self._rerank_unified(
             original_query, unique_chunks,
             novel_id=novel_id,
             db=db,
             query_id=query_id,
             recency_bias_weight=recency_bias_weight,
-            top_k=self.top_k_rerank
+            top_k=self.top_k_rerank,
+            shared_context=stages[0].rerank_context if stages else None
         )
         
         logger.info(f"🎯 全局Rerank完成: {len(final_reranked)} 个chunks")
@@ -1514,124 +2228,60 @@ class RAGEngine:
             query_id=query_id
         )
         
-        # 5. 生成答案
-        answer = self.generate_answer(prompt, model, stream=False)
-        
-        # 6. 构建引用和统计
-        citations = []
-        max_citations = min(10, len(final_reranked))
-        
-        for chunk in final_reranked[:max_citations]:
-            metadata = chunk['metadata']
-            chapter_num = metadata.get('chapter_num')
-            
-            citations.append(Citation(
-                chapter_num=chapter_num,
-                chapter_title=metadata.get('chapter_title'),
-                text=chunk['content'][:200] + "...",
-                score=chunk.get('score')
-            ))
-        
-        # 统计信息
+        # 统计信息（引用数在生成答案后补充）
         stats = {
             'decomposed': True,
+            'retrieved_chunks': retrieved_count,
             'sub_queries_count': len(sub_queries),
             'sub_queries': sub_queries,
             'sub_query_stats': sub_query_stats,
+            'retrieval_timings_ms': stages[0].timings if stages else {},
             'total_chunks_before_dedup': len(all_chunks),
             'unique_chunks': len(unique_chunks),
             'final_chunks': len(final_reranked),
-            'citations': len(citations),
             'query_rewrite_applied': rewritten_query is not None
         }
         
-        logger.info(f"✅ 查询分解流程完成: {len(citations)} 条引用")
+        logger.info(f"✅ 查询分解检索完成: {len(final_reranked)} 个chunks")
         
-        # 保存结果到缓存
-        cache_data = {
-            'answer': answer,
-            'citations': citations,
-            'stats': stats,
-            'rewritten_query': rewritten_query
-        }
-        self.query_cache.set(
-            novel_id, original_query, model, cache_data,
-            enable_query_rewrite, enable_query_decomposition
-        )
-        
-        return answer, citations, stats, rewritten_query
-    
-    def _retrieve_single_subquery(
-        self,
-        db: Session,
-        novel_id: int,
-        sub_query: str,
-        query_id: Optional[int],
-        recency_bias_weight: float,
-        sub_idx: int
-    ) -> Tuple[List[Dict], Dict]:
-        """
-        检索单个子查询
-        
-        Returns:
-            Tuple[List[Dict], Dict]: (chunks列表, 统计信息)
-        """
-        # 向量化子查询
-        sub_embedding = self.query_embedding(sub_query, query_id=query_id)
-        
-        # 执行检索
-        sub_vector_results = self.vector_search(novel_id, sub_embedding, query_id=query_id)
-        sub_keyword_results = self.keyword_search(db, novel_id, sub_query)
-        
-        # Rerank子查询结果（每个子查询取Top20）
-        sub_reranked = self.rerank(
-            sub_query, 
-            sub_vector_results, 
-            sub_keyword_results,
+        return PreparedQuery(
             novel_id=novel_id,
-            db=db,
-            query_id=query_id,
-            recency_bias_weight=recency_bias_weight,
-            top_k=20  # 每个子查询取Top20
+            query=original_query,
+            model=model,
+            prompt=prompt,
+            reranked_chunks=final_reranked,
+            retrieved_count=retrieved_count,
+            stats=stats,
+            rewritten_query=rewritten_query,
+            enable_query_rewrite=enable_query_rewrite,
+            enable_query_decomposition=enable_query_decomposition
         )
-        
-        stats = {
-            'vector_count': len(sub_vector_results.get('ids', [[]])[0]),
-            'keyword_count': len(sub_keyword_results) if sub_keyword_results else 0,
-            'reranked_count': len(sub_reranked)
-        }
-        
-        return sub_reranked, stats
     
     def _deduplicate_chunks(self, chunks: List[Dict]) -> List[Dict]:
         """
         对chunks进行去重
         
         去重策略：
-        1. 相同章节 + 相同内容的chunk只保留一个
+        1. 分块ID相同的chunk只保留一个
         2. 保留分数最高的那个
         3. 保持相对顺序
         """
-        seen_keys = {}  # key -> chunk
+        if not chunks:
+            return []
         
-        for chunk in chunks:
-            # 构建唯一键：章节号 + 内容前100字符
-            chapter_num = chunk.get('metadata', {}).get('chapter_num', 0)
-            content_prefix = chunk.get('content', '')[:100]
-            key = f"{chapter_num}_{content_prefix}"
-            
-            # 如果未见过，或者当前chunk分数更高，则保留
-            if key not in seen_keys:
-                seen_keys[key] = chunk
-            else:
-                # 比较分数，保留分数更高的
-                current_score = seen_keys[key].get('score', 0)
-                new_score = chunk.get('score', 0)
-                if new_score > current_score:
-                    seen_keys[key] = chunk
-        
-        # 返回去重后的chunks
-        return list(seen_keys.values())
+        # 唯一键：分块整数ID（已包含章节号）
+        chunk_ids = self._chunk_keys(chunks)
+        scores = np.fromiter((chunk.get('score', 0) for chunk in chunks), dtype=np.float64, count=len(chunks))
+        unique_ids, first_index, inverse = np.unique(chunk_ids, return_index=True, return_inverse=True)
+        
+        # 每组取分数最高的（同分取先出现的）
+        order = np.lexsort((np.arange(len(chunks)), -scores, inverse))
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = inverse[order][1:] != inverse[order][:-1]
+        best = order[group_start]
+        
+        # 按每个分块首次出现的位置保持相对顺序
+        return [chunks[best[group]] for group in np.argsort(first_index, kind='stable')]
     
     def _rerank_unified(
         self,
@@ -1641,7 +2291,8 @@ class RAGEngine:
         db: Session,
         query_id: Optional[int],
         recency_bias_weight: float,
-        top_k: int
+        top_k: int,
+        shared_context: Optional[RerankContext] = None
     ) -> List[Dict]:
         """
         对合并后的chunks进行全局rerank（基于原始查询）
@@ -1649,6 +2300,8 @@ class RAGEngine:
         与普通rerank的区别：
         - 输入是已经rerank过的chunks列表（不是vector_results）
         - 需要重新计算基于原始查询的相关性
+        
+        shared_context: 子查询批量检索时已加载的图谱特征与总章节数（提供时不再重复加载）
         """
         logger.info(f"🔄 开始全局Rerank: {len(chunks)} -> Top {top_k}")
         
@@ -1660,64 +2313,62 @@ class RAGEngine:
         
         # 获取图谱（用于章节重要性计算）
         graph = None
-        chapter_importance_map = {}
+        chapter_features = {}
         total_chapters = 0
         
-        try:
-            novel = db.query(Novel).filter(Novel.id == novel_id).first()
-            if novel:
-                total_chapters = novel.total_chapters
-            
-            graph = self.graph_builder.load_graph(novel_id)
-            if graph:
-                chapters = set()
-                for node in graph.nodes():
-                    first_chapter = graph.nodes[node].get('first_chapter')
-                    if first_chapter:
-                        chapters.add(first_chapter)
+        if shared_context is not None:
+            total_chapters = shared_context.total_chapters
+            chapter_features = shared_context.graph_features.get('chapters', {})
+        else:
+            try:
+                novel = db.query(Novel).filter(Novel.id == novel_id).first()
+                if novel:
+                    total_chapters = novel.total_chapters
                 
-                for chapter in chapters:
-                    importance = self.graph_analyzer.compute_chapter_importance(graph, chapter)
-                    chapter_importance_map[chapter] = importance
-        except Exception as e:
-            logger.debug(f"全局rerank加载图谱失败: {e}")
+                graph = self.graph_repository.get_graph(novel_id)
+                if graph:
+                    chapter_features = self.graph_analyzer.get_chapter_features(graph)['chapters']
+            except Exception as e:
+                logger.debug(f"全局rerank加载图谱失败: {e}")
         
-        # 重新计算每个chunk的分数
-        reranked_chunks = []
-        for chunk in chunks:
-            content = chunk.get('content', '')
-            metadata = chunk.get('metadata', {})
-            chapter_num = metadata.get('chapter_num')
-            
-            # 实体匹配分数
-            entity_match_score = self._calculate_entity_match_score(content, query_entities)
-            
-            # 章节重要性
-            chapter_importance = chapter_importance_map.get(chapter_num, 0.5)
-            
-            # 使用原有分数作为基础，结合实体匹配重新计算
-            base_score = chunk.get('score', 0.5)
-            
-            # 时间衰减
-            recency_bias = self._calculate_recency_bias(
-                chapter_num, total_chapters, recency_bias_weight
-            )
-            
-            # 计算最终分数（简化版，主要考虑实体匹配和原有分数）
-            final_score = base_score * entity_match_score * recency_bias * (0.5 + chapter_importance)
-            
-            reranked_chunks.append({
-                **chunk,
-                'score': final_score,
-                'original_score': base_score,
-                'entity_match_score': entity_match_score
-            })
+        # 重新计算每个chunk的分数（向量化，见 rerank_kernel）
+        contents = [chunk.get('content', '') for chunk in chunks]
+        metadatas = [chunk.get('metadata', {}) for chunk in chunks]
         
-        # 排序
-        reranked_chunks.sort(key=lambda x: -x['score'])
+        # 实体匹配分数
+        entity_scores = EntityMatcher(query_entities).scores(contents)
+        
+        # 章节重要性
+        importances = np.fromiter(
+            (chapter_features.get(metadata.get('chapter_num'), {}).get('importance', 0.5) for metadata in metadatas),
+            dtype=np.float64,
+            count=len(chunks)
+        )
         
-        # 返回Top-K
-        return reranked_chunks[:top_k]
+        # 使用原有分数作为基础，结合实体匹配重新计算
+        base_scores = np.fromiter((chunk.get('score', 0.5) for chunk in chunks), dtype=np.float64, count=len(chunks))
+        
+        # 时间衰减（优先使用预计算的章节位置）
+        chunk_features = get_chunk_features(novel_id)
+        positions = None
+        if chunk_features is not None:
+            positions = chunk_features.positions(chunk_features.lookup(metadatas, novel_id), total_chapters)
+        recency = recency_biases(chapter_numbers(metadatas), total_chapters, recency_bias_weight, positions=positions)
+        
+        # 计算最终分数（简化版，主要考虑实体匹配和原有分数）
+        scores = score_unified(base_scores, entity_scores, importances, recency)
+        
+        # 排序并返回Top-K
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return [
+            {
+                **chunks[i],
+                'score': float(scores[i]),
+                'original_score': float(base_scores[i]),
+                'entity_match_score': float(entity_scores[i])
+            }
+            for i in order
+        ]
 
 
 # 全局RAG引擎实例
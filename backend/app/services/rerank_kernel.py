@@ -0,0 +1,254 @@
+"""
+向量化Rerank内核
+
+把候选文档的特征（基础分、章节号、章节重要性、实体命中数、引号密度）放进NumPy列数组，
+三种查询类型的打分策略都用数组表达式一次算完，取代逐候选的Python循环。
+
+公式与 RAGEngine._calculate_entity_match_score / _calculate_quote_boost /
+_calculate_recency_bias 及 rerank() 中的逐候选计算完全一致（见 tests/test_rerank_kernel.py）。
+
+实体匹配：每个查询构建一次匹配器（去重后的实体，短实体的词边界正则只编译一次），
+所有候选文档复用；先用子串查找过滤，只对出现过的短实体检查词边界
+"""
+
+import math
+import re
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.services.query_router import QueryType
+
+# 中文字符范围（短实体的词边界）
+CJK = "[\\u4e00-\\u9fa5]"
+
+# 长实体的最小长度（≥该长度时简单包含即视为匹配）
+LONG_ENTITY_LENGTH = 3
+
+
+class EntityMatcher:
+    """查询实体匹配器（每个查询构建一次，对所有候选文档复用）"""
+    
+    def __init__(self, entities: Sequence[str]):
+        """
+        Args:
+            entities: 查询实体列表（可含重复，重复实体按次数计入得分）
+        """
+        self.entities = list(entities)
+        self.distinct = list(dict.fromkeys(self.entities))
+        self.short = [entity for entity in self.distinct if len(entity) < LONG_ENTITY_LENGTH]
+        self.long = [entity for entity in self.distinct if len(entity) >= LONG_ENTITY_LENGTH]
+        
+        # 每个实体在 entities 中出现的次数
+        counts = {}
+        for entity in self.entities:
+            counts[entity] = counts.get(entity, 0) + 1
+        self._short_counts = [counts[entity] for entity in self.short]
+        self._long_counts = [counts[entity] for entity in self.long]
+        
+        # 短实体的独立词模式（每个查询编译一次）
+        self._patterns = [
+            re.compile(f"(?<!{CJK}){re.escape(entity)}(?!{CJK})") for entity in self.short
+        ]
+    
+    def hit_counts(self, texts: Sequence[str]):
+        """
+        统计每个文档的精确匹配数与部分匹配数
+        
+        Args:
+            texts: 文档内容列表
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (精确匹配数, 部分匹配数)，按实体出现次数计
+        """
+        long_entities = list(zip(self.long, self._long_counts))
+        short_entities = list(zip(self.short, self._patterns, self._short_counts))
+        
+        matched = np.zeros(len(texts), dtype=np.int64)
+        partial = np.zeros(len(texts), dtype=np.int64)
+        for row, text in enumerate(texts):
+            matched_count = 0
+            partial_count = 0
+            for entity, count in long_entities:
+                if entity in text:
+                    matched_count += count
+            for entity, pattern, count in short_entities:
+                # 先用子串查找过滤，只有出现过的短实体才检查词边界
+                if entity not in text:
+                    continue
+                if pattern.search(text):
+                    matched_count += count
+                else:
+                    partial_count += count
+            matched[row] = matched_count
+            partial[row] = partial_count
+        return matched, partial
+    
+    def scores(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        实体匹配得分（与 _calculate_entity_match_score 相同）
+        
+        Args:
+            texts: 文档内容列表
+        
+        Returns:
+            np.ndarray: 匹配得分 (0.3-1.5)，无查询实体时全为1.0
+        """
+        if not self.entities:
+            return np.ones(len(texts), dtype=np.float64)
+        
+        matched, partial = self.hit_counts(texts)
+        total_entities = len(self.entities)
+        match_ratio = matched / total_entities
+        partial_ratio = partial / total_entities
+        
+        # 精确匹配 + 部分匹配（权重减半）
+        effective_ratio = match_ratio + (partial_ratio * 0.5)
+        return np.where(
+            effective_ratio >= 0.5,
+            1.0 + (effective_ratio - 0.5),
+            0.3 + (effective_ratio * 0.7)  # 严重惩罚：匹配不足50%
+        )
+
+
+def quote_boosts(texts: Sequence[str]) -> np.ndarray:
+    """
+    引号内容权重加成（与 _calculate_quote_boost 相同）
+    
+    Args:
+        texts: 文档内容列表
+    
+    Returns:
+        np.ndarray: 权重加成系数 (1.0-1.5)
+    """
+    quote_counts = np.fromiter(
+        (
+            text.count('"') + text.count('"') +
+            text.count("'") + text.count("'") +
+            text.count('"') // 2
+            for text in texts
+        ),
+        dtype=np.float64,
+        count=len(texts)
+    )
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.float64, count=len(texts))
+    
+    boosts = np.ones(len(texts), dtype=np.float64)
+    nonempty = lengths > 0
+    quote_density = np.minimum(quote_counts[nonempty] / (lengths[nonempty] / 100), 1.0)
+    boosts[nonempty] = 1.0 + (quote_density * 0.5)
+    return boosts
+
+
+def recency_biases(
+    chapter_nums: np.ndarray,
+    total_chapters: int,
+    bias_weight: float,
+    positions: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    时间衰减偏向得分（与 _calculate_recency_bias 相同）
+    
+    Args:
+        chapter_nums: 章节号数组
+        total_chapters: 总章节数
+        bias_weight: 衰减权重 (0.0-0.5)
+        positions: 预计算的章节位置比例（见 chunk_features），为None时由章节号现算
+    
+    Returns:
+        np.ndarray: 时间衰减得分 (0.7-1.3)
+    """
+    if bias_weight == 0.0 or total_chapters == 0:
+        return np.ones(len(chapter_nums), dtype=np.float64)
+    
+    if positions is None:
+        positions = chapter_nums / total_chapters
+    
+    # 指数只对不同位置各算一次（math.exp，与标量实现逐位一致）
+    unique_positions, inverse = np.unique(positions, return_inverse=True)
+    recency_score = np.array(
+        [math.exp(bias_weight * float(position)) for position in unique_positions],
+        dtype=np.float64
+    )[inverse]
+    normalized = 0.7 + (recency_score - 1.0) * 0.6
+    return np.maximum(0.7, np.minimum(1.3, normalized))
+
+
+def chapter_numbers(metadatas: Sequence[dict]) -> np.ndarray:
+    """提取候选的章节号（缺失时为0）"""
+    return np.fromiter(
+        (metadata.get('chapter_num') or 0 for metadata in metadatas),
+        dtype=np.float64,
+        count=len(metadatas)
+    )
+
+
+def score_candidates(
+    query_type: QueryType,
+    base_scores: np.ndarray,
+    entity_scores: np.ndarray,
+    importances: np.ndarray,
+    recency: np.ndarray,
+    texts: Optional[List[str]] = None,
+    quote_boost: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    按查询类型计算最终得分（与 rerank() 中的逐候选公式相同）
+    
+    Args:
+        query_type: 查询类型
+        base_scores: 基础分（RRF分数或由L2距离换算的相似度）
+        entity_scores: 实体匹配得分
+        importances: 章节重要性
+        recency: 时间衰减得分
+        texts: 文档内容（对话类查询未提供引号加成时需要）
+        quote_boost: 预计算的引号加成（见 chunk_features）
+    
+    Returns:
+        np.ndarray: 最终得分
+    """
+    if query_type == QueryType.DIALOGUE:
+        # 对话类：引号加成（高相似度时减弱）× 实体匹配 × 时间衰减
+        if quote_boost is None:
+            quote_boost = quote_boosts(texts)
+        quote_boost = np.where(base_scores > 0.85, 1.0 + (quote_boost - 1.0) * 0.5, quote_boost)
+        return base_scores * quote_boost * entity_scores * recency
+    
+    if query_type == QueryType.ANALYSIS:
+        # 分析类：章节重要性（低相似度时增强30%）× 实体匹配 × 时间衰减
+        importance_boost = importances + 0.5
+        importance_boost = np.where(base_scores < 0.60, importance_boost * 1.3, importance_boost)
+        return base_scores * importance_boost * entity_scores * recency
+    
+    # 事实类：按相似度与实体匹配情况动态调整的加权和
+    w_semantic = np.where(base_scores > 0.85, 0.60, np.where(base_scores < 0.50, 0.30, 0.50))
+    w_entity = np.where(base_scores > 0.85, 0.30, np.where(base_scores < 0.50, 0.60, 0.40))
+    w_temporal = 0.10
+    
+    strong = entity_scores > 1.3
+    weak = ~strong & (entity_scores < 0.5)
+    w_entity, w_semantic = (
+        np.where(strong, np.minimum(w_entity + 0.10, 0.70), np.where(weak, np.maximum(w_entity - 0.15, 0.15), w_entity)),
+        np.where(strong, np.maximum(w_semantic - 0.10, 0.20), np.where(weak, np.minimum(w_semantic + 0.15, 0.75), w_semantic))
+    )
+    
+    total_weight = w_semantic + w_temporal + w_entity
+    semantic_weight = (base_scores * w_semantic) / total_weight
+    temporal_weight = (importances * w_temporal) / total_weight
+    entity_weight = (entity_scores * w_entity) / total_weight
+    return (semantic_weight + temporal_weight + entity_weight) * recency
+
+
+def score_unified(
+    base_scores: np.ndarray,
+    entity_scores: np.ndarray,
+    importances: np.ndarray,
+    recency: np.ndarray
+) -> np.ndarray:
+    """
+    查询分解全局Rerank得分（与 _rerank_unified 中的公式相同）
+    
+    Returns:
+        np.ndarray: 最终得分
+    """
+    return base_scores * entity_scores * recency * (0.5 + importances)
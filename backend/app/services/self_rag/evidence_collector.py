@@ -8,6 +8,8 @@ import logging
 from typing import List, Dict, Optional
 from sqlalchemy.orm import Session
 
+from app.services.chunk_store import resolve_documents
+
 logger = logging.getLogger(__name__)
 
 
@@ -94,21 +96,22 @@ class EvidenceCollector:
         """
         try:
             from app.services.zhipu_client import get_zhipu_client
-            from app.core.chromadb_client import get_chroma_client
+            from app.core.vector_store import get_vector_store
             
             zhipu_client = get_zhipu_client()
-            chroma_client = get_chroma_client()
+            vector_store = get_vector_store()
             
             # 向量化
             query_embedding = zhipu_client.embed_text(query)
             
             # 检索
             collection_name = f"novel_{novel_id}"
-            results = chroma_client.query_documents(
-                collection_name=collection_name,
+            results = vector_store.query(
+                collection_name,
                 query_embeddings=[query_embedding],
                 n_results=top_k
             )
+            results = resolve_documents(novel_id, results)
             
             # 转换为标准格式
             evidence_list = []
@@ -181,18 +184,14 @@ class EvidenceCollector:
             return []
         
         try:
-            import pickle
-            from pathlib import Path
             from app.services.graph.graph_query import get_graph_query
+            from app.services.graph.graph_repository import get_graph_repository
             
-            # 加载图谱
-            graph_path = Path(f"./backend/data/graphs/novel_{novel_id}_graph.pkl")
-            if not graph_path.exists():
+            # 加载图谱（共享只读缓存）
+            graph = get_graph_repository().get_graph(novel_id)
+            if graph is None:
                 return []
             
-            with open(graph_path, 'rb') as f:
-                graph = pickle.load(f)
-            
             # 查询关系
             graph_query = get_graph_query()
             evolution = graph_query.get_relationship_evolution(
@@ -269,17 +268,16 @@ class EvidenceCollector:
         Returns:
             List[Dict]: 证据对列表，包含early和late描述
         """
-        from app.services.graph.graph_builder import GraphBuilder
+        from app.services.graph.graph_repository import get_graph_repository
         from app.services.graph.graph_query import GraphQuery
         from app.models.database import Novel, Chapter
         from pathlib import Path
         
-        graph_builder = GraphBuilder()
         graph_query = GraphQuery()
         
         try:
-            # 加载图谱
-            graph = graph_builder.load_graph(novel_id)
+            # 加载图谱（共享只读缓存）
+            graph = get_graph_repository().get_graph(novel_id)
             if not graph:
                 logger.warning(f"图谱不存在，无法使用图谱增强")
                 return []
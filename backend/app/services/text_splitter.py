@@ -9,6 +9,7 @@ from typing import List, Dict
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 from app.core.config import settings
+from app.services.chunk_ids import make_chunk_id
 
 logger = logging.getLogger(__name__)
 
@@ -176,6 +177,9 @@ class ChineseTextSplitter:
                     'chunk_size': len(chunk)
                 }
             }
+            if metadata.get('chapter_num') is not None:
+                # 稳定的整数ID，所有索引共用
+                doc['metadata']['chunk_id'] = make_chunk_id(metadata['chapter_num'], i)
             documents.append(doc)
         
         return documents
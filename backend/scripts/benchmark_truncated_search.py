@@ -0,0 +1,107 @@
+"""
+维度截断两阶段检索基准测试（VECTOR_STORE_QUANTIZATION=truncate）
+
+合成Matryoshka式语料：簇中心的信号强度随维度递减，前导维度包含大部分语义信息。
+对每组（截断维度, 重排候选数）报告 recall@K（相对全维度精确检索）与单查询延迟。
+
+用法:
+    python -m scripts.benchmark_truncated_search [--rows 100000] [--dim 2048] [--truncate-dims 128,256,512] [--shortlists 100,300,1000]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+import json
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.numpy_vector_store import NumpyCollection, COLLECTION_FILE
+
+
+def make_corpus(rows: int, dim: int, clusters: int, queries: int, noise: float, seed: int = 0):
+    """生成信号集中在前导维度的合成向量与查询"""
+    rng = np.random.default_rng(seed)
+    weights = np.exp(-3.0 * np.arange(dim) / dim).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * weights
+    
+    def sample(count: int) -> np.ndarray:
+        assign = rng.integers(0, clusters, size=count)
+        return centers[assign] + noise * rng.standard_normal((count, dim)).astype(np.float32) * weights
+    
+    return sample(rows), sample(queries)
+
+
+def run_queries(collection: NumpyCollection, queries: np.ndarray, top_k: int):
+    """逐个查询，返回 (结果ID列表, 延迟毫秒列表)"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query([query], n_results=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(result["ids"][0])
+    return ids, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='维度截断两阶段检索基准测试')
+    parser.add_argument('--rows', type=int, default=100000, help='向量数')
+    parser.add_argument('--dim', type=int, default=2048, help='向量维度')
+    parser.add_argument('--clusters', type=int, default=500, help='合成语料的簇数')
+    parser.add_argument('--noise', type=float, default=1.0, help='簇内噪声强度')
+    parser.add_argument('--queries', type=int, default=100, help='查询数')
+    parser.add_argument('--top-k', type=int, default=30, help='召回率计算的K')
+    parser.add_argument('--truncate-dims', type=str, default='64,128,256,512', help='截断维度列表')
+    parser.add_argument('--shortlists', type=str, default='100,300,1000', help='全维度重排候选数列表')
+    args = parser.parse_args()
+    
+    vectors, queries = make_corpus(args.rows, args.dim, args.clusters, args.queries, args.noise)
+    print(f"语料: {args.rows} x {args.dim}，查询 {args.queries} 个，K={args.top_k}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        info = {"space": "cosine", "dimension": None, "metadata": {"hnsw:space": "cosine"}}
+        (path / COLLECTION_FILE).write_text(json.dumps(info), encoding="utf-8")
+        
+        exact = NumpyCollection(path)
+        batch = 5000
+        for offset in range(0, args.rows, batch):
+            block = vectors[offset:offset + batch]
+            exact.add(
+                ids=[str(i) for i in range(offset, offset + block.shape[0])],
+                embeddings=block,
+                documents=[""] * block.shape[0]
+            )
+        
+        exact_ids, exact_latencies = run_queries(exact, queries, args.top_k)
+        print(f"\n全维度精确检索: p50 {np.percentile(exact_latencies, 50):.2f}ms, p95 {np.percentile(exact_latencies, 95):.2f}ms")
+        print(f"\n{'截断维度':<8} {'重排候选':>8} {'recall@K':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'加速':>7}")
+        
+        for truncate_dim in (int(value) for value in args.truncate_dims.split(',')):
+            for shortlist in (int(value) for value in args.shortlists.split(',')):
+                collection = NumpyCollection(
+                    path,
+                    quantization="truncate",
+                    rescore_size=shortlist,
+                    truncate_dim=truncate_dim
+                )
+                collection._get_quantized()  # 截断副本的构建不计入查询延迟
+                
+                ids, latencies = run_queries(collection, queries, args.top_k)
+                recall = np.mean([
+                    len(set(found) & set(expected)) / len(expected)
+                    for found, expected in zip(ids, exact_ids)
+                ])
+                p50 = np.percentile(latencies, 50)
+                print(
+                    f"{truncate_dim:<8} {shortlist:>8} {recall:>9.4f} {p50:>9.2f} "
+                    f"{np.percentile(latencies, 95):>9.2f} {np.percentile(exact_latencies, 50) / p50:>6.1f}x"
+                )
+
+
+if __name__ == '__main__':
+    main()
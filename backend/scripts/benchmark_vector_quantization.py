@@ -0,0 +1,123 @@
+"""
+NumPy向量存储量化模式基准测试
+
+在合成语料（高斯混合簇，模拟同一小说内语义相近的片段）上对比 none / int8 / pq：
+- recall@K: 与精确检索Top-K的重合率
+- 内存: 每次查询需要扫描的常驻数据量（none为全精度矩阵，量化模式为编码）
+- 延迟: 单查询检索耗时（p50 / p95）
+
+用法:
+    python -m scripts.benchmark_vector_quantization [--rows 100000] [--dim 2048] [--queries 100]
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+import json
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.numpy_vector_store import NumpyCollection, COLLECTION_FILE
+
+
+def make_corpus(rows: int, dim: int, clusters: int, noise: float, seed: int = 0):
+    """生成高斯混合合成向量（noise越大簇越松散，近邻越难区分）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    assign = rng.integers(0, clusters, size=rows)
+    vectors = centers[assign] + noise * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors, centers
+
+
+def build_collection(path: Path, vectors: np.ndarray, quantization: str, rescore_size: int, pq_subspaces: int):
+    """写入集合并完成量化编码，返回 (集合, 构建耗时)"""
+    path.mkdir(parents=True)
+    info = {"space": "cosine", "dimension": None, "metadata": {"hnsw:space": "cosine"}}
+    (path / COLLECTION_FILE).write_text(json.dumps(info), encoding="utf-8")
+    
+    collection = NumpyCollection(
+        path,
+        quantization=quantization,
+        rescore_size=rescore_size,
+        pq_subspaces=pq_subspaces,
+        pq_min_rows=0
+    )
+    start = time.perf_counter()
+    batch = 5000
+    for offset in range(0, vectors.shape[0], batch):
+        block = vectors[offset:offset + batch]
+        collection.add(
+            ids=[str(i) for i in range(offset, offset + block.shape[0])],
+            embeddings=block,
+            documents=[""] * block.shape[0]
+        )
+    return collection, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NumPy向量存储量化模式基准测试')
+    parser.add_argument('--rows', type=int, default=100000, help='向量数')
+    parser.add_argument('--dim', type=int, default=2048, help='向量维度')
+    parser.add_argument('--clusters', type=int, default=200, help='合成语料的簇数')
+    parser.add_argument('--noise', type=float, default=2.0, help='簇内噪声强度（相对簇中心）')
+    parser.add_argument('--queries', type=int, default=100, help='查询数')
+    parser.add_argument('--top-k', type=int, default=30, help='召回率计算的K')
+    parser.add_argument('--rescore-size', type=int, default=300, help='全精度重排的候选数')
+    parser.add_argument('--pq-subspaces', type=int, default=64, help='PQ子空间数')
+    parser.add_argument('--modes', type=str, default='none,int8,pq', help='测试的量化方式')
+    args = parser.parse_args()
+    
+    vectors, centers = make_corpus(args.rows, args.dim, args.clusters, args.noise)
+    rng = np.random.default_rng(1)
+    queries = centers[rng.integers(0, args.clusters, size=args.queries)]
+    queries = queries + args.noise * rng.standard_normal(queries.shape).astype(np.float32)
+    print(f"语料: {args.rows} x {args.dim}，查询 {args.queries} 个，K={args.top_k}，重排候选 {args.rescore_size}")
+    
+    exact_ids = None
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"\n{'模式':<6} {'recall@K':>9} {'扫描内存':>10} {'磁盘':>10} {'p50(ms)':>9} {'p95(ms)':>9} {'构建(s)':>8}")
+        for mode in args.modes.split(','):
+            collection, build_seconds = build_collection(
+                Path(tmp) / mode, vectors, mode, args.rescore_size, args.pq_subspaces
+            )
+            
+            latencies = []
+            results = []
+            for query in queries:
+                start = time.perf_counter()
+                result = collection.query([query], n_results=args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+                results.append(result["ids"][0])
+            
+            if exact_ids is None:
+                # 精确结果作为召回率基准（首个模式不是none时单独计算）
+                if mode == "none":
+                    exact_ids = results
+                else:
+                    exact_collection = NumpyCollection(Path(tmp) / mode)
+                    exact_ids = [
+                        exact_collection.query([query], n_results=args.top_k)["ids"][0]
+                        for query in queries
+                    ]
+            recall = np.mean([
+                len(set(found) & set(expected)) / len(expected)
+                for found, expected in zip(results, exact_ids)
+            ])
+            
+            quantized = collection._get_quantized()
+            scan_bytes = quantized.nbytes() if quantized is not None else collection.size * args.dim * 4
+            disk_bytes = sum(path.stat().st_size for path in (Path(tmp) / mode).iterdir())
+            
+            print(
+                f"{mode:<6} {recall:>9.4f} {scan_bytes / 2**20:>8.1f}MB {disk_bytes / 2**20:>8.1f}MB "
+                f"{np.percentile(latencies, 50):>9.2f} {np.percentile(latencies, 95):>9.2f} {build_seconds:>8.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
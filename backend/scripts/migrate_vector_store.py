@@ -0,0 +1,71 @@
+"""
+将ChromaDB中已有的向量集合迁移到NumPy向量存储（VECTOR_STORE_PATH）
+
+迁移后设置 VECTOR_STORE_BACKEND=numpy 即可切换，无需重新调用Embedding API
+
+用法:
+    python -m scripts.migrate_vector_store [--collection novel_1] [--batch-size 2000]
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.chromadb_client import get_chroma_client
+from app.core.numpy_vector_store import NumpyVectorStore
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_collection(store: NumpyVectorStore, name: str, batch_size: int) -> int:
+    """迁移单个集合，返回迁移的文档数"""
+    collection = get_chroma_client().get_collection(name)
+    total = collection.count()
+    
+    store.create_collection(name, metadata=collection.metadata)
+    
+    migrated = 0
+    for offset in range(0, total, batch_size):
+        batch = collection.get(
+            include=["embeddings", "documents", "metadatas"],
+            limit=batch_size,
+            offset=offset
+        )
+        store.add(
+            name,
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"]
+        )
+        migrated += len(batch["ids"])
+    
+    logger.info(f"✅ {name}: 迁移 {migrated}/{total} 条向量")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='迁移ChromaDB向量集合到NumPy向量存储')
+    parser.add_argument('--collection', type=str, help='指定集合名称（不指定则迁移所有集合）')
+    parser.add_argument('--batch-size', type=int, default=2000, help='每批读取的向量数')
+    args = parser.parse_args()
+    
+    store = NumpyVectorStore(settings.vector_store_path)
+    names = [args.collection] if args.collection else get_chroma_client().list_collections()
+    logger.info(f"找到 {len(names)} 个集合")
+    
+    total = 0
+    for name in names:
+        total += migrate_collection(store, name, args.batch_size)
+    
+    logger.info(f"✅ 总共迁移了 {total} 条向量")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+异步查询流程并发测试
+
+验证 RAGEngine.aquery 不阻塞事件循环：
+N 个并发查询的总耗时应接近单个查询的耗时，且查询期间事件循环保持响应
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services import rag_engine as rag_engine_module
+from app.services.rag_engine import RAGEngine, PreparedQuery
+
+# 模拟的检索耗时（同步阻塞）与生成耗时（异步网络等待）
+RETRIEVAL_SECONDS = 0.2
+GENERATION_SECONDS = 0.3
+NUM_QUERIES = 8
+
+
+class FakeLLMClient:
+    """模拟原生异步SDK的LLM客户端"""
+    
+    async def achat_completion(self, messages, model, **kwargs):
+        await asyncio.sleep(GENERATION_SECONDS)
+        return {"content": "答案", "usage": {"prompt_tokens": 10, "completion_tokens": 2}}
+
+
+class FakeQueryCache:
+    """模拟查询缓存（只记录写入）"""
+    
+    def __init__(self):
+        self.entries = []
+    
+    def set(self, *args, **kwargs):
+        self.entries.append(args)
+
+
+def fake_prepare_query(db, novel_id, query, model, **kwargs):
+    """模拟检索阶段：阻塞式的磁盘/CPU工作"""
+    time.sleep(RETRIEVAL_SECONDS)
+    chunk = {
+        "content": f"{query} 相关片段",
+        "metadata": {"chapter_num": 1, "chapter_title": "第一章"},
+        "score": 0.9
+    }
+    return PreparedQuery(
+        novel_id=novel_id,
+        query=query,
+        model=model,
+        prompt=f"问题: {query}",
+        reranked_chunks=[chunk],
+        retrieved_count=1,
+        stats={"retrieved": 1}
+    )
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """构造不依赖外部服务的RAGEngine"""
+    engine = RAGEngine.__new__(RAGEngine)
+    engine.query_cache = FakeQueryCache()
+    monkeypatch.setattr(engine, "prepare_query", fake_prepare_query)
+    monkeypatch.setattr(
+        "app.services.llm.factory.get_llm_client_for_model",
+        lambda model: (FakeLLMClient(), "fake-model")
+    )
+    monkeypatch.setattr(rag_engine_module.settings, "query_retrieval_workers", NUM_QUERIES)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_parallel_queries_finish_in_time_of_one(engine):
+    """N个并发查询的总耗时接近单个查询"""
+    single_start = time.perf_counter()
+    await engine.aquery(db=None, novel_id=1, query="单个查询")
+    single_elapsed = time.perf_counter() - single_start
+    
+    # 事件循环心跳：查询期间应持续被调度
+    ticks = 0
+    stop = asyncio.Event()
+    
+    async def ticker():
+        nonlocal ticks
+        while not stop.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+    
+    ticker_task = asyncio.create_task(ticker())
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        engine.aquery(db=None, novel_id=1, query=f"查询{i}")
+        for i in range(NUM_QUERIES)
+    ])
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await ticker_task
+    
+    assert len(results) == NUM_QUERIES
+    assert all(result.answer == "答案" for result in results)
+    assert all(len(result.citations) == 1 for result in results)
+    assert len(engine.query_cache.entries) == NUM_QUERIES + 1
+    
+    # 串行执行需要 NUM_QUERIES * single_elapsed，并发应接近单个查询耗时
+    assert elapsed < single_elapsed * 2, f"并发耗时 {elapsed:.2f}s，单个查询 {single_elapsed:.2f}s"
+    
+    # 事件循环未被阻塞：心跳次数接近 elapsed / 0.01
+    assert ticks >= (elapsed / 0.01) * 0.5, f"事件循环心跳过少: {ticks}"
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_queries_are_coalesced(engine, monkeypatch):
+    """相同的并发查询只执行一次检索与生成"""
+    prepare_calls = []
+    
+    def counting_prepare_query(db, novel_id, query, model, **kwargs):
+        prepare_calls.append(query)
+        return fake_prepare_query(db, novel_id, query, model, **kwargs)
+    
+    monkeypatch.setattr(engine, "prepare_query", counting_prepare_query)
+    monkeypatch.setattr(rag_engine_module.settings, "query_coalescing_enabled", True)
+    
+    results = await asyncio.gather(*[
+        engine.aquery(db=None, novel_id=1, query="热门问题")
+        for _ in range(NUM_QUERIES)
+    ])
+    
+    assert prepare_calls == ["热门问题"]
+    assert len(engine.query_cache.entries) == 1
+    assert all(result.answer == "答案" for result in results)
+    assert sum(not result.from_cache for result in results) == 1
@@ -0,0 +1,152 @@
+"""
+倒排 BM25 索引与 rank_bm25.BM25Okapi 一致性测试
+
+单段索引、多段索引（全局统计量）、合并后的索引，分数与 Top-K 排序都应与 BM25Okapi 对整个语料的结果一致；
+BM25Retriever 端到端（进程池分词、追加段、合并）同样与 BM25Okapi 一致
+"""
+
+import os
+import random
+import sys
+
+import jieba
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services.bm25_retriever import BM25Index, BM25Retriever, SegmentedBM25Index, tokenize_corpus
+from app.services.chunk_ids import make_chunk_id
+
+# 词项按 Zipf 分布抽样：高频词出现在一半以上的文档中（负IDF），低频词只出现在少数文档中
+VOCAB = [f"w{i}" for i in range(60)]
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(VOCAB))]
+QUERIES = [
+    ["w0"],
+    ["w1", "w5", "w30"],
+    ["w2", "w2", "w7"],  # 重复词项重复计分
+    ["w0", "w1", "w2", "w3"],
+    ["w59", "w45"],
+    ["w10", "不存在"],
+]
+SEGMENT_SPLITS = [0, 70, 95, 120]
+
+WORDS = ["萧炎", "药老", "云岚宗", "斗气", "修炼", "。", "，", "他", "说道", "\"", "火焰", "纳兰嫣然", "丹药"]
+TEXT_QUERIES = ["萧炎 药老", "云岚宗修炼", "火焰", "说道", "纳兰嫣然的丹药"]
+
+
+@pytest.fixture
+def corpus():
+    """固定种子的随机分词语料"""
+    rng = random.Random(0)
+    return [rng.choices(VOCAB, WEIGHTS, k=rng.randint(1, 30)) for _ in range(SEGMENT_SPLITS[-1])]
+
+
+def okapi_top_k(bm25: BM25Okapi, query_tokens, k: int):
+    """BM25Okapi 全量打分后取正分 Top-K（分数降序、文档ID升序）"""
+    scores = bm25.get_scores(query_tokens)
+    ranked = sorted((i for i in range(len(scores)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+    return [(i, scores[i]) for i in ranked[:k]]
+
+
+def dense_scores(index, query_tokens, num_docs: int) -> np.ndarray:
+    """稀疏打分结果展开为稠密数组（未命中文档为0，与 BM25Okapi 一致）"""
+    doc_ids, scores = index.get_scores(query_tokens)
+    dense = np.zeros(num_docs)
+    dense[doc_ids] = scores
+    return dense
+
+
+def assert_matches_okapi(index, bm25: BM25Okapi, num_docs: int):
+    for query in QUERIES:
+        np.testing.assert_allclose(dense_scores(index, query, num_docs), bm25.get_scores(query), rtol=1e-9, atol=1e-12)
+        for k in (1, 5, 10, num_docs + 10):
+            expected = okapi_top_k(bm25, query, k)
+            actual = index.top_k(query, k)
+            assert [doc_id for doc_id, _ in actual] == [doc_id for doc_id, _ in expected]
+            assert [score for _, score in actual] == pytest.approx([score for _, score in expected])
+
+
+def segments_of(corpus):
+    return [BM25Index.build(corpus[start:end]) for start, end in zip(SEGMENT_SPLITS, SEGMENT_SPLITS[1:])]
+
+
+def test_single_index_matches_okapi(corpus):
+    assert_matches_okapi(BM25Index.build(corpus), BM25Okapi(corpus), len(corpus))
+
+
+def test_segmented_index_uses_global_statistics(corpus):
+    """多段索引按全局文档频率与平均文档长度打分，与对整个语料建的 BM25Okapi 一致"""
+    assert_matches_okapi(SegmentedBM25Index(segments_of(corpus)), BM25Okapi(corpus), len(corpus))
+
+
+def test_merged_index_matches_okapi(corpus):
+    assert_matches_okapi(BM25Index.merge(segments_of(corpus)), BM25Okapi(corpus), len(corpus))
+
+
+def test_edge_cases(corpus):
+    """未知词项、空查询、k 大于文档数、k 为 0"""
+    bm25 = BM25Okapi(corpus)
+    for index in (BM25Index.build(corpus), SegmentedBM25Index(segments_of(corpus)), BM25Index.merge(segments_of(corpus))):
+        assert index.top_k(["不存在", "也不存在"], 10) == []
+        assert index.top_k([], 10) == []
+        assert index.top_k(["w1"], 0) == []
+        everything = index.top_k(["w40", "w50"], len(corpus) * 2)
+        assert [doc_id for doc_id, _ in everything] == [doc_id for doc_id, _ in okapi_top_k(bm25, ["w40", "w50"], len(corpus) * 2)]
+
+
+def test_parallel_tokenization_matches_serial():
+    """进程池分批分词与逐条 jieba 分词结果一致且顺序不变"""
+    rng = random.Random(1)
+    texts = ["".join(rng.choice(WORDS) for _ in range(rng.randint(0, 50))) for _ in range(40)]
+    assert tokenize_corpus(texts, workers=2, batch_size=7) == [list(jieba.cut_for_search(text)) for text in texts]
+
+
+def test_retriever_segments_and_compaction_match_okapi(tmp_path, monkeypatch):
+    """BM25Retriever：全量构建 + 追加段 + 合并，检索结果与 BM25Okapi 一致"""
+    monkeypatch.setattr(settings, "data_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "bm25_tokenize_workers", 2)
+    monkeypatch.setattr(settings, "bm25_tokenize_batch_size", 16)
+    
+    rng = random.Random(2)
+    chunks = []
+    for chapter_num in range(1, 13):
+        for chunk_index in range(rng.randint(3, 8)):
+            chunks.append({
+                'content': "".join(rng.choice(WORDS) for _ in range(rng.randint(5, 60))),
+                'metadata': {
+                    'novel_id': 901,
+                    'chapter_num': chapter_num,
+                    'chunk_index': chunk_index,
+                    'chunk_id': make_chunk_id(chapter_num, chunk_index)
+                }
+            })
+    bm25 = BM25Okapi([list(jieba.cut_for_search(chunk['content'])) for chunk in chunks])
+    
+    def expected(query: str, k: int):
+        return [
+            (chunks[doc_id]['metadata']['chunk_id'], pytest.approx(score))
+            for doc_id, score in okapi_top_k(bm25, list(jieba.cut_for_search(query)), k)
+        ]
+    
+    def actual(query: str, k: int):
+        return [(result['metadata']['chunk_id'], result['score']) for result in BM25Retriever(901).search(query, k)]
+    
+    first_append = sum(1 for chunk in chunks if chunk['metadata']['chapter_num'] <= 8)
+    second_append = sum(1 for chunk in chunks if chunk['metadata']['chapter_num'] <= 10)
+    BM25Retriever(901).build_index(chunks[:first_append])
+    assert BM25Retriever(901).append_segment(chunks[first_append:second_append])
+    assert BM25Retriever(901).append_segment(chunks[second_append:])
+    
+    for query in TEXT_QUERIES:
+        for k in (3, 10, len(chunks) + 5):
+            assert actual(query, k) == expected(query, k)
+    assert BM25Retriever(901).search("", 10) == []
+    
+    assert BM25Retriever(901).compact_segments()
+    for query in TEXT_QUERIES:
+        for k in (3, 10, len(chunks) + 5):
+            assert actual(query, k) == expected(query, k)
@@ -0,0 +1,118 @@
+"""
+分块文本中心存储测试
+
+文本写入中心存储后，BM25 索引只保存分块ID，检索结果（文本、元数据、得分）应与内联文本的索引一致
+"""
+
+import os
+import pickle
+import random
+import sys
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services.bm25_retriever import BM25Retriever
+from app.services.chunk_store import ChunkStore, get_chunk_store, has_chunk_texts, resolve_documents
+from app.services.text_splitter import get_text_splitter
+
+WORDS = ["萧炎", "药老", "云岚宗", "斗气", "修炼", "。", "，", "他", "说道", "\"", "火焰"]
+QUERIES = ["萧炎 药老", "云岚宗 修炼", "火焰", "说道", "不存在"]
+
+
+@pytest.fixture
+def chapters(tmp_path, monkeypatch):
+    """随机章节及其分块"""
+    monkeypatch.setattr(settings, "data_dir", str(tmp_path))
+    rng = random.Random(0)
+    splitter = get_text_splitter()
+    result = {}
+    for chapter_num in range(1, 11):
+        title = f"第{chapter_num}章 标题{chapter_num}"
+        text = title + "\n" + "".join(rng.choice(WORDS) for _ in range(rng.randint(200, 1000)))
+        result[chapter_num] = (title, text, splitter.split_chapter(text, 1, chapter_num, title))
+    return result
+
+
+def test_chunk_store_round_trip(chapters):
+    """按ID读取文本、还原元数据，重复追加以最后一次为准"""
+    store = ChunkStore(1)
+    for chapter_num, (title, text, chunks) in chapters.items():
+        assert store.append(chunks, [(chapter_num, title)])
+    
+    reader = get_chunk_store(1)
+    all_chunks = [chunk for _, _, chunks in chapters.values() for chunk in chunks]
+    chunk_ids = [chunk['metadata']['chunk_id'] for chunk in all_chunks]
+    assert reader.get_texts(chunk_ids + [None]) == [chunk['content'] for chunk in all_chunks] + [None]
+    for chunk in all_chunks:
+        assert reader.get_metadata(chunk['metadata']['chunk_id'], chunk['content']) == chunk['metadata']
+    assert reader.get_chapter_title(3) == chapters[3][0]
+    
+    results = {'documents': [['', '保留']], 'metadatas': [[all_chunks[0]['metadata'], {}]]}
+    assert resolve_documents(1, results)['documents'] == [[all_chunks[0]['content'], '保留']]
+    
+    assert store.append([{'content': '新文本', 'metadata': all_chunks[0]['metadata']}])
+    assert get_chunk_store(1).get_texts(chunk_ids[:1]) == ['新文本']
+    
+    store.delete()
+    assert get_chunk_store(1) is None
+
+
+def test_bm25_ids_only_index_matches_inline_index(chapters):
+    """只保存分块ID的 BM25 索引（含追加段与合并）检索结果与内联文本一致"""
+    all_chunks = [chunk for _, _, chunks in chapters.values() for chunk in chunks]
+    inline = BM25Retriever(2)
+    inline.build_index(all_chunks)
+    expected = {query: inline.search(query, 10) for query in QUERIES}
+    
+    store = ChunkStore(1)
+    for chapter_num, (title, text, chunks) in chapters.items():
+        store.append(chunks, [(chapter_num, title)])
+    
+    retriever = BM25Retriever(1)
+    retriever.build_index([chunk for n in range(1, 8) for chunk in chapters[n][2]])
+    retriever.append_segment([chunk for n in range(8, 11) for chunk in chapters[n][2]])
+    with open(retriever.index_path, 'rb') as f:
+        assert 'documents' not in pickle.load(f)
+    
+    def key(results):
+        return [(r['chunk_id'], r['content'], r['metadata'], pytest.approx(r['score'])) for r in results]
+    
+    for query in QUERIES:
+        assert key(BM25Retriever(1).search(query, 10)) == key(expected[query])
+    
+    assert BM25Retriever(1).compact_segments()
+    for query in QUERIES:
+        assert key(BM25Retriever(1).search(query, 10)) == key(expected[query])
+
+
+def test_rebuild_switches_generation_only_on_publish(chapters):
+    """重建期间查询读取旧一代，丢弃后旧文本保留，切换后读取新一代并删除旧一代"""
+    store = ChunkStore(1)
+    for chapter_num, (title, text, chunks) in chapters.items():
+        store.append(chunks, [(chapter_num, title)])
+    chunk = chapters[1][2][0]
+    chunk_id = chunk['metadata']['chunk_id']
+    old_dir = store.blob_path.parent
+    
+    rebuild = ChunkStore.begin_rebuild(1)
+    assert rebuild.append([{'content': '重建文本', 'metadata': chunk['metadata']}], [(1, chapters[1][0])])
+    assert has_chunk_texts(1, [chunk_id])
+    assert not has_chunk_texts(1, [chapters[2][2][0]['metadata']['chunk_id']])
+    assert get_chunk_store(1).get_texts([chunk_id]) == [chunk['content']]
+    
+    rebuild.discard()
+    assert get_chunk_store(1).get_texts([chunk_id]) == [chunk['content']]
+    assert not rebuild.blob_path.parent.exists()
+    
+    rebuild = ChunkStore.begin_rebuild(1)
+    rebuild.append([{'content': '重建文本', 'metadata': chunk['metadata']}], [(1, chapters[1][0])])
+    rebuild.publish()
+    assert get_chunk_store(1).get_texts([chunk_id, chapters[2][2][0]['metadata']['chunk_id']]) == ['重建文本', None]
+    assert not old_dir.exists()
+    
+    ChunkStore(1).delete()
+    assert get_chunk_store(1) is None
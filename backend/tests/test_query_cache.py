@@ -0,0 +1,82 @@
+"""
+查询缓存二级存储测试
+
+- 查询结果（含引用）经 L2 往返后还原为相同的 RAGQueryResult
+- L2 中无法解码的记录、无法还原为查询结果的条目按未命中处理并被删除
+"""
+
+import os
+import sys
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.models.schemas import Citation
+from app.services.query_cache import QueryCacheService
+from app.services.query_cache_store import SQLiteCacheStore
+from app.services.rag_engine import RAGEngine, RAGQueryResult
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SQLiteCacheStore(str(tmp_path / "query_cache.db"))
+
+
+@pytest.fixture
+def engine(store):
+    """只带查询缓存的RAGEngine（L1与L2分离，模拟另一个worker读取L2）"""
+    engine = RAGEngine.__new__(RAGEngine)
+    engine.query_cache = QueryCacheService(l2=store)
+    return engine
+
+
+def make_result() -> RAGQueryResult:
+    return RAGQueryResult(
+        answer="药老是萧炎的老师",
+        citations=[Citation(novel_id=1, novel_title="斗破苍穹", chapter_num=3, chapter_title="第三章", text="……", score=0.8)],
+        stats={'retrieved_chunks': 12, 'citations': 1},
+        prompt="prompt",
+        reranked_chunks=[{'chunk_id': 3 << 20, 'content': "……", 'metadata': {'chapter_num': 3}, 'score': 0.8}],
+        retrieved_count=12,
+        usage={'total_tokens': 100}
+    )
+
+
+def cache_result(engine, result: RAGQueryResult):
+    engine.query_cache.set(
+        1, "萧炎和药老的关系", "glm-4",
+        {**vars(result), 'citations': [citation.model_dump() for citation in result.citations]}
+    )
+    # 清空L1（不清L2），后续读取走L2
+    engine.query_cache.cache.clear()
+
+
+def test_l2_round_trip_restores_result(engine):
+    result = make_result()
+    cache_result(engine, result)
+    
+    cached = engine._result_from_cache(engine.query_cache.get(1, "萧炎和药老的关系", "glm-4"))
+    assert cached == RAGQueryResult(**{**vars(result), 'from_cache': True})
+    assert engine.query_cache.l2_hit_count == 1
+
+
+def test_undecodable_l2_record_is_deleted(engine, store):
+    cache_result(engine, make_result())
+    store._connect().execute("UPDATE query_cache SET value = ?", (b"not zlib",))
+    
+    assert engine.query_cache.get(1, "萧炎和药老的关系", "glm-4") is None
+    assert store.get_stats()['entries'] == 0
+
+
+def test_unrestorable_entry_is_discarded(engine, store):
+    result = make_result()
+    cache_result(engine, result)
+    key = engine.query_cache._generate_key(1, "萧炎和药老的关系", "glm-4")
+    # 可以解码但引用缺少必填字段
+    store.set(key, {'key': key, 'result': {**vars(result), 'citations': [{'text': "……"}]}, 'cached_at': 0.0}, novel_id=1)
+    
+    assert engine._result_from_cache(engine.query_cache.get(1, "萧炎和药老的关系", "glm-4")) is None
+    assert store.get_stats()['entries'] == 0
+    assert engine.query_cache.get(1, "萧炎和药老的关系", "glm-4") is None
@@ -0,0 +1,282 @@
+"""
+向量化Rerank内核一致性测试
+
+用随机候选文档对比 rerank_kernel 与逐候选的标量公式
+（_calculate_entity_match_score / _calculate_quote_boost / _calculate_recency_bias），
+三种查询类型与查询分解的全局Rerank得分和排序都应逐位一致
+"""
+
+import math
+import os
+import random
+import sys
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.query_router import QueryType
+from app.services.rag_engine import RAGEngine, RerankContext
+from app.services.rerank_kernel import EntityMatcher
+
+# 随机文档的组成片段：实体、包含实体的词、引号、中英文标点
+PIECES = [
+    "张三", "李四", "王五", "萧炎", "张三丰", "李四娘", "药老", "云岚宗",
+    "他说", "\"", "'", "，", "。", " ", "a", "1", "走了过来", "心中一动", "萧炎哥哥"
+]
+ENTITIES = ["张三", "李四", "萧炎", "云岚宗", "药老", "王五", "张三丰"]
+TOTAL_CHAPTERS = 50
+
+
+class FakeGraphAnalyzer:
+    """固定的关系演变章节"""
+    
+    def get_evolution_chapters(self, graph_features, entity_a, entity_b):
+        return {3, 7, 12}
+
+
+def random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 40)))
+
+
+def random_entities(rng: random.Random):
+    # 可能为空、可能包含重复实体
+    return [rng.choice(ENTITIES) for _ in range(rng.randint(0, 4))]
+
+
+@pytest.fixture
+def engine():
+    """构造不依赖外部服务的RAGEngine"""
+    engine = RAGEngine.__new__(RAGEngine)
+    engine.top_k_rerank = 10
+    engine.graph_analyzer = FakeGraphAnalyzer()
+    return engine
+
+
+def reference_rerank(engine, documents, metadatas, distances, query_entities, query_type,
+                     chapter_features, recency_bias_weight, evolution_chapters):
+    """逐候选的标量公式（向量化之前的实现）"""
+    candidates = []
+    for i, (doc, metadata) in enumerate(zip(documents, metadatas)):
+        base_score = math.exp(-distances[i]**2 / 2)
+        entity_match_score = engine._calculate_entity_match_score(doc, query_entities)
+        chapter_num = metadata.get('chapter_num')
+        chapter_importance = 0.5
+        if chapter_num and chapter_num in chapter_features:
+            chapter_importance = chapter_features[chapter_num]['importance']
+        recency_bias = engine._calculate_recency_bias(chapter_num, TOTAL_CHAPTERS, recency_bias_weight)
+        
+        if query_type == QueryType.DIALOGUE:
+            quote_boost = engine._calculate_quote_boost(doc)
+            if base_score > 0.85:
+                quote_boost = 1.0 + (quote_boost - 1.0) * 0.5
+            final_score = base_score * quote_boost * entity_match_score * recency_bias
+        elif query_type == QueryType.ANALYSIS:
+            importance_boost = chapter_importance + 0.5
+            if base_score < 0.60:
+                importance_boost = importance_boost * 1.3
+            final_score = base_score * importance_boost * entity_match_score * recency_bias
+        else:
+            w_semantic, w_temporal, w_entity = 0.50, 0.10, 0.40
+            if base_score > 0.85:
+                w_semantic, w_entity = 0.60, 0.30
+            elif base_score < 0.50:
+                w_semantic, w_entity = 0.30, 0.60
+            if entity_match_score > 1.3:
+                w_entity = min(w_entity + 0.10, 0.70)
+                w_semantic = max(w_semantic - 0.10, 0.20)
+            elif entity_match_score < 0.5:
+                w_entity = max(w_entity - 0.15, 0.15)
+                w_semantic = min(w_semantic + 0.15, 0.75)
+            total_weight = w_semantic + w_temporal + w_entity
+            final_score = (
+                (base_score * w_semantic) / total_weight +
+                (chapter_importance * w_temporal) / total_weight +
+                (entity_match_score * w_entity) / total_weight
+            )
+            final_score = final_score * recency_bias
+        
+        if evolution_chapters and chapter_num and chapter_num in evolution_chapters:
+            final_score *= 1.5
+        candidates.append((final_score, base_score, entity_match_score, i + 1))
+    
+    candidates.sort(key=lambda x: -x[0])
+    return candidates
+
+
+def test_entity_matcher_matches_scalar_score(engine):
+    """一次编译的匹配器与逐实体正则得分一致"""
+    rng = random.Random(0)
+    for _ in range(200):
+        entities = random_entities(rng)
+        texts = [random_text(rng) for _ in range(20)]
+        expected = [engine._calculate_entity_match_score(text, entities) for text in texts]
+        assert EntityMatcher(entities).scores(texts).tolist() == expected
+
+
+@pytest.mark.parametrize("query_type", [QueryType.FACT, QueryType.DIALOGUE, QueryType.ANALYSIS])
+def test_rerank_matches_scalar_formulas(engine, query_type, monkeypatch):
+    """三种查询类型的得分与排序与标量公式逐位一致"""
+    # 相邻块合并与打分无关，这里比较合并前的排序
+    monkeypatch.setattr(engine, "_merge_adjacent_chunks", lambda candidates: candidates, raising=False)
+    rng = random.Random(query_type.value)
+    for _ in range(50):
+        n = rng.randint(1, 60)
+        documents = [random_text(rng) for _ in range(n)]
+        metadatas = [{'chapter_num': rng.randint(0, TOTAL_CHAPTERS)} for _ in range(n)]
+        distances = [rng.uniform(0.0, 1.6) for _ in range(n)]
+        query_entities = random_entities(rng)
+        chapter_features = {c: {'importance': rng.random()} for c in range(1, TOTAL_CHAPTERS + 1, 2)}
+        recency_bias_weight = rng.choice([0.0, 0.15, 0.5])
+        graph = object() if rng.random() < 0.5 else None
+        
+        context = RerankContext(
+            query_entities=query_entities,
+            query_type=query_type,
+            total_chapters=TOTAL_CHAPTERS,
+            graph=graph,
+            graph_features={'chapters': chapter_features}
+        )
+        vector_results = {'documents': [documents], 'metadatas': [metadatas], 'distances': [distances]}
+        results = engine.rerank(
+            "查询", vector_results, top_k=n, query_type=query_type,
+            recency_bias_weight=recency_bias_weight, context=context
+        )
+        
+        evolution_chapters = (
+            engine.graph_analyzer.get_evolution_chapters({}, None, None)
+            if graph and len(query_entities) >= 2 else None
+        )
+        expected = reference_rerank(
+            engine, documents, metadatas, distances, query_entities, query_type,
+            chapter_features, recency_bias_weight, evolution_chapters
+        )
+        
+        assert [(r['score'], r['base_score'], r['entity_match_score'], r['rank']) for r in results] == expected
+
+
+def test_unified_rerank_matches_scalar_formula(engine):
+    """查询分解全局Rerank得分与标量公式逐位一致"""
+    rng = random.Random(1)
+    for _ in range(50):
+        n = rng.randint(1, 40)
+        chunks = [
+            {
+                'content': random_text(rng),
+                'metadata': {'chapter_num': rng.randint(1, TOTAL_CHAPTERS)},
+                'score': rng.random()
+            }
+            for _ in range(n)
+        ]
+        query_entities = random_entities(rng)
+        chapter_features = {c: {'importance': rng.random()} for c in range(1, TOTAL_CHAPTERS + 1, 3)}
+        recency_bias_weight = rng.choice([0.0, 0.15, 0.5])
+        engine._extract_entities = lambda query: query_entities
+        engine._resolve_entity_aliases = lambda entities, novel_id, db: entities
+        
+        context = RerankContext(
+            query_entities=query_entities,
+            query_type=QueryType.FACT,
+            total_chapters=TOTAL_CHAPTERS,
+            graph_features={'chapters': chapter_features}
+        )
+        results = engine._rerank_unified(
+            "查询", chunks, 1, None, None, recency_bias_weight, top_k=n, shared_context=context
+        )
+        
+        expected = []
+        for chunk in chunks:
+            chapter_num = chunk['metadata']['chapter_num']
+            entity_match_score = engine._calculate_entity_match_score(chunk['content'], query_entities)
+            chapter_importance = chapter_features.get(chapter_num, {}).get('importance', 0.5)
+            recency_bias = engine._calculate_recency_bias(chapter_num, TOTAL_CHAPTERS, recency_bias_weight)
+            expected.append((
+                chunk['score'] * entity_match_score * recency_bias * (0.5 + chapter_importance),
+                entity_match_score
+            ))
+        expected.sort(key=lambda x: -x[0])
+        
+        assert [(r['score'], r['entity_match_score']) for r in results] == expected
+
+
+def test_precomputed_chunk_features_keep_scores(engine, tmp_path, monkeypatch):
+    """使用索引时预计算的分块特征，得分不变，并附加分块中出现的实体"""
+    from app.services import rag_engine as rag_engine_module
+    from app.services.chunk_features import ChunkFeatureStore
+    
+    monkeypatch.setattr(rag_engine_module.settings, "data_dir", str(tmp_path))
+    
+    rng = random.Random(2)
+    n = 40
+    chunks = [
+        {
+            'content': random_text(rng),
+            'metadata': {'chapter_num': rng.randint(1, TOTAL_CHAPTERS), 'chunk_index': i}
+        }
+        for i in range(n)
+    ]
+    store = ChunkFeatureStore(1)
+    assert store.build(chunks, TOTAL_CHAPTERS, entity_names=ENTITIES)
+    features = store.load()
+    
+    context = RerankContext(
+        query_entities=["萧炎", "药老"],
+        query_type=QueryType.DIALOGUE,
+        total_chapters=TOTAL_CHAPTERS
+    )
+    vector_results = {
+        'documents': [[chunk['content'] for chunk in chunks]],
+        'metadatas': [[chunk['metadata'] for chunk in chunks]],
+        'distances': [[rng.uniform(0.0, 1.6) for _ in range(n)]]
+    }
+    
+    monkeypatch.setattr(rag_engine_module, "get_chunk_features", lambda novel_id: None)
+    expected = engine.rerank("查询", vector_results, top_k=n, novel_id=1, context=context)
+    monkeypatch.setattr(rag_engine_module, "get_chunk_features", lambda novel_id: features)
+    results = engine.rerank("查询", vector_results, top_k=n, novel_id=1, context=context)
+    
+    assert [r['score'] for r in results] == [r['score'] for r in expected]
+    for result in results:
+        content = result['content']
+        assert result['metadata']['entities'] == sorted(e for e in ENTITIES if e in content)
+
+
+def test_multi_novel_candidates_skip_other_novel_features(engine, tmp_path, monkeypatch):
+    """多小说检索：两本小说有相同（章节, 块序号）的分块时，只有来自 novel_id 的分块使用其预计算特征"""
+    from app.services import rag_engine as rag_engine_module
+    from app.services.chunk_features import ChunkFeatureStore
+    
+    monkeypatch.setattr(rag_engine_module.settings, "data_dir", str(tmp_path))
+    
+    # 小说1的分块对白密集且提到实体；小说2同位置的分块没有引号和实体
+    dialogue = "萧炎说：\"药老，\"\"走吧。\"" * 3
+    plain = "云岚宗山门外风平浪静" * 3
+    store = ChunkFeatureStore(1)
+    assert store.build(
+        [{'content': dialogue, 'metadata': {'chapter_num': 3, 'chunk_index': 0}}],
+        TOTAL_CHAPTERS, entity_names=ENTITIES
+    )
+    features = store.load()
+    
+    context = RerankContext(query_entities=[], query_type=QueryType.DIALOGUE, total_chapters=TOTAL_CHAPTERS)
+    vector_results = {
+        'documents': [[dialogue, plain]],
+        'metadatas': [[
+            {'chapter_num': 3, 'chunk_index': 0, 'source_novel_id': 1},
+            {'chapter_num': 3, 'chunk_index': 0, 'source_novel_id': 2}
+        ]],
+        'distances': [[0.5, 0.5]]
+    }
+    
+    monkeypatch.setattr(rag_engine_module, "get_chunk_features", lambda novel_id: None)
+    expected = engine.rerank("查询", vector_results, top_k=2, novel_id=1, context=context)
+    monkeypatch.setattr(rag_engine_module, "get_chunk_features", lambda novel_id: features if novel_id == 1 else None)
+    results = engine.rerank("查询", vector_results, top_k=2, novel_id=1, context=context)
+    
+    assert [r['score'] for r in results] == [r['score'] for r in expected]
+    by_novel = {r['metadata']['source_novel_id']: r['metadata'] for r in results}
+    assert by_novel[1]['entities'] == ["药老", "萧炎"]
+    assert 'entities' not in by_novel[2] and 'token_count' not in by_novel[2]
+    assert features.lookup(vector_results['metadatas'][0], 1).tolist() == [0, -1]
+    assert features.lookup(vector_results['metadatas'][0]).tolist() == [0, 0]
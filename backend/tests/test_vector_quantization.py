@@ -0,0 +1,185 @@
+"""
+NumPy向量存储量化检索测试
+
+固定种子的聚簇向量：
+- 未开启量化时检索结果与暴力精确检索逐位一致
+- int8 / pq / truncate 粗排 + 全精度重排的 recall@30 不低于 0.95；短名单覆盖全部候选时与精确检索一致
+- where 过滤与 Chroma 的语义一致（缺失键、$ne/$nin、$and/$or 等）
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.core.numpy_vector_store import NumpyVectorStore
+from app.core.vector_quantization import Int8Index, PQIndex, TruncatedIndex
+
+DIMENSION = 64
+NUM_ROWS = 3000
+NUM_QUERIES = 20
+TOP_K = 30
+RESCORE_SIZE = 150
+MIN_RECALL = 0.95
+
+WHERE_CLAUSES = [
+    {"chapter_num": 7},
+    {"chapter_num": {"$ne": 7}},
+    {"chapter_num": {"$gt": 10}},
+    {"$and": [{"chapter_num": {"$gte": 10}}, {"chapter_num": {"$lt": 20}}]},
+    {"chapter_num": {"$lte": 3}},
+    {"chapter_num": {"$in": [1, 2, 3, 44]}},
+    {"chapter_num": {"$nin": [1, 2, 3]}},
+    {"weight": {"$gt": 0.5}},
+    {"chapter_title": "第5章"},
+    {"chapter_title": {"$in": ["第1章", "第9章"]}},
+    {"quoted": True},
+    {"tag": "战斗"},
+    {"tag": {"$ne": "战斗"}},
+    {"tag": {"$nin": ["战斗"]}},
+    {"$and": [{"chapter_num": {"$gte": 5}}, {"quoted": False}]},
+    {"$or": [{"chapter_num": {"$lt": 3}}, {"tag": "日常"}]},
+    {"$and": [{"$or": [{"tag": "战斗"}, {"tag": "日常"}]}, {"chapter_num": {"$lte": 25}}]},
+]
+
+
+@pytest.fixture
+def data():
+    """聚簇向量（簇中心 + 噪声）与在数据点附近的查询"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(40, DIMENSION)).astype(np.float32)
+    matrix = centers[rng.integers(0, len(centers), NUM_ROWS)] + 0.35 * rng.normal(size=(NUM_ROWS, DIMENSION))
+    queries = matrix[rng.choice(NUM_ROWS, NUM_QUERIES, replace=False)] + 0.1 * rng.normal(size=(NUM_QUERIES, DIMENSION))
+    return matrix.astype(np.float32), queries.astype(np.float32)
+
+
+def make_store(tmp_path, monkeypatch, quantization: str, space: str, matrix: np.ndarray, metadatas=None):
+    monkeypatch.setattr(settings, "vector_store_rescore_size", RESCORE_SIZE)
+    monkeypatch.setattr(settings, "vector_store_pq_subspaces", 16)
+    monkeypatch.setattr(settings, "vector_store_pq_min_rows", 1000)
+    monkeypatch.setattr(settings, "vector_store_truncate_dim", 16)
+    store = NumpyVectorStore(str(tmp_path / quantization / space), quantization=quantization)
+    store.create_collection("test", {"hnsw:space": space})
+    store.add(
+        "test",
+        ids=[f"id{i}" for i in range(len(matrix))],
+        embeddings=matrix.tolist(),
+        documents=[f"doc{i}" for i in range(len(matrix))],
+        metadatas=metadatas
+    )
+    return store
+
+
+def brute_force(matrix: np.ndarray, queries: np.ndarray, space: str, k: int, rows=None):
+    """按Chroma的距离定义暴力计算 Top-K（行号, 距离）"""
+    matrix = matrix.astype(np.float64)
+    queries = queries.astype(np.float64)
+    if space == "cosine":
+        matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    rows = np.arange(len(matrix)) if rows is None else rows
+    vectors = matrix[rows]
+    if space == "l2":
+        distances = ((vectors[:, None, :] - queries[None, :, :]) ** 2).sum(axis=2)
+    else:
+        distances = 1.0 - vectors @ queries.T
+    hits = []
+    for column in distances.T:
+        top = np.argsort(column, kind="stable")[:k]
+        hits.append((rows[top], column[top]))
+    return hits
+
+
+@pytest.mark.parametrize("space", ["l2", "cosine", "ip"])
+def test_exact_search_matches_brute_force(tmp_path, monkeypatch, data, space):
+    matrix, queries = data
+    store = make_store(tmp_path, monkeypatch, "none", space, matrix)
+    result = store.query("test", queries.tolist(), n_results=TOP_K)
+    
+    for q, (rows, distances) in enumerate(brute_force(matrix, queries, space, TOP_K)):
+        assert result["ids"][q] == [f"id{row}" for row in rows]
+        assert result["distances"][q] == pytest.approx(distances, rel=1e-4, abs=1e-4)
+        assert result["documents"][q] == [f"doc{row}" for row in rows]
+
+
+@pytest.mark.parametrize("quantization, index_class", [("int8", Int8Index), ("pq", PQIndex), ("truncate", TruncatedIndex)])
+@pytest.mark.parametrize("space", ["l2", "cosine"])
+def test_quantized_search_recall(tmp_path, monkeypatch, data, quantization, index_class, space):
+    """量化粗排 + 全精度重排的 recall@30 不低于阈值，重排后的距离为全精度距离"""
+    matrix, queries = data
+    store = make_store(tmp_path, monkeypatch, quantization, space, matrix)
+    collection = store._get("test")
+    assert isinstance(collection._get_quantized(), index_class)
+    
+    result = store.query("test", queries.tolist(), n_results=TOP_K)
+    recalls = []
+    for q, (rows, distances) in enumerate(brute_force(matrix, queries, space, TOP_K)):
+        exact = {f"id{row}" for row in rows}
+        recalls.append(len(exact & set(result["ids"][q])) / TOP_K)
+        # 命中的行距离与精确距离相同（重排使用全精度向量）
+        exact_distances = dict(zip((f"id{row}" for row in rows), distances))
+        for doc_id, distance in zip(result["ids"][q], result["distances"][q]):
+            if doc_id in exact_distances:
+                assert distance == pytest.approx(exact_distances[doc_id], rel=1e-4, abs=1e-4)
+    assert np.mean(recalls) >= MIN_RECALL
+
+
+@pytest.mark.parametrize("quantization", ["int8", "pq", "truncate"])
+def test_rescore_with_full_shortlist_is_exact(tmp_path, monkeypatch, data, quantization):
+    """短名单覆盖全部候选时 _rescore 与精确检索一致（含 where 候选子集）"""
+    matrix, queries = data
+    store = make_store(tmp_path, monkeypatch, quantization, "l2", matrix)
+    collection = store._get("test")
+    quantized = collection._get_quantized()
+    full_matrix = collection._get_matrix()
+    
+    for candidates in (None, np.arange(0, NUM_ROWS, 3)):
+        collection.rescore_size = NUM_ROWS if candidates is None else len(candidates)
+        hits = collection._rescore(full_matrix, quantized, queries, candidates, TOP_K)
+        for (rows, distances), (exact_rows, exact_distances) in zip(
+            hits, brute_force(matrix, queries, "l2", TOP_K, rows=candidates)
+        ):
+            assert rows.tolist() == exact_rows.tolist()
+            assert distances == pytest.approx(exact_distances, rel=1e-4, abs=1e-4)
+
+
+def test_where_filter_matches_chroma(tmp_path, monkeypatch):
+    """where 过滤结果与 Chroma 对相同数据的过滤结果一致"""
+    chromadb = pytest.importorskip("chromadb")
+    from chromadb.config import Settings as ChromaSettings
+    
+    rng = np.random.default_rng(1)
+    matrix = rng.normal(size=(200, 8)).astype(np.float32)
+    metadatas = []
+    for i in range(len(matrix)):
+        chapter_num = int(rng.integers(1, 51))
+        metadata = {
+            "chapter_num": chapter_num,
+            "chapter_title": f"第{chapter_num % 10}章",
+            "weight": float(rng.random()),
+            "quoted": bool(rng.random() < 0.3)
+        }
+        if rng.random() < 0.6:
+            metadata["tag"] = str(rng.choice(["战斗", "日常", "修炼"]))
+        metadatas.append(metadata)
+    
+    store = make_store(tmp_path, monkeypatch, "int8", "l2", matrix, metadatas)
+    client = chromadb.EphemeralClient(settings=ChromaSettings(anonymized_telemetry=False))
+    chroma = client.create_collection("where_test", embedding_function=None)
+    chroma.add(
+        ids=[f"id{i}" for i in range(len(matrix))],
+        embeddings=matrix.tolist(),
+        documents=[f"doc{i}" for i in range(len(matrix))],
+        metadatas=metadatas
+    )
+    
+    for where in WHERE_CLAUSES:
+        expected = set(chroma.get(where=where)["ids"])
+        actual = store.query("test", matrix[:1].tolist(), n_results=len(matrix), where=where)["ids"][0]
+        assert set(actual) == expected, where
+        assert len(actual) == len(expected)